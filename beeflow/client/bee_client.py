@@ -36,7 +36,7 @@ from beeflow.common.cli import NaturalOrderGroup
 from beeflow.common.connection import Connection
 from beeflow.common import paths
 from beeflow.common.object_models import generate_workflow_id
-from beeflow.client import remote_client
+from beeflow.client import query_format, remote_client
 from beeflow.wf_manager.models import (
     CopyWorkflowRequest,
     CopyWorkflowResponse,
@@ -362,7 +362,7 @@ def get_wf_status(wf_id):
 
 def modify_workflow_list(wf_ids, all_, action, valid_statuses):
     """Modify a list of workflows based on action and valid statuses."""
-    if not action in ("pause", "resume", "cancel", "remove"):
+    if not action in ("pause", "resume", "cancel", "remove", "archive"):
         error_exit(f'Invalid action "{action}" provided to modify_workflow_list')
 
     if not all_ and not wf_ids:
@@ -413,7 +413,7 @@ def modify_workflow_list(wf_ids, all_, action, valid_statuses):
         if any(wf_status.startswith(valid_status) for valid_status in valid_statuses):
             try:
                 conn = _wfm_conn()
-                if action in ("pause", "resume"):
+                if action in ("pause", "resume", "archive"):
                     resp = conn.patch(
                         _resource(wf_id),
                         json=ModifyWorkflowRequest(option=action).model_dump(),
@@ -436,6 +436,7 @@ def modify_workflow_list(wf_ids, all_, action, valid_statuses):
                     "resume": "resumed",
                     "cancel": "cancelled",
                     "remove": "removed",
+                    "archive": "archiving",
                 }
                 typer.secho(f"Workflow {_short_id(wf_id)} {past_tense[action]}!",
                             fg=typer.colors.GREEN)
@@ -695,7 +696,7 @@ def remove(
         wf_ids,
         all_,
         action="remove",
-        valid_statuses=["Cancelled", "Paused", "Archived"],
+        valid_statuses=["Cancelled", "Paused", "Archived", "Archive Failed"],
     )
 
 
@@ -754,35 +755,11 @@ def query(wf_id: str = typer.Argument(..., callback=match_short_id)):
     tasks_status = status.tasks_status
     wf_status = status.wf_status
     typer.echo(wf_status)
-
-    scheduler = config_driver.BeeConfig.get('DEFAULT','workload_scheduler').lower()
-    if scheduler == 'slurm' and config_driver.BeeConfig.get('slurm','use_commands'):
-        section = 'slurm command attributes'
-    elif scheduler == 'flux':
-        section = 'flux attributes'
-    else:
-        section= 'slurm attributes'
-
-    attrs = config_driver.BeeConfig.get(section, 'attributes')
-    logging.info(attrs)
-    if isinstance(attrs,str):
-        attrs = [attr.strip() for attr in attrs.split(',') if attr.strip()]
-
-    attr_data=[]
-    for _task_id, task_name, task_state,metadata in tasks_status:
-        if wf_status == 'No Start':
-            typer.echo(f'{task_name}')
-            continue
-
-        output_fields=[task_name,task_state]
-        for attr in attrs:
-            value = metadata.get(attr)
-            if value is not None:
-                output_fields.append(str(value))
-        attr_data.append(output_fields)
-    headers = ['task_name','task_state'] + attrs
-    if attr_data:
-        typer.echo(tabulate(attr_data,headers=headers,tablefmt="fancy grid"))
+    prefetch = query_format.format_prefetch(status.prefetch)
+    if prefetch is not None:
+        typer.echo(prefetch)
+    for line in query_format.format_tasks(wf_status, tasks_status):
+        typer.echo(line)
     logging.info('Query workflow:  {resp.text}')
     return wf_status, tasks_status
 
@@ -835,6 +812,30 @@ def resume(
     )
 
 
+@app.command("archive")
+def archive_workflows(
+    wf_ids: Optional[List[str]] = typer.Argument(
+        None,
+        metavar="WF_IDS...",
+        callback=match_short_ids,
+        help="Workflow ID(s) to archive again",
+    ),
+    all_: bool = typer.Option(
+        False,
+        "--all",
+        "-a",
+        help="Archive all workflows whose archive failed again",
+    ),
+):
+    """Retry archiving workflows whose archive failed."""
+    modify_workflow_list(
+        wf_ids,
+        all_,
+        action="archive",
+        valid_statuses=["Archive Failed"],
+    )
+
+
 @app.command()
 def cancel(
     wf_ids: Optional[List[str]] = typer.Argument(
@@ -945,9 +946,10 @@ def dag(
 
     # output_dir must be a string
     output_dir = str(output_dir)
-    # Check if the workflow is archived
+    # Check if the workflow is archived. A workflow whose archive failed keeps
+    # its directory, so its DAG is exported from there.
     wf_status = get_wf_status(wf_id)
-    if wf_status == "Archived":
+    if wf_status.startswith("Archived"):
         bee_workdir = wf_utils.get_bee_workdir()
         mount_dir = os.path.join(bee_workdir, "gdb_mount")
         graphmls_dir = mount_dir + "/graphmls"
@@ -279,7 +279,8 @@ def init_components(remote=False):
             """Start BEESlurmRestD. Returns a Popen process object."""
             bee_workdir = bc.get('DEFAULT', 'bee_workdir')
             slurmrestd_log = '/'.join([bee_workdir, 'logs', 'restd.log'])
-            openapi_version = worker_utils.get_slurmrestd_version()
+            openapi_version = worker_utils.cached_slurmrestd_version(
+                paths.slurmrestd_version_cache())
             print(f"Inferred slurmrestd version: {openapi_version}")
             slurm_args = f'-d {openapi_version} -s openapi/slurmctld'
             # The following adds the db plugin we opted not to use for now
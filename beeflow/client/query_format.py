@@ -0,0 +1,53 @@
+"""Formatting of workflow queries for the BEE client."""
+
+import logging
+
+from tabulate import tabulate
+from beeflow.common import config_driver
+
+
+def format_prefetch(prefetch):
+    """Return the line describing the container image prefetch (None if there is none)."""
+    if prefetch is None:
+        return None
+    failed = f', {prefetch.failed} failed' if prefetch.failed else ''
+    return f'Container images: {prefetch.done}/{prefetch.total} ready{failed}'
+
+
+def task_attributes():
+    """Return the scheduler attributes to show for each task."""
+    scheduler = config_driver.BeeConfig.get('DEFAULT','workload_scheduler').lower()
+    if scheduler == 'slurm' and config_driver.BeeConfig.get('slurm','use_commands'):
+        section = 'slurm command attributes'
+    elif scheduler == 'flux':
+        section = 'flux attributes'
+    else:
+        section= 'slurm attributes'
+
+    attrs = config_driver.BeeConfig.get(section, 'attributes')
+    logging.info(attrs)
+    if isinstance(attrs,str):
+        attrs = [attr.strip() for attr in attrs.split(',') if attr.strip()]
+    return attrs
+
+
+def format_tasks(wf_status, tasks_status):
+    """Return the lines listing the tasks of a workflow with their states and attributes."""
+    attrs = task_attributes()
+    lines = []
+    attr_data=[]
+    for _task_id, task_name, task_state,metadata in tasks_status:
+        if wf_status == 'No Start':
+            lines.append(f'{task_name}')
+            continue
+
+        output_fields=[task_name,task_state]
+        for attr in attrs:
+            value = metadata.get(attr)
+            if value is not None:
+                output_fields.append(str(value))
+        attr_data.append(output_fields)
+    headers = ['task_name','task_state'] + attrs
+    if attr_data:
+        lines.append(tabulate(attr_data,headers=headers,tablefmt="fancy grid"))
+    return lines
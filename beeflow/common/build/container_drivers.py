@@ -13,9 +13,11 @@ import subprocess
 import tempfile
 from beeflow.common.config_driver import BeeConfig as bc
 from beeflow.common import log as bee_logging
+from beeflow.common.build import image_cache
 from beeflow.common.build.utils import ContainerBuildError
 from beeflow.common.build.build_driver import BuildDriver
 from beeflow.common.crt.charliecloud_driver import CharliecloudDriver as crt_driver
+from beeflow.common.crt.charliecloud_driver import SQUASHFS_EXTENSIONS
 
 
 log = bee_logging.setup(__name__)
@@ -52,6 +54,8 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
             container_archive = bc.get('builder', 'container_archive')
             self.container_archive = bc.resolve_path(container_archive)
             os.makedirs(self.container_archive, exist_ok=True)
+            # Pulled and built images are stored by content in the archive
+            self.image_cache = image_cache.ImageCache.from_config()
             # Deploy build tarballs relative to /var/tmp/username/beeflow by default
             deployed_image_root = bc.get('builder', 'deployed_image_root')
             # Make sure conf_file path exists
@@ -144,19 +148,24 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
 
         # Determine name for successful build target
         ch_build_addr = addr.replace('/', '%')
-
-        ch_build_target = '/'.join([self.container_archive, ch_build_addr]) + '.tar.gz'
-        # Return if image already exist and force==False.
-        if os.path.exists(ch_build_target) and not force:
-            log.info('Image already exists. If you want to refresh container, use force option.')
-            log.info(f'Image path: {ch_build_target}')
-            return 0
-        # Force remove any cached images if force==True
-        if os.path.exists(ch_build_target) and force:
-            try:
-                os.remove(ch_build_target)
-            except FileNotFoundError:
-                pass
+        key = image_cache.pull_key(addr, self.image_cache.image_format)
+
+        if not force:
+            # Return if the image is already cached
+            cached = self.image_cache.lookup(key, ch_build_addr, self.task.id)
+            if cached:
+                log.info('Image already exists. If you want to refresh container, '
+                         'use force option.')
+                log.info(f'Image path: {cached}')
+                return 0
+            # Adopt a tarball pulled before the cache existed
+            ch_build_target = self.image_cache.name_path(ch_build_addr)
+            if os.path.isfile(ch_build_target) and not os.path.islink(ch_build_target):
+                log.info(f'Adding existing image {ch_build_target} to the image cache')
+                self.image_cache.add(key, ch_build_addr, self.task.id, source=ch_build_target)
+                return 0
+        else:
+            # Force remove any images held by Charliecloud if force==True
             try:
                 shutil.rmtree('/var/tmp/' + os.getlogin() + '/ch-image/' + ch_build_addr)
             except FileNotFoundError:
@@ -164,10 +173,12 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
 
         # Out of excuses. Pull the image.
         cmd = (f'ch-image pull {addr}\n'
-               f'ch-convert -i ch-image -o tar {ch_build_addr}'
-               f' {self.container_archive}/{ch_build_addr}.tar.gz'
+               f'ch-convert -i ch-image -o {self.image_cache.image_format} {ch_build_addr}'
+               f' {self.image_cache.partial_path(key)}'
                )
-        return subprocess.run(cmd, check=True, shell=True)
+        result = subprocess.run(cmd, check=True, shell=True)
+        self.image_cache.add(key, ch_build_addr, self.task.id)
+        return result
 
     def process_docker_load(self):
         """Get and process the CWL compliant dockerLoad dockerRequirment.
@@ -211,25 +222,23 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
         # Determine name for successful build target
         ch_build_addr = self.container_name.replace('/', '%')
 
-        ch_build_target = '/'.join([self.container_archive, ch_build_addr]) + '.tar.gz'
-        log.info(f'Build will create tar ball at {ch_build_target}')
+        # Get the force type (uses seccomp by default)
+        force_type = self.task.get_requirement('DockerRequirement', 'beeflow:forceType', 'seccomp')
+
+        # Images built from the same Dockerfile are only built once, whatever their name
+        key = image_cache.dockerfile_key(task_dockerfile, force_type,
+                                         self.image_cache.image_format)
+        log.info(f'Build will create tar ball at {self.image_cache.path(key)}')
         # Return if image already exist and force==False.
-        if os.path.exists(ch_build_target) and not force:
+        if not force and self.image_cache.lookup(key, ch_build_addr, self.task.id):
             return 0
-        # Force remove any cached images if force==True
-        if os.path.exists(ch_build_target) and force:
-            try:
-                os.remove(ch_build_target)
-            except FileNotFoundError:
-                pass
+        # Force remove any images held by Charliecloud if force==True
+        if force:
             try:
                 shutil.rmtree('/var/tmp/' + os.getlogin() + '/ch-image/' + ch_build_addr)
             except FileNotFoundError:
                 pass
 
-        # Get the force type (uses seccomp by default)
-        force_type = self.task.get_requirement('DockerRequirement', 'beeflow:forceType', 'seccomp')
-
         # Out of excuses. Build the image.
         with tempfile.NamedTemporaryFile(mode='w+', encoding='utf-8') as tmp:
             # Write the dockerfile to the tempfile
@@ -240,11 +249,13 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
             log.info('Context directory configured. Beginning build.')
             cmd = (f'ch-image build -t {self.container_name} --force {force_type} '
                    f'-f {dockerfile_path} {context_dir}\n'
-                   f'ch-convert -i ch-image -o tar {ch_build_addr} '
-                   f'{self.container_archive}/{ch_build_addr}.tar.gz'
+                   f'ch-convert -i ch-image -o {self.image_cache.image_format} {ch_build_addr} '
+                   f'{self.image_cache.partial_path(key)}'
                    )
             log.info(f'Executing: {cmd}')
-            return subprocess.run(cmd, check=True, shell=True)
+            result = subprocess.run(cmd, check=True, shell=True)
+        self.image_cache.add(key, ch_build_addr, self.task.id)
+        return result
 
     def process_docker_import(self, param_import=None):
         """Get and process the CWL compliant dockerImport dockerRequirement.
@@ -321,11 +332,15 @@ class CharliecloudBuildDriver(ContainerBuildDriver):
                 "beeflow:copyContainer: You must specify the path to an existing container."
             )
 
-        if self.container_name:
-            copy_target = '/'.join([self.container_archive, self.container_name + '.tar.gz'])
+        # Keep SquashFS images as they are so that they can be mounted directly
+        base, ext = os.path.splitext(os.path.basename(task_container_path))
+        if ext in SQUASHFS_EXTENSIONS:
+            name, ext = base, '.sqfs'
         else:
-            copy_target = '/'.join([self.container_archive,
-                                    crt_driver.get_ccname(task_container_path) + '.tar.gz'])
+            name, ext = crt_driver.get_ccname(task_container_path), '.tar.gz'
+        if self.container_name:
+            name = self.container_name
+        copy_target = '/'.join([self.container_archive, name + ext])
         log.info(f'Build will copy a container to {copy_target}')
         # Return if image already exist and force==False.
         if os.path.exists(copy_target) and not force:
@@ -0,0 +1,187 @@
+"""Content-addressed store of container image tarballs.
+
+Pulled and built images are stored once in the ``store`` directory of the
+container archive, named by a key derived from the registry digest of a
+pulled image or the contents of a Dockerfile, in the format set by
+``[builder] image_format``. The ``<name>.tar.gz`` (or ``<name>.sqfs``) paths
+that the container runtime reads are symlinks into the store, so identical
+images used under different names share one file. An index records the
+size and last use of each image and the active tasks using it; once the
+store outgrows ``[builder] cache_max_size``, the least recently used images
+that no active task uses are evicted.
+"""
+
+import hashlib
+import os
+
+from beeflow.common.config_driver import BeeConfig as bc
+from beeflow.common import log as bee_logging
+from beeflow.common.db import bdb
+from beeflow.common.db import image_db
+
+log = bee_logging.setup(__name__)
+
+STORE_DIR = 'store'
+INDEX_FILE = 'image_cache.db'
+DIGEST_SEPARATOR = '@sha256:'
+# File extension of the images written in each [builder] image_format
+IMAGE_EXTENSIONS = {'tar': '.tar.gz', 'squash': '.sqfs'}
+
+
+def _sha256(text):
+    """Return the hex SHA-256 digest of a string."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _format_suffix(image_format):
+    """Return the key suffix telling images of other formats than tar apart."""
+    return '' if image_format == 'tar' else f'-{image_format}'
+
+
+def pull_key(addr, image_format='tar'):
+    """Return the cache key of a pulled image.
+
+    Images pinned to a digest are keyed by the digest, whatever name or tag
+    they are pulled with; others are keyed by their address.
+    """
+    if DIGEST_SEPARATOR in addr:
+        return 'sha256-' + addr.split(DIGEST_SEPARATOR, 1)[1] + _format_suffix(image_format)
+    return 'pull-' + _sha256(addr) + _format_suffix(image_format)
+
+
+def dockerfile_key(dockerfile, force_type='', image_format='tar'):
+    """Return the cache key of an image built from a Dockerfile."""
+    return 'dockerfile-' + _sha256(f'{force_type}\0{dockerfile}') + _format_suffix(image_format)
+
+
+class ImageCache:
+    """Content-addressed image store in a container archive."""
+
+    def __init__(self, archive, max_size=0, image_format='tar'):
+        """Construct the image cache.
+
+        :param archive: the container archive directory
+        :type archive: str
+        :param max_size: size in bytes above which images are evicted (0 for no limit)
+        :type max_size: int
+        :param image_format: format of the stored images ('tar' or 'squash')
+        :type image_format: str
+        """
+        self.archive = archive
+        self.store = os.path.join(archive, STORE_DIR)
+        self.index_file = os.path.join(archive, INDEX_FILE)
+        self.max_size = max_size
+        self.image_format = image_format
+        self.extension = IMAGE_EXTENSIONS[image_format]
+        self._db = None
+
+    @classmethod
+    def from_config(cls):
+        """Return the image cache of the configured container archive."""
+        archive = bc.resolve_path(bc.get('builder', 'container_archive'))
+        return cls(archive, bc.get('builder', 'cache_max_size') * 2**20,
+                   bc.get('builder', 'image_format'))
+
+    @property
+    def db(self):
+        """Return the image index, creating it if necessary."""
+        if self._db is None:
+            os.makedirs(self.store, exist_ok=True)
+            self._db = bdb.connect_db(image_db, self.index_file)
+        return self._db
+
+    def path(self, key):
+        """Return the store path of an image."""
+        return os.path.join(self.store, f'{key}{self.extension}')
+
+    def partial_path(self, key):
+        """Return the path an image is written to before it is added."""
+        return os.path.join(self.store, f'{key}.partial{self.extension}')
+
+    def name_path(self, name):
+        """Return the archive path that the runtime reads an image from."""
+        return os.path.join(self.archive, f'{name}{self.extension}')
+
+    def lookup(self, key, name, task_id):
+        """Use a stored image for a task; returns its path (None if it isn't stored).
+
+        The image is linked to name and marked as used now. Index entries
+        whose tarball has gone missing are dropped.
+        """
+        image = self.db.get(key)
+        if image is None:
+            return None
+        if not os.path.exists(image.path):
+            log.warning(f'Cached image {key} is missing; dropping it from the index')
+            self.db.remove(key)
+            return None
+        self.db.touch(key)
+        self.db.acquire(key, task_id)
+        self.link(name, key)
+        return image.path
+
+    def add(self, key, name, task_id, source=None):
+        """Move a new image into the store and link it to name; returns its path.
+
+        :param source: the tarball to add (by default, the image's partial path)
+        :type source: str
+        """
+        path = self.path(key)
+        os.replace(source or self.partial_path(key), path)
+        with bdb.transaction(self.db.db_file):
+            self.db.add(key, path, os.path.getsize(path))
+            self.db.acquire(key, task_id)
+        self.link(name, key)
+        self.evict()
+        return path
+
+    def link(self, name, key):
+        """Point the archive path of name at a stored image."""
+        name_path = self.name_path(name)
+        tmp_path = f'{name_path}.{os.getpid()}.link'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.symlink(os.path.relpath(self.path(key), self.archive), tmp_path)
+        # Replace any existing link (or old unmanaged tarball) atomically
+        os.replace(tmp_path, name_path)
+        self.db.set_alias(name, key)
+
+    def _unlink(self, name, key):
+        """Remove the archive path of name if it still points at key."""
+        name_path = self.name_path(name)
+        target = os.path.relpath(self.path(key), self.archive)
+        if os.path.islink(name_path) and os.readlink(name_path) == target:
+            os.remove(name_path)
+
+    def release(self, task_id):
+        """Drop a task's references to its images."""
+        if os.path.exists(self.index_file):
+            self.db.release(task_id)
+
+    def evict(self):
+        """Evict least recently used images until the store fits; returns the evicted keys.
+
+        Images in use by active tasks are never evicted.
+        """
+        if not self.max_size:
+            return []
+        evicted = []
+        with bdb.transaction(self.db.db_file):
+            total = self.db.total_size()
+            for image in self.db.images():
+                if total <= self.max_size:
+                    break
+                if image.refs:
+                    continue
+                for name in self.db.aliases(image.key):
+                    self._unlink(name, image.key)
+                self.db.remove(image.key)
+                try:
+                    os.remove(image.path)
+                except FileNotFoundError:
+                    pass
+                total -= image.size
+                evicted.append(image.key)
+        if evicted:
+            log.info(f'Evicted cached images {evicted}')
+        return evicted
@@ -1,4 +1,5 @@
 """Container build utility code."""
+import json
 import jsonpickle
 
 
@@ -22,5 +23,27 @@ def task2arg(task):
     return jsonpickle.encode(task)
 
 
+def image_requirement_key(task):
+    """Return a key identifying the container image that a task needs.
+
+    Tasks with the same DockerRequirement need the same image, so they share
+    a key; tasks without one get None.
+    """
+    requirement = task.get_full_requirement('DockerRequirement')
+    if not requirement:
+        return None
+    return json.dumps(requirement, sort_keys=True, default=str)
+
+
+def image_tasks(tasks):
+    """Return one task for each distinct container image that the tasks need."""
+    images = {}
+    for task in tasks:
+        key = image_requirement_key(task)
+        if key is not None:
+            images.setdefault(key, task)
+    return list(images.values())
+
+
 class ContainerBuildError(Exception):
     """Cotnainer build error class."""
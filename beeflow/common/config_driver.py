@@ -145,17 +145,18 @@ class BeeConfig:
         # Discard redundant paths, iff Windows, replace(\,/)
         # Assume "~" means home dir
         relative_path = os.path.expanduser(os.path.normpath(relative_path))
-        # Resolve the true path (expand relative path refs)
-        tmp = os.getcwd()
+        # Resolve the true path (expand relative path refs). This avoids
+        # changing the working directory since the task manager builds
+        # containers from several threads.
         if os.path.isdir(relative_path):
-            os.chdir(relative_path)
-            absolute_path = os.getcwd()
+            absolute_path = os.path.realpath(relative_path)
         else:
             # Get desired config file name
             filename = os.path.basename(relative_path)
-            os.chdir(os.path.dirname(relative_path))
-            absolute_path = '/'.join([os.getcwd(), filename])
-        os.chdir(tmp)
+            dirname = os.path.realpath(os.path.dirname(relative_path))
+            if not os.path.isdir(dirname):
+                raise FileNotFoundError(f'No such directory: {dirname}')
+            absolute_path = '/'.join([dirname, filename])
         return absolute_path
 
 
@@ -269,6 +270,12 @@ VALIDATOR.option('DEFAULT', 'workload_scheduler', choices=('Slurm', 'LSF', 'Flux
 
 VALIDATOR.option('DEFAULT', 'delete_completed_workflow_dirs', validator=validation.bool_,
                  default=True, info='delete workflow directory for completed jobs', prompt=False)
+VALIDATOR.option('DEFAULT', 'archive_compression_level', validator=validation.compression_level,
+                 default=6, prompt=False,
+                 info='gzip compression level (1-9) of workflow archives')
+VALIDATOR.option('DEFAULT', 'archive_compression_threads', validator=validation.nonnegative_int,
+                 default=0, prompt=False,
+                 info='threads used to compress workflow archives with pigz (0 for one per core)')
 
 VALIDATOR.option('DEFAULT', 'use_redis_container', validator=validation.bool_,
                  default=True, info='Use the redis container image or spack',
@@ -291,6 +298,10 @@ VALIDATOR.option('DEFAULT', 'max_restarts', validator=int, default=3, prompt=Fal
 
 # Workflow Manager
 VALIDATOR.section('workflow_manager', info='Workflow manager section.')
+VALIDATOR.option('workflow_manager', 'native_dependencies', default=False,
+                 validator=validation.bool_, prompt=False,
+                 info='submit the dependents of running tasks early, chained with '
+                      'scheduler dependencies (Slurm, Flux and LSF only)')
 # Task manager
 VALIDATOR.section('task_manager',
                   info='Task manager configuration and config of container to use.')
@@ -303,11 +314,65 @@ VALIDATOR.option('task_manager', 'runner_opts', default='', prompt=False,
                  info='special runner options to pass to the runner opts')
 VALIDATOR.option('task_manager', 'background_interval', default=5,
                  validator=int, prompt=False,
-                 info='interval at which the task manager processes queues and updates states')
+                 info='interval at which the task manager checks the submit queue when it '
+                      'has not been woken up by a new submission')
+VALIDATOR.option('task_manager', 'submit_workers', default=4,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='number of tasks whose containers are built and jobs submitted '
+                      'concurrently (1 submits serially)')
+VALIDATOR.option('task_manager', 'prefetch_workers', default=2,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='number of container images pulled or built concurrently ahead of the '
+                      'tasks of a newly started workflow (0 disables prefetching)')
+VALIDATOR.option('task_manager', 'job_array_min_size', default=0,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='submit at least this many ready tasks that share resources as one '
+                      'job array (Slurm only; 0 never uses job arrays)')
+VALIDATOR.option('task_manager', 'poll_interval_min', default=2,
+                 validator=int, prompt=False,
+                 info='interval at which newly submitted jobs and jobs that just changed '
+                      'state are polled')
+VALIDATOR.option('task_manager', 'poll_interval_max', default=60,
+                 validator=int, prompt=False,
+                 info='maximum interval between polls of a job whose state is not changing')
+VALIDATOR.option('task_manager', 'poll_backoff', default=2.0,
+                 validator=float, prompt=False,
+                 info='factor by which the polling interval of an unchanged job grows')
+VALIDATOR.option('task_manager', 'heartbeat_interval', default=300,
+                 validator=int, prompt=False,
+                 info='interval at which the state of a job that has not changed is re-sent '
+                      'to the workflow manager')
 VALIDATOR.option('task_manager', 'backup_interval', default=5,
                  validator=int, prompt=False,
                  info='interval at which the task manager processes queues and updates states')
 
+# Pilot jobs
+VALIDATOR.section('pilot', info='Pilot job configuration: run tasks inside one long-lived '
+                                'allocation instead of submitting a job per task.')
+VALIDATOR.option('pilot', 'enabled', default=False, validator=validation.bool_, prompt=False,
+                 info='dispatch tasks to a pilot agent running in an allocation')
+VALIDATOR.option('pilot', 'nodes', default=1, validator=validation.nonnegative_int,
+                 prompt=False, info='number of nodes of the pilot allocation')
+VALIDATOR.option('pilot', 'cores', default=0, validator=validation.nonnegative_int,
+                 prompt=False,
+                 info='number of cores the agent packs tasks onto (0 for all of its CPUs)')
+VALIDATOR.option('pilot', 'time_limit', default='', validator=validation.time_limit,
+                 prompt=False, info='time limit of the pilot job (blank for the job default)')
+VALIDATOR.option('pilot', 'idle_timeout', default=300, validator=int, prompt=False,
+                 info='seconds without tasks after which the pilot agent exits')
+VALIDATOR.constraint(
+    lambda conf: not (conf['pilot']['enabled'] and conf['workflow_manager']['native_dependencies']),
+    'pilot::enabled and workflow_manager::native_dependencies cannot both be set, since the '
+    'pilot agent cannot hold tasks until the tasks they depend on complete')
+
+# Simple worker (depends on DEFAULT::workload_scheduler == Simple)
+VALIDATOR.section('simple', info='Local execution configuration for the Simple scheduler.',
+                  depends_on=('DEFAULT', 'workload_scheduler', 'Simple'))
+VALIDATOR.option('simple', 'cores', default=0, validator=validation.nonnegative_int,
+                 prompt=False, info='number of cores tasks may use at once (0 for all CPUs)')
+VALIDATOR.option('simple', 'memory', default=0, validator=validation.nonnegative_int,
+                 prompt=False,
+                 info='MB of memory tasks may use at once (0 for all of the memory)')
 
 # Charliecloud (depends on task_manager::container_runtime == Charliecloud)
 VALIDATOR.section('charliecloud', info='Charliecloud configuration section.',
@@ -414,10 +479,34 @@ VALIDATOR.option('graphdb', 'gdb_image_mntdir', default=join_path('/tmp', USER),
 VALIDATOR.option('graphdb', 'sleep_time', validator=int, default=1, prompt=False,
                  info='how long to wait for the graph database to come up (this can take a while, '
                       'depending on the system)')
+# SQLite databases (workflow, task manager, client and graph databases)
+VALIDATOR.section('database', info='SQLite database connection configuration section.')
+VALIDATOR.option('database', 'sqlite_journal_mode', default='WAL',
+                 choices=('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY'), prompt=False,
+                 info='SQLite journal mode (use DELETE if bee_workdir is on a filesystem '
+                      'without shared memory support)')
+VALIDATOR.option('database', 'sqlite_synchronous', default='NORMAL',
+                 choices=('OFF', 'NORMAL', 'FULL', 'EXTRA'), prompt=False,
+                 info='SQLite synchronous setting')
+VALIDATOR.option('database', 'sqlite_cache_size', default=-8192, validator=int, prompt=False,
+                 info='SQLite page cache size (pages if positive, KiB if negative)')
+VALIDATOR.option('database', 'sqlite_mmap_size', default=0,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='maximum number of bytes of a database to memory map (0 disables mmap)')
+VALIDATOR.option('database', 'sqlite_cached_statements', default=256,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='number of prepared statements to cache per connection')
 # Builder
 VALIDATOR.section('builder', info='General builder configuration section.')
 VALIDATOR.option('builder', 'deployed_image_root', default='/tmp', prompt=False,
                  info='where to deploy container images', validator=validation.make_dir)
+VALIDATOR.option('builder', 'deployed_image_ttl', default=24, validator=validation.nonnegative_int,
+                 prompt=False,
+                 info='hours an unpacked image is kept on a node after its last use')
+VALIDATOR.option('builder', 'deployed_image_max_size', default=0,
+                 validator=validation.nonnegative_int, prompt=False,
+                 info='size in MiB above which the least recently used unpacked images are '
+                      'removed from a node (0 for no limit)')
 VALIDATOR.option('builder', 'container_output_path', default='/tmp', prompt=False,
                  info='container output path', validator=validation.make_dir)
 VALIDATOR.option('builder', 'container_archive', prompt=True,
@@ -425,6 +514,14 @@ VALIDATOR.option('builder', 'container_archive', prompt=True,
                  info='container archive location')
 VALIDATOR.option('builder', 'container_type', default='charliecloud',
                  info='container type to use', prompt=False)
+VALIDATOR.option('builder', 'image_format', default='tar', choices=('tar', 'squash'),
+                 prompt=False,
+                 info='format the builder converts images to (squash images are mounted by '
+                      'ch-run instead of being unpacked on each node; ch-run needs SquashFUSE)')
+VALIDATOR.option('builder', 'cache_max_size', default=0, validator=validation.nonnegative_int,
+                 prompt=False,
+                 info='size in MiB above which the least recently used images are evicted from '
+                      'the container archive (0 for no limit)')
 # Slurmrestd (depends on DEFAULT:workload_scheduler == Slurm)
 VALIDATOR.section('slurm', info='Configuration section for Slurm.',
                   depends_on=('DEFAULT', 'workload_scheduler', 'Slurm'))
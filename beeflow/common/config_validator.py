@@ -18,6 +18,7 @@ class ConfigValidator:
         self._section_order = []
         self._sections = {}
         self._options = {}
+        self._constraints = []
 
     def validate(self, conf):
         """Validate a config and return a new config with defaults and values converted."""
@@ -26,6 +27,8 @@ class ConfigValidator:
 
         self._validate_existing_options(conf, new_conf, errors)
         self._check_required_options(conf, new_conf, errors)
+        if not errors:
+            self._check_constraints(new_conf, errors)
 
         # Bundle up all the errors into one exception
         if errors:
@@ -86,6 +89,10 @@ class ConfigValidator:
                     new_conf[sec_name] = {}
                 new_conf[sec_name][opt_name] = default
 
+    def _check_constraints(self, new_conf, errors):
+        """Check that the validated options can be used together."""
+        errors.extend(message for check, message in self._constraints if not check(new_conf))
+
     def _validate_section(self, conf, depends_on):
         """Ensure that this section is valid in this context (check depends relations)."""
         if depends_on is None:
@@ -125,6 +132,14 @@ class ConfigValidator:
         except ConfigError as err:
             raise ConfigError(f'{sec_name}::{opt_name}: {err.args[0]}') from None
 
+    def constraint(self, check, message):
+        """Define a constraint on options that can't be validated on their own.
+
+        check is passed the validated config and returns False if the config
+        breaks the constraint, in which case validation fails with message.
+        """
+        self._constraints.append((check, message))
+
     @property
     def sections(self):
         """Return all sections in order as list of tuples (sec_name, section)."""
@@ -4,17 +4,24 @@ Creates text for tasks using Charliecloud.
 """
 
 import os
+import sys
 import yaml
 from beeflow.common.crt.crt_driver import (ContainerRuntimeDriver, ContainerRuntimeResult,
                                            Command, CommandType)
 from beeflow.common.config_driver import BeeConfig as bc
+from beeflow.common.build.image_cache import IMAGE_EXTENSIONS
 from beeflow.common.build.utils import task2arg
+from beeflow.common.crt.image_deploy import image_key
 from beeflow.common.container_path import convert_path
 from beeflow.common import log as bee_logging
 
 
 log = bee_logging.setup(__name__)
 
+# Extensions ch-convert infers the SquashFS format from, see:
+# https://hpc.github.io/charliecloud/ch-convert.html#format-inference
+SQUASHFS_EXTENSIONS = ('.sqfs', '.squash', '.squashfs')
+
 
 class CharliecloudDriver(ContainerRuntimeDriver):
     """The ContainerRuntimeDriver for Charliecloud as container runtime system.
@@ -42,6 +49,19 @@ class CharliecloudDriver(ContainerRuntimeDriver):
         name = '.'.join(name)
         return name
 
+    def archive_path(self, name):
+        """Return the path of an image in the container archive.
+
+        Images in the configured [builder] image_format are preferred; images
+        in the other format (e.g. built before the option was changed) are
+        used if there are none.
+        """
+        image_format = bc.get('builder', 'image_format')
+        extensions = sorted(IMAGE_EXTENSIONS.values(),
+                            key=lambda ext: ext != IMAGE_EXTENSIONS.get(image_format))
+        paths = [os.path.join(self.container_archive, name + ext) for ext in extensions]
+        return next((path for path in paths if os.path.exists(path)), paths[0])
+
     def run_text(self, task):  # pylint: disable=R0915
         """Create text for Charliecloud batch script."""
         os.makedirs(self.container_archive, exist_ok=True)
@@ -103,11 +123,11 @@ class CharliecloudDriver(ContainerRuntimeDriver):
             task_container_name = self.get_ccname(use_container)
             container_path = os.path.expanduser(use_container)
             _, ext = os.path.splitext(container_path)
-            # infer if using SquashFS, similar to:
-            # https://hpc.github.io/charliecloud/ch-convert.html#format-inference
-            squashfs = ext in ['.sqfs', '.squash', '.squashfs']
+            squashfs = ext in SQUASHFS_EXTENSIONS
         else:
-            container_path = '/'.join([self.container_archive, task_container_name]) + '.tar.gz'
+            container_path = self.archive_path(task_container_name)
+            # SquashFS images are mounted by ch-run as they are
+            squashfs = container_path.endswith(IMAGE_EXTENSIONS['squash'])
 
         log.info(f'Expecting container at {container_path}. Ready to deploy and run.')
 
@@ -126,14 +146,21 @@ class CharliecloudDriver(ContainerRuntimeDriver):
         if squashfs:
             deployed_path = container_path
         else:
-            deployed_path = deployed_image_root + '/' + task_container_name
+            # Unpack the image once per node and share it with later tasks
+            key = image_key(container_path)
+            deployed_path = deployed_image_root + '/' + key
+            image_deploy = f'{sys.executable} -m beeflow.common.crt.image_deploy'
+            cache_opts = (f'--lease {task.id} '
+                          f'--ttl {bc.get("builder", "deployed_image_ttl")} '
+                          f'--max-size {bc.get("builder", "deployed_image_max_size")}')
             pre_commands = [
-                Command(f'mkdir -p {deployed_image_root}\n'.split(), CommandType.ONE_PER_NODE),
-                Command(f'ch-convert -i tar -o dir {container_path} {deployed_path}\n'.split(),
+                Command(f'{image_deploy} deploy {deployed_image_root} {key} '
+                        f'--archive {container_path} {cache_opts}\n'.split(),
                         CommandType.ONE_PER_NODE),
             ]
             post_commands = [
-                Command(f'rm -rf {deployed_path}\n'.split(), type_=CommandType.ONE_PER_NODE),
+                Command(f'{image_deploy} release {deployed_image_root} {key} '
+                        f'{cache_opts}\n'.split(), type_=CommandType.ONE_PER_NODE),
             ]
         # Need to convert the path from inside to outside base on the bind mounts
         extra_opts = ''
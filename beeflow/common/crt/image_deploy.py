@@ -0,0 +1,231 @@
+"""Node-local cache of unpacked container images.
+
+Tasks no longer unpack their image before running and delete it afterwards.
+The job script runs ``deploy`` on each node before the task and ``release``
+after it. Images are unpacked once per node into ``ROOT/KEY``, where the key
+is derived from the archive tarball. This module runs on the compute nodes,
+so it only depends on the standard library, beeflow.common.file_utils and its
+arguments.
+
+* deploy: if ``ROOT/KEY`` is missing, unpack the archive into a temporary
+  directory and rename it into place while holding ``ROOT/KEY.lock``.
+  Concurrent tasks on the node wait for the first one and then share its
+  copy. A lease is then taken on the image.
+* release: drop the task's lease.
+
+After either action, images that no task holds a lease on are evicted if
+they haven't been used within the TTL. Unleased images are also evicted,
+least recently used first, while the cache is larger than its size limit.
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from beeflow.common.file_utils import dir_size
+
+# Leases older than this are left over from jobs that never released them
+LEASE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def image_key(archive_path):
+    """Return the key an archive tarball is deployed under.
+
+    The key changes whenever the tarball is replaced, so a rebuilt image is
+    never confused with the copy unpacked from the old one.
+
+    :param archive_path: path to the image tarball
+    :type archive_path: str
+    :rtype: str
+    """
+    real_path = os.path.realpath(archive_path)
+    try:
+        stat = os.stat(real_path)
+        ident = f'{real_path}:{stat.st_size}:{stat.st_mtime_ns}'
+    except OSError:
+        ident = real_path
+    name = os.path.basename(real_path).split('.tar', 1)[0]
+    return f'{name}-{hashlib.sha256(ident.encode()).hexdigest()[:16]}'
+
+
+class DeployedImages:
+    """Unpacked images under a node-local root directory."""
+
+    def __init__(self, root, ttl=0, max_size=0):
+        """Construct the cache.
+
+        :param root: directory the images are unpacked in
+        :type root: str
+        :param ttl: seconds an unused image is kept for
+        :type ttl: int
+        :param max_size: bytes above which unused images are evicted (0 for no limit)
+        :type max_size: int
+        """
+        self.root = root
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def path(self, key):
+        """Return the directory an image is unpacked in."""
+        return os.path.join(self.root, key)
+
+    def _meta_path(self, key):
+        """Return the metadata file of an image."""
+        return os.path.join(self.root, f'{key}.json')
+
+    def _lease_dir(self, key):
+        """Return the directory holding the leases on an image."""
+        return os.path.join(self.root, f'{key}.leases')
+
+    @contextlib.contextmanager
+    def _locked(self, key):
+        """Hold the lock of an image for the duration of the block."""
+        with open(os.path.join(self.root, f'{key}.lock'), 'a', encoding='utf-8') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_meta(self, key):
+        """Return the metadata of an image (None if it isn't deployed)."""
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        """Replace the metadata of an image."""
+        tmp_path = f'{self._meta_path(key)}.{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(meta, fp)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def keys(self):
+        """Return the keys of the deployed images."""
+        return [name[:-len('.json')] for name in os.listdir(self.root)
+                if name.endswith('.json') and os.path.isdir(self.path(name[:-len('.json')]))]
+
+    def leases(self, key, now=None):
+        """Return the live leases on an image."""
+        now = time.time() if now is None else now
+        try:
+            names = os.listdir(self._lease_dir(key))
+        except FileNotFoundError:
+            return []
+        live = []
+        for name in names:
+            try:
+                lease_path = os.path.join(self._lease_dir(key), name)
+                if now - os.stat(lease_path).st_mtime < LEASE_TIMEOUT:
+                    live.append(name)
+            except FileNotFoundError:
+                pass
+        return live
+
+    def deploy(self, key, archive, lease):
+        """Unpack an image unless it is already deployed and take a lease on it.
+
+        :param key: the image key
+        :type key: str
+        :param archive: path to the image tarball
+        :type archive: str
+        :param lease: name of the lease (e.g. the task ID)
+        :type lease: str
+        :rtype: str
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(key)
+        with self._locked(key):
+            meta = self._read_meta(key)
+            if meta is None or not os.path.isdir(path):
+                tmp_path = f'{path}.partial.{os.getpid()}'
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                subprocess.run(['ch-convert', '-i', 'tar', '-o', 'dir', archive, tmp_path],
+                               check=True)
+                shutil.rmtree(path, ignore_errors=True)
+                os.rename(tmp_path, path)
+                meta = {'archive': archive, 'size': dir_size(path)}
+            meta['last_use'] = time.time()
+            self._write_meta(key, meta)
+            os.makedirs(self._lease_dir(key), exist_ok=True)
+            with open(os.path.join(self._lease_dir(key), lease), 'w', encoding='utf-8'):
+                pass
+        self.evict()
+        return path
+
+    def release(self, key, lease):
+        """Drop a lease on an image and evict the images that are no longer needed."""
+        with self._locked(key):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self._lease_dir(key), lease))
+            meta = self._read_meta(key)
+            if meta is not None:
+                meta['last_use'] = time.time()
+                self._write_meta(key, meta)
+        return self.evict()
+
+    def _remove(self, key):
+        """Remove an image; the caller holds its lock, which is kept for later users."""
+        os.remove(self._meta_path(key))
+        shutil.rmtree(self.path(key), ignore_errors=True)
+        shutil.rmtree(self._lease_dir(key), ignore_errors=True)
+
+    def evict(self, now=None):
+        """Evict expired images, then the least recently used ones above the size limit.
+
+        Images with live leases are kept. Returns the evicted keys.
+        """
+        now = time.time() if now is None else now
+        images = sorted(((key, self._read_meta(key)) for key in self.keys()),
+                        key=lambda image: image[1]['last_use'] if image[1] else 0)
+        total = sum(meta['size'] for _, meta in images if meta)
+        evicted = []
+        for key, meta in images:
+            if meta is None:
+                continue
+            expired = now - meta['last_use'] >= self.ttl
+            if not expired and not (self.max_size and total > self.max_size):
+                continue
+            with self._locked(key):
+                # Another task may have started using the image in the meantime
+                if self.leases(key, now) or self._read_meta(key) != meta:
+                    continue
+                self._remove(key)
+            total -= meta['size']
+            evicted.append(key)
+        return evicted
+
+
+def main(argv=None):
+    """Deploy or release an image on this node."""
+    parser = argparse.ArgumentParser(description='Manage the node-local image cache')
+    parser.add_argument('action', choices=('deploy', 'release'))
+    parser.add_argument('root', help='directory the images are unpacked in')
+    parser.add_argument('key', help='image key')
+    parser.add_argument('--archive', help='image tarball to deploy')
+    parser.add_argument('--lease', required=True, help='name of the lease (e.g. the task ID)')
+    parser.add_argument('--ttl', type=float, default=0, help='hours an unused image is kept')
+    parser.add_argument('--max-size', type=int, default=0,
+                        help='MiB above which unused images are evicted (0 for no limit)')
+    args = parser.parse_args(argv)
+    images = DeployedImages(args.root, args.ttl * 3600, args.max_size * 2**20)
+    if args.action == 'deploy':
+        if not args.archive:
+            parser.error('deploy requires --archive')
+        images.deploy(args.key, args.archive, args.lease)
+    else:
+        images.release(args.key, args.lease)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
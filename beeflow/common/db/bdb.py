@@ -1,8 +1,20 @@
 """Contains functions for managing a database for workflow and task information."""
 
+import contextlib
+import os
 import sqlite3
+import threading
 from sqlite3 import Error
 
+from beeflow.common.config_driver import BeeConfig as bc
+
+
+# Connections are cached per thread (sqlite3 connections can't be shared
+# across threads by default) and tagged with the pid of the process that
+# opened them, so that a forked child (e.g. a celery worker) never reuses
+# its parent's connection.
+_local = threading.local()
+
 
 def connect_db(module, db_path):
     """Return a DB object."""
@@ -10,88 +22,239 @@ def connect_db(module, db_path):
     return db
 
 
+def _configure_connection(conn):
+    """Apply the connection pragmas configured in bee.conf."""
+    conn.execute("PRAGMA foreign_keys = ON;")
+    journal_mode = bc.get('database', 'sqlite_journal_mode')
+    conn.execute(f"PRAGMA journal_mode = {journal_mode};")
+    synchronous = bc.get('database', 'sqlite_synchronous')
+    conn.execute(f"PRAGMA synchronous = {synchronous};")
+    cache_size = bc.get('database', 'sqlite_cache_size')
+    conn.execute(f"PRAGMA cache_size = {cache_size};")
+    mmap_size = bc.get('database', 'sqlite_mmap_size')
+    conn.execute(f"PRAGMA mmap_size = {mmap_size};")
+
+
 def create_connection(db_file):
     """Create a new connection with the workflow database."""
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
-        conn.execute("PRAGMA foreign_keys = ON;")
+        conn = sqlite3.connect(db_file,
+                               cached_statements=bc.get('database', 'sqlite_cached_statements'))
+        _configure_connection(conn)
         return conn
     except Error as error:
         print("Error connecting to database: ", error)
     return conn
 
 
+def _file_id(db_file):
+    """Return an identifier for the file backing db_file (None if it doesn't exist)."""
+    try:
+        stat = os.stat(db_file)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino)
+
+
+def _connections():
+    """Return the connection cache for the current thread and process."""
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        # Either a new thread or a freshly forked process; drop anything
+        # inherited without closing it, since it belongs to the parent.
+        _local.pid = pid
+        _local.conns = {}
+        _local.tx_depth = {}
+    return _local.conns
+
+
+def get_connection(db_file):
+    """Return the cached connection for db_file, opening it if necessary.
+
+    The connection is reopened if the database file was removed or replaced
+    since the connection was created.
+    """
+    conns = _connections()
+    cached = conns.get(db_file)
+    file_id = _file_id(db_file)
+    if cached is not None:
+        conn, cached_file_id = cached
+        if cached_file_id == file_id:
+            return conn
+        del conns[db_file]
+        _local.tx_depth.pop(db_file, None)
+        conn.close()
+    conn = create_connection(db_file)
+    if conn is not None:
+        # Look up the id again in case connecting created the file
+        conns[db_file] = (conn, _file_id(db_file))
+    return conn
+
+
+def close_connections():
+    """Close all cached connections held by the current thread."""
+    conns = _connections()
+    for conn, _ in conns.values():
+        conn.close()
+    conns.clear()
+    _local.tx_depth.clear()
+
+
+def _in_transaction(db_file):
+    """Return true if the current thread has an open transaction on db_file."""
+    _connections()
+    return _local.tx_depth.get(db_file, 0) > 0
+
+
+@contextlib.contextmanager
+def transaction(db_file):
+    """Run a group of statements on db_file in a single transaction.
+
+    Calls to run(), runmany(), runscript(), getone() and getall() made on the same
+    thread inside the block share the transaction instead of committing
+    individually, and errors are raised so that the whole block is rolled
+    back. Transactions may be nested; only the outermost one commits.
+
+    The write lock is taken up front, so that a transaction that reads before
+    it writes waits for other writers instead of failing with "database is
+    locked" when it tries to write.
+    """
+    conn = get_connection(db_file)
+    depth = _local.tx_depth.get(db_file, 0)
+    if depth == 0 and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    _local.tx_depth[db_file] = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.tx_depth[db_file] = depth
+        if depth == 0:
+            conn.rollback()
+        raise
+    _local.tx_depth[db_file] = depth
+    if depth == 0:
+        conn.commit()
+
+
 def create_table(db_file, stmt):
     """Create a new table in the database."""
-    with create_connection(db_file) as conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute(stmt)
-        except Error as error:
-            print(error)
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(stmt)
+        if not _in_transaction(db_file):
+            conn.commit()
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        print(error)
 
 
 def run(db_file, stmt, params=None):
     """Run the sql statement on the database. Doesn't return anything."""
-    with create_connection(db_file) as conn:
-        try:
-            cursor = conn.cursor()
-            if params:
-                cursor.execute(stmt, params)
-            else:
-                cursor.execute(stmt)
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(stmt, params)
+        else:
+            cursor.execute(stmt)
+        if not _in_transaction(db_file):
             conn.commit()
-        except Error as error:
-            print("Error running: ", stmt)
-            print(error)
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        conn.rollback()
+        print("Error running: ", stmt)
+        print(error)
 
 
+def runmany(db_file, stmt, seq_of_params):
+    """Run the sql statement once for each set of parameters. Doesn't return anything."""
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(stmt, seq_of_params)
+        if not _in_transaction(db_file):
+            conn.commit()
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        conn.rollback()
+        print("Error running: ", stmt)
+        print(error)
+
+
+def _split_script(script):
+    """Split a sql script into complete statements."""
+    stmt = ''
+    for line in script.splitlines(keepends=True):
+        stmt += line
+        if sqlite3.complete_statement(stmt):
+            yield stmt
+            stmt = ''
+    if stmt.strip():
+        yield stmt
+
 
 def runscript(db_file, script):
     """Run the sql script on the database. Doesn't return anything."""
-    with create_connection(db_file) as conn:
-        try:
-            cursor = conn.cursor()
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        if _in_transaction(db_file):
+            # executescript() would commit the pending transaction first
+            for stmt in _split_script(script):
+                cursor.execute(stmt)
+        else:
             cursor.executescript(script)
             conn.commit()
-        except Error as error:
-            print("Error running script")
-            print(error)
-
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        conn.rollback()
+        print("Error running script")
+        print(error)
 
 
 def getone(db_file, stmt, params=None):
     """Run the sql statement on the database and return the result."""
-    with create_connection(db_file) as conn:
-        try:
-            cursor = conn.cursor()
-            if params:
-                cursor.execute(stmt, params)
-            else:
-                cursor.execute(stmt)
-            result = cursor.fetchone()
-        except Error as error:
-            print("Error fetching one: ", stmt)
-            print(error)
-            result = None
-        return result
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(stmt, params)
+        else:
+            cursor.execute(stmt)
+        result = cursor.fetchone()
+        # Finish the statement so that it doesn't hold a read snapshot open
+        cursor.close()
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        print("Error fetching one: ", stmt)
+        print(error)
+        result = None
+    return result
 
 
 def getall(db_file, stmt, params=None):
     """Run the sql statement on the database and return the result."""
-    with create_connection(db_file) as conn:
-        try:
-            cursor = conn.cursor()
-            if params:
-                cursor.execute(stmt, params)
-            else:
-                cursor.execute(stmt)
-            result = cursor.fetchall()
-        except Error as error:
-            print("Error fetching all: ", stmt)
-            print(error)
-            result = None
+    conn = get_connection(db_file)
+    try:
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(stmt, params)
+        else:
+            cursor.execute(stmt)
+        result = cursor.fetchall()
+    except Error as error:
+        if _in_transaction(db_file):
+            raise
+        print("Error fetching all: ", stmt)
+        print(error)
+        result = None
     return result
 
 
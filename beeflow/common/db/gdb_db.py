@@ -4,6 +4,7 @@
 import json
 from typing import Optional
 from beeflow.common.db import bdb
+from beeflow.common.db.task_state_counts import add_task_state_counts, count_states
 from beeflow.common.object_models import (Workflow, Task, Requirement, Hint,
 InputParameter, OutputParameter, StepInput, StepOutput)
 from beeflow.wf_manager.models import WorkflowInfo
@@ -63,6 +64,7 @@ class SQL_GDB:
             reqs JSON,
             hints JSON,
             metadata JSON,
+            unsatisfied INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (workflow_id) REFERENCES workflow(id) ON DELETE CASCADE
         );"""
 
@@ -111,11 +113,43 @@ class SQL_GDB:
 
                 CREATE INDEX IF NOT EXISTS idx_task_input_task_id ON task_input(task_id);
                 CREATE INDEX IF NOT EXISTS idx_task_output_task_id ON task_output(task_id);
+                CREATE INDEX IF NOT EXISTS idx_task_input_source ON task_input(source);
+                CREATE INDEX IF NOT EXISTS idx_task_output_id ON task_output(id);
 
                 CREATE INDEX IF NOT EXISTS idx_task_dep_depends_on ON task_dep(depends_on_task_id);
                 CREATE INDEX IF NOT EXISTS idx_task_dep_depending ON task_dep(depending_task_id);
         """
 
+        # task.unsatisfied counts the inputs of a task that don't have a value
+        # yet, so that runnable tasks can be found without scanning task_input
+        unsatisfied_stmt = """
+            CREATE INDEX IF NOT EXISTS idx_task_runnable
+                ON task(workflow_id, state, unsatisfied);
+
+            CREATE TRIGGER IF NOT EXISTS task_input_unsatisfied_insert
+            AFTER INSERT ON task_input
+            WHEN NEW.value IS NULL
+            BEGIN
+                UPDATE task SET unsatisfied = unsatisfied + 1 WHERE id = NEW.task_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS task_input_unsatisfied_update
+            AFTER UPDATE OF value ON task_input
+            WHEN (OLD.value IS NULL) != (NEW.value IS NULL)
+            BEGIN
+                UPDATE task
+                SET unsatisfied = unsatisfied + (CASE WHEN NEW.value IS NULL THEN 1 ELSE -1 END)
+                WHERE id = NEW.task_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS task_input_unsatisfied_delete
+            AFTER DELETE ON task_input
+            WHEN OLD.value IS NULL
+            BEGIN
+                UPDATE task SET unsatisfied = unsatisfied - 1 WHERE id = OLD.task_id;
+            END;
+        """
+
         bdb.create_table(self.db_file, wfs_stmt)
         bdb.create_table(self.db_file, wf_inputs_stmt)
         bdb.create_table(self.db_file, wf_outputs_stmt)
@@ -125,9 +159,30 @@ class SQL_GDB:
         bdb.create_table(self.db_file, task_deps_stmt)
         bdb.create_table(self.db_file, task_rst_stmt)
         bdb.runscript(self.db_file, add_indexes_stmt)
+        self._add_unsatisfied_column()
+        bdb.runscript(self.db_file, unsatisfied_stmt)
+        add_task_state_counts(self.db_file)
+
+    def _add_unsatisfied_column(self):
+        """Add and fill in task.unsatisfied for databases created without it."""
+        columns = bdb.getall(self.db_file, 'PRAGMA table_info(task)')
+        if not columns or any(column[1] == 'unsatisfied' for column in columns):
+            return
+        count_query = """
+            UPDATE task
+            SET unsatisfied = (
+                SELECT COUNT(*)
+                FROM task_input AS ti
+                WHERE ti.task_id = task.id
+                    AND ti.value IS NULL
+            );"""
+        with bdb.transaction(self.db_file):
+            bdb.run(self.db_file,
+                    'ALTER TABLE task ADD COLUMN unsatisfied INTEGER NOT NULL DEFAULT 0')
+            bdb.run(self.db_file, count_query)
 
-    def create_workflow(self, workflow: Workflow):
-        """Create a workflow in the db"""
+    def _insert_workflow(self, workflow: Workflow):
+        """Insert the workflow and its inputs and outputs (no commit)."""
         wf_stmt = """INSERT INTO workflow (id, name, state, workdir, main_cwl,
                     wf_path, yaml, reqs, hints, restart)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"""
@@ -136,20 +191,21 @@ class SQL_GDB:
         wf_output_stmt = """INSERT INTO workflow_output (id, workflow_id, type, value, source)
                             VALUES (?, ?, ?, ?, ?);"""
 
-
         hints_json = json.dumps([h.model_dump() for h in workflow.hints])
         reqs_json = json.dumps([r.model_dump() for r in workflow.requirements])
         bdb.run(self.db_file, wf_stmt, (workflow.id, workflow.name, workflow.state,
                                         workflow.workdir, workflow.main_cwl, workflow.wf_path,
                                         workflow.yaml, reqs_json, hints_json, 0))
+        bdb.runmany(self.db_file, wf_input_stmt,
+                    [(inp.id, workflow.id, inp.type, inp.value) for inp in workflow.inputs])
+        bdb.runmany(self.db_file, wf_output_stmt,
+                    [(outp.id, workflow.id, outp.type, outp.value, outp.source)
+                     for outp in workflow.outputs])
 
-
-        for inp in workflow.inputs:
-            bdb.run(self.db_file, wf_input_stmt, (inp.id, workflow.id, inp.type, inp.value))
-        for outp in workflow.outputs:
-            bdb.run(self.db_file, wf_output_stmt, (outp.id, workflow.id, outp.type,
-                                                   outp.value, outp.source))
-
+    def create_workflow(self, workflow: Workflow):
+        """Create a workflow in the db"""
+        with bdb.transaction(self.db_file):
+            self._insert_workflow(workflow)
 
     def set_init_task_inputs(self, wf_id: str):
         """Set initial workflow task inputs from workflow inputs or defaults"""
@@ -207,14 +263,23 @@ class SQL_GDB:
             SET state = 'READY'
             WHERE workflow_id = :wf_id
             AND state = 'WAITING'
-            AND NOT EXISTS (
-                SELECT 1
-                FROM task_input AS ti
-                WHERE ti.task_id = task.id
-                    AND ti.value IS NULL
-        );"""
+            AND unsatisfied = 0;"""
         bdb.run(self.db_file, set_runnable_ready_query, {'wf_id': wf_id})
 
+    def set_runnable_dependents_to_ready(self, task_id: str):
+        """Set the direct dependents of a task with all inputs satisfied to READY state"""
+        set_dependents_ready_query = """
+            UPDATE task
+            SET state = 'READY'
+            WHERE id IN (
+                SELECT depending_task_id
+                FROM task_dep
+                WHERE depends_on_task_id = :task_id
+            )
+            AND state = 'WAITING'
+            AND unsatisfied = 0;"""
+        bdb.run(self.db_file, set_dependents_ready_query, {'task_id': task_id})
+
     def set_workflow_state(self, wf_id: str, state: str):
         """Set the state of the workflow."""
         set_wf_state_query = """
@@ -223,8 +288,8 @@ class SQL_GDB:
             WHERE id = :wf_id;"""
         bdb.run(self.db_file, set_wf_state_query, {'wf_id': wf_id, 'state': state})
 
-    def create_task(self, task: Task):
-        """Create a task in the db"""
+    def _insert_tasks(self, tasks: list[Task]):
+        """Insert the tasks and their inputs and outputs (no commit)."""
         task_stmt = """INSERT INTO task (id, workflow_id, name, state, workdir, base_command,
                     stdout, stderr, reqs, hints, metadata)
                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"""
@@ -234,24 +299,53 @@ class SQL_GDB:
         task_output_stmt = """INSERT INTO task_output (id, task_id, type, value, glob)
                             VALUES (?, ?, ?, ?, ?);"""
 
+        task_rows = []
+        input_rows = []
+        output_rows = []
+        for task in tasks:
+            hints_json = json.dumps([h.model_dump() for h in task.hints])
+            reqs_json = json.dumps([r.model_dump() for r in task.requirements])
+            task_rows.append((task.id, task.workflow_id, task.name, task.state, task.workdir,
+                              json.dumps(task.base_command), task.stdout, task.stderr,
+                              reqs_json, hints_json, json.dumps(task.metadata)))
+            input_rows.extend((inp.id, task.id, inp.type, inp.value, inp.default, inp.source,
+                               inp.prefix, inp.position, inp.value_from)
+                              for inp in task.inputs)
+            output_rows.extend((outp.id, task.id, outp.type, outp.value, outp.glob)
+                               for outp in task.outputs)
+        bdb.runmany(self.db_file, task_stmt, task_rows)
+        bdb.runmany(self.db_file, task_input_stmt, input_rows)
+        bdb.runmany(self.db_file, task_output_stmt, output_rows)
+
+    def create_task(self, task: Task):
+        """Create a task in the db"""
+        with bdb.transaction(self.db_file):
+            self._insert_tasks([task])
 
-        hints_json = json.dumps([h.model_dump() for h in task.hints])
-        reqs_json = json.dumps([r.model_dump() for r in task.requirements])
-        metadata_json = json.dumps(task.metadata)
-        bdb.run(self.db_file, task_stmt, (task.id, task.workflow_id, task.name,
-                                          task.state, task.workdir,
-                                      json.dumps(task.base_command), task.stdout, task.stderr,
-                                      reqs_json, hints_json, metadata_json))
+    def bulk_load_workflow(self, workflow: Workflow, tasks: list[Task]):
+        """Create a workflow and all of its tasks and dependencies in one transaction.
 
+        Dependencies are inferred once for the whole workflow by joining task
+        inputs to the task outputs they are sourced from.
+        """
+        dependency_query = """
+            INSERT OR IGNORE INTO task_dep (depending_task_id, depends_on_task_id)
+            SELECT DISTINCT s.id AS depending_task_id, t.id AS depends_on_task_id
+            FROM task AS s
+            JOIN task_input AS i
+            ON i.task_id = s.id
+            JOIN task_output AS o
+            ON o.id = i.source
+            JOIN task AS t
+            ON t.id = o.task_id
+            WHERE
+                s.workflow_id = :wf_id
+                AND t.workflow_id = :wf_id;"""
 
-        for inp in task.inputs:
-            bdb.run(self.db_file, task_input_stmt, (inp.id, task.id, inp.type, inp.value,
-                                                    inp.default, inp.source,
-                                                    inp.prefix, inp.position,
-                                                    inp.value_from))
-        for outp in task.outputs:
-            bdb.run(self.db_file, task_output_stmt, (outp.id, task.id, outp.type,
-                                                     outp.value, outp.glob))
+        with bdb.transaction(self.db_file):
+            self._insert_workflow(workflow)
+            self._insert_tasks(tasks)
+            bdb.run(self.db_file, dependency_query, {'wf_id': workflow.id})
 
     def set_task_state(self, task_id: str, state: str):
         """Set the state of a task."""
@@ -261,6 +355,24 @@ class SQL_GDB:
             WHERE id = :task_id;"""
         bdb.run(self.db_file, set_task_state_query, {'task_id': task_id, 'state': state})
 
+    def mark_downstream(self, task_id: str, state: str):
+        """Set the state of every task that transitively depends on a task."""
+        mark_downstream_query = """
+            WITH RECURSIVE downstream(id) AS (
+                SELECT depending_task_id
+                FROM task_dep
+                WHERE depends_on_task_id = :task_id
+                UNION
+                SELECT task_dep.depending_task_id
+                FROM task_dep
+                JOIN downstream
+                    ON task_dep.depends_on_task_id = downstream.id
+            )
+            UPDATE task
+            SET state = :state
+            WHERE id IN (SELECT id FROM downstream);"""
+        bdb.run(self.db_file, mark_downstream_query, {'task_id': task_id, 'state': state})
+
 
     def add_dependencies(self, task: Task, old_task: Task=None, restarted_task=False):
         """Add dependencies for a task based on its inputs and outputs."""
@@ -400,18 +512,64 @@ class SQL_GDB:
                     AND o.task_id = :task_id
             );"""
 
-        bdb.run(self.db_file, task_inputs_query, {'task_id': task.id})
-        bdb.run(self.db_file, defaults_query, [task.id, *final_task_states])
-        bdb.run(self.db_file, workflow_output_query, {'task_id': task.id})
+        with bdb.transaction(self.db_file):
+            bdb.run(self.db_file, task_inputs_query, {'task_id': task.id})
+            bdb.run(self.db_file, defaults_query, [task.id, *final_task_states])
+            bdb.run(self.db_file, workflow_output_query, {'task_id': task.id})
 
 
-    def get_task(self, task_id: str) -> Optional[Task]:
-        """Return a reconstructed Task object from the db by its ID."""
-        task_data = bdb.getone(self.db_file, 'SELECT * FROM task WHERE id=?', [task_id])
-        if not task_data:
-            return None
+    def _get_tasks(self, where: str, params) -> list[Task]:
+        """Return reconstructed Task objects for the tasks matching a condition.
 
-        task = Task(
+        where is a condition on the task table. The tasks, their inputs and
+        their outputs are each read with a single query and grouped here.
+        """
+        tasks_query = f"""
+            SELECT task.id, task.workflow_id, task.name, task.state, task.workdir,
+                   task.base_command, task.stdout, task.stderr, task.reqs, task.hints,
+                   task.metadata
+            FROM task
+            WHERE {where}
+            ORDER BY task.rowid;"""
+        inputs_query = f"""
+            SELECT ti.task_id, ti.id, ti.type, ti.value, ti.default_val, ti.source,
+                   ti.prefix, ti.position, ti.value_from
+            FROM task_input AS ti
+            JOIN task ON task.id = ti.task_id
+            WHERE {where}
+            ORDER BY ti.rowid;"""
+        outputs_query = f"""
+            SELECT to_.task_id, to_.id, to_.type, to_.value, to_.glob
+            FROM task_output AS to_
+            JOIN task ON task.id = to_.task_id
+            WHERE {where}
+            ORDER BY to_.rowid;"""
+
+        tasks_data = bdb.getall(self.db_file, tasks_query, params)
+        if not tasks_data:
+            return []
+        inputs = {}
+        for ti in bdb.getall(self.db_file, inputs_query, params):
+            inputs.setdefault(ti[0], []).append(StepInput(
+                id=ti[1],
+                type=ti[2],
+                value=ti[3],
+                default=ti[4],
+                source=ti[5],
+                prefix=ti[6],
+                position=ti[7],
+                value_from=ti[8]
+            ))
+        outputs = {}
+        for to in bdb.getall(self.db_file, outputs_query, params):
+            outputs.setdefault(to[0], []).append(StepOutput(
+                id=to[1],
+                type=to[2],
+                value=to[3],
+                glob=to[4]
+            ))
+
+        return [Task(
             id=task_data[0],
             workflow_id=task_data[1],
             name=task_data[2],
@@ -423,10 +581,15 @@ class SQL_GDB:
             requirements=[Requirement.model_validate(r) for r in json.loads(task_data[8])],
             hints=[Hint.model_validate(h) for h in json.loads(task_data[9])],
             metadata=json.loads(task_data[10]),
-            inputs=self.get_task_inputs(task_data[0]),
-            outputs=self.get_task_outputs(task_data[0])
+            inputs=inputs.get(task_data[0], []),
+            outputs=outputs.get(task_data[0], [])
             )
-        return task
+            for task_data in tasks_data]
+
+    def get_task(self, task_id: str) -> Optional[Task]:
+        """Return a reconstructed Task object from the db by its ID."""
+        tasks = self._get_tasks('task.id = ?', [task_id])
+        return tasks[0] if tasks else None
 
     def get_task_inputs(self, task_id: str):
         """Return a list of StepInput objects for a task."""
@@ -539,20 +702,27 @@ class SQL_GDB:
 
         :rtype: list of Task
         """
-        tasks_data = bdb.getall(self.db_file, 'SELECT id FROM task WHERE workflow_id=?', [wf_id])
-        tasks = [self.get_task(t[0]) for t in tasks_data] if tasks_data else []
-        return tasks
+        return self._get_tasks('task.workflow_id = ?', [wf_id])
+
+    def get_workflow_task_states(self, wf_id: str):
+        """Return the (id, name, state, metadata) of every workflow task from the db.
+
+        A projection of get_workflow_tasks() for callers that don't need
+        full Task objects.
+
+        :rtype: list of (str, str, str, dict)
+        """
+        rows = bdb.getall(self.db_file, """SELECT id, name, state, metadata FROM task
+                                           WHERE workflow_id=? ORDER BY rowid""", [wf_id])
+        return [(id_, name, state, json.loads(metadata) if metadata else {})
+                for id_, name, state, metadata in rows] if rows else []
 
     def get_ready_tasks(self, wf_id: str):
         """Return tasks with state 'READY' from the db.
 
         :rtype: list of Task
         """
-        tasks_data = bdb.getall(self.db_file,
-                                "SELECT id FROM task WHERE workflow_id=? AND state='READY'",
-                                [wf_id])
-        tasks = [self.get_task(t[0]) for t in tasks_data] if tasks_data else []
-        return tasks
+        return self._get_tasks("task.workflow_id = ? AND task.state = 'READY'", [wf_id])
 
     def get_dependent_tasks(self, task_id: str):
         """Return the dependent tasks of a workflow task in the db.
@@ -561,11 +731,8 @@ class SQL_GDB:
         :type task_id: str
         :rtype: list of Task
         """
-        deps_data = bdb.getall(self.db_file,
-                               "SELECT depending_task_id FROM task_dep WHERE depends_on_task_id=?",
-                               [task_id])
-        deps = [self.get_task(d[0]) for d in deps_data] if deps_data else []
-        return deps
+        return self._get_tasks("""task.id IN (SELECT depending_task_id FROM task_dep
+                                              WHERE depends_on_task_id = ?)""", [task_id])
 
     def get_task_state(self, task_id: str):
         """Return the state of a task in the db.
@@ -731,29 +898,37 @@ class SQL_GDB:
                 'UPDATE task_output SET glob=? WHERE task_id=? AND id=?',
                 [glob, task_id, output_id])
 
-    def final_tasks_completed(self, wf_id: str) -> bool:
+    def get_task_state_counts(self, wf_id: str) -> dict:
+        """Return the number of tasks of a workflow in each state.
+
+        :param wf_id: the ID of the workflow
+        :type wf_id: str
+        :rtype: dict of str to int
+        """
+        counts_query = """
+            SELECT state, count
+            FROM workflow_task_state
+            WHERE workflow_id = ?
+            AND count > 0;"""
+        result = bdb.getall(self.db_file, counts_query, [wf_id])
+        return dict(result) if result is not None else {}
+
+    def final_tasks_completed(self, wf_id: str, counts: Optional[dict] = None) -> bool:
         """Determine if a workflow's final tasks have completed.
 
         A workflow's final tasks have completed if each of its final tasks has finished or failed.
 
         :param wf_id: the ID of the workflow to check
         :type wf_id: str
+        :param counts: the task state counts, if already read
+        :type counts: Optional[dict]
         :rtype: bool
         """
-        placeholders = ','.join('?' for _ in final_task_states)
-        final_tasks_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state NOT IN ({placeholders});
-        """
-
-        params = [wf_id, *final_task_states]
-
-        result = bdb.getone(self.db_file, final_tasks_query, params)
-        return result is not None and result[0] == 0
+        if counts is None:
+            counts = self.get_task_state_counts(wf_id)
+        return count_states(counts, final_task_states, exclude=True) == 0
 
-    def final_tasks_succeeded(self, wf_id: str) -> bool:
+    def final_tasks_succeeded(self, wf_id: str, counts: Optional[dict] = None) -> bool:
         """Determine if a workflow's final tasks have succeeded.
 
         A workflow's final tasks have succeeded if each of its final tasks has 
@@ -761,40 +936,27 @@ class SQL_GDB:
 
         :param wf_id: the ID of the workflow to check
         :type wf_id: str
+        :param counts: the task state counts, if already read
+        :type counts: Optional[dict]
         :rtype: bool
         """
-        placeholders = ','.join('?' for _ in failed_task_states)
-        final_tasks_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state IN ({placeholders});
-        """
-
-        params = [wf_id, *failed_task_states]
+        if counts is None:
+            counts = self.get_task_state_counts(wf_id)
+        return (self.final_tasks_completed(wf_id, counts)
+                and count_states(counts, failed_task_states) == 0)
 
-        result = bdb.getone(self.db_file, final_tasks_query, params)
-        return self.final_tasks_completed(wf_id) and result is not None and result[0] == 0
-
-    def final_tasks_failed(self, wf_id: str) -> bool:
+    def final_tasks_failed(self, wf_id: str, counts: Optional[dict] = None) -> bool:
         """Determine if all of a workflow's final tasks have failed.
 
         :param wf_id: the ID of the workflow to check
         :type wf_id: str
+        :param counts: the task state counts, if already read
+        :type counts: Optional[dict]
         :rtype: bool
         """
-        placeholders = ','.join('?' for _ in failed_task_states) + ',?'
-        final_tasks_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state NOT IN ({placeholders});
-        """
-
-        params = [wf_id, *failed_task_states, 'RESTARTED']
-
-        result = bdb.getone(self.db_file, final_tasks_query, params)
-        return result is not None and result[0] == 0
+        if counts is None:
+            counts = self.get_task_state_counts(wf_id)
+        return count_states(counts, [*failed_task_states, 'RESTARTED'], exclude=True) == 0
 
     def cancelled_final_tasks_completed(self, wf_id: str) -> bool:
         """Determine if a cancelled workflow's final tasks have completed.
@@ -807,18 +969,7 @@ class SQL_GDB:
         :rtype: bool
         """
         incomplete_states = ['SUBMIT', 'PENDING', 'RUNNING', 'COMPLETING']
-        placeholders = ','.join('?' for _ in incomplete_states)
-        final_tasks_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state IN ({placeholders});
-        """
-
-        params = [wf_id, *incomplete_states]
-
-        result = bdb.getone(self.db_file, final_tasks_query, params)
-        return result is not None and result[0] == 0
+        return count_states(self.get_task_state_counts(wf_id), incomplete_states) == 0
 
     def remove_workflow(self, wf_id: str):
         """Remove a workflow and all its associated tasks from the db."""
@@ -0,0 +1,103 @@
+"""Container image cache index."""
+
+from collections import namedtuple
+import time
+
+from beeflow.common.db import bdb
+
+Image = namedtuple('Image', 'key path size created last_access refs')
+
+
+class ImageDB:
+    """Index of the images in the container image cache.
+
+    Each image is recorded once by its key, along with the names that link to
+    it and the active tasks that use it.
+    """
+
+    def __init__(self, db_file):
+        """Construct a new image index connection."""
+        self.db_file = db_file
+        self._init_tables()
+
+    def _init_tables(self):
+        """Initialize the image tables if they don't exist."""
+        image_stmt = """CREATE TABLE IF NOT EXISTS image(
+                        key TEXT PRIMARY KEY,
+                        path TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created REAL NOT NULL,
+                        last_access REAL NOT NULL)"""
+        alias_stmt = """CREATE TABLE IF NOT EXISTS alias(
+                        name TEXT PRIMARY KEY,
+                        key TEXT NOT NULL)"""
+        ref_stmt = """CREATE TABLE IF NOT EXISTS ref(
+                        task_id TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        PRIMARY KEY (task_id, key))"""
+        with bdb.transaction(self.db_file):
+            bdb.create_table(self.db_file, image_stmt)
+            bdb.create_table(self.db_file, alias_stmt)
+            bdb.create_table(self.db_file, ref_stmt)
+            bdb.create_table(self.db_file, 'CREATE INDEX IF NOT EXISTS idx_ref_key '
+                                           'ON ref(key)')
+
+    def get(self, key):
+        """Return the image stored under key (None if there isn't one)."""
+        stmt = """SELECT image.key, path, size, created, last_access, COUNT(ref.key)
+                  FROM image LEFT JOIN ref ON ref.key = image.key
+                  WHERE image.key=? GROUP BY image.key"""
+        result = bdb.getone(self.db_file, stmt, [key])
+        return None if result is None else Image(*result)
+
+    def images(self):
+        """Return all images, least recently used first."""
+        stmt = """SELECT image.key, path, size, created, last_access, COUNT(ref.key)
+                  FROM image LEFT JOIN ref ON ref.key = image.key
+                  GROUP BY image.key ORDER BY last_access ASC"""
+        return [Image(*row) for row in bdb.getall(self.db_file, stmt)]
+
+    def total_size(self):
+        """Return the combined size of all images in bytes."""
+        return bdb.getone(self.db_file, 'SELECT COALESCE(SUM(size), 0) FROM image')[0]
+
+    def add(self, key, path, size):
+        """Record (or replace) an image."""
+        now = time.time()
+        stmt = """INSERT OR REPLACE INTO image (key, path, size, created, last_access)
+                  VALUES (?, ?, ?, ?, ?)"""
+        bdb.run(self.db_file, stmt, [key, path, size, now, now])
+
+    def touch(self, key):
+        """Mark an image as used now."""
+        bdb.run(self.db_file, 'UPDATE image SET last_access=? WHERE key=?', [time.time(), key])
+
+    def remove(self, key):
+        """Remove an image and the names linking to it."""
+        with bdb.transaction(self.db_file):
+            bdb.run(self.db_file, 'DELETE FROM alias WHERE key=?', [key])
+            bdb.run(self.db_file, 'DELETE FROM image WHERE key=?', [key])
+
+    def set_alias(self, name, key):
+        """Link a name to an image."""
+        bdb.run(self.db_file, 'INSERT OR REPLACE INTO alias (name, key) VALUES (?, ?)',
+                [name, key])
+
+    def aliases(self, key):
+        """Return the names linking to an image."""
+        result = bdb.getall(self.db_file, 'SELECT name FROM alias WHERE key=?', [key])
+        return [row[0] for row in result]
+
+    def acquire(self, key, task_id):
+        """Record that a task uses an image."""
+        bdb.run(self.db_file, 'INSERT OR IGNORE INTO ref (task_id, key) VALUES (?, ?)',
+                [task_id, key])
+
+    def release(self, task_id):
+        """Drop every reference held by a task."""
+        bdb.run(self.db_file, 'DELETE FROM ref WHERE task_id=?', [task_id])
+
+
+def open_db(db_file):
+    """Open and return a new database."""
+    return ImageDB(db_file)
@@ -0,0 +1,66 @@
+"""Per-workflow task state counts for the SQL graph database.
+
+workflow_task_state counts the tasks of each workflow by state. Triggers on
+the task table keep the counts up to date, so that completion checks don't
+have to scan the workflow's tasks.
+"""
+
+from beeflow.common.db import bdb
+
+
+TASK_STATE_COUNTS_STMT = """
+    CREATE TABLE IF NOT EXISTS workflow_task_state (
+        workflow_id TEXT,
+        state TEXT,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (workflow_id, state),
+        FOREIGN KEY (workflow_id) REFERENCES workflow(id) ON DELETE CASCADE
+    );
+
+    CREATE TRIGGER IF NOT EXISTS task_state_count_insert
+    AFTER INSERT ON task
+    BEGIN
+        INSERT INTO workflow_task_state (workflow_id, state, count)
+        VALUES (NEW.workflow_id, NEW.state, 1)
+        ON CONFLICT (workflow_id, state) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_state_count_update
+    AFTER UPDATE OF state ON task
+    WHEN OLD.state IS NOT NEW.state
+    BEGIN
+        UPDATE workflow_task_state SET count = count - 1
+        WHERE workflow_id = OLD.workflow_id AND state = OLD.state;
+        INSERT INTO workflow_task_state (workflow_id, state, count)
+        VALUES (NEW.workflow_id, NEW.state, 1)
+        ON CONFLICT (workflow_id, state) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_state_count_delete
+    AFTER DELETE ON task
+    BEGIN
+        UPDATE workflow_task_state SET count = count - 1
+        WHERE workflow_id = OLD.workflow_id AND state = OLD.state;
+    END;
+"""
+
+
+def add_task_state_counts(db_file):
+    """Create the task state counters, filling them in for existing tasks."""
+    if not bdb.getall(db_file, 'PRAGMA table_info(task)'):
+        return
+    count_query = """
+        INSERT INTO workflow_task_state (workflow_id, state, count)
+        SELECT workflow_id, state, COUNT(*)
+        FROM task
+        GROUP BY workflow_id, state;"""
+    with bdb.transaction(db_file):
+        fill = not bdb.table_exists(db_file, 'workflow_task_state')
+        bdb.runscript(db_file, TASK_STATE_COUNTS_STMT)
+        if fill:
+            bdb.run(db_file, count_query)
+
+
+def count_states(counts, states, exclude=False):
+    """Count the tasks in (or, with exclude, not in) the given states."""
+    return sum(count for state, count in counts.items() if (state in states) != exclude)
@@ -1,14 +1,126 @@
 """Task Manager database code."""
 
 from collections import namedtuple
+import json
+import time
 import jsonpickle
 
 from beeflow.common.db import bdb
 from beeflow.common import log as bee_logging
+from beeflow.common.object_models import Task
 from beeflow.wf_manager.models import TaskStateUpdate
 
 log = bee_logging.setup(__name__)
 
+# Bumped whenever the queue table layout changes
+SCHEMA_VERSION = 5
+
+
+FINISHED_JOB_STMT = """CREATE TABLE IF NOT EXISTS finished_job(
+                        task_id TEXT PRIMARY KEY,
+                        job_state TEXT,
+                        finished_at REAL)"""
+
+
+def _encode_task(task):
+    """Encode a task for storage in the task table."""
+    return task.model_dump_json()
+
+
+def _decode_task(data):
+    """Decode a task stored in the task table."""
+    return Task.model_validate_json(data)
+
+
+def _migrate_to_v1(db_file):
+    """Move the tasks pickled into the queue rows into the task table."""
+    bdb.run(db_file, 'CREATE TABLE task(id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+    bdb.run(db_file, 'ALTER TABLE submit_queue RENAME TO submit_queue_v0')
+    bdb.run(db_file, 'ALTER TABLE job_queue RENAME TO job_queue_v0')
+    bdb.run(db_file, """CREATE TABLE submit_queue(id INTEGER PRIMARY KEY ASC,
+                                                  task_id TEXT NOT NULL)""")
+    bdb.run(db_file, """CREATE TABLE job_queue(id INTEGER PRIMARY KEY ASC, workflow_id TEXT,
+                                               task_id TEXT NOT NULL, job_id INTEGER,
+                                               job_state TEXT)""")
+    tasks = TaskTable(db_file)
+    # Queue IDs are kept so that the queue order doesn't change
+    for id_, data in bdb.getall(db_file, 'SELECT id, task FROM submit_queue_v0'):
+        task = jsonpickle.decode(data)
+        tasks.put(task)
+        bdb.run(db_file, 'INSERT INTO submit_queue (id, task_id) VALUES (?, ?)', [id_, task.id])
+    stmt = """INSERT INTO job_queue (id, workflow_id, task_id, job_id, job_state)
+              VALUES (?, ?, ?, ?, ?)"""
+    for id_, data, job_id, job_state in bdb.getall(
+            db_file, 'SELECT id, task, job_id, job_state FROM job_queue_v0'):
+        task = jsonpickle.decode(data)
+        tasks.put(task)
+        bdb.run(db_file, stmt, [id_, task.workflow_id, task.id, job_id, job_state])
+    bdb.run(db_file, 'DROP TABLE submit_queue_v0')
+    bdb.run(db_file, 'DROP TABLE job_queue_v0')
+
+
+def _migrate_to_v2(db_file):
+    """Add the job metadata last reported to the WFM and the time of that report."""
+    bdb.run(db_file, 'ALTER TABLE job_queue ADD COLUMN metadata TEXT')
+    bdb.run(db_file, 'ALTER TABLE job_queue ADD COLUMN reported_at REAL')
+
+
+def _migrate_to_v3(db_file):
+    """Add the upstream tasks of each queued task."""
+    bdb.run(db_file, 'ALTER TABLE submit_queue ADD COLUMN depends_on TEXT')
+
+
+def _migrate_to_v4(db_file):
+    """Add the revision of each update."""
+    bdb.run(db_file, 'ALTER TABLE update_queue ADD COLUMN revision INTEGER')
+    bdb.run(db_file, 'UPDATE update_queue SET revision=id')
+
+
+def _migrate_to_v5(db_file):
+    """Add the table of finished jobs."""
+    bdb.run(db_file, FINISHED_JOB_STMT)
+
+
+# Migrations from each schema version to the next one
+MIGRATIONS = [_migrate_to_v1, _migrate_to_v2, _migrate_to_v3, _migrate_to_v4,
+              _migrate_to_v5]
+
+
+class TaskTable:
+    """Tasks referenced by the submit and job queues.
+
+    Each task is stored once, keyed by its ID, so that the queues themselves
+    only hold small rows that are cheap to scan.
+    """
+
+    def __init__(self, db_file):
+        """Construct a task table handler."""
+        self.db_file = db_file
+
+    def put(self, task):
+        """Store (or replace) a task."""
+        stmt = 'INSERT OR REPLACE INTO task (id, data) VALUES (?, ?)'
+        bdb.run(self.db_file, stmt, [task.id, _encode_task(task)])
+
+    def get(self, task_id):
+        """Load a task by ID (None if it isn't stored)."""
+        result = bdb.getone(self.db_file, 'SELECT data FROM task WHERE id=?', [task_id])
+        return None if result is None else _decode_task(result[0])
+
+    def release(self, task_id):
+        """Remove a task if neither queue references it anymore."""
+        stmt = """DELETE FROM task WHERE id=:id
+                  AND NOT EXISTS (SELECT 1 FROM submit_queue WHERE task_id=:id)
+                  AND NOT EXISTS (SELECT 1 FROM job_queue WHERE task_id=:id)"""
+        bdb.run(self.db_file, stmt, {'id': task_id})
+
+    def release_all(self):
+        """Remove every task that neither queue references anymore."""
+        stmt = """DELETE FROM task
+                  WHERE id NOT IN (SELECT task_id FROM submit_queue)
+                  AND id NOT IN (SELECT task_id FROM job_queue)"""
+        bdb.run(self.db_file, stmt)
+
 
 class SubmitQueue:
     """Task Manager submit queue."""
@@ -16,15 +128,16 @@ class SubmitQueue:
     def __init__(self, db_file):
         """Construct a submit queue handler."""
         self.db_file = db_file
-        self.Job = namedtuple("Job", "id task") # pylint: disable=C0103
+        self.tasks = TaskTable(db_file)
 
     def __iter__(self):
         """Create an iterator for going over all elements."""
-        stmt = 'SELECT task FROM submit_queue ORDER BY id ASC'
+        stmt = """SELECT task.data FROM submit_queue
+                  JOIN task ON task.id = submit_queue.task_id
+                  ORDER BY submit_queue.id ASC"""
         result = bdb.getall(self.db_file, stmt)
         for rslt in result:
-            task = jsonpickle.decode(rslt[0])
-            yield task
+            yield _decode_task(rslt[0])
 
     def count(self):
         """Count the number of items in the submit queue."""
@@ -32,28 +145,68 @@ class SubmitQueue:
         count = bdb.getone(self.db_file, stmt)[0]
         return count
 
-    def push(self, task):
-        """Push the task onto the submit queue."""
-        task_data = jsonpickle.encode(task)
-        stmt = 'INSERT INTO submit_queue (task) VALUES (?)'
-        bdb.run(self.db_file, stmt, [task_data])
+    def push(self, task, depends_on=None):
+        """Push the task onto the submit queue.
+
+        depends_on lists the IDs of tasks whose jobs must complete before this
+        task's job may start.
+        """
+        stmt = 'INSERT INTO submit_queue (task_id, depends_on) VALUES (?, ?)'
+        with bdb.transaction(self.db_file):
+            self.tasks.put(task)
+            bdb.run(self.db_file, stmt, [task.id, json.dumps(depends_on or [])])
+
+    def entries(self):
+        """Return the (task_id, depends_on) of each queued task, in queue order."""
+        stmt = 'SELECT task_id, depends_on FROM submit_queue ORDER BY id ASC'
+        return [(task_id, json.loads(depends_on) if depends_on else [])
+                for task_id, depends_on in bdb.getall(self.db_file, stmt)]
+
+    def take(self, task_id):
+        """Take a task off the queue.
+
+        Returns (task, depends_on), or None if the task isn't queued (e.g.
+        because it was cancelled).
+        """
+        select_stmt = """SELECT submit_queue.id, task.data, submit_queue.depends_on
+                         FROM submit_queue JOIN task ON task.id = submit_queue.task_id
+                         WHERE submit_queue.task_id=? ORDER BY submit_queue.id ASC"""
+        with bdb.transaction(self.db_file):
+            result = bdb.getone(self.db_file, select_stmt, [task_id])
+            if result is None:
+                return None
+            id_, task_data, depends_on = result
+            bdb.run(self.db_file, 'DELETE FROM submit_queue WHERE id=?', [id_])
+            self.tasks.release(task_id)
+        return _decode_task(task_data), json.loads(depends_on) if depends_on else []
 
     def pop(self):
         """Pop the bottom element off the queue."""
-        select_stmt = 'SELECT id, task FROM submit_queue ORDER BY id ASC'
-        result = bdb.getone(self.db_file, select_stmt)
-        job = self.Job(*result)
-        id_ = job.id
-        task_data = job.task
-        task = jsonpickle.decode(task_data)
-        delete_stmt = 'DELETE FROM submit_queue WHERE id=?'
-        bdb.run(self.db_file, delete_stmt, [id_])
-        return task
+        return self.pop_entry()[0]
+
+    def pop_entry(self):
+        """Pop the bottom element off the queue, returning (task, depends_on)."""
+        select_stmt = """SELECT submit_queue.id, task.id, task.data, submit_queue.depends_on
+                         FROM submit_queue JOIN task ON task.id = submit_queue.task_id
+                         ORDER BY submit_queue.id ASC"""
+        with bdb.transaction(self.db_file):
+            id_, task_id, task_data, depends_on = bdb.getone(self.db_file, select_stmt)
+            bdb.run(self.db_file, 'DELETE FROM submit_queue WHERE id=?', [id_])
+            self.tasks.release(task_id)
+        return _decode_task(task_data), json.loads(depends_on) if depends_on else []
+
+    def remove_tasks(self, task_ids):
+        """Remove the given tasks from the queue."""
+        with bdb.transaction(self.db_file):
+            for task_id in task_ids:
+                bdb.run(self.db_file, 'DELETE FROM submit_queue WHERE task_id=?', [task_id])
+                self.tasks.release(task_id)
 
     def clear(self):
         """Clear the submit queue."""
-        stmt = 'DELETE FROM submit_queue'
-        bdb.run(self.db_file, stmt)
+        with bdb.transaction(self.db_file):
+            bdb.run(self.db_file, 'DELETE FROM submit_queue')
+            self.tasks.release_all()
 
 
 class JobQueue:
@@ -62,19 +215,49 @@ class JobQueue:
     def __init__(self, db_file):
         """Construct a job queue handler."""
         self.db_file = db_file
+        self.tasks = TaskTable(db_file)
         self.Job = namedtuple("Task", "id task job_id job_state") # pylint: disable=C0103
+        self.JobState = namedtuple("JobState", # pylint: disable=C0103
+                                   "id workflow_id task_id job_id job_state metadata reported_at")
 
     def __iter__(self):
         """Create an iterator for going over all elements in the queue."""
-        stmt = 'SELECT id, task, job_id, job_state FROM job_queue ORDER BY id ASC'
+        stmt = """SELECT job_queue.id, task.data, job_queue.job_id, job_queue.job_state
+                  FROM job_queue JOIN task ON task.id = job_queue.task_id
+                  ORDER BY job_queue.id ASC"""
         result = bdb.getall(self.db_file, stmt)
-        for j in result:
-            id_ = j[0]
-            task = jsonpickle.decode(j[1])
-            job_id = j[2]
-            state = j[3]
-            job = self.Job(id_, task, job_id, state)
-            yield job
+        for id_, task_data, job_id, state in result:
+            yield self.Job(id_, _decode_task(task_data), job_id, state)
+
+    def states(self):
+        """Create an iterator over the job states without loading the tasks.
+
+        Each job also carries the metadata last reported to the WFM and the
+        time of that report.
+        """
+        stmt = """SELECT id, workflow_id, task_id, job_id, job_state, metadata, reported_at
+                  FROM job_queue ORDER BY id ASC"""
+        result = bdb.getall(self.db_file, stmt)
+        for id_, wf_id, task_id, job_id, state, metadata, reported_at in result:
+            yield self.JobState(id_, wf_id, task_id, job_id, state,
+                                json.loads(metadata) if metadata else {}, reported_at)
+
+    def get_task(self, id_):
+        """Load the task of the job with the given queue ID (None if it isn't queued)."""
+        stmt = """SELECT task.data FROM job_queue
+                  JOIN task ON task.id = job_queue.task_id WHERE job_queue.id=?"""
+        result = bdb.getone(self.db_file, stmt, [id_])
+        return None if result is None else _decode_task(result[0])
+
+    def jobs_for_tasks(self, task_ids):
+        """Return {task_id: (job_id, job_state)} for the given tasks that have a queued job."""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        params = ', '.join('?' * len(task_ids))
+        stmt = f'SELECT task_id, job_id, job_state FROM job_queue WHERE task_id IN ({params})'
+        return {task_id: (job_id, job_state)
+                for task_id, job_id, job_state in bdb.getall(self.db_file, stmt, task_ids)}
 
     def count(self):
         """Count the number of items in the job queue."""
@@ -82,39 +265,105 @@ class JobQueue:
         count = bdb.getone(self.db_file, stmt)[0]
         return count
 
-    def push(self, task, job_id, job_state):
-        """Push the job info onto the queue."""
-        task_data = jsonpickle.encode(task)
-        stmt = """INSERT INTO job_queue (task, job_id, job_state)
-               VALUES (?, ?, ?)"""
-        bdb.run(self.db_file, stmt, [task_data, job_id, job_state])
+    def push(self, task, job_id, job_state, metadata=None):
+        """Push the job info onto the queue.
+
+        metadata is the job metadata reported to the WFM along with job_state.
+        """
+        stmt = """INSERT INTO job_queue (workflow_id, task_id, job_id, job_state,
+                                         metadata, reported_at)
+               VALUES (?, ?, ?, ?, ?, ?)"""
+        with bdb.transaction(self.db_file):
+            self.tasks.put(task)
+            bdb.run(self.db_file, stmt, [task.workflow_id, task.id, job_id, job_state,
+                                         json.dumps(metadata or {}), time.time()])
 
     def pop(self):
         """Pop the bottom element off the queue."""
-        stmt = 'SELECT id, task, job_id, job_state FROM job_queue ORDER BY id ASC'
-        result = bdb.getone(self.db_file, stmt)
-        id_ = result[0]
-        task = jsonpickle.decode(result[1])
-        job_id = result[2]
-        state = result[3]
-        job = self.Job(id_, task, job_id, state)
-        bdb.run(self.db_file, 'DELETE FROM job_queue WHERE id=?', [id_])
-        return job
+        stmt = """SELECT job_queue.id, task.id, task.data, job_queue.job_id, job_queue.job_state
+                  FROM job_queue JOIN task ON task.id = job_queue.task_id
+                  ORDER BY job_queue.id ASC"""
+        with bdb.transaction(self.db_file):
+            id_, task_id, task_data, job_id, state = bdb.getone(self.db_file, stmt)
+            bdb.run(self.db_file, 'DELETE FROM job_queue WHERE id=?', [id_])
+            self.tasks.release(task_id)
+        return self.Job(id_, _decode_task(task_data), job_id, state)
 
     def update_job_state(self, id_, job_state):
         """Update the job_state."""
         stmt = 'UPDATE job_queue SET job_state=? WHERE id=?'
         bdb.run(self.db_file, stmt, [job_state, id_])
 
+    def set_reported(self, id_, metadata):
+        """Record that the job's state and metadata were just reported to the WFM."""
+        stmt = 'UPDATE job_queue SET metadata=?, reported_at=? WHERE id=?'
+        bdb.run(self.db_file, stmt, [json.dumps(metadata), time.time(), id_])
+
+    def finish(self, id_):
+        """Move a job whose state is final from the queue to the finished jobs."""
+        with bdb.transaction(self.db_file):
+            result = bdb.getone(self.db_file,
+                                'SELECT task_id, job_state FROM job_queue WHERE id=?', [id_])
+            if result is None:
+                return
+            FinishedJobs(self.db_file).record(*result)
+            self.remove_by_id(id_)
+
     def remove_by_id(self, id_):
         """Remove a job from the queue by ID."""
-        stmt = 'DELETE FROM job_queue WHERE id=?'
-        bdb.run(self.db_file, stmt, [id_])
+        with bdb.transaction(self.db_file):
+            result = bdb.getone(self.db_file, 'SELECT task_id FROM job_queue WHERE id=?', [id_])
+            if result is None:
+                return
+            bdb.run(self.db_file, 'DELETE FROM job_queue WHERE id=?', [id_])
+            self.tasks.release(result[0])
+
+    def remove_tasks(self, task_ids):
+        """Remove the jobs of the given tasks from the queue."""
+        with bdb.transaction(self.db_file):
+            for task_id in task_ids:
+                bdb.run(self.db_file, 'DELETE FROM job_queue WHERE task_id=?', [task_id])
+                self.tasks.release(task_id)
 
     def clear(self):
         """Clear the job queue."""
-        stmt = 'DELETE FROM job_queue'
-        bdb.run(self.db_file, stmt)
+        with bdb.transaction(self.db_file):
+            bdb.run(self.db_file, 'DELETE FROM job_queue')
+            self.tasks.release_all()
+
+
+class FinishedJobs:
+    """Final states of the tasks that left the queues.
+
+    Chained tasks are checked against these once their upstream tasks' jobs
+    are gone from the job queue.
+    """
+
+    def __init__(self, db_file):
+        """Construct a finished jobs handler."""
+        self.db_file = db_file
+
+    def record(self, task_id, job_state):
+        """Record the final state of a task."""
+        stmt = """INSERT OR REPLACE INTO finished_job (task_id, job_state, finished_at)
+                  VALUES (?, ?, ?)"""
+        bdb.run(self.db_file, stmt, [task_id, job_state, time.time()])
+
+    def states(self, task_ids):
+        """Return {task_id: job_state} for the given tasks that finished."""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        params = ', '.join('?' * len(task_ids))
+        stmt = f'SELECT task_id, job_state FROM finished_job WHERE task_id IN ({params})'
+        return dict(bdb.getall(self.db_file, stmt, task_ids))
+
+    def prune(self, max_age):
+        """Forget tasks that finished over max_age seconds ago and no queued task waits for."""
+        stmt = """DELETE FROM finished_job WHERE finished_at < ?
+                  AND task_id NOT IN (SELECT json_each.value
+                                      FROM submit_queue, json_each(submit_queue.depends_on))"""
+        bdb.run(self.db_file, stmt, [time.time() - max_age])
 
 
 class UpdateQueue:
@@ -125,27 +374,64 @@ class UpdateQueue:
         self.db_file = db_file
 
     def push(self, wf_id, task_id, job_state, task_info=None, metadata=None, output=None):
-        """Push an update onto the update queue."""
-        stmt = """INSERT INTO update_queue (wf_id, task_id, job_state, task_info, metadata, output)
-                  VALUES (:wf_id, :task_id, :job_state, :task_info, :metadata, :output)"""
-        bdb.run(self.db_file, stmt, {'wf_id': wf_id, 'task_id': task_id,
-                                     'job_state': job_state,
-                                     'task_info': jsonpickle.encode(task_info),
-                                     'metadata': jsonpickle.encode(metadata),
-                                     'output': jsonpickle.encode(output)})
+        """Push an update onto the update queue.
+
+        Updates are coalesced per task: a pending update for the same task is
+        changed in place to the new state, the merged metadata and the newest
+        task_info and output, so it keeps its place in the queue. Every change
+        gets a new revision, so that an update changed while it is being sent
+        isn't cleared with the old revision.
+        """
+        select_stmt = """SELECT id, task_info, metadata, output FROM update_queue
+                         WHERE wf_id=? AND task_id=? ORDER BY id DESC"""
+        insert_stmt = """INSERT INTO update_queue (wf_id, task_id, job_state, task_info,
+                                                   metadata, output, revision)
+                  VALUES (:wf_id, :task_id, :job_state, :task_info, :metadata, :output,
+                          :revision)"""
+        update_stmt = """UPDATE update_queue SET job_state=:job_state, task_info=:task_info,
+                                                 metadata=:metadata, output=:output,
+                                                 revision=:revision
+                         WHERE id=:id"""
+        with bdb.transaction(self.db_file):
+            pending = bdb.getone(self.db_file, select_stmt, [wf_id, task_id])
+            params = {'wf_id': wf_id, 'task_id': task_id, 'job_state': job_state,
+                      'revision': self.last_revision() + 1}
+            if pending is not None:
+                _, old_task_info, old_metadata, old_output = pending
+                old_metadata = jsonpickle.decode(old_metadata)
+                if old_metadata is not None:
+                    metadata = {**old_metadata, **(metadata or {})}
+                if task_info is None:
+                    task_info = jsonpickle.decode(old_task_info)
+                if output is None:
+                    output = jsonpickle.decode(old_output)
+            params.update({'task_info': jsonpickle.encode(task_info),
+                           'metadata': jsonpickle.encode(metadata),
+                           'output': jsonpickle.encode(output)})
+            if pending is None:
+                bdb.run(self.db_file, insert_stmt, params)
+            else:
+                bdb.run(self.db_file, update_stmt, {**params, 'id': pending[0]})
 
     def count(self):
         """Count the number of items in the update queue."""
-        stmt = 'SELECT COUNT(*) AS count FROM job_queue'
+        stmt = 'SELECT COUNT(*) AS count FROM update_queue'
         count = bdb.getone(self.db_file, stmt)[0]
         return count
 
-    def updates(self):
-        """Get a list of all updates from the update queue."""
+    def last_revision(self):
+        """Return the revision of the newest change to the queue (0 if it's empty)."""
+        stmt = 'SELECT COALESCE(MAX(revision), 0) FROM update_queue'
+        return bdb.getone(self.db_file, stmt)[0]
+
+    def updates(self, through_revision=None):
+        """Get a list of all updates (up to and including through_revision) in queue order."""
         stmt = """SELECT wf_id, task_id, job_state, task_info, metadata, output
-                  FROM update_queue ORDER BY id ASC"""
+                  FROM update_queue WHERE revision <= ? ORDER BY id ASC"""
+        if through_revision is None:
+            through_revision = self.last_revision()
         state_updates = []
-        for result in bdb.getall(self.db_file, stmt):
+        for result in bdb.getall(self.db_file, stmt, [through_revision]):
             wf_id, task_id, job_state, task_info, metadata, output = result
             state_updates.append(TaskStateUpdate(wf_id=wf_id, task_id=task_id, job_state=job_state,
                                                  task_info=jsonpickle.decode(task_info),
@@ -153,9 +439,13 @@ class UpdateQueue:
                                                  output=jsonpickle.decode(output)))
         return state_updates
 
-    def clear(self):
-        """Clear the update queue."""
-        bdb.run(self.db_file, 'DELETE FROM update_queue')
+    def clear(self, through_revision=None):
+        """Clear the update queue (only up to and including through_revision if given)."""
+        if through_revision is None:
+            bdb.run(self.db_file, 'DELETE FROM update_queue')
+        else:
+            bdb.run(self.db_file, 'DELETE FROM update_queue WHERE revision <= ?',
+                    [through_revision])
 
 
 class TMDB:
@@ -169,15 +459,23 @@ class TMDB:
 
     def _init_tables(self):
         """Initialize the workflow tables."""
+        task_stmt = """CREATE TABLE IF NOT EXISTS task(
+                        id TEXT PRIMARY KEY,
+                        data TEXT NOT NULL)"""
+
         submit_queue_stmt = """CREATE TABLE IF NOT EXISTS submit_queue(
                         id INTEGER PRIMARY KEY ASC,
-                        task TEXT)"""
+                        task_id TEXT NOT NULL,
+                        depends_on TEXT)"""
 
         job_queue_stmt = """CREATE TABLE IF NOT EXISTS job_queue(
                         id INTEGER PRIMARY KEY ASC,
-                        task TEXT,
+                        workflow_id TEXT,
+                        task_id TEXT NOT NULL,
                         job_id INTEGER,
-                        job_state TEXT)"""
+                        job_state TEXT,
+                        metadata TEXT,
+                        reported_at REAL)"""
 
         update_queue_stmt = """CREATE TABLE IF NOT EXISTS update_queue(
                         id INTEGER PRIMARY KEY ASC,
@@ -186,11 +484,29 @@ class TMDB:
                         job_state TEXT,
                         task_info TEXT,
                         metadata TEXT,
-                        output TEXT)"""
-
-        bdb.create_table(self.db_file, submit_queue_stmt)
-        bdb.create_table(self.db_file, job_queue_stmt)
-        bdb.create_table(self.db_file, update_queue_stmt)
+                        output TEXT,
+                        revision INTEGER)"""
+
+        with bdb.transaction(self.db_file):
+            version = bdb.getone(self.db_file, 'PRAGMA user_version')[0]
+            # A new database starts out with the current layout
+            if version < SCHEMA_VERSION and bdb.table_exists(self.db_file, 'job_queue'):
+                log.info(f'Migrating task manager database from version {version} '
+                         f'to {SCHEMA_VERSION}')
+                for migrate in MIGRATIONS[version:]:
+                    migrate(self.db_file)
+            bdb.run(self.db_file, f'PRAGMA user_version = {SCHEMA_VERSION}')
+            bdb.create_table(self.db_file, task_stmt)
+            bdb.create_table(self.db_file, submit_queue_stmt)
+            bdb.create_table(self.db_file, job_queue_stmt)
+            bdb.create_table(self.db_file, update_queue_stmt)
+            bdb.create_table(self.db_file, FINISHED_JOB_STMT)
+            bdb.create_table(self.db_file, 'CREATE INDEX IF NOT EXISTS idx_submit_queue_task '
+                                           'ON submit_queue(task_id)')
+            bdb.create_table(self.db_file, 'CREATE INDEX IF NOT EXISTS idx_job_queue_task '
+                                           'ON job_queue(task_id)')
+            bdb.create_table(self.db_file, 'CREATE INDEX IF NOT EXISTS idx_update_queue_task '
+                                           'ON update_queue(wf_id, task_id)')
 
     def backup_db(self, backup_db):
         """Backup DB to NFS."""
@@ -210,6 +526,11 @@ class TMDB:
         """Return a JobQueue object."""
         return JobQueue(self.db_file)
 
+    @property
+    def finished_jobs(self):
+        """Return a FinishedJobs object."""
+        return FinishedJobs(self.db_file)
+
     @property
     def update_queue(self):
         """Return an UpdateQueue object."""
@@ -208,6 +208,7 @@ def connect_neo4j_driver(bolt_port):
                    db_hostname=bc.get("graphdb", "hostname"),
                    password=bc.get("graphdb", "dbpass"))
     driver.create_bee_node()
+    driver.create_constraints()
 
 
 def remove_gdb():
@@ -0,0 +1,19 @@
+"""Helpers for files and directories shared by BEE components.
+
+This module only depends on the standard library, since it's also used by
+code that runs on the compute nodes.
+"""
+
+import os
+
+
+def dir_size(path):
+    """Return the combined size of the files under a directory."""
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return size
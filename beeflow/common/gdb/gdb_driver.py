@@ -1,5 +1,7 @@
 """Abstract base class for the handling of workflow DAGs."""
 
+import collections
+import contextlib
 from abc import ABC, abstractmethod
 from beeflow.common import log as bee_logging
 
@@ -13,6 +15,9 @@ class GraphDatabaseDriver(ABC):
     the graph database and returns some kind of 'connection' interface object.
     """
 
+    # Whether finalize_task() sets the dependents that became runnable to READY
+    marks_ready_dependents = False
+
     @abstractmethod
     def initialize_workflow(self, workflow):
         """Begin construction of a workflow in the graph database.
@@ -63,6 +68,28 @@ class GraphDatabaseDriver(ABC):
         :type task: Task
         """
 
+    def load_workflow(self, workflow, tasks):
+        """Load a workflow and all of its tasks into the graph database.
+
+        Equivalent to initialize_workflow() followed by load_task() for each
+        task. Drivers should override this with a bulk implementation.
+
+        :param workflow: the workflow description
+        :type workflow: Workflow
+        :param tasks: the workflow tasks
+        :type tasks: list of Task
+        """
+        self.initialize_workflow(workflow)
+        for task in tasks:
+            self.load_task(task)
+
+    def transaction(self):
+        """Return a context manager that runs the operations inside it as one transaction.
+
+        Drivers that can't group operations run each of them on its own.
+        """
+        return contextlib.nullcontext()
+
     @abstractmethod
     def initialize_ready_tasks(self, workflow_id):
         """Set runnable tasks to state 'READY'.
@@ -129,6 +156,27 @@ class GraphDatabaseDriver(ABC):
         :rtype: list of Task
         """
 
+    def get_workflow_task_states(self, workflow_id):
+        """Return the (id, name, state, metadata) of every task in a workflow.
+
+        A projection of get_workflow_tasks() for callers that don't need full
+        Task objects. Drivers should override this to only read those fields.
+
+        :rtype: list of (str, str, str, dict)
+        """
+        return [(task.id, task.name, task.state, task.metadata)
+                for task in self.get_workflow_tasks(workflow_id)]
+
+    def get_workflow_state_counts(self, workflow_id):
+        """Return the number of tasks of a workflow in each state.
+
+        Drivers should override this to read maintained counts.
+
+        :rtype: dict of str to int
+        """
+        return dict(collections.Counter(
+            state for _, _, state, _ in self.get_workflow_task_states(workflow_id)))
+
     @abstractmethod
     def get_workflow_requirements_and_hints(self, workflow_id):
         """Return all workflow requirements and hints from the graph database.
@@ -182,6 +230,25 @@ class GraphDatabaseDriver(ABC):
         :type state: str
         """
 
+    def mark_downstream(self, task_id, state):
+        """Set the state of every task that transitively depends on a task.
+
+        Drivers should override this to update the whole closure at once.
+
+        :param task_id: the ID of the task whose dependents to update
+        :type task_id: str
+        :param state: the new state
+        :type state: str
+        """
+        task_ids = [task_id]
+        marked = set()
+        while task_ids:
+            for dep_task in self.get_dependent_tasks(task_ids.pop()):
+                if dep_task.id not in marked:
+                    marked.add(dep_task.id)
+                    self.set_task_state(dep_task.id, state)
+                    task_ids.append(dep_task.id)
+
     @abstractmethod
     def get_task_metadata(self, task_id):
         """Return the metadata of a task in the graph database.
@@ -46,18 +46,38 @@ def create_workflow_node(tx, workflow):
            yaml=workflow.yaml, reqs=reqs, hints=hints)
 
 
+def create_constraints(tx):
+    """Create the uniqueness constraints and indexes used to look up nodes.
+
+    Without these, each MATCH on a Task or Workflow id scans every node with that label.
+    """
+    constraint_queries = [
+        "CREATE CONSTRAINT task_id IF NOT EXISTS FOR (t:Task) REQUIRE t.id IS UNIQUE",
+        "CREATE CONSTRAINT workflow_id IF NOT EXISTS FOR (w:Workflow) REQUIRE w.id IS UNIQUE",
+        "CREATE INDEX task_workflow_id IF NOT EXISTS FOR (t:Task) ON (t.workflow_id)",
+    ]
+
+    for constraint_query in constraint_queries:
+        tx.run(constraint_query)
+
+
+def _param_rows(items, **kwargs):
+    """Get the parameters of hints or requirements as rows for UNWIND."""
+    return [dict(kwargs, params=item.params, class_=item.class_) for item in items]
+
+
 def create_workflow_hint_nodes(tx, workflow):
     """Create Hint nodes for the workflow.
 
     :param workflow: the workflow whose hints to add to the graph
     :type workflow: Workflow
     """
-    for hint in workflow.hints:
-        hint_query = ("MATCH (w:Workflow {id: $wf_id}) "
-                      "CREATE (w)<-[:HINT_OF]-(h:Hint $params) "
-                      "SET h.class = $class_")
+    hint_query = ("MATCH (w:Workflow {id: $wf_id}) "
+                  "UNWIND $hints AS hint "
+                  "CREATE (w)<-[:HINT_OF]-(h:Hint) "
+                  "SET h = hint.params, h.class = hint.class_")
 
-        tx.run(hint_query, wf_id=workflow.id, params=hint.params, class_=hint.class_)
+    tx.run(hint_query, wf_id=workflow.id, hints=_param_rows(workflow.hints))
 
 
 def create_workflow_requirement_nodes(tx, workflow):
@@ -66,12 +86,12 @@ def create_workflow_requirement_nodes(tx, workflow):
     :param workflow: the workflow whose requirements to add to the graph
     :type workflow: Workflow
     """
-    for req in workflow.requirements:
-        req_query = ("MATCH (w:Workflow {id: $wf_id}) "
-                     "CREATE (w)<-[:REQUIREMENT_OF]-(r:Requirement $params) "
-                     "SET r.class = $class_")
+    req_query = ("MATCH (w:Workflow {id: $wf_id}) "
+                 "UNWIND $reqs AS req "
+                 "CREATE (w)<-[:REQUIREMENT_OF]-(r:Requirement) "
+                 "SET r = req.params, r.class = req.class_")
 
-        tx.run(req_query, wf_id=workflow.id, params=req.params, class_=req.class_)
+    tx.run(req_query, wf_id=workflow.id, reqs=_param_rows(workflow.requirements))
 
 
 def create_workflow_input_nodes(tx, workflow):
@@ -80,14 +100,14 @@ def create_workflow_input_nodes(tx, workflow):
     :param workflow: the workflow whose inputs to add to the graph
     :type workflow: Workflow
     """
-    for input_ in workflow.inputs:
-        input_query = ("MATCH (w:Workflow {id: $wf_id}) CREATE (w)<-[:INPUT_OF]-(i:Input) "
-                       "SET i.id = $input_id "
-                       "SET i.type = $type "
-                       "SET i.value = $value")
+    input_query = ("MATCH (w:Workflow {id: $wf_id}) "
+                   "UNWIND $inputs AS input "
+                   "CREATE (w)<-[:INPUT_OF]-(i:Input) "
+                   "SET i = input")
 
-        tx.run(input_query, wf_id=workflow.id, input_id=input_.id, type=input_.type,
-               value=input_.value)
+    inputs = [{"id": input_.id, "type": input_.type, "value": input_.value}
+              for input_ in workflow.inputs]
+    tx.run(input_query, wf_id=workflow.id, inputs=inputs)
 
 
 def create_workflow_output_nodes(tx, workflow):
@@ -96,15 +116,81 @@ def create_workflow_output_nodes(tx, workflow):
     :param workflow: the workflow whose outputs to add to the graph
     :type workflow: Workflow
     """
-    for output in workflow.outputs:
-        output_query = ("MATCH (w:Workflow {id: $wf_id}) CREATE (w)<-[:OUTPUT_OF]-(o:Output) "
-                        "SET o.id = $output_id "
-                        "SET o.type = $type "
-                        "SET o.value = $value "
-                        "SET o.source = $source")
+    output_query = ("MATCH (w:Workflow {id: $wf_id}) "
+                    "UNWIND $outputs AS output "
+                    "CREATE (w)<-[:OUTPUT_OF]-(o:Output) "
+                    "SET o = output")
 
-        tx.run(output_query, wf_id=workflow.id, output_id=output.id, type=output.type,
-               value=output.value, source=output.source)
+    outputs = [{"id": output.id, "type": output.type, "value": output.value,
+                "source": output.source} for output in workflow.outputs]
+    tx.run(output_query, wf_id=workflow.id, outputs=outputs)
+
+
+def _create_task_nodes(tx, tasks):
+    """Create the Task nodes for a list of tasks."""
+    create_query = ("UNWIND $tasks AS task "
+                    "CREATE (t:Task) "
+                    "SET t = task")
+
+    # Unpack requirements, hints dictionaries into flat list
+    rows = [{"id": task.id, "workflow_id": task.workflow_id, "name": task.name,
+             "base_command": task.base_command, "stdout": task.stdout, "stderr": task.stderr,
+             "reqs": len(task.requirements) > 0, "hints": len(task.hints) > 0,
+             "state": task.state, "workdir": task.workdir} for task in tasks]
+    tx.run(create_query, tasks=rows)
+
+
+def _create_task_param_nodes(tx, label, rel, rows):
+    """Create Hint or Requirement nodes from rows holding the task_id, params and class_."""
+    param_query = ("UNWIND $rows AS row "
+                   "MATCH (t:Task {id: row.task_id}) "
+                   f"CREATE (t)<-[:{rel}]-(n:{label}) "
+                   "SET n = row.params, n.class = row.class_")
+
+    tx.run(param_query, rows=rows)
+
+
+def _create_task_input_nodes(tx, tasks):
+    """Create the Input nodes for a list of tasks."""
+    input_query = ("UNWIND $rows AS row "
+                   "MATCH (t:Task {id: row.task_id}) "
+                   "CREATE (t)<-[:INPUT_OF]-(i:Input) "
+                   "SET i = row.input")
+
+    rows = [{"task_id": task.id,
+             "input": {"id": input_.id, "type": input_.type, "value": input_.value,
+                       "default": input_.default, "source": input_.source,
+                       "prefix": input_.prefix, "position": input_.position,
+                       "value_from": input_.value_from}}
+            for task in tasks for input_ in task.inputs]
+    tx.run(input_query, rows=rows)
+
+
+def _create_task_output_nodes(tx, tasks):
+    """Create the Output nodes for a list of tasks."""
+    output_query = ("UNWIND $rows AS row "
+                    "MATCH (t:Task {id: row.task_id}) "
+                    "CREATE (t)<-[:OUTPUT_OF]-(o:Output) "
+                    "SET o = row.output")
+
+    rows = [{"task_id": task.id,
+             "output": {"id": output.id, "type": output.type, "value": output.value,
+                        "glob": output.glob}}
+            for task in tasks for output in task.outputs]
+    tx.run(output_query, rows=rows)
+
+
+def _create_task_metadata_nodes(tx, tasks):
+    """Create the Metadata nodes for a list of tasks."""
+    metadata_query = ("UNWIND $rows AS row "
+                      "MATCH (t:Task {id: row.task_id}) "
+                      "CREATE (m:Metadata)-[:DESCRIBES]->(t) "
+                      "SET m = row.metadata")
+
+    for task in tasks:
+        _check_metadata_keys(task.metadata)
+    rows = [{"task_id": task.id, "metadata": task.metadata} for task in tasks]
+    tx.run(metadata_query, rows=rows)
 
 
 def create_task(tx, task):
@@ -113,24 +199,7 @@ def create_task(tx, task):
     :param task: the new task to create
     :type task: Task
     """
-    create_query = ("CREATE (t:Task) "
-                    "SET t.id = $task_id "
-                    "SET t.workflow_id = $workflow_id "
-                    "SET t.name = $name "
-                    "SET t.base_command = $base_command "
-                    "SET t.stdout = $stdout "
-                    "SET t.stderr = $stderr "
-                    "SET t.reqs = $reqs "
-                    "SET t.hints = $hints "
-                    "SET t.state = $state "
-                    "SET t.workdir = $workdir")
-
-    # Unpack requirements, hints dictionaries into flat list
-    reqs = len(task.requirements) > 0
-    hints = len(task.hints) > 0
-    tx.run(create_query, task_id=task.id, workflow_id=task.workflow_id, name=task.name,
-           base_command=task.base_command, stdout=task.stdout, stderr=task.stderr,
-           reqs=reqs, hints=hints, state=task.state, workdir=task.workdir)
+    _create_task_nodes(tx, [task])
 
 
 def create_task_hint_nodes(tx, task):
@@ -139,12 +208,7 @@ def create_task_hint_nodes(tx, task):
     :param task: the task whose hints to add to the graph
     :type task: Task
     """
-    for hint in task.hints:
-        hint_query = ("MATCH (t:Task {id: $task_id}) "
-                      "CREATE (t)<-[:HINT_OF]-(h:Hint $params) "
-                      "SET h.class = $class_")
-
-        tx.run(hint_query, task_id=task.id, params=hint.params, class_=hint.class_)
+    _create_task_param_nodes(tx, "Hint", "HINT_OF", _param_rows(task.hints, task_id=task.id))
 
 
 def create_task_requirement_nodes(tx, task):
@@ -153,12 +217,8 @@ def create_task_requirement_nodes(tx, task):
     :param task: the task whose requirements to add to the graph
     :type task: Task
     """
-    for req in task.requirements:
-        req_query = ("MATCH (t:Task {id: $task_id}) "
-                     "CREATE (t)<-[:REQUIREMENT_OF]-(r:Requirement $params) "
-                     "SET r.class = $class_")
-
-        tx.run(req_query, task_id=task.id, params=req.params, class_=req.class_)
+    _create_task_param_nodes(tx, "Requirement", "REQUIREMENT_OF",
+                             _param_rows(task.requirements, task_id=task.id))
 
 
 def create_task_input_nodes(tx, task):
@@ -167,21 +227,7 @@ def create_task_input_nodes(tx, task):
     :param task: the task whose inputs to add to the graph
     :type task: Task
     """
-    for input_ in task.inputs:
-        input_query = ("MATCH (t:Task {id: $task_id}) "
-                       "CREATE (t)<-[:INPUT_OF]-(i:Input) "
-                       "SET i.id = $input_id "
-                       "SET i.type = $type "
-                       "SET i.value = $value "
-                       "SET i.default = $default "
-                       "SET i.source = $source "
-                       "SET i.prefix = $prefix "
-                       "SET i.position = $position "
-                       "SET i.value_from = $value_from")
-
-        tx.run(input_query, task_id=task.id, input_id=input_.id, type=input_.type,
-               value=input_.value, default=input_.default, source=input_.source,
-               prefix=input_.prefix, position=input_.position, value_from=input_.value_from)
+    _create_task_input_nodes(tx, [task])
 
 
 def create_task_output_nodes(tx, task):
@@ -190,16 +236,7 @@ def create_task_output_nodes(tx, task):
     :param task: the task whose outputs to add to the graph
     :type task: Task
     """
-    for output in task.outputs:
-        output_query = ("MATCH (t:Task {id: $task_id}) "
-                        "CREATE (t)<-[:OUTPUT_OF]-(o:Output) "
-                        "SET o.id = $output_id "
-                        "SET o.type = $type "
-                        "SET o.value = $value "
-                        "SET o.glob = $glob")
-
-        tx.run(output_query, task_id=task.id, output_id=output.id, type=output.type,
-               value=output.value, glob=output.glob)
+    _create_task_output_nodes(tx, [task])
 
 
 def create_task_metadata_node(tx, task):
@@ -210,11 +247,62 @@ def create_task_metadata_node(tx, task):
     :param task: the task for which to create a metadata node
     :type task: Task
     """
-    metadata_query = ("MATCH (t:Task {id: $task_id}) "
-                      "CREATE (m:Metadata)-[:DESCRIBES]->(t)")
+    _create_task_metadata_nodes(tx, [task])
 
-    tx.run(metadata_query, task_id=task.id)
-    set_task_metadata(tx, task.id, task.metadata)
+
+def load_workflow(tx, workflow, tasks):
+    """Create a workflow and all of its tasks with a fixed number of queries.
+
+    Nodes of each kind are created by a single UNWIND query over all tasks, and
+    the dependency edges are worked out from the task inputs and outputs up
+    front instead of being matched in the graph task by task.
+
+    :param workflow: the workflow
+    :type workflow: Workflow
+    :param tasks: the workflow tasks
+    :type tasks: list of Task
+    """
+    create_workflow_node(tx, workflow)
+    create_workflow_requirement_nodes(tx, workflow)
+    create_workflow_hint_nodes(tx, workflow)
+    create_workflow_input_nodes(tx, workflow)
+    create_workflow_output_nodes(tx, workflow)
+
+    _create_task_nodes(tx, tasks)
+    _create_task_param_nodes(tx, "Hint", "HINT_OF",
+                             [row for task in tasks
+                              for row in _param_rows(task.hints, task_id=task.id)])
+    _create_task_param_nodes(tx, "Requirement", "REQUIREMENT_OF",
+                             [row for task in tasks
+                              for row in _param_rows(task.requirements, task_id=task.id)])
+    _create_task_input_nodes(tx, tasks)
+    _create_task_output_nodes(tx, tasks)
+    _create_task_metadata_nodes(tx, tasks)
+
+    wf_inputs = {input_.id for input_ in workflow.inputs}
+    output_tasks = {}
+    for task in tasks:
+        for output in task.outputs:
+            output_tasks.setdefault(output.id, set()).add(task.id)
+    begins = []
+    deps = set()
+    for task in tasks:
+        sources = {input_.source for input_ in task.inputs}
+        if sources & wf_inputs:
+            begins.append(task.id)
+        deps.update((task.id, dep_id) for source in sources
+                    for dep_id in output_tasks.get(source, ()))
+
+    begins_query = ("MATCH (w:Workflow {id: $wf_id}) "
+                    "UNWIND $task_ids AS task_id "
+                    "MATCH (s:Task {id: task_id}) "
+                    "MERGE (s)-[:BEGINS]->(w)")
+    dependency_query = ("UNWIND $deps AS dep "
+                        "MATCH (s:Task {id: dep[0]}), (t:Task {id: dep[1]}) "
+                        "MERGE (s)-[:DEPENDS_ON]->(t)")
+
+    tx.run(begins_query, wf_id=workflow.id, task_ids=begins)
+    tx.run(dependency_query, deps=[list(dep) for dep in sorted(deps)])
 
 
 def add_dependencies(tx, task, old_task=None, restarted_task=False):
@@ -285,6 +373,29 @@ def get_task_by_id(tx, task_id):
     return tx.run(task_query, task_id=task_id).single()['t']
 
 
+def get_tasks_data(tx, task_ids):
+    """Get fully assembled task records from the Neo4j database by the tasks' IDs.
+
+    Each record holds the task node ('t') along with its 'hints', 'reqs',
+    'inputs', 'outputs' and 'metadata' nodes, so that any number of tasks is
+    read in a single query. Records are returned in the order of task_ids.
+
+    :param task_ids: the IDs of the tasks
+    :type task_ids: list of str
+    :rtype: list of neo4j.Record
+    """
+    tasks_query = ("UNWIND $task_ids AS task_id "
+                   "MATCH (t:Task {id: task_id}) "
+                   "RETURN t, "
+                   "[(t)<-[:HINT_OF]-(h:Hint) | h] AS hints, "
+                   "[(t)<-[:REQUIREMENT_OF]-(r:Requirement) | r] AS reqs, "
+                   "[(t)<-[:INPUT_OF]-(i:Input) | i] AS inputs, "
+                   "[(t)<-[:OUTPUT_OF]-(o:Output) | o] AS outputs, "
+                   "head([(m:Metadata)-[:DESCRIBES]->(t) | m]) AS metadata")
+
+    return list(tx.run(tasks_query, task_ids=task_ids))
+
+
 def get_task_hints(tx, task_id):
     """Get task hints from the Neo4j database by the task's ID.
 
@@ -371,6 +482,33 @@ def get_workflow_tasks(tx, wf_id):
     return [rec['t'] for rec in tx.run(workflow_query, wf_id=wf_id)]
 
 
+def get_workflow_task_states(tx, wf_id):
+    """Get the id, name, state and metadata of the workflow tasks from the Neo4j database.
+
+    :param wf_id: the workflow's ID
+    :type wf_id: str
+    :rtype: list of neo4j.Record
+    """
+    states_query = ("MATCH (t:Task) WHERE t.workflow_id = $wf_id "
+                    "RETURN t.id AS id, t.name AS name, t.state AS state, "
+                    "head([(m:Metadata)-[:DESCRIBES]->(t) | m]) AS metadata")
+
+    return list(tx.run(states_query, wf_id=wf_id))
+
+
+def get_workflow_state_counts(tx, wf_id):
+    """Get the number of workflow tasks in each state from the Neo4j database.
+
+    :param wf_id: the workflow's ID
+    :type wf_id: str
+    :rtype: list of neo4j.Record
+    """
+    counts_query = ("MATCH (t:Task) WHERE t.workflow_id = $wf_id "
+                    "RETURN t.state AS state, count(t) AS count")
+
+    return list(tx.run(counts_query, wf_id=wf_id))
+
+
 def get_workflow_requirements(tx, wf_id):
     """Get workflow requirements from the Neo4j database.
 
@@ -498,6 +636,21 @@ def set_task_state(tx, task_id, state):
     tx.run(state_query, task_id=task_id, state=state)
 
 
+def mark_downstream(tx, task_id, state):
+    """Set the state of every task that transitively depends on a task.
+
+    :param task_id: the ID of the task whose dependents to update
+    :type task_id: str
+    :param state: the new task state
+    :type state: str
+    """
+    downstream_query = ("MATCH (:Task {id: $task_id})<-[:DEPENDS_ON*]-(t:Task) "
+                        "WITH DISTINCT t "
+                        "SET t.state = $state")
+
+    tx.run(downstream_query, task_id=task_id, state=state)
+
+
 def get_task_metadata(tx, task_id):
     """Get a task's metadata.
 
@@ -518,17 +671,23 @@ def set_task_metadata(tx, task_id, metadata):
     :param metadata: the task metadata
     :type metadata: dict
     """
+    _check_metadata_keys(metadata)
     for k, v in metadata.items():
-        # Manual sanitization needed for keys as the official Neo4j driver does not
-        # currently support parameter substitution for property keys
-        if fullmatch(r"[A-Za-z][0-9A-Za-z_]*", k) is None:
-            raise ValueError(f"invalid metadata key: {k}")
         metadata_query = ("MATCH (m:Metadata)-[:DESCRIBES]->(:Task {id: $task_id}) "
                           f"SET m.{k} = $value")
 
         tx.run(metadata_query, task_id=task_id, value=v)
 
 
+def _check_metadata_keys(metadata):
+    """Raise a ValueError if a metadata key can't be used as a property key."""
+    for k in metadata:
+        # Manual sanitization needed for keys as the official Neo4j driver does not
+        # currently support parameter substitution for property keys
+        if fullmatch(r"[A-Za-z][0-9A-Za-z_]*", k) is None:
+            raise ValueError(f"invalid metadata key: {k}")
+
+
 def get_task_input(tx, task_id, input_id):
     """Get a task input object.
 
@@ -737,6 +896,21 @@ def final_tasks_failed(tx, wf_id):
     return bool(tx.run(not_failed_query, wf_id=wf_id).single() is None)
 
 
+def get_final_task_state_counts(tx, wf_id):
+    """Get the number of a workflow's final Task nodes in each state.
+
+    :param wf_id: the workflow's id
+    :type wf_id: str
+    :rtype: dict of str to int
+    """
+    restart = "|RESTARTED_FROM" if get_workflow_by_id(tx, wf_id)['restart'] else ""
+    counts_query = ("MATCH (t:Task {workflow_id: $wf_id}) "
+                    f"WHERE NOT (t)<-[:DEPENDS_ON{restart}]-(:Task) "
+                    "RETURN t.state AS state, count(t) AS count")
+
+    return {rec['state']: rec['count'] for rec in tx.run(counts_query, wf_id=wf_id)}
+
+
 def cancelled_final_tasks_completed(tx, wf_id):
     """Return true if all a cancelled workflow's scheduled tasks have completed, else false.
 
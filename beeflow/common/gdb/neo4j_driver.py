@@ -96,6 +96,11 @@ class Neo4jDriver(GraphDatabaseDriver):
         with self._driver.session() as session:
             session.write_transaction(tx.create_bee_node)
 
+    def create_constraints(self):
+        """Create the uniqueness constraints and indexes on Task and Workflow ids."""
+        with self._driver.session() as session:
+            session.write_transaction(tx.create_constraints)
+
     def initialize_workflow(self, workflow):
         """Begin construction of a workflow stored in Neo4j.
 
@@ -172,6 +177,16 @@ class Neo4jDriver(GraphDatabaseDriver):
             )
             session.write_transaction(tx.add_dependencies, task=task)
 
+    def load_workflow(self, workflow, tasks):
+        """Load a workflow and all of its tasks in a single transaction.
+
+        :param workflow: the workflow description
+        :type workflow: Workflow
+        :param tasks: the workflow tasks
+        :type tasks: list of Task
+        """
+        self._write_transaction(tx.load_workflow, workflow=workflow, tasks=tasks)
+
     def initialize_ready_tasks(self, workflow_id):
         """Set runnable tasks to state 'READY'.
 
@@ -226,11 +241,8 @@ class Neo4jDriver(GraphDatabaseDriver):
         :type task_id: str
         :rtype: Task
         """
-        task_record = self._read_transaction(tx.get_task_by_id, task_id=task_id)
-        tuples = self._get_task_data_tuples([task_record])
-        return _reconstruct_task(
-            tuples[0][0], tuples[0][1], tuples[0][2], tuples[0][3], tuples[0][4], tuples[0][5]
-        )
+        records = self._read_transaction(tx.get_tasks_data, task_ids=[task_id])
+        return _reconstruct_task_data(records[0]) if records else None
 
     def get_all_workflow_info(self):
         """Return all workflow information from the Neo4j database.
@@ -311,11 +323,28 @@ class Neo4jDriver(GraphDatabaseDriver):
         :type workflow_id: str
         :rtype: list of Task
         """
-        task_records = self._read_transaction(tx.get_workflow_tasks, wf_id=workflow_id)
-        tuples = self._get_task_data_tuples(task_records)
-        return [
-            _reconstruct_task(tup[0], tup[1], tup[2], tup[3], tup[4], tup[5]) for tup in tuples
-        ]
+        return self._read_tasks(tx.get_workflow_tasks, wf_id=workflow_id)
+
+    def get_workflow_task_states(self, workflow_id):
+        """Return the (id, name, state, metadata) of every task in a workflow.
+
+        :param workflow_id: the workflow id
+        :type workflow_id: str
+        :rtype: list of (str, str, str, dict)
+        """
+        records = self._read_transaction(tx.get_workflow_task_states, wf_id=workflow_id)
+        return [(rec["id"], rec["name"], rec["state"], _reconstruct_metadata(rec["metadata"]))
+                for rec in records]
+
+    def get_workflow_state_counts(self, workflow_id):
+        """Return the number of tasks of a workflow in each state.
+
+        :param workflow_id: the workflow id
+        :type workflow_id: str
+        :rtype: dict of str to int
+        """
+        records = self._read_transaction(tx.get_workflow_state_counts, wf_id=workflow_id)
+        return {rec["state"]: rec["count"] for rec in records}
 
     def get_workflow_requirements_and_hints(self, workflow_id):
         """Return all workflow requirements and hints from the Neo4j database.
@@ -363,11 +392,7 @@ class Neo4jDriver(GraphDatabaseDriver):
         :type workflow_id: str
         :rtype: list of Task
         """
-        task_records = self._read_transaction(tx.get_ready_tasks, wf_id=workflow_id)
-        tuples = self._get_task_data_tuples(task_records)
-        return [
-            _reconstruct_task(tup[0], tup[1], tup[2], tup[3], tup[4], tup[5]) for tup in tuples
-        ]
+        return self._read_tasks(tx.get_ready_tasks, wf_id=workflow_id)
 
     def get_dependent_tasks(self, task_id):
         """Return the dependent tasks of a specified workflow task.
@@ -376,11 +401,7 @@ class Neo4jDriver(GraphDatabaseDriver):
         :type task_id: str
         :rtype: list of Task
         """
-        task_records = self._read_transaction(tx.get_dependent_tasks, task_id=task_id)
-        tuples = self._get_task_data_tuples(task_records)
-        return [
-            _reconstruct_task(tup[0], tup[1], tup[2], tup[3], tup[4], tup[5]) for tup in tuples
-        ]
+        return self._read_tasks(tx.get_dependent_tasks, task_id=task_id)
 
     def get_task_state(self, task_id):
         """Return the state of a task in the Neo4j workflow.
@@ -401,6 +422,16 @@ class Neo4jDriver(GraphDatabaseDriver):
         """
         self._write_transaction(tx.set_task_state, task_id=task_id, state=state)
 
+    def mark_downstream(self, task_id, state):
+        """Set the state of every task that transitively depends on a task.
+
+        :param task_id: the ID of the task whose dependents to update
+        :type task_id: str
+        :param state: the new state
+        :type state: str
+        """
+        self._write_transaction(tx.mark_downstream, task_id=task_id, state=state)
+
     def get_task_metadata(self, task_id):
         """Return the metadata of a task in the Neo4j workflow.
 
@@ -528,14 +559,16 @@ class Neo4jDriver(GraphDatabaseDriver):
         :type workflow_id: str
         :rtype: Optional[str]
         """
+        # Read the final task states once for all of the checks
+        states = set(self._read_transaction(tx.get_final_task_state_counts, wf_id=workflow_id))
         final_state = None
-        if self._read_transaction(tx.final_tasks_succeeded, wf_id=workflow_id):
+        if states <= {"COMPLETED"}:
             # all tasks succeeded
             final_state = None
-        elif self._read_transaction(tx.final_tasks_failed, wf_id=workflow_id):
+        elif states <= set(tx.failed_task_states):
             # all tasks failed
             final_state = "Failed"
-        elif self.workflow_completed(workflow_id):
+        elif states <= set(tx.final_task_states):
             # some tasks failed
             final_state = "Partial-Fail"
         else:
@@ -568,50 +601,19 @@ class Neo4jDriver(GraphDatabaseDriver):
         """Close the connection to the Neo4j database."""
         self._driver.close()
 
-    def _get_task_data_tuples(self, task_records):
-        """Get a list of (task_record, hints, requirements, inputs, outputs) tuples.
+    def _read_tasks(self, tx_fun, **kwargs):
+        """Select tasks and read them fully assembled in a single read transaction.
 
-        :param task_records: the database records of the tasks
-        :type task_records: BoltStatementResult
-        :rtype: list of (BoltStatementResult, list of Hint, list of Requirement)
+        :param tx_fun: the transaction function returning the task nodes to read
+        :type tx_fun: function
+        :param kwargs: optional parameters for the transaction function
+        :rtype: list of Task
         """
-        with self._driver.session() as session:
-            trecords = list(task_records)
-            hint_records = [
-                session.read_transaction(tx.get_task_hints, task_id=rec["id"])
-                for rec in trecords
-            ]
-            req_records = [
-                session.read_transaction(tx.get_task_requirements, task_id=rec["id"])
-                for rec in trecords
-            ]
-            input_records = [
-                session.read_transaction(tx.get_task_inputs, task_id=rec["id"])
-                for rec in trecords
-            ]
-            output_records = [
-                session.read_transaction(tx.get_task_outputs, task_id=rec["id"])
-                for rec in trecords
-            ]
-            metadata_records = [
-                session.read_transaction(tx.get_task_metadata, task_id=rec["id"])
-                for rec in trecords
-            ]
-
-        hints = [_reconstruct_hints(hint_record) for hint_record in hint_records]
-        reqs = [_reconstruct_requirements(req_record) for req_record in req_records]
-        inputs = [
-            _reconstruct_task_inputs(input_record) for input_record in input_records
-        ]
-        outputs = [
-            _reconstruct_task_outputs(output_record) for output_record in output_records
-        ]
-        metadata = [
-            _reconstruct_metadata(metadata_record)
-            for metadata_record in metadata_records
-        ]
+        def read_tasks(neo_tx):
+            task_ids = [rec["id"] for rec in tx_fun(neo_tx, **kwargs)]
+            return tx.get_tasks_data(neo_tx, task_ids=task_ids)
 
-        return list(zip(trecords, hints, reqs, inputs, outputs, metadata))
+        return [_reconstruct_task_data(rec) for rec in self._read_transaction(read_tasks)]
 
     def _read_transaction(self, tx_fun, **kwargs):
         """Run a Neo4j read transaction.
@@ -811,6 +813,23 @@ def _reconstruct_task(task_record, hints, requirements, inputs, outputs, metadat
     )
 
 
+def _reconstruct_task_data(task_data_record):
+    """Reconstruct a Task object from an assembled record retrieved by get_tasks_data.
+
+    :param task_data_record: the database record of the task and its related nodes
+    :type task_data_record: neo4j.Record
+    :rtype: Task
+    """
+    return _reconstruct_task(
+        task_data_record["t"],
+        _reconstruct_hints(task_data_record["hints"]),
+        _reconstruct_requirements(task_data_record["reqs"]),
+        _reconstruct_task_inputs(task_data_record["inputs"]),
+        _reconstruct_task_outputs(task_data_record["outputs"]),
+        _reconstruct_metadata(task_data_record["metadata"]),
+    )
+
+
 def _reconstruct_metadata(metadata_record):
     """Reconstruct a dict containing the job description metadata retrieved from Neo4j.
 
@@ -820,4 +839,6 @@ def _reconstruct_metadata(metadata_record):
     :type keys: iterable of str
     :rtype: dict
     """
+    if metadata_record is None:
+        return {}
     return dict(metadata_record.items())
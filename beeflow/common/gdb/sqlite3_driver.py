@@ -3,6 +3,7 @@
 import os
 from beeflow.common.gdb.gdb_driver import GraphDatabaseDriver
 from beeflow.common.config_driver import BeeConfig as bc
+from beeflow.common.db import bdb
 from beeflow.common.db.gdb_db import SQL_GDB
 
 def db_path():
@@ -19,6 +20,9 @@ def connect_db():
 class SQLDriver(GraphDatabaseDriver):
     """Graph database driver using SQLite as the backend."""
 
+    # Dependents are set to READY from their count of unsatisfied inputs
+    marks_ready_dependents = True
+
     def __new__(cls):
         if not hasattr(cls, 'instance'):
             cls.instance = super(SQLDriver, cls).__new__(cls)
@@ -79,6 +83,21 @@ class SQLDriver(GraphDatabaseDriver):
         self.db.create_task(task)
         self.db.add_dependencies(task)
 
+    def load_workflow(self, workflow, tasks):
+        """Load a workflow and all of its tasks in a single transaction.
+
+        :param workflow: the workflow description
+        :type workflow: Workflow
+        :param tasks: the workflow tasks
+        :type tasks: list of Task
+        """
+        self.db.bulk_load_workflow(workflow, tasks)
+
+
+    def transaction(self):
+        """Return a context manager that runs the operations inside it as one transaction."""
+        return bdb.transaction(self.db.db_file)
+
 
     def initialize_ready_tasks(self, workflow_id):
         """Set runnable tasks to state 'READY'.
@@ -107,11 +126,16 @@ class SQLDriver(GraphDatabaseDriver):
     def finalize_task(self, task):
         """Set task state to 'COMPLETED' and set inputs from source.
 
+        Dependents whose inputs are now all set are marked 'READY'.
+
         :param task: the task to finalize
         :type task: Task
         """
-        self.db.set_task_state(task.id, 'COMPLETED')
-        self.db.copy_task_outputs(task)
+        with bdb.transaction(self.db.db_file):
+            self.db.set_task_state(task.id, 'COMPLETED')
+            self.db.copy_task_outputs(task)
+            # Only the direct dependents can have become runnable
+            self.db.set_runnable_dependents_to_ready(task.id)
 
 
     def get_task_by_id(self, task_id):
@@ -165,6 +189,22 @@ class SQLDriver(GraphDatabaseDriver):
         return self.db.get_workflow_tasks(workflow_id)
 
 
+    def get_workflow_task_states(self, workflow_id):
+        """Return the (id, name, state, metadata) of every task in a workflow.
+
+        :rtype: list of (str, str, str, dict)
+        """
+        return self.db.get_workflow_task_states(workflow_id)
+
+
+    def get_workflow_state_counts(self, workflow_id):
+        """Return the number of tasks of a workflow in each state.
+
+        :rtype: dict of str to int
+        """
+        return self.db.get_task_state_counts(workflow_id)
+
+
     def get_workflow_requirements_and_hints(self, workflow_id):
         """Return all workflow requirements and hints from the graph database.
 
@@ -243,6 +283,16 @@ class SQLDriver(GraphDatabaseDriver):
         """
         self.db.set_task_state(task_id, state)
 
+    def mark_downstream(self, task_id, state):
+        """Set the state of every task that transitively depends on a task.
+
+        :param task_id: the ID of the task whose dependents to update
+        :type task_id: str
+        :param state: the new state
+        :type state: str
+        """
+        self.db.mark_downstream(task_id, state)
+
 
     def get_task_metadata(self, task_id):
         """Return the metadata of a task in the graph database.
@@ -355,12 +405,14 @@ class SQLDriver(GraphDatabaseDriver):
 
         :rtype: Optional[str]
         """
+        # Read the state counts once for all of the checks
+        counts = self.db.get_task_state_counts(workflow_id)
         final_state = None
-        if self.db.final_tasks_succeeded(workflow_id):
+        if self.db.final_tasks_succeeded(workflow_id, counts):
             final_state = None
-        elif self.db.final_tasks_failed(workflow_id):
+        elif self.db.final_tasks_failed(workflow_id, counts):
             final_state = 'Failed'
-        elif self.db.final_tasks_completed(workflow_id):
+        elif self.db.final_tasks_completed(workflow_id, counts):
             final_state = 'Partial-Fail'
         else:
             raise ValueError(f"Workflow with id {workflow_id} has not finished.")
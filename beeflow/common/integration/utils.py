@@ -83,9 +83,10 @@ class Workflow:
 
     @property
     def running(self):
-        """Check if the workflow is running or about to run."""
-        return bee_client.query(self.wf_id)[0] in ('Initializing', 'Starting',
-                                                   'Waiting', 'Running', 'Pending')
+        """Check if the workflow is running, about to run or being archived."""
+        status = bee_client.query(self.wf_id)[0]
+        return (status in ('Initializing', 'Starting', 'Waiting', 'Running', 'Pending')
+                or status.startswith('Archiving'))
 
     @property
     def status(self):
@@ -40,6 +40,11 @@ def slurm_socket():
     return os.path.join(_sockdir(), 'slurmrestd.sock')
 
 
+def slurmrestd_version_cache():
+    """Get the file caching the detected slurmrestd OpenAPI version."""
+    return os.path.join(workdir(), 'slurmrestd_version.json')
+
+
 def log_path():
     """Return the main log path."""
     bee_workdir = bc.get('DEFAULT', 'bee_workdir')
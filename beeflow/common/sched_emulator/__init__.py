@@ -0,0 +1,9 @@
+"""Slurm emulator for load-testing the task manager without a cluster.
+
+The emulator provides stand-ins for the sbatch, squeue, scontrol, sacct,
+scancel and slurmrestd commands that share their job state through an
+SQLite database. Jobs don't run anything: their queue wait, run time and
+outcome are drawn from the distributions in the emulator's configuration
+when they are submitted. This package only uses the standard library, so
+that each emulated command starts quickly.
+"""
@@ -0,0 +1,7 @@
+"""Run an emulated Slurm command: python -m beeflow.common.sched_emulator COMMAND [ARGS...]."""
+
+import sys
+
+from beeflow.common.sched_emulator.commands import main
+
+sys.exit(main())
@@ -0,0 +1,360 @@
+"""Stand-ins for the Slurm commands, backed by the emulator.
+
+Each command takes the options that BEE and most scripts use and prints
+what the real command would; options it doesn't know are ignored. The
+install() function writes executables named after the commands into a
+directory so that putting it first on PATH replaces the real ones.
+"""
+
+import argparse
+import os
+import re
+import shlex
+import stat
+import sys
+
+from beeflow.common.sched_emulator.emulator import (Emulator, EmulatorError, STATE_CODES,
+                                                    STATE_DIR_VAR, CONFIG_VAR, compress_indices,
+                                                    expand_indices, format_duration,
+                                                    format_timestamp, parse_time_limit)
+
+COMMANDS = ('sbatch', 'squeue', 'scontrol', 'sacct', 'scancel', 'slurmrestd')
+
+# squeue format codes: (header, function of the job description)
+SQUEUE_CODES = {
+    'i': ('JOBID', lambda job: job['id']),
+    'A': ('JOBID', lambda job: job['JobId']),
+    'T': ('STATE', lambda job: job['JobState']),
+    't': ('ST', lambda job: STATE_CODES.get(job['JobState'], job['JobState'])),
+    'j': ('NAME', lambda job: job['JobName']),
+    'u': ('USER', lambda job: job['UserId']),
+    'a': ('ACCOUNT', lambda job: job['Account']),
+    'P': ('PARTITION', lambda job: job['Partition']),
+    'q': ('QOS', lambda job: job['QOS']),
+    'r': ('REASON', lambda job: job['Reason']),
+    'R': ('NODELIST(REASON)',
+          lambda job: job['NodeList'] if job['NodeList'] else f'({job["Reason"]})'),
+    'D': ('NODES', lambda job: job['NumNodes']),
+    'C': ('CPUS', lambda job: job['NumCPUs']),
+    'N': ('NODELIST', lambda job: job['NodeList']),
+    'M': ('TIME', lambda job: format_duration(job['RunTime'])),
+    'l': ('TIME_LIMIT', lambda job: format_duration(job['TimeLimit'])),
+    'V': ('SUBMIT_TIME', lambda job: format_timestamp(job['SubmitTime'], 'N/A')),
+    'S': ('START_TIME', lambda job: format_timestamp(job['StartTime'], 'N/A')),
+    'e': ('END_TIME', lambda job: format_timestamp(job['EndTime'], 'N/A')),
+    'o': ('COMMAND', lambda job: job['Command']),
+    'Z': ('WORK_DIR', lambda job: job['WorkDir']),
+}
+SQUEUE_DEFAULT_FORMAT = '%.18i %.9P %.8j %.8u %.2t %.10M %.6D %R'
+_SQUEUE_CODE = re.compile(r'%(\.)?(\d*)([a-zA-Z])')
+
+# sacct fields: (name, function of the job description and state)
+SACCT_FIELDS = {
+    'jobid': ('JobID', lambda job, state: job['id']),
+    'jobidraw': ('JobIDRaw', lambda job, state: job['JobId']),
+    'jobname': ('JobName', lambda job, state: job['JobName']),
+    'partition': ('Partition', lambda job, state: job['Partition']),
+    'account': ('Account', lambda job, state: job['Account']),
+    'user': ('User', lambda job, state: job['UserId']),
+    'alloccpus': ('AllocCPUS', lambda job, state: job['NumCPUs']),
+    'ncpus': ('NCPUS', lambda job, state: job['NumCPUs']),
+    'nnodes': ('NNodes', lambda job, state: job['NumNodes']),
+    'state': ('State', lambda job, state: state),
+    'exitcode': ('ExitCode', lambda job, state: job['ExitCode']),
+    'submit': ('Submit', lambda job, state: format_timestamp(job['SubmitTime'])),
+    'start': ('Start', lambda job, state: format_timestamp(job['StartTime'])),
+    'end': ('End', lambda job, state: format_timestamp(job['EndTime'])),
+    'elapsed': ('Elapsed', lambda job, state: format_duration(job['RunTime'], fixed=True)),
+    'elapsedraw': ('ElapsedRaw', lambda job, state: int(job['RunTime'])),
+    'timelimit': ('Timelimit', lambda job, state: format_duration(job['TimeLimit'])),
+    'nodelist': ('NodeList', lambda job, state: job['NodeList'] or 'None assigned'),
+    'workdir': ('WorkDir', lambda job, state: job['WorkDir']),
+}
+SACCT_DEFAULT_FORMAT = 'JobID,JobName,Partition,Account,AllocCPUS,State,ExitCode'
+
+
+class CommandError(Exception):
+    """Error printed by a command before it exits with a failure."""
+
+
+def _job_parser(prog):
+    """Return a parser for the sbatch options BEE uses."""
+    parser = argparse.ArgumentParser(prog=prog, add_help=False, allow_abbrev=False)
+    parser.add_argument('--parsable', action='store_true', default=None)
+    parser.add_argument('-D', '--chdir', dest='workdir')
+    parser.add_argument('-d', '--dependency')
+    parser.add_argument('--kill-on-invalid-dep', dest='kill_on_invalid_dep')
+    parser.add_argument('-a', '--array')
+    parser.add_argument('-J', '--job-name', dest='name')
+    parser.add_argument('-o', '--output', dest='stdout')
+    parser.add_argument('-e', '--error', dest='stderr')
+    parser.add_argument('-N', '--nodes')
+    parser.add_argument('-n', '--ntasks')
+    parser.add_argument('-t', '--time')
+    parser.add_argument('-p', '--partition')
+    parser.add_argument('-A', '--account')
+    parser.add_argument('-q', '--qos')
+    # Accepted but not emulated
+    for option in ('--reservation', '--signal', '--open-mode', '--mem', '--mpi'):
+        parser.add_argument(option)
+    return parser
+
+
+def _script_options(script):
+    """Return the #SBATCH options of a batch script as a list of arguments."""
+    args = []
+    for line in script.splitlines():
+        line = line.strip()
+        if line.startswith('#SBATCH'):
+            args.extend(shlex.split(line[len('#SBATCH'):], comments=True))
+        elif line and not line.startswith('#'):
+            # sbatch stops reading options at the first command
+            break
+    return args
+
+
+def _dependency_ids(dependency):
+    """Return the job ids of an afterok dependency (the only kind BEE uses)."""
+    if not dependency:
+        return []
+    kind, _, job_ids = dependency.partition(':')
+    if kind != 'afterok':
+        raise CommandError(f'unsupported dependency type {kind}')
+    return [job_id for job_id in job_ids.split(':') if job_id]
+
+
+def sbatch(emulator, argv, out):
+    """Submit a batch script."""
+    parser = _job_parser('sbatch')
+    parser.add_argument('script')
+    args, _ = parser.parse_known_args(argv)
+    try:
+        with open(args.script, encoding='utf-8') as fp:
+            script = fp.read()
+    except OSError as err:
+        raise CommandError(f'Unable to open file {args.script}') from err
+    # Command line options override those in the script
+    defaults, _ = _job_parser('sbatch').parse_known_args(_script_options(script))
+    options = {key: value for key, value in vars(defaults).items() if value is not None}
+    options.update((key, value) for key, value in vars(args).items() if value is not None)
+    try:
+        time_limit = parse_time_limit(options.get('time'))
+    except ValueError as err:
+        raise CommandError(f'Invalid --time specification {options["time"]}') from err
+    options.update(command=os.path.abspath(args.script), time_limit=time_limit,
+                   dependency=_dependency_ids(options.get('dependency')),
+                   kill_on_invalid_dep=options.get('kill_on_invalid_dep') == 'yes')
+    array = expand_indices(options['array']) if options.get('array') else None
+    try:
+        job_id = emulator.submit(options, array=array)
+    except EmulatorError as err:
+        raise CommandError(f'Batch job submission failed: {err}') from err
+    out.write(f'{job_id}\n' if options.get('parsable') else f'Submitted batch job {job_id}\n')
+    return 0
+
+
+def _format_line(fmt, job):
+    """Fill in squeue format codes for a job (or headers, if job is None)."""
+    def replace(match):
+        right, width, code = match.groups()
+        header, field = SQUEUE_CODES.get(code, (code.upper(), lambda job: ''))
+        value = str(header if job is None else field(job))
+        if not width:
+            return value
+        value = value[:int(width)]
+        return value.rjust(int(width)) if right else value.ljust(int(width))
+    return _SQUEUE_CODE.sub(replace, fmt)
+
+
+def squeue(emulator, argv, out):
+    """List queued, running and recently finished jobs."""
+    parser = argparse.ArgumentParser(prog='squeue', add_help=False, allow_abbrev=False)
+    parser.add_argument('-h', '--noheader', action='store_true')
+    parser.add_argument('-t', '--states', default='')
+    parser.add_argument('-r', '--array', action='store_true')
+    parser.add_argument('-j', '--jobs', default='')
+    parser.add_argument('-o', '--format', default=SQUEUE_DEFAULT_FORMAT)
+    args, _ = parser.parse_known_args(argv)
+    snapshot = emulator.snapshot()
+    if args.jobs:
+        ids = [id_ for job_id in args.jobs.split(',') for id_ in snapshot.find(job_id)]
+        ids = sorted(id_ for id_ in set(ids) if snapshot.visible(id_))
+        if not ids:
+            raise CommandError('slurm_load_jobs error: Invalid job id specified')
+    else:
+        ids = [id_ for id_ in snapshot.jobs if snapshot.visible(id_)]
+    if args.states.lower() == 'all':
+        states = None
+    elif args.states:
+        codes = {code: state for state, code in STATE_CODES.items()}
+        states = {codes.get(state.upper(), state.upper()) for state in args.states.split(',')}
+    else:
+        states = {'PENDING', 'RUNNING'}
+    jobs = []
+    pending_arrays = {}
+    for id_ in ids:
+        job = snapshot.describe(id_)
+        if states is not None and job['JobState'] not in states:
+            continue
+        job['id'] = snapshot.job_id(id_)
+        if job['ArrayJobId'] is not None and job['JobState'] == 'PENDING' and not args.array:
+            # Pending elements of an array are listed on one line unless --array is given
+            if job['ArrayJobId'] in pending_arrays:
+                pending_arrays[job['ArrayJobId']].append(job['ArrayTaskId'])
+                continue
+            pending_arrays[job['ArrayJobId']] = [job['ArrayTaskId']]
+        jobs.append(job)
+    if not args.noheader:
+        out.write(_format_line(args.format, None) + '\n')
+    for job in jobs:
+        indices = pending_arrays.get(job['ArrayJobId'])
+        if indices and job['JobState'] == 'PENDING' and not args.array and len(indices) > 1:
+            job['id'] = f'{job["ArrayJobId"]}_[{compress_indices(indices)}]'
+        out.write(_format_line(args.format, job) + '\n')
+    return 0
+
+
+def scontrol(emulator, argv, out):
+    """Show jobs (scontrol show job [JOBID])."""
+    if len(argv) < 2 or argv[0] != 'show' or argv[1] != 'job':
+        raise CommandError(f'unsupported command: scontrol {" ".join(argv)}')
+    snapshot = emulator.snapshot()
+    if len(argv) > 2:
+        ids = [id_ for id_ in snapshot.find(argv[2]) if snapshot.visible(id_)]
+        if not ids:
+            raise CommandError('slurm_load_jobs error: Invalid job id specified')
+    else:
+        ids = [id_ for id_ in snapshot.jobs if snapshot.visible(id_)]
+    for id_ in ids:
+        job = snapshot.describe(id_)
+        fields = {key: value for key, value in job.items()
+                  if key not in ('ArrayJobId', 'ArrayTaskId') or value is not None}
+        fields['Dependency'] = fields['Dependency'] or '(null)'
+        fields['RunTime'] = format_duration(job['RunTime'], fixed=True)
+        fields['TimeLimit'] = format_duration(job['TimeLimit'], fixed=True)
+        for key in ('SubmitTime', 'StartTime', 'EndTime'):
+            fields[key] = format_timestamp(job[key])
+        fields['NodeList'] = job['NodeList'] or '(null)'
+        out.write('\n   '.join(f'{key}={value}' for key, value in fields.items()) + '\n\n')
+    return 0
+
+
+def sacct(emulator, argv, out):
+    """Report on all jobs, including those the controller no longer lists."""
+    parser = argparse.ArgumentParser(prog='sacct', add_help=False, allow_abbrev=False)
+    parser.add_argument('-p', '--parsable', action='store_true')
+    parser.add_argument('-P', '--parsable2', action='store_true')
+    parser.add_argument('-n', '--noheader', action='store_true')
+    parser.add_argument('-X', '--allocations', action='store_true')
+    parser.add_argument('-o', '--format', default=SACCT_DEFAULT_FORMAT)
+    parser.add_argument('-j', '--jobs', default='')
+    args, _ = parser.parse_known_args(argv)
+    fields = []
+    for name in args.format.split(','):
+        field = SACCT_FIELDS.get(name.split('%', 1)[0].lower())
+        if field is None:
+            raise CommandError(f'Invalid field requested: "{name}"')
+        fields.append(field)
+    snapshot = emulator.snapshot()
+    if args.jobs:
+        ids = sorted({id_ for job_id in args.jobs.split(',') for id_ in snapshot.find(job_id)})
+    else:
+        ids = list(snapshot.jobs)
+    rows = []
+    for id_ in ids:
+        job = snapshot.describe(id_)
+        job['id'] = snapshot.job_id(id_)
+        state = job['JobState']
+        if state == 'CANCELLED':
+            state = f'CANCELLED by {os.getuid()}'
+        rows.append([field(job, state) for _, field in fields])
+        if job['StartTime'] is not None and not args.allocations:
+            step = dict(job, id=f'{job["id"]}.batch', JobName='batch')
+            rows.append([field(step, state) for _, field in fields])
+    if args.parsable or args.parsable2:
+        end = '|' if args.parsable and not args.parsable2 else ''
+        lines = ['|'.join(str(value) for value in row) + end for row in rows]
+        header = '|'.join(name for name, _ in fields) + end
+    else:
+        lines = [' '.join(f'{str(value)[:10]:>10}' for value in row) for row in rows]
+        header = ' '.join(f'{name[:10]:>10}' for name, _ in fields)
+        if not args.noheader:
+            header += '\n' + ' '.join('-' * 10 for _ in fields)
+    if not args.noheader:
+        lines.insert(0, header)
+    out.writelines(f'{line}\n' for line in lines)
+    return 0
+
+
+def scancel(emulator, argv, out):  # pylint: disable=W0613 # same signature as the others
+    """Cancel jobs."""
+    job_ids = [arg for arg in argv if not arg.startswith('-')]
+    if not job_ids:
+        raise CommandError('No job identification provided')
+    errors = emulator.cancel(job_ids)
+    status = 0
+    for job_id, error in errors.items():
+        if 'completed' in error:
+            # Like scancel, don't fail for jobs that already ended
+            print(f'scancel: error: Kill job error on job id {job_id}: {error}', file=sys.stderr)
+        else:
+            print(f'scancel: error: {error} {job_id}', file=sys.stderr)
+            status = 1
+    return status
+
+
+def slurmrestd(emulator, argv, out):
+    """List the OpenAPI versions or serve the REST API on a unix socket."""
+    # Import here, so that the other commands don't pay for the HTTP server
+    from beeflow.common.sched_emulator import restd  # pylint: disable=C0415
+    return restd.main(emulator, argv, out)
+
+
+def main(argv=None):
+    """Run the stand-in for the command named by the first argument."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or os.path.basename(argv[0]) not in COMMANDS:
+        print(f'usage: {sys.argv[0]} {{{",".join(COMMANDS)}}} [ARGS...]', file=sys.stderr)
+        return 2
+    name = os.path.basename(argv[0])
+    try:
+        emulator = Emulator.from_env()
+    except EmulatorError as err:
+        print(f'{name}: error: {err}', file=sys.stderr)
+        return 1
+    try:
+        emulator.controller_delay()
+        return globals()[name](emulator, argv[1:], sys.stdout)
+    except (CommandError, EmulatorError) as err:
+        print(f'{name}: error: {err}', file=sys.stderr)
+        return 1
+    finally:
+        emulator.close()
+
+
+def install(bin_dir, state_dir, config=None):
+    """Write executables for the stand-in commands into bin_dir.
+
+    :param bin_dir: directory to put first on PATH
+    :type bin_dir: str
+    :param state_dir: the emulator state directory the commands share
+    :type state_dir: str
+    :param config: the emulator configuration file (None for state_dir/emulator.conf)
+    :type config: str
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(state_dir, exist_ok=True)
+    # The package may not be installed, so point the commands at this copy
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))))
+    env = [f'export {STATE_DIR_VAR}={shlex.quote(os.path.abspath(state_dir))}',
+           f'export PYTHONPATH={shlex.quote(package_root)}${{PYTHONPATH:+:$PYTHONPATH}}']
+    if config is not None:
+        env.append(f'export {CONFIG_VAR}={shlex.quote(os.path.abspath(config))}')
+    for name in COMMANDS:
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write('\n'.join(['#!/bin/sh', *env,
+                                f'exec {shlex.quote(sys.executable)} -m '
+                                f'beeflow.common.sched_emulator {name} "$@"', '']))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
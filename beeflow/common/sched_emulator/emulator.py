@@ -0,0 +1,477 @@
+"""Emulated Slurm controller state shared by the stand-in commands.
+
+Jobs are stored in an SQLite database in the emulator's state directory.
+When a job is submitted, its queue wait, run time and outcome are drawn
+from the configured distributions, so its whole timeline is fixed except
+for cancellations and the jobs it depends on. The state of a job at any
+moment is worked out from that timeline when it's queried.
+"""
+
+import configparser
+import getpass
+import math
+import os
+import random
+import sqlite3
+import time
+
+# Environment variables naming the state directory and the configuration file
+STATE_DIR_VAR = 'BEE_EMULATOR_DIR'
+CONFIG_VAR = 'BEE_EMULATOR_CONFIG'
+
+# Default configuration; the [emulator] section of the configuration file
+# overrides these
+DEFAULTS = {
+    # mean seconds that a job waits in the queue once it's eligible to run
+    'queue_wait': 1.0,
+    # mean seconds that a job runs
+    'run_time': 5.0,
+    # how waits and run times are drawn: 'exponential' around the mean or 'fixed'
+    'distribution': 'exponential',
+    # fractions of jobs that fail and that are lost to a node failure
+    'failure_rate': 0.0,
+    'node_fail_rate': 0.0,
+    # mean seconds the controller takes to answer a command or request
+    'latency': 0.0,
+    # seconds that finished jobs are still listed by squeue, scontrol and slurmrestd
+    'min_job_age': 300.0,
+    # seed for the random draws; the same seed gives every job id the same timeline
+    'seed': 0,
+    # id of the first job submitted
+    'first_job_id': 1000,
+}
+
+FINAL_STATES = {'COMPLETED', 'FAILED', 'CANCELLED', 'TIMEOUT', 'NODE_FAIL'}
+
+# Compact state codes shown by squeue's %t
+STATE_CODES = {'PENDING': 'PD', 'RUNNING': 'R', 'COMPLETED': 'CD', 'FAILED': 'F',
+               'CANCELLED': 'CA', 'TIMEOUT': 'TO', 'NODE_FAIL': 'NF'}
+
+EXIT_CODES = {'COMPLETED': '0:0', 'FAILED': '1:0', 'CANCELLED': '0:15', 'TIMEOUT': '0:15',
+              'NODE_FAIL': '0:0'}
+
+_COLUMNS = ('id', 'array_id', 'array_index', 'name', 'user', 'workdir', 'command', 'stdout',
+            'stderr', 'partition', 'account', 'qos', 'nodes', 'ntasks', 'time_limit',
+            'dependency', 'kill_on_invalid_dep', 'submit_time', 'queue_wait', 'run_time',
+            'outcome', 'cancel_time')
+
+
+class EmulatorError(Exception):
+    """Error raised for requests the emulated controller rejects."""
+
+
+def load_config(path=None):
+    """Load the emulator configuration from an INI file with an [emulator] section.
+
+    :param path: the configuration file (None for the defaults only)
+    :type path: str
+    :rtype: dict
+    """
+    config = dict(DEFAULTS)
+    if path is None or not os.path.exists(path):
+        return config
+    parser = configparser.ConfigParser()
+    parser.read(path, encoding='utf-8')
+    if not parser.has_section('emulator'):
+        return config
+    for key, value in parser.items('emulator'):
+        if key not in DEFAULTS:
+            raise EmulatorError(f'unknown emulator option {key} in {path}')
+        try:
+            config[key] = type(DEFAULTS[key])(value)
+        except ValueError as err:
+            raise EmulatorError(f'bad value for emulator option {key}: {value}') from err
+    if config['distribution'] not in ('exponential', 'fixed'):
+        raise EmulatorError(f'unknown distribution {config["distribution"]}')
+    if not 0 <= config['failure_rate'] + config['node_fail_rate'] <= 1:
+        raise EmulatorError('failure_rate and node_fail_rate must add up to at most 1')
+    return config
+
+
+def draw(rng, mean, distribution):
+    """Draw a duration with the given mean."""
+    if mean <= 0:
+        return 0.0
+    if distribution == 'fixed':
+        return float(mean)
+    return rng.expovariate(1 / mean)
+
+
+def parse_time_limit(value):
+    """Parse a Slurm time limit such as '30', '1:00:00' or '1-12' into seconds.
+
+    Returns None for an unlimited time.
+    """
+    if value is None or value.upper() in ('', 'UNLIMITED', 'INFINITE'):
+        return None
+    days, _, rest = value.rpartition('-')
+    parts = [int(part) for part in rest.split(':')]
+    if days:
+        # D-HH, D-HH:MM or D-HH:MM:SS
+        hours, minutes, seconds = (parts + [0, 0])[:3]
+    elif len(parts) == 3:
+        hours, minutes, seconds = parts
+    else:
+        # MM or MM:SS
+        hours, minutes, seconds = 0, parts[0], parts[1] if len(parts) > 1 else 0
+    return ((int(days or 0) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def expand_indices(spec):
+    """Expand a job array index expression such as '0-5:2,7%4' into a list."""
+    result = []
+    for part in filter(None, spec.split('%', 1)[0].split(',')):
+        part, _, step = part.partition(':')
+        first, _, last = part.partition('-')
+        result.extend(range(int(first), int(last or first) + 1, int(step or 1)))
+    return result
+
+
+def compress_indices(indices):
+    """Write job array indices as ranges, as in '0-3,7'."""
+    ranges = []
+    for index in sorted(indices):
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ','.join(str(first) if first == last else f'{first}-{last}'
+                    for first, last in ranges)
+
+
+def format_duration(seconds, fixed=False):
+    """Format seconds as Slurm does: M:SS, H:MM:SS or D-HH:MM:SS.
+
+    With fixed, hours are always shown as two digits (scontrol's format).
+    """
+    if seconds is None:
+        return 'UNLIMITED'
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days:
+        return f'{days}-{hours:02}:{minutes:02}:{seconds:02}'
+    if fixed:
+        return f'{hours:02}:{minutes:02}:{seconds:02}'
+    if hours:
+        return f'{hours}:{minutes:02}:{seconds:02}'
+    return f'{minutes}:{seconds:02}'
+
+
+def format_timestamp(value, missing='Unknown'):
+    """Format a timestamp as Slurm does (missing for no time)."""
+    if value is None or math.isinf(value):
+        return missing
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(value))
+
+
+class Emulator:
+    """Emulated Slurm controller backed by the job database in a state directory."""
+
+    def __init__(self, state_dir, config=None):
+        """Open the emulator state, creating it if needed.
+
+        :param state_dir: directory holding the job database
+        :type state_dir: str
+        :param config: the configuration (None to load it from the environment or
+                       emulator.conf in the state directory)
+        :type config: dict
+        """
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        if config is None:
+            config = load_config(os.environ.get(CONFIG_VAR,
+                                                os.path.join(state_dir, 'emulator.conf')))
+        self.config = config
+        self.conn = sqlite3.connect(os.path.join(state_dir, 'jobs.db'), timeout=60,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                             id INTEGER PRIMARY KEY,
+                             array_id INTEGER,
+                             array_index INTEGER,
+                             name TEXT,
+                             user TEXT,
+                             workdir TEXT,
+                             command TEXT,
+                             stdout TEXT,
+                             stderr TEXT,
+                             partition TEXT,
+                             account TEXT,
+                             qos TEXT,
+                             nodes INTEGER,
+                             ntasks INTEGER,
+                             time_limit INTEGER,
+                             dependency TEXT,
+                             kill_on_invalid_dep INTEGER,
+                             submit_time REAL,
+                             queue_wait REAL,
+                             run_time REAL,
+                             outcome TEXT,
+                             cancel_time REAL)""")
+        self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_array ON jobs (array_id)')
+
+    @classmethod
+    def from_env(cls):
+        """Open the emulator whose state directory is named in the environment."""
+        try:
+            return cls(os.environ[STATE_DIR_VAR])
+        except KeyError:
+            raise EmulatorError(f'{STATE_DIR_VAR} is not set') from None
+
+    def close(self):
+        """Close the job database."""
+        self.conn.close()
+
+    def controller_delay(self):
+        """Wait as long as the controller takes to answer."""
+        delay = draw(random, self.config['latency'], self.config['distribution'])
+        if delay:
+            time.sleep(delay)
+
+    def _timeline(self, job_id, time_limit):
+        """Draw the queue wait, run time and outcome of a job."""
+        rng = random.Random(f'{self.config["seed"]}:{job_id}')
+        distribution = self.config['distribution']
+        queue_wait = draw(rng, self.config['queue_wait'], distribution)
+        run_time = draw(rng, self.config['run_time'], distribution)
+        outcome = 'COMPLETED'
+        roll = rng.random()
+        if roll < self.config['failure_rate']:
+            outcome = 'FAILED'
+        elif roll < self.config['failure_rate'] + self.config['node_fail_rate']:
+            outcome = 'NODE_FAIL'
+            run_time *= rng.random()
+        if time_limit is not None and run_time > time_limit:
+            outcome = 'TIMEOUT'
+            run_time = float(time_limit)
+        return queue_wait, run_time, outcome
+
+    def submit(self, options, array=None):
+        """Submit a job (or a job array) and return its job id.
+
+        :param options: the job's name, workdir, command, stdout, stderr, partition,
+                        account, qos, nodes, ntasks, time_limit (seconds or None),
+                        dependency (list of job ids) and kill_on_invalid_dep
+        :type options: dict
+        :param array: job array indices (None for a single job)
+        :type array: list of int
+        :rtype: int
+        """
+        now = time.time()
+        dependency = list(options.get('dependency') or [])
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            if dependency:
+                snapshot = self.snapshot(now)
+                if any(not snapshot.find(dep) for dep in dependency):
+                    raise EmulatorError('Job dependency problem')
+            last_id = self.conn.execute('SELECT MAX(id) FROM jobs').fetchone()[0]
+            first_id = max(self.config['first_job_id'], (last_id or 0) + 1)
+            indices = [None] if array is None else array
+            for offset, index in enumerate(indices):
+                job_id = first_id + offset
+                array_id = None if index is None else first_id
+                queue_wait, run_time, outcome = self._timeline(job_id, options.get('time_limit'))
+                row = {
+                    'id': job_id,
+                    'array_id': array_id,
+                    'array_index': index,
+                    'name': options.get('name') or os.path.basename(options['command']),
+                    'user': getpass.getuser(),
+                    'workdir': options.get('workdir') or os.getcwd(),
+                    'command': options['command'],
+                    'partition': options.get('partition') or 'emulated',
+                    'account': options.get('account') or '',
+                    'qos': options.get('qos') or 'normal',
+                    'nodes': int(options.get('nodes') or 1),
+                    'ntasks': int(options.get('ntasks') or options.get('nodes') or 1),
+                    'time_limit': options.get('time_limit'),
+                    'dependency': ':'.join(dependency),
+                    'kill_on_invalid_dep': int(bool(options.get('kill_on_invalid_dep'))),
+                    'submit_time': now,
+                    'queue_wait': queue_wait,
+                    'run_time': run_time,
+                    'outcome': outcome,
+                    'cancel_time': None,
+                }
+                default_output = 'slurm-%j.out' if index is None else 'slurm-%A_%a.out'
+                for key in ('stdout', 'stderr'):
+                    path = options.get(key) or options.get('stdout') or default_output
+                    row[key] = (path.replace('%j', str(job_id)).replace('%x', row['name'])
+                                .replace('%A', str(array_id or job_id))
+                                .replace('%a', str(index)))
+                self.conn.execute(f'INSERT INTO jobs ({",".join(_COLUMNS)}) '
+                                  f'VALUES ({",".join("?" * len(_COLUMNS))})',
+                                  [row[column] for column in _COLUMNS])
+        return first_id
+
+    def cancel(self, job_ids):
+        """Cancel jobs; returns {job_id: error} for the ones that couldn't be cancelled."""
+        now = time.time()
+        errors = {}
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            snapshot = self.snapshot(now)
+            for job_id in job_ids:
+                ids = snapshot.find(job_id)
+                if not ids:
+                    errors[job_id] = 'Invalid job id specified'
+                    continue
+                active = [id_ for id_ in ids if snapshot.state(id_)[0] not in FINAL_STATES]
+                if not active:
+                    errors[job_id] = 'Job/step already completing or completed'
+                    continue
+                self.conn.executemany('UPDATE jobs SET cancel_time = ? WHERE id = ?',
+                                      [(now, id_) for id_ in active])
+        return errors
+
+    def snapshot(self, now=None):
+        """Return the jobs as they are at now (the current time by default)."""
+        rows = self.conn.execute(f'SELECT {",".join(_COLUMNS)} FROM jobs ORDER BY id')
+        return Snapshot([dict(row) for row in rows], self.config,
+                        time.time() if now is None else now)
+
+
+class Snapshot:
+    """The emulated jobs at one moment."""
+
+    def __init__(self, jobs, config, now):
+        """Construct the snapshot from the job rows."""
+        self.jobs = {job['id']: job for job in jobs}
+        self.config = config
+        self.now = now
+        self.arrays = {}
+        for job in jobs:
+            if job['array_id'] is not None:
+                self.arrays.setdefault(job['array_id'], {})[job['array_index']] = job['id']
+        self._times = {}
+
+    def find(self, job_id):
+        """Return the ids of the jobs that a Slurm job id stands for.
+
+        ARRAYID_INDEX is one element of a job array and a plain array id is
+        all of its elements.
+        """
+        job_id = str(job_id)
+        try:
+            if '_' in job_id:
+                array_id, index = job_id.split('_', 1)
+                id_ = self.arrays.get(int(array_id), {}).get(int(index))
+                return [] if id_ is None else [id_]
+            id_ = int(job_id)
+        except ValueError:
+            return []
+        if id_ in self.arrays:
+            return sorted(self.arrays[id_].values())
+        return [id_] if id_ in self.jobs else []
+
+    def times(self, id_):
+        """Return the (eligible, start, end, final state) of a job.
+
+        Times that will never come are infinite; the start of a job that ends
+        without running is infinite too.
+        """
+        if id_ in self._times:
+            return self._times[id_]
+        job = self.jobs[id_]
+        eligible = job['submit_time']
+        blocked = None
+        for dep in filter(None, job['dependency'].split(':')):
+            for dep_id in self.find(dep):
+                _, _, dep_end, dep_final = self.times(dep_id)
+                if dep_final == 'COMPLETED':
+                    eligible = max(eligible, dep_end)
+                else:
+                    blocked = dep_end if blocked is None else min(blocked, dep_end)
+        if blocked is None:
+            start = eligible + job['queue_wait']
+            end, final = start + job['run_time'], job['outcome']
+        elif job['kill_on_invalid_dep'] and not math.isinf(blocked):
+            # Slurm cancels the job once the dependency can't be satisfied
+            eligible = start = math.inf
+            end, final = max(blocked, job['submit_time']), 'CANCELLED'
+        else:
+            eligible = start = end = math.inf
+            final = None
+        cancel_time = job['cancel_time']
+        if cancel_time is not None and cancel_time < end:
+            end, final = cancel_time, 'CANCELLED'
+            if start >= cancel_time:
+                start = math.inf
+        self._times[id_] = (eligible, start, end, final)
+        return self._times[id_]
+
+    def state(self, id_):
+        """Return the state of a job and the reason it's pending."""
+        eligible, start, end, final = self.times(id_)
+        if self.now >= end:
+            return final, 'None'
+        if self.now >= start:
+            return 'RUNNING', 'None'
+        if math.isinf(eligible):
+            blocked = any(self.times(dep_id)[3] not in (None, 'COMPLETED')
+                          and self.times(dep_id)[2] <= self.now
+                          for dep in filter(None, self.jobs[id_]['dependency'].split(':'))
+                          for dep_id in self.find(dep))
+            return 'PENDING', 'DependencyNeverSatisfied' if blocked else 'Dependency'
+        if self.now < eligible:
+            return 'PENDING', 'Dependency'
+        return 'PENDING', 'Priority'
+
+    def visible(self, id_):
+        """Return true if the controller still lists the job (it isn't an old finished job)."""
+        _, _, end, _ = self.times(id_)
+        return self.now < end + self.config['min_job_age']
+
+    def job_id(self, id_):
+        """Return the Slurm job id of a job (ARRAYID_INDEX for array elements)."""
+        job = self.jobs[id_]
+        if job['array_id'] is None:
+            return str(id_)
+        return f'{job["array_id"]}_{job["array_index"]}'
+
+    def describe(self, id_):
+        """Return the fields of a job, keyed as scontrol names them."""
+        job = self.jobs[id_]
+        state, reason = self.state(id_)
+        _, start, end, _ = self.times(id_)
+        started = self.now >= start
+        finished = self.now >= end
+        nodes = job['nodes']
+        if not started:
+            node_list = ''
+        elif nodes == 1:
+            node_list = f'emu{id_ % 10000:04}'
+        else:
+            node_list = f'emu[{id_ % 10000:04}-{id_ % 10000 + nodes - 1:04}]'
+        return {
+            'JobId': id_,
+            'ArrayJobId': job['array_id'],
+            'ArrayTaskId': job['array_index'],
+            'JobName': job['name'],
+            'UserId': job['user'],
+            'Account': job['account'],
+            'QOS': job['qos'],
+            'JobState': state,
+            'Reason': reason,
+            'Dependency': job['dependency'] and f'afterok:{job["dependency"]}',
+            'ExitCode': EXIT_CODES.get(state, '0:0'),
+            'RunTime': ((end if finished else self.now) - start) if started else 0,
+            'TimeLimit': job['time_limit'],
+            'SubmitTime': job['submit_time'],
+            'StartTime': start if started else None,
+            'EndTime': end if finished else None,
+            'Partition': job['partition'],
+            'NodeList': node_list,
+            'NumNodes': nodes,
+            'NumCPUs': job['ntasks'],
+            'NumTasks': job['ntasks'],
+            'Command': job['command'],
+            'WorkDir': job['workdir'],
+            'StdOut': job['stdout'],
+            'StdErr': job['stderr'],
+        }
@@ -0,0 +1,252 @@
+"""Load harness running the task manager's queue processing against the emulator.
+
+For each job count, the harness pushes that many tasks onto a fresh TM
+database and calls background.process_queues() in a loop, as the TM does,
+with the Slurm worker talking to the emulated commands (or the fake
+slurmrestd) until every job has finished. Only the WFM connection and the
+TM database path are replaced. It reports:
+
+* submissions per second: jobs submitted over the time until the last
+  submission reached the emulator
+* state-propagation latency: the time from a job finishing in the emulator
+  to the TM sending its final state to the WFM
+* TM CPU time, and the CPU time of the emulated commands the TM ran
+
+Run it with ``python -m beeflow.common.sched_emulator.harness``; it needs a
+BEE configuration, since the TM reads its limits and intervals from it.
+"""
+
+import argparse
+import contextlib
+import os
+import pathlib
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from beeflow.common.db import bdb
+from beeflow.common.db import tm_db
+from beeflow.common.object_models import Task
+from beeflow.common.sched_emulator import commands
+from beeflow.common.sched_emulator.emulator import Emulator, load_config
+from beeflow.common.sched_emulator.restd import OPENAPI_VERSIONS
+from beeflow.common.worker.slurm_worker import SlurmWorker
+from beeflow.common.worker_interface import WorkerInterface
+from beeflow.task_manager import background
+from beeflow.task_manager import utils
+
+DEFAULT_JOB_COUNTS = (100, 1000, 10000)
+
+
+class _Response:
+    """Successful response from the stand-in WFM."""
+
+    status_code = 200
+
+    @staticmethod
+    def json():
+        """Return the response body."""
+        return {}
+
+
+class WFMRecorder:
+    """Stand-in for the WFM connection that records when each final state arrives."""
+
+    def __init__(self):
+        """Construct the recorder."""
+        self.final = {}
+        self.lock = threading.Lock()
+
+    def put(self, url, json=None, **_kwargs):  # pylint: disable=W0613,W0621 # Connection.put
+        """Record the task state updates sent to the WFM."""
+        now = time.time()
+        with self.lock:
+            for update in json['state_updates']:
+                if update['job_state'] in background.COMPLETED_STATES:
+                    self.final.setdefault(update['task_id'], (now, update['job_state']))
+        return _Response()
+
+
+class RecordingWorker:
+    """Worker interface wrapper remembering the job id of each task."""
+
+    def __init__(self, worker):
+        """Wrap the worker interface."""
+        self.worker = worker
+        self.job_ids = {}
+
+    def __getattr__(self, name):
+        """Pass everything else on to the worker interface."""
+        return getattr(self.worker, name)
+
+    def submit_task(self, task, depends_on=None):
+        """Submit a task, remembering its job id."""
+        job_id, job_state, job_info = self.worker.submit_task(task, depends_on=depends_on)
+        self.job_ids[task.id] = job_id
+        return job_id, job_state, job_info
+
+    def submit_array(self, tasks):
+        """Submit tasks as a job array, remembering their job ids."""
+        jobs = self.worker.submit_array(tasks)
+        self.job_ids.update((task.id, job[0]) for task, job in zip(tasks, jobs))
+        return jobs
+
+
+@contextlib.contextmanager
+def _replaced(module, **attrs):
+    """Replace module attributes for the duration of the block."""
+    saved = {name: getattr(module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def emulated_slurm(work_dir, config_file=None, slurmrestd=False):
+    """Put the emulated commands first on PATH; yields the slurmrestd socket path.
+
+    With slurmrestd, the fake slurmrestd is started for the duration of the block.
+    """
+    bin_dir = os.path.join(work_dir, 'bin')
+    state_dir = os.path.join(work_dir, 'emulator')
+    commands.install(bin_dir, state_dir, config_file)
+    socket_path = os.path.join(work_dir, 'slurmrestd.sock')
+    path = os.environ.get('PATH', '')
+    os.environ['PATH'] = f'{bin_dir}{os.pathsep}{path}'
+    proc = None
+    try:
+        if slurmrestd:
+            # pylint: disable-next=R1732 # the server runs until the block ends
+            proc = subprocess.Popen([os.path.join(bin_dir, 'slurmrestd'), f'unix:{socket_path}'])
+            deadline = time.monotonic() + 30
+            while not os.path.exists(socket_path):
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('the fake slurmrestd did not start')
+                time.sleep(0.05)
+        yield socket_path
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        os.environ['PATH'] = path
+
+
+def _cpu_time(who):
+    """Return the user and system CPU seconds of this process or its waited-for children."""
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_load(job_count, work_dir, config_file=None, slurmrestd=False, interval=1.0,
+             timeout=3600):
+    """Run job_count tasks through the TM against the emulator; returns the measurements."""
+    os.makedirs(work_dir, exist_ok=True)
+    recorder = WFMRecorder()
+    with emulated_slurm(work_dir, config_file, slurmrestd) as socket_path:
+        worker = RecordingWorker(WorkerInterface(
+            SlurmWorker, bee_workdir=work_dir, container_runtime='Charliecloud',
+            use_commands=not slurmrestd, slurm_socket=socket_path,
+            openapi_version=OPENAPI_VERSIONS[0]))
+        db_file = pathlib.Path(work_dir, 'tm.db')
+        db = bdb.connect_db(tm_db, db_file)
+        task_dir = os.path.join(work_dir, 'tasks')
+        tasks = [Task(name=f'load-{i}', base_command=['true'], workflow_id='load',
+                      workdir=task_dir) for i in range(job_count)]
+        with _replaced(utils, db_path=lambda: db_file, worker_interface=lambda: worker,
+                       wfm_conn=lambda: recorder):
+            start = time.time()
+            cpu_start = _cpu_time(resource.RUSAGE_SELF)
+            children_start = _cpu_time(resource.RUSAGE_CHILDREN)
+            for task in tasks:
+                db.submit_queue.push(task)
+            while len(recorder.final) < job_count and time.time() - start < timeout:
+                background.process_queues()
+                time.sleep(interval)
+            wall = time.time() - start
+            cpu = _cpu_time(resource.RUSAGE_SELF) - cpu_start
+            children_cpu = _cpu_time(resource.RUSAGE_CHILDREN) - children_start
+
+    emulator = Emulator(os.path.join(work_dir, 'emulator'), load_config(config_file))
+    snapshot = emulator.snapshot()
+    emulator.close()
+    submit_times = [job['submit_time'] for job in snapshot.jobs.values()]
+    latencies = []
+    for task_id, (reported, _) in recorder.final.items():
+        ids = snapshot.find(worker.job_ids.get(task_id, ''))
+        if ids:
+            latencies.append(reported - snapshot.times(ids[0])[2])
+    return {
+        'jobs': job_count,
+        'finished': len(recorder.final),
+        'submit_rate': len(submit_times) / max(max(submit_times, default=start) - start, 1e-9),
+        'latency': latencies,
+        'tm_cpu': cpu,
+        'command_cpu': children_cpu,
+        'wall': wall,
+    }
+
+
+def _percentile(values, fraction):
+    """Return a percentile of the values (0 if there are none)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(results):
+    """Format the measurements of several runs as a table."""
+    header = (f'{"jobs":>7} {"finished":>8} {"submit/s":>9} {"lat mean":>9} {"lat p50":>8} '
+              f'{"lat p95":>8} {"lat max":>8} {"TM cpu s":>9} {"cmd cpu s":>9} {"wall s":>8}')
+    lines = [header]
+    for result in results:
+        latency = result['latency']
+        lines.append(f'{result["jobs"]:>7} {result["finished"]:>8} '
+                     f'{result["submit_rate"]:>9.1f} '
+                     f'{statistics.fmean(latency) if latency else 0:>9.2f} '
+                     f'{_percentile(latency, 0.5):>8.2f} {_percentile(latency, 0.95):>8.2f} '
+                     f'{max(latency, default=0):>8.2f} {result["tm_cpu"]:>9.2f} '
+                     f'{result["command_cpu"]:>9.2f} {result["wall"]:>8.1f}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Run the load harness."""
+    parser = argparse.ArgumentParser(description='Load-test the task manager against the '
+                                                 'Slurm emulator')
+    parser.add_argument('--jobs', type=int, nargs='+', default=list(DEFAULT_JOB_COUNTS),
+                        help='job counts to run (default: 100 1000 10000)')
+    parser.add_argument('--config', help='emulator configuration file')
+    parser.add_argument('--slurmrestd', action='store_true',
+                        help='query jobs through the fake slurmrestd instead of the commands')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='seconds between calls to process_queues()')
+    parser.add_argument('--timeout', type=float, default=3600,
+                        help='seconds after which a run is given up')
+    parser.add_argument('--workdir', help='directory for the runs (default: a temporary one)')
+    args = parser.parse_args(argv)
+    base_dir = args.workdir or tempfile.mkdtemp(prefix='bee-load-')
+    print(report([]), flush=True)
+    try:
+        for job_count in args.jobs:
+            work_dir = os.path.join(base_dir, f'jobs-{job_count}')
+            result = run_load(job_count, work_dir, args.config, args.slurmrestd,
+                              args.interval, args.timeout)
+            print(report([result]).splitlines()[-1], flush=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Fake slurmrestd serving the emulated jobs on a unix socket.
+
+Only the slurmctld job endpoints that the Slurmrestd worker uses are
+served: GET /slurm/VERSION/jobs, GET /slurm/VERSION/job/JOBID[,JOBID...]
+and DELETE /slurm/VERSION/job/JOBID. Any OpenAPI version is accepted.
+"""
+
+import argparse
+import http.server
+import json
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+
+# The versions reported by slurmrestd -d list
+OPENAPI_VERSIONS = ('v0.0.41', 'v0.0.40', 'v0.0.39')
+
+_JOB_PATH = re.compile(r'^/slurm/[^/]+/job/([^/?]+)/?(?:\?.*)?$')
+_JOBS_PATH = re.compile(r'^/slurm/[^/]+/jobs/?(?:\?.*)?$')
+
+
+def _number(value):
+    """Return an integer field as newer slurmrestd versions do."""
+    return {'set': value is not None, 'infinite': False,
+            'number': 0 if value is None else int(value)}
+
+
+def job_record(snapshot, id_):
+    """Return the slurmrestd record of an emulated job."""
+    job = snapshot.describe(id_)
+    time_limit = job['TimeLimit']
+    return {
+        'job_id': job['JobId'],
+        'array_job_id': _number(job['ArrayJobId'] or 0),
+        'array_task_id': _number(job['ArrayTaskId']),
+        'name': job['JobName'],
+        'user_name': job['UserId'],
+        'account': job['Account'],
+        'partition': job['Partition'],
+        'qos': job['QOS'],
+        'job_state': [job['JobState']],
+        'state_reason': job['Reason'],
+        'dependency': job['Dependency'],
+        'exit_code': {'status': ['SUCCESS' if job['ExitCode'] == '0:0' else 'ERROR'],
+                      'return_code': _number(int(job['ExitCode'].split(':')[0]))},
+        'nodes': job['NodeList'],
+        'node_count': _number(job['NumNodes']),
+        'cpus': _number(job['NumCPUs']),
+        'tasks': _number(job['NumTasks']),
+        'submit_time': _number(job['SubmitTime']),
+        'start_time': _number(job['StartTime']),
+        'end_time': _number(job['EndTime']),
+        # slurmrestd gives time limits in minutes
+        'time_limit': (_number(None) if time_limit is None
+                       else _number(-(-time_limit // 60))),
+        'command': job['Command'],
+        'current_working_directory': job['WorkDir'],
+        'standard_output': job['StdOut'],
+        'standard_error': job['StdErr'],
+    }
+
+
+def _error(description, number=2017):
+    """Return a slurmrestd error list entry."""
+    return {'error': 'Invalid job id specified' if number == 2017 else description,
+            'error_number': number, 'description': description, 'source': 'emulator'}
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answer slurmrestd requests from the emulator's state."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        """Unix socket clients have no address."""
+        return 'unix'
+
+    def log_message(self, format, *args):  # pylint: disable=W0622 # overridden signature
+        """Only log requests when asked to."""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body):
+        """Send a JSON response."""
+        data = json.dumps({'meta': {'plugin': {'name': 'emulator'}}, 'warnings': [],
+                           'errors': [], **body}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):  # pylint: disable=C0103 # name required by BaseHTTPRequestHandler
+        """List one or all jobs."""
+        emulator = self.server.emulator
+        emulator.controller_delay()
+        with self.server.lock:
+            snapshot = emulator.snapshot()
+            match = _JOB_PATH.match(self.path)
+            if match:
+                ids = [id_ for job_id in match.group(1).split(',')
+                       for id_ in snapshot.find(job_id) if snapshot.visible(id_)]
+                if not ids:
+                    self._reply(404, {'jobs': [], 'errors': [_error(
+                        f'Unable to query JobId={match.group(1)}')]})
+                    return
+            elif _JOBS_PATH.match(self.path):
+                ids = [id_ for id_ in snapshot.jobs if snapshot.visible(id_)]
+            else:
+                self._reply(404, {'errors': [_error(f'Unknown path {self.path}', 9001)]})
+                return
+            self._reply(200, {'jobs': [job_record(snapshot, id_) for id_ in ids]})
+
+    def do_DELETE(self):  # pylint: disable=C0103 # name required by BaseHTTPRequestHandler
+        """Cancel a job."""
+        emulator = self.server.emulator
+        emulator.controller_delay()
+        match = _JOB_PATH.match(self.path)
+        if not match:
+            self._reply(404, {'errors': [_error(f'Unknown path {self.path}', 9001)]})
+            return
+        with self.server.lock:
+            errors = emulator.cancel([match.group(1)])
+        error = errors.get(match.group(1))
+        if error is not None and 'completed' not in error:
+            self._reply(500, {'errors': [_error(error)]})
+        else:
+            self._reply(200, {'warnings': [{'description': error}] if error else []})
+
+
+class RestdServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server for the fake slurmrestd."""
+
+    daemon_threads = True
+
+    def __init__(self, path, emulator, verbose=False):
+        """Listen on the unix socket at path."""
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, _RequestHandler)
+        self.emulator = emulator
+        self.verbose = verbose
+        # The emulator's database connection is shared by the request threads
+        self.lock = threading.Lock()
+
+
+def main(emulator, argv, out):
+    """Handle the slurmrestd command line."""
+    parser = argparse.ArgumentParser(prog='slurmrestd', add_help=False, allow_abbrev=False)
+    parser.add_argument('-d', dest='data_parser')
+    parser.add_argument('-s', dest='plugins')
+    parser.add_argument('-a', dest='auth')
+    parser.add_argument('-v', dest='verbose', action='count', default=0)
+    parser.add_argument('listen', nargs='*')
+    args, _ = parser.parse_known_args(argv)
+    if args.data_parser == 'list':
+        out.write('slurmrestd: Possible data_parser plugins:\n')
+        out.writelines(f'slurmrestd: data_parser/{version}\n' for version in OPENAPI_VERSIONS)
+        return 0
+    sockets = [address[len('unix:'):] for address in args.listen if address.startswith('unix:')]
+    if len(sockets) != 1:
+        out.write('slurmrestd: error: the emulator only listens on one unix:PATH\n')
+        return 1
+    server = RestdServer(sockets[0], emulator, verbose=args.verbose > 0)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(sockets[0])
+    return 0
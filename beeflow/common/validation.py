@@ -47,6 +47,14 @@ def nonnegative_int(value):
     return i
 
 
+def compression_level(value):
+    """Validate a gzip compression level."""
+    i = int(value)
+    if not 1 <= i <= 9:
+        raise ValueError('the compression level must be between 1 and 9')
+    return i
+
+
 # NOTE: You must use validate_bool for all boolean values (since just using
 #       bool, as in bool('False'), gives True for any string of length > 0)
 def bool_(value):
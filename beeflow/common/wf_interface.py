@@ -55,6 +55,31 @@ class WorkflowInterface:
         # Load the new workflow into the graph database
         self._gdb_driver.initialize_workflow(workflow)
 
+    def load_workflow(self, workflow, tasks):
+        """Initialize a BEE workflow and add all of its tasks at once.
+
+        :param workflow: the workflow object
+        :type workflow: Workflow
+        :param tasks: the workflow tasks
+        :type tasks: list of Task
+        """
+        if workflow.requirements is None:
+            workflow.requirements = []
+        if workflow.hints is None:
+            workflow.hints = []
+        for task in tasks:
+            if task.inputs is None:
+                task.inputs = []
+            if task.outputs is None:
+                task.outputs = []
+            if task.requirements is None:
+                task.requirements = []
+            if task.hints is None:
+                task.hints = []
+
+        self._workflow_id = workflow.id
+        self._gdb_driver.load_workflow(workflow, tasks)
+
     def execute_workflow(self):
         """Begin execution of a BEE workflow."""
         self._gdb_driver.execute_workflow(self._workflow_id)
@@ -149,10 +174,39 @@ class WorkflowInterface:
         :type task: Task
         :rtype: list of Task
         """
+        self.complete_task(task)
+        return self.update_ready_tasks()
+
+    def complete_task(self, task):
+        """Mark a BEE workflow task as completed without looking for runnable tasks.
+
+        Used to finalize several tasks before calling update_ready_tasks() once.
+
+        :param task: the task to complete
+        :type task: Task
+        """
         self._gdb_driver.finalize_task(task)
-        self._gdb_driver.initialize_ready_tasks(self._workflow_id)
+
+    def update_ready_tasks(self):
+        """Set the runnable tasks of a BEE workflow to ready and return all ready tasks.
+
+        The whole workflow is only searched for runnable tasks if the driver
+        didn't already set the dependents of the completed tasks to ready.
+
+        :rtype: list of Task
+        """
+        if not self._gdb_driver.marks_ready_dependents:
+            self._gdb_driver.initialize_ready_tasks(self._workflow_id)
         return self._gdb_driver.get_ready_tasks(self._workflow_id)
 
+    def transaction(self):
+        """Return a context manager that groups the changes inside it into one transaction.
+
+        Whether the changes are actually applied atomically depends on the
+        graph database driver.
+        """
+        return self._gdb_driver.transaction()
+
     def get_task_by_id(self, task_id):
         """Get a task by its Task ID.
 
@@ -180,6 +234,22 @@ class WorkflowInterface:
         """
         return self._gdb_driver.get_workflow_tasks(self._workflow_id)
 
+    def get_task_states(self):
+        """Get the ID, name, state and metadata of all tasks in the workflow.
+
+        Cheaper than get_tasks() when full Task objects aren't needed.
+
+        :rtype: list of (str, str, str, dict)
+        """
+        return self._gdb_driver.get_workflow_task_states(self._workflow_id)
+
+    def get_task_state_counts(self):
+        """Get the number of tasks in the workflow in each state.
+
+        :rtype: dict of str to int
+        """
+        return self._gdb_driver.get_workflow_state_counts(self._workflow_id)
+
     def get_workflow_outputs(self):
         """Get the outputs from a BEE workflow.
 
@@ -242,6 +312,16 @@ class WorkflowInterface:
         """
         self._gdb_driver.set_task_state(task_id, state)
 
+    def mark_downstream(self, task_id, state):
+        """Set the state of every task that transitively depends on a task.
+
+        :param task_id: the id of the task whose dependents to update
+        :type task_id: str
+        :param state: the new state of the dependent tasks
+        :type state: str
+        """
+        self._gdb_driver.mark_downstream(task_id, state)
+
     def get_task_metadata(self, task_id):
         """Get the job description metadata of a task in a BEE workflow.
 
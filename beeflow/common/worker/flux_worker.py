@@ -30,6 +30,8 @@ BEE_STATES = {
 class FluxWorker(Worker):
     """Flux worker code."""
 
+    supports_dependencies = True
+
     def __init__(self, **kwargs):
         """Initialize the flux worker object."""
         super().__init__(**kwargs)
@@ -127,10 +129,14 @@ class FluxWorker(Worker):
         self.write_script(task)
         return jobspec
 
-    def submit_task(self, task):
+    def submit_task(self, task, depends_on=None):
         """Worker submits task; returns job_id, job_state."""
         log.info(f'Submitting task: {task.name}')
         jobspec = self.build_jobspec(task)
+        if depends_on:
+            jobspec.setattr('system.dependencies',
+                            [{'scheme': 'afterok', 'value': str(job_id)}
+                             for job_id in depends_on])
         flux = self.flux.Flux()
         job_id = self.job.submit(flux, jobspec)
         job_state, job_info = self.query_task(job_id)
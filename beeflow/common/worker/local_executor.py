@@ -0,0 +1,195 @@
+"""Run task scripts as local processes within a core and memory budget.
+
+Used by the simple worker on machines without a workload manager and by the
+pilot agent inside an allocation. Jobs are started as soon as their cores
+and memory fit in what is left of the budget; jobs that don't fit wait in
+submission order, with smaller jobs allowed to fill in around them.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# States that a job never leaves
+FINAL_STATES = ('COMPLETED', 'FAILED', 'CANCELLED')
+
+
+def total_memory():
+    """Return the memory of this machine in MB (0 if it can't be found)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError):
+        return 0
+
+
+class LocalExecutor:
+    """Run scripts concurrently on a fixed number of cores and amount of memory."""
+
+    def __init__(self, cores=0, memory=0, shell='/bin/bash'):
+        """Construct the executor.
+
+        :param cores: number of cores jobs may use at once (0 for the CPU count)
+        :type cores: int
+        :param memory: MB of memory jobs may use at once (0 for no limit)
+        :type memory: int
+        :param shell: the shell that runs the scripts
+        :type shell: str
+        """
+        self.cores = max(1, cores or os.cpu_count() or 1)
+        self.memory = max(0, memory)
+        self.shell = shell
+        self.free_cores = self.cores
+        self.free_memory = self.memory
+        # job id -> job record; queued jobs are kept in submission order
+        self.jobs = {}
+        self.queue = []
+        self.lock = threading.RLock()
+
+    def submit(self, job_id, script, stdout, stderr, cores=1, memory=0, workdir=None):
+        """Queue a script to run with the given cores and MB of memory; returns its state.
+
+        A job never gets more cores or memory than the executor has, so that
+        it can't wait forever.
+        """
+        cores = min(max(1, int(cores)), self.cores)
+        memory = max(0, int(memory or 0))
+        if self.memory:
+            memory = min(memory, self.memory)
+        with self.lock:
+            self.jobs[job_id] = {
+                'script': script,
+                'stdout': stdout,
+                'stderr': stderr,
+                'workdir': workdir,
+                'cores': cores,
+                'memory': memory,
+                'state': 'PENDING',
+                'proc': None,
+                'submit_time': time.time(),
+                'start_time': None,
+                'end_time': None,
+                'exit_code': None,
+                'max_rss': None,
+            }
+            self.queue.append(job_id)
+            self.schedule()
+            return self.jobs[job_id]['state']
+
+    def _fits(self, job):
+        """Return true if the job fits in the free cores and memory."""
+        return (job['cores'] <= self.free_cores
+                and (not self.memory or job['memory'] <= self.free_memory))
+
+    def _start(self, job_id, job):
+        """Start a queued job."""
+        with open(job['stdout'], 'ab') as out, open(job['stderr'], 'ab') as err:
+            try:
+                # pylint: disable-next=R1732 # the process outlives this call
+                job['proc'] = subprocess.Popen([self.shell, job['script']], stdout=out,
+                                               stderr=err, cwd=job['workdir'],
+                                               start_new_session=True)
+            except OSError as error:
+                err.write(f'Failed to start {job_id}: {error}\n'.encode())
+                job['state'] = 'FAILED'
+                job['end_time'] = time.time()
+                return
+        job['state'] = 'RUNNING'
+        job['start_time'] = time.time()
+        self.free_cores -= job['cores']
+        self.free_memory -= job['memory']
+
+    def _finish(self, job, exit_code, max_rss, state=None):
+        """Record the end of a job and free its resources."""
+        job['proc'].returncode = exit_code
+        job['exit_code'] = exit_code
+        job['max_rss'] = max_rss
+        job['end_time'] = time.time()
+        if state is None:
+            state = 'COMPLETED' if job['exit_code'] == 0 else 'FAILED'
+        job['state'] = state
+        self.free_cores += job['cores']
+        self.free_memory += job['memory']
+
+    @staticmethod
+    def _reap(job, options):
+        """Wait for a job's process; returns (exit code, max RSS in MB) or None if running."""
+        try:
+            pid, status, rusage = os.wait4(job['proc'].pid, options)
+        except ChildProcessError:
+            # Reaped elsewhere, so the exit status is lost
+            return 255, None
+        if pid == 0:
+            return None
+        # ru_maxrss is in KB on Linux
+        return os.waitstatus_to_exitcode(status), rusage.ru_maxrss // 1024
+
+    def schedule(self):
+        """Reap finished jobs and start the queued jobs that fit."""
+        with self.lock:
+            for job in self.jobs.values():
+                if job['state'] != 'RUNNING':
+                    continue
+                result = self._reap(job, os.WNOHANG)
+                if result is not None:
+                    self._finish(job, *result)
+            for job_id in list(self.queue):
+                job = self.jobs[job_id]
+                if self._fits(job):
+                    self.queue.remove(job_id)
+                    self._start(job_id, job)
+
+    def info(self, job_id):
+        """Return the state and the job info of a job."""
+        job = self.jobs[job_id]
+        info = {'cores': job['cores'], 'memory': job['memory'],
+                'submit_time': job['submit_time'], 'start_time': job['start_time'],
+                'end_time': job['end_time'], 'exit_code': job['exit_code'],
+                'max_rss': job['max_rss']}
+        if job['start_time'] is not None:
+            info['wall_time'] = (job['end_time'] or time.time()) - job['start_time']
+        return job['state'], info
+
+    def query(self, job_ids):
+        """Return {job_id: (state, info)} for the known jobs among job_ids.
+
+        The info has the cores and memory given to the job, its wall-clock
+        time in seconds and, once it's done, its exit code and its maximum
+        resident set size in MB. Jobs are forgotten once their final state
+        has been returned.
+        """
+        with self.lock:
+            self.schedule()
+            results = {job_id: self.info(job_id) for job_id in job_ids if job_id in self.jobs}
+            for job_id, (state, _) in results.items():
+                if state in FINAL_STATES:
+                    del self.jobs[job_id]
+            return results
+
+    def cancel(self, job_id):
+        """Cancel a job, killing its processes if it's running; returns its final state.
+
+        The job is forgotten afterwards.
+        """
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return 'UNKNOWN'
+            if job_id in self.queue:
+                self.queue.remove(job_id)
+                job.update(state='CANCELLED', end_time=time.time())
+            elif job['state'] == 'RUNNING':
+                try:
+                    os.killpg(job['proc'].pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self._finish(job, *self._reap(job, 0), state='CANCELLED')
+            return job['state']
+
+    def busy(self):
+        """Return true if any job is running or waiting."""
+        with self.lock:
+            self.schedule()
+            return bool(self.queue) or any(job['state'] == 'RUNNING'
+                                           for job in self.jobs.values())
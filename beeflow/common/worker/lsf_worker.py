@@ -11,6 +11,8 @@ from beeflow.common.worker.worker import Worker
 class LSFWorker(Worker):
     """The Worker for systems where LSF is the Workload Manager."""
 
+    supports_dependencies = True
+
     def __init__(self, bee_workdir, **kwargs):
         """Create a new LSF Worker object."""
         super().__init__(bee_workdir, **kwargs)
@@ -35,17 +37,20 @@ class LSFWorker(Worker):
         job_state = self.bee_states[job_st.decode().split()[2]]
         return job_state
 
-    def submit_job(self, script):
+    def submit_job(self, script, depends_on=None):
         """Worker submits job-returns (job_id, job_state)."""
-        job_st = subprocess.check_output(['bsub', script], stderr=subprocess.STDOUT)
+        cmd = ['bsub']
+        if depends_on:
+            cmd.extend(['-w', ' && '.join(f'done({job_id})' for job_id in depends_on)])
+        job_st = subprocess.check_output([*cmd, script], stderr=subprocess.STDOUT)
         job_id = int(job_st.decode().split()[1][1:-1])
         job_state = self.query_job(job_id)
         return job_id, job_state
 
-    def submit_task(self, task):
+    def submit_task(self, task, depends_on=None):
         """Worker builds & submits script."""
         task_script = self.write_script(task)
-        job_id, job_state = self.submit_job(task_script)
+        job_id, job_state = self.submit_job(task_script, depends_on)
         return job_id, job_state
 
     def query_task(self, job_id):
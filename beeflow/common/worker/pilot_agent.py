@@ -0,0 +1,168 @@
+"""Pilot agent running BEE task scripts inside a long-lived allocation.
+
+The agent is started as a job by the pilot worker. It listens on a TCP
+socket for requests from the task manager and runs the task scripts it is
+sent, packing them onto its cores. Requests and responses are single lines
+of JSON; the address of the agent and the token that requests must carry
+are written to a contact file that only the user can read.
+"""
+
+import argparse
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from beeflow.common.worker.local_executor import LocalExecutor
+
+
+# Environment variables holding the rank of a process started by a job launcher
+RANK_VARIABLES = ('SLURM_PROCID', 'FLUX_TASK_RANK', 'PMI_RANK', 'OMPI_COMM_WORLD_RANK',
+                  'JSM_NAMESPACE_RANK')
+
+
+class PilotAgent(LocalExecutor):
+    """Local executor that answers requests from the task manager."""
+
+    def __init__(self, cores, idle_timeout, memory=0):
+        """Construct the agent.
+
+        :param cores: number of cores that tasks may use at once
+        :type cores: int
+        :param idle_timeout: seconds without any job after which the agent is idle
+        :type idle_timeout: float
+        :param memory: MB of memory that tasks may use at once (0 for no limit)
+        :type memory: int
+        """
+        super().__init__(cores=cores, memory=memory)
+        self.idle_timeout = idle_timeout
+        self.last_active = time.monotonic()
+
+    def idle(self):
+        """Return true if nothing has run or waited for longer than the idle timeout."""
+        if self.busy():
+            self.last_active = time.monotonic()
+        return time.monotonic() - self.last_active > self.idle_timeout
+
+    def handle(self, request):
+        """Handle a request from the task manager and return the response."""
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True, 'cores': self.cores, 'memory': self.memory}
+        if op == 'submit':
+            return {'ok': True, 'state': self.submit(**request['job'])}
+        if op == 'query':
+            return {'ok': True, 'jobs': self.query(request['job_ids'])}
+        if op == 'cancel':
+            return {'ok': True, 'state': self.cancel(request['job_id'])}
+        return {'ok': False, 'error': f'unknown operation {op}'}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answer the JSON requests sent on one connection."""
+
+    def handle(self):
+        """Handle each line as a request."""
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not hmac.compare_digest(str(request.get('token')), self.server.token):
+                    response = {'ok': False, 'error': 'bad token'}
+                elif request.get('op') == 'shutdown':
+                    self.server.stop.set()
+                    response = {'ok': True}
+                else:
+                    response = self.server.agent.handle(request)
+            except (ValueError, KeyError, TypeError, OSError) as err:
+                response = {'ok': False, 'error': str(err)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class PilotServer(socketserver.ThreadingTCPServer):
+    """TCP server passing requests on to a pilot agent."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, agent, token, address=('', 0)):
+        """Construct the server."""
+        super().__init__(address, _RequestHandler)
+        self.agent = agent
+        self.token = token
+        self.stop = threading.Event()
+
+
+def send_request(contact, op, timeout=10, **params):
+    """Send a request to the agent described by a contact dict; returns the response.
+
+    Raises OSError if the agent can't be reached or refuses the request.
+    """
+    request = json.dumps({'op': op, 'token': contact['token'], **params}).encode() + b'\n'
+    with socket.create_connection((contact['host'], contact['port']), timeout=timeout) as sock:
+        sock.sendall(request)
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise OSError('pilot agent closed the connection')
+    response = json.loads(line)
+    if not response.get('ok'):
+        raise OSError(f'pilot agent error: {response.get("error")}')
+    return response
+
+
+def write_contact_file(path, contact):
+    """Write the contact file atomically, readable by the user only."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+        json.dump(contact, fp)
+    os.replace(tmp_path, path)
+
+
+def run(contact_file, cores, idle_timeout, memory=0, poll_interval=1.0):
+    """Serve requests until the agent is idle or asked to shut down."""
+    agent = PilotAgent(cores, idle_timeout, memory)
+    server = PilotServer(agent, secrets.token_hex(16))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    write_contact_file(contact_file, {'host': socket.gethostname(),
+                                      'port': server.server_address[1],
+                                      'token': server.token, 'pid': os.getpid()})
+    try:
+        while not server.stop.wait(poll_interval):
+            if agent.idle():
+                break
+    finally:
+        os.remove(contact_file)
+        server.shutdown()
+        server.server_close()
+        for job_id in list(agent.jobs):
+            agent.cancel(job_id)
+
+
+def main(argv=None):
+    """Start the pilot agent."""
+    parser = argparse.ArgumentParser(description='BEE pilot agent')
+    parser.add_argument('--contact-file', required=True,
+                        help='file to write the agent address and token to')
+    parser.add_argument('--cores', type=int, default=0,
+                        help='number of cores to run tasks on (0 for the number of CPUs)')
+    parser.add_argument('--memory', type=int, default=0,
+                        help='MB of memory tasks may use at once (0 for no limit)')
+    parser.add_argument('--idle-timeout', type=float, default=300,
+                        help='seconds without tasks after which the agent exits')
+    args = parser.parse_args(argv)
+    # Launchers may start one agent per node or task; only the first one serves
+    if any(os.environ.get(var, '0') != '0' for var in RANK_VARIABLES):
+        return 0
+    run(args.contact_file, args.cores, args.idle_timeout, args.memory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
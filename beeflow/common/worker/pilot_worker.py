@@ -0,0 +1,216 @@
+"""Pilot worker running many short tasks inside one long-lived allocation.
+
+The pilot worker uses another worker (Slurm, Flux, LSF or Simple) to start
+a pilot job running the pilot agent, and then hands the task scripts to the
+agent over a socket instead of submitting a job per task. Tasks are held
+until the agent is up; if the pilot job ends, the tasks that were still
+running in it are reported as NODE_FAIL so that the TM resubmits them to
+the next pilot.
+"""
+
+import json
+import os
+import sys
+import threading
+import uuid
+
+from beeflow.common import log as bee_logging
+from beeflow.common.object_models import Requirement, Task
+from beeflow.common.worker.worker import Worker, WorkerError
+from beeflow.common.worker import pilot_agent
+
+log = bee_logging.setup(__name__)
+
+# States of the pilot job after which the agent is gone
+PILOT_ENDED_STATES = {'COMPLETED', 'CANCELLED', 'FAILED', 'TIMEOUT', 'NODE_FAIL', 'BOOT_FAIL',
+                      'OUT_OF_MEMORY', 'PREEMPTED', 'UNKNOWN'}
+
+
+class PilotWorker(Worker):
+    """Worker dispatching tasks to a pilot agent started with another worker."""
+
+    def __init__(self, bee_workdir, worker_class, pilot_nodes=1, pilot_cores=0,
+                 pilot_time_limit='', pilot_idle_timeout=300, **kwargs):
+        """Create the pilot worker.
+
+        :param worker_class: the worker class used to start the pilot job
+        :type worker_class: type
+        :param pilot_nodes: number of nodes of the pilot allocation
+        :type pilot_nodes: int
+        :param pilot_cores: cores the agent packs tasks onto (0 for its CPU count)
+        :type pilot_cores: int
+        :param pilot_time_limit: time limit of the pilot job (empty for the default)
+        :type pilot_time_limit: str
+        :param pilot_idle_timeout: seconds without tasks after which the agent exits
+        :type pilot_idle_timeout: int
+        """
+        super().__init__(bee_workdir=bee_workdir, **kwargs)
+        self.inner = worker_class(bee_workdir=bee_workdir, **kwargs)
+        self.pilot_dir = os.path.join(bee_workdir, 'pilot')
+        self.pilot_nodes = pilot_nodes
+        self.pilot_cores = pilot_cores
+        self.pilot_time_limit = pilot_time_limit
+        self.pilot_idle_timeout = pilot_idle_timeout
+        # The current pilot job: its job id and contact file
+        self.pilot = None
+        self._contact = None
+        # Jobs waiting for an agent (job id -> submit request), in submission order
+        self.held = {}
+        # Jobs handed to an agent: job id -> pilot job id
+        self.dispatched = {}
+        self.lock = threading.RLock()
+
+    def prepare(self, task):
+        """Prepare for the task."""
+        super().prepare(task)
+        self.inner.prepare(task)
+
+    def build_text(self, task):
+        """Build the task script as the pilot job's worker would."""
+        return self.inner.build_text(task)
+
+    def pilot_task(self):
+        """Return the task that runs the pilot agent."""
+        task_id = uuid.uuid4().hex
+        contact_file = os.path.join(self.pilot_dir, f'{task_id}.json')
+        requirements = [Requirement(class_='beeflow:MPIRequirement',
+                                    params={'nodes': self.pilot_nodes,
+                                            'ntasks': self.pilot_nodes})]
+        if self.pilot_time_limit:
+            requirements.append(Requirement(class_='beeflow:SlurmRequirement',
+                                            params={'timeLimit': self.pilot_time_limit}))
+        command = [sys.executable, '-m', 'beeflow.common.worker.pilot_agent',
+                   '--contact-file', contact_file, '--cores', str(self.pilot_cores),
+                   '--idle-timeout', str(self.pilot_idle_timeout)]
+        return Task(name='bee-pilot', base_command=command, requirements=requirements,
+                    workflow_id='pilot', workdir=self.pilot_dir, id=task_id)
+
+    def start_pilot(self):
+        """Submit a pilot job if there isn't one queued or running."""
+        if self.pilot is not None:
+            try:
+                state, _ = self.inner.query_task(self.pilot['job_id'])
+            except WorkerError as err:
+                log.warning(f'Failed to query pilot job {self.pilot["job_id"]}: {err}')
+                return
+            if state not in PILOT_ENDED_STATES:
+                return
+            log.info(f'Pilot job {self.pilot["job_id"]} ended in state {state}')
+            self.pilot_ended()
+        os.makedirs(self.pilot_dir, exist_ok=True)
+        task = self.pilot_task()
+        self.inner.prepare(task)
+        job_id, state, _ = self.inner.submit_task(task)
+        log.info(f'Submitted pilot job {job_id} in state {state}')
+        self.pilot = {'job_id': job_id, 'contact_file': os.path.join(self.pilot_dir,
+                                                                     f'{task.id}.json')}
+
+    def pilot_ended(self):
+        """Forget the current pilot; its unfinished jobs have to be resubmitted."""
+        pilot_id = self.pilot['job_id']
+        for job_id in [job_id for job_id, pid in self.dispatched.items() if pid == pilot_id]:
+            self.dispatched[job_id] = None
+        self.pilot = None
+        self._contact = None
+
+    def contact(self):
+        """Return the contact dict of the running agent (None if there is none)."""
+        if self._contact is not None:
+            return self._contact
+        if self.pilot is None:
+            return None
+        try:
+            with open(self.pilot['contact_file'], encoding='utf-8') as fp:
+                contact = json.load(fp)
+            pilot_agent.send_request(contact, 'ping')
+        except (OSError, ValueError):
+            return None
+        log.info(f'Pilot agent is up on {contact["host"]}:{contact["port"]}')
+        self._contact = contact
+        return contact
+
+    def request(self, op, **params):
+        """Send a request to the agent; returns None if there is no agent to send it to."""
+        contact = self.contact()
+        if contact is None:
+            return None
+        try:
+            return pilot_agent.send_request(contact, op, **params)
+        except (OSError, ValueError) as err:
+            log.warning(f'Pilot agent request {op} failed: {err}')
+            self._contact = None
+            return None
+
+    def dispatch(self):
+        """Hand the held jobs to the agent, starting a pilot job if needed."""
+        if not self.held:
+            return
+        if self.contact() is None:
+            self.start_pilot()
+            return
+        for job_id, job in list(self.held.items()):
+            if self.request('submit', job=job) is None:
+                return
+            del self.held[job_id]
+            self.dispatched[job_id] = self.pilot['job_id']
+
+    def submit_task(self, task):
+        """Hold the task for the agent; returns job_id, job_state, job_info."""
+        task_script = self.write_script(task)
+        stdout_path, stderr_path = self.resolve_stdout_stderr(task)
+        nodes = task.get_requirement('beeflow:MPIRequirement', 'nodes', default=1)
+        cores = task.get_requirement('beeflow:MPIRequirement', 'ntasks', default=nodes)
+        memory = task.get_requirement('beeflow:MPIRequirement', 'memory', default=0)
+        job_id = f'pilot-{uuid.uuid4().hex}'
+        with self.lock:
+            self.held[job_id] = {'job_id': job_id, 'script': task_script,
+                                 'stdout': stdout_path, 'stderr': stderr_path,
+                                 'cores': int(cores), 'memory': int(memory),
+                                 'workdir': str(task.workdir) if task.workdir else None}
+            self.dispatch()
+        return job_id, 'PENDING', {}
+
+    def query_tasks(self, job_ids):
+        """Query the states of several jobs with one request to the agent."""
+        with self.lock:
+            self.dispatch()
+            results = {job_id: ('PENDING', {}) for job_id in job_ids if job_id in self.held}
+            sent = [job_id for job_id in job_ids if self.dispatched.get(job_id) is not None]
+            response = self.request('query', job_ids=sent) if sent else None
+            if response is not None:
+                results.update((job_id, tuple(state))
+                               for job_id, state in response['jobs'].items())
+            elif sent:
+                # The agent is unreachable; check whether its job is gone
+                self.start_pilot()
+            for job_id in job_ids:
+                if job_id in self.dispatched and self.dispatched[job_id] is None:
+                    # Lost along with its pilot
+                    del self.dispatched[job_id]
+                    results[job_id] = ('NODE_FAIL', {})
+        return results
+
+    def query_task(self, job_id):
+        """Query the state of one job."""
+        results = self.query_tasks([job_id])
+        if job_id not in results:
+            raise WorkerError(f'Pilot job {job_id} could not be queried')
+        return results[job_id]
+
+    def cancel_task(self, job_id):
+        """Cancel a job held for or running in the agent."""
+        with self.lock:
+            if self.held.pop(job_id, None) is not None:
+                return 'CANCELLED'
+            if self.dispatched.pop(job_id, None) is None:
+                return 'CANCELLED'
+            response = self.request('cancel', job_id=job_id)
+        if response is None:
+            raise WorkerError(f'Unable to cancel pilot job {job_id}')
+        return response['state']
+
+    def stop_pilot(self):
+        """Ask the agent to shut down."""
+        with self.lock:
+            if self.request('shutdown') is not None:
+                self.pilot_ended()
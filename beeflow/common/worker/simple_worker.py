@@ -1,56 +1,84 @@
-
 """Simple Worker class for launching tasks on a system with no workload manager."""
 
-import subprocess
-
-import os
-from beeflow.common.worker.worker import Worker
+from beeflow.common.worker.local_executor import LocalExecutor, total_memory
+from beeflow.common.worker.worker import Worker, WorkerError
 
 
 class SimpleWorker(Worker):
-    """Worker interface for system with no workload manager."""
+    """Worker interface for system with no workload manager.
+
+    Tasks run as background processes packed onto the cores and memory of
+    this machine; tasks that don't fit wait until enough is free.
+    """
 
-    def __init__(self, container_runtime, **kwargs):
-        """Create Simple worker object."""
+    def __init__(self, container_runtime, cores=0, memory=0, **kwargs):
+        """Create Simple worker object.
+
+        :param cores: number of cores tasks may use at once (0 for the CPU count)
+        :type cores: int
+        :param memory: MB of memory tasks may use at once (0 for the machine's memory)
+        :type memory: int
+        """
         super().__init__(container_runtime=container_runtime, **kwargs)
-        # This should be stored in Redis if possible
-        self.tasks = {}
+        self.executor = LocalExecutor(cores=cores, memory=memory or total_memory())
+
+    def build_text(self, task):
+        """Build text for task script."""
+        crt_res = self.crt.run_text(task)
+        script = ['#!/bin/bash', 'set -e', crt_res.env_code]
+        script.extend(' '.join(cmd.args) for cmd in crt_res.pre_commands)
+        script.append(' '.join(crt_res.main_command.args))
+        script.extend(' '.join(cmd.args) for cmd in crt_res.post_commands)
+        return '\n'.join(script)
 
     def submit_task(self, task):
-        """Worker submits task; returns job_id, job_state.
+        """Worker submits task; returns job_id, job_state, job_info.
+
+        The task is queued until the cores and memory (in MB) given by its
+        beeflow:MPIRequirement are free; its state is found with query_task().
 
         :param task: instance of Task
-        :rtype: tuple (int, string)
+        :rtype: tuple (str, string, dict)
         """
-        script = self.build_text(task)
-        script_path = os.path.join(self.task_save_path(task), f'{task.name}-{task.id}.sh')
-        with open(script_path, 'w', encoding='UTF-8') as fp:
-            fp.write(script)
-        with subprocess.Popen(['/bin/sh', script_path]) as taskid:
-            self.tasks[task.id] = taskid
-        return (task.id, 'PENDING')
+        script_path = self.write_script(task)
+        stdout_path, stderr_path = self.resolve_stdout_stderr(task)
+        nodes = task.get_requirement('beeflow:MPIRequirement', 'nodes', default=1)
+        cores = task.get_requirement('beeflow:MPIRequirement', 'ntasks', default=nodes)
+        memory = task.get_requirement('beeflow:MPIRequirement', 'memory', default=0)
+        self.executor.submit(task.id, script_path, stdout_path, stderr_path, cores=cores,
+                             memory=memory, workdir=task.workdir)
+        job_state, job_info = self.executor.info(task.id)
+        return (task.id, job_state, job_info)
 
     def cancel_task(self, job_id):
         """Cancel task with job_id; returns job_state.
 
         :param job_id: to be cancelled
-        :type job_id: integer
+        :type job_id: str
         :rtype: string
         """
-        self.tasks[job_id].kill()
-        return 'CANCELLED'
+        return self.executor.cancel(job_id)
+
+    def query_tasks(self, job_ids):
+        """Query the states of several jobs at once.
+
+        :param job_ids: job ids to query for status
+        :type job_ids: list of str
+        :rtype: dict of str to tuple (string, dict)
+        """
+        return self.executor.query(job_ids)
 
     def query_task(self, job_id):
         """Query job state for the task.
 
+        The job info holds the task's wall-clock time in seconds and, once
+        it has finished, its exit code and maximum RSS in MB.
+
         :param job_id: job id to query for status.
-        :type job_id: int
-        :rtype: string
+        :type job_id: str
+        :rtype: tuple (string, dict)
         """
-        return_code = self.tasks[job_id].poll()
-        # This assumes a standard returncode
-        if return_code is None:
-            return 'RUNNING'
-        if return_code == 0:
-            return 'COMPLETED'
-        return 'FAILED'
+        results = self.executor.query([job_id])
+        if job_id not in results:
+            raise WorkerError(f'Unknown job {job_id}')
+        return results[job_id]
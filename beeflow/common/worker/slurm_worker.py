@@ -9,7 +9,9 @@ import subprocess
 import json
 import urllib
 import pathlib
+import shlex
 import getpass
+import threading
 import requests_unixsocket
 import requests
 
@@ -19,7 +21,7 @@ from beeflow.common import log as bee_logging
 import beeflow.common.worker.utils as worker_utils
 from beeflow.common.worker.worker import (Worker, WorkerError)
 from beeflow.common import validation
-from beeflow.common.worker.utils import get_state_sacct
+from beeflow.common.worker.utils import get_state_sacct, get_states_sacct
 from beeflow.common.worker.utils import parse_key_val
 
 log = bee_logging.setup(__name__)
@@ -28,6 +30,8 @@ log = bee_logging.setup(__name__)
 class BaseSlurmWorker(Worker):
     """Base slurm worker code."""
 
+    supports_dependencies = True
+
     def __init__(self, default_account='', default_time_limit='', default_partition='',
                  default_qos='', default_reservation='', **kwargs):
         """Initialize the base slurm worker."""
@@ -196,10 +200,16 @@ class BaseSlurmWorker(Worker):
 
         return '\n'.join(script)
 
-    def submit_job(self, task, script):
+    def submit_job(self, task, script, depends_on=None):
         """Worker submits job-returns (job_id, job_state,job_info)."""
         workdir = task.workdir
-        res = subprocess.run(['sbatch', '--parsable', f"--chdir={workdir}", script], text=True,  # pylint: disable=W1510
+        cmd = ['sbatch', '--parsable', f"--chdir={workdir}"]
+        if depends_on:
+            # Have Slurm cancel the job if an upstream job fails instead of
+            # leaving it pending forever
+            cmd.extend([f'--dependency=afterok:{":".join(str(job_id) for job_id in depends_on)}',
+                        '--kill-on-invalid-dep=yes'])
+        res = subprocess.run([*cmd, script], text=True,  # pylint: disable=W1510
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if res.returncode != 0:
             raise WorkerError(f'Failed to submit job: {res.stderr}')
@@ -208,7 +218,7 @@ class BaseSlurmWorker(Worker):
         job_state,job_info = self.query_task(job_id)
         return job_id, job_state,job_info
 
-    def submit_task(self, task):
+    def submit_task(self, task, depends_on=None):
         """Worker builds & submits script."""
         sbatch_script = task.get_requirement('beeflow:SlurmRequirement', 'sbatch')
         if sbatch_script:
@@ -220,7 +230,7 @@ class BaseSlurmWorker(Worker):
         else:
             task_script = self.write_script(task)
 
-        job_id, job_state,job_info = self.submit_job(task, task_script)
+        job_id, job_state,job_info = self.submit_job(task, task_script, depends_on)
         if sbatch_script and bc.get("graphdb", "type").lower() == "sqlite3":
             # We do this after job submission for sbatch jobs
             driver = sqlite3_driver.SQLDriver()
@@ -229,23 +239,105 @@ class BaseSlurmWorker(Worker):
             driver.set_task_stderr(task.id, task.stderr)
         return job_id,job_state,job_info
 
+    def array_key(self, task):
+        """Return the job array key of a task: its workflow, workdir and resources.
+
+        Tasks with their own sbatch script are always submitted alone.
+        """
+        if task.get_requirement('beeflow:SlurmRequirement', 'sbatch'):
+            return None
+        requirements = self.get_task_requirements(task)
+        return (task.workflow_id, str(task.workdir), tuple(sorted(requirements.items())))
+
+    def build_array_text(self, tasks, table):
+        """Build the script of a job array running one task script per element.
+
+        Each line of the table file holds the script, stdout and stderr paths
+        of one element, separated by tabs. Slurm doesn't expand %j, %A and %a
+        in those paths, so the script does: %j becomes the element's job id
+        (ARRAYID_INDEX). Anything failing before the element's output is
+        redirected ends up in the per-element log in the table's directory.
+        """
+        task = tasks[0]
+        requirements = self.get_task_requirements(task)
+        # Keep the resource directives; names and outputs are per element
+        per_task = ('#SBATCH --job-name', '#SBATCH --output', '#SBATCH --error')
+        resources = [line for line in self.build_sbatch_header(task, requirements)
+                     if line.startswith('#SBATCH') and not line.startswith(per_task)]
+        script = [
+            '#!/bin/bash',
+            f'#SBATCH --job-name={task.name}-{task.id}-array',
+            f'#SBATCH --output={table.parent}/%A_%a.out',
+            *resources,
+            f'#SBATCH --array=0-{len(tasks) - 1}',
+            'set -e',
+            "IFS=$'\\t' read -r script stdout stderr "
+            f'< <(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {shlex.quote(str(table))})',
+            'for path in stdout stderr; do',
+            '    value=${!path//"%j"/${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}}',
+            '    value=${value//"%A"/$SLURM_ARRAY_JOB_ID}',
+            '    printf -v "$path" %s "${value//"%a"/$SLURM_ARRAY_TASK_ID}"',
+            'done',
+            'exec >>"$stdout" 2>>"$stderr"',
+            f'exec {requirements["shell"]} "$script"',
+        ]
+        return '\n'.join(script)
+
+    def submit_array(self, tasks):
+        """Submit the tasks as one job array; the element job ids are ARRAYID_INDEX."""
+        table_lines = []
+        for task in tasks:
+            task_script = self.write_script(task)
+            stdout_path, stderr_path = self.resolve_stdout_stderr(task)
+            table_lines.append('\t'.join([task_script, stdout_path, stderr_path]))
+        task = tasks[0]
+        array_dir = pathlib.Path(f'{task.workdir}/{task.name}-{task.id[:4]}')
+        table = array_dir / 'array.tsv'
+        table.write_text('\n'.join(table_lines) + '\n', encoding='utf-8')
+        array_script = array_dir / 'array.sh'
+        array_script.write_text(self.build_array_text(tasks, table), encoding='utf-8')
+
+        cmd = ['sbatch', '--parsable', f'--chdir={task.workdir}', str(array_script)]
+        res = subprocess.run(cmd, text=True,  # pylint: disable=W1510
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            raise WorkerError(f'Failed to submit job array: {res.stderr}')
+        array_id = int(res.stdout)
+        job_ids = [f'{array_id}_{i}' for i in range(len(tasks))]
+        for job_id, task in zip(job_ids, tasks):
+            worker_utils.resolve_slurm_paths(job_id, task)
+        # Elements that aren't listed yet are still pending
+        states = self.query_tasks(job_ids)
+        return [(job_id, *states.get(job_id, ('PENDING', {}))) for job_id in job_ids]
+
 class SlurmrestdWorker(BaseSlurmWorker):
     """Worker class for when slurmrestd is available."""
 
     def __init__(self, bee_workdir, **kwargs):
         """Create a new Slurmrestd Worker object."""
-        openapi_version = worker_utils.get_slurmrestd_version()
+        openapi_version = kwargs.get('openapi_version') or worker_utils.get_slurmrestd_version()
         super().__init__(bee_workdir=bee_workdir, **kwargs)
         # Pull slurm socket configs from kwargs (Uses getpass.getuser() instead
         # of os.getlogin() because of an issue with using getlogin() without a
         # controlling terminal)
         self.slurm_socket = kwargs.get('slurm_socket', f'/tmp/slurm_{getpass.getuser()}.sock')
-        self.session = requests_unixsocket.Session()
+        # One session per thread, so that connections are reused without
+        # sharing a session between the poller and request threads
+        self._sessions = threading.local()
         encoded_path = urllib.parse.quote(self.slurm_socket, safe="")
         # Note: Socket path is encoded, http request is not generally.
         self.slurm_url = f"http+unix://{encoded_path}/slurm/{openapi_version}"
         self.cli_worker = SlurmCLIWorker(bee_workdir=bee_workdir, **kwargs)
 
+    @property
+    def session(self):
+        """Return the HTTP session for the current thread."""
+        session = getattr(self._sessions, 'session', None)
+        if session is None:
+            session = requests_unixsocket.Session()
+            self._sessions.session = session
+        return session
+
     def query_task(self,job_id):
         """Worker queries job; returns job_state,job_info."""
         try:
@@ -269,6 +361,41 @@ class SlurmrestdWorker(BaseSlurmWorker):
             job_info = {}
         return job_state,job_info
 
+    def query_tasks(self, job_ids):
+        """Query several jobs with one /job request; returns {job_id: (job_state, job_info)}.
+
+        Only the given jobs are requested, by their comma-separated ids, rather
+        than every job on the cluster. Jobs that slurmrestd no longer knows
+        about are looked up with a single sacct call.
+        """
+        wanted = {str(job_id): job_id for job_id in job_ids}
+        if not wanted:
+            return {}
+        try:
+            resp = self.session.get(f'{self.slurm_url}/job/{",".join(wanted)}')
+        except requests.exceptions.ConnectionError:
+            return {job_id: ("NOT_RESPONDING", {}) for job_id in job_ids}
+        results = {}
+        if resp.status_code == 200:
+            data = json.loads(resp.text)
+            check_slurm_error(data, 'Failed to query jobs, slurm error.')
+            for job in data.get('jobs', []):
+                # For some versions of slurm, the job_state isn't included on failure
+                try:
+                    job_state = job['job_state'][0]
+                except (KeyError, IndexError):
+                    continue
+                for job_id in slurmrestd_job_ids(job):
+                    if job_id in wanted:
+                        results[wanted[job_id]] = (job_state, deepcopy(job))
+        missing = [job_id for job_id in job_ids if job_id not in results]
+        try:
+            results.update((job_id, (state, {}))
+                           for job_id, state in get_states_sacct(missing).items())
+        except WorkerError as err:
+            log.warning(err)
+        return results
+
     def cancel_task(self, job_id):
         """Worker cancels job, returns job_state."""
         try:
@@ -292,6 +419,28 @@ class SlurmrestdWorker(BaseSlurmWorker):
 class SlurmCLIWorker(BaseSlurmWorker):
     """Slurm worker interface that uses the CLI."""
 
+    # squeue format codes for the scontrol job keys reported in job_info by
+    # query_tasks(); the command must be last since it may contain the separator
+    SQUEUE_FIELDS = (
+        ('JobId', '%i'),
+        ('JobState', '%T'),
+        ('JobName', '%j'),
+        ('UserId', '%u'),
+        ('Account', '%a'),
+        ('Partition', '%P'),
+        ('QOS', '%q'),
+        ('Reason', '%r'),
+        ('NumNodes', '%D'),
+        ('NumCPUs', '%C'),
+        ('NodeList', '%N'),
+        ('RunTime', '%M'),
+        ('TimeLimit', '%l'),
+        ('SubmitTime', '%V'),
+        ('StartTime', '%S'),
+        ('EndTime', '%e'),
+        ('Command', '%o'),
+    )
+
     def query_task(self, job_id):
         """Query job state and job information for the task."""
         # Use scontrol since it gives a lot of useful info; may want to save info
@@ -311,6 +460,42 @@ class SlurmCLIWorker(BaseSlurmWorker):
             job_info = deepcopy(key_vals)
         return job_state,job_info
 
+    def query_tasks(self, job_ids):
+        """Query several jobs with one squeue call; returns {job_id: (job_state, job_info)}.
+
+        Jobs that squeue no longer reports are looked up with a single sacct
+        call. Jobs missing from both are left out of the result.
+        """
+        wanted = {str(job_id): job_id for job_id in job_ids}
+        if not wanted:
+            return {}
+        keys = [key for key, _ in self.SQUEUE_FIELDS]
+        fmt = '|'.join(code for _, code in self.SQUEUE_FIELDS)
+        try:
+            # --array lists pending job array elements one per line
+            res = subprocess.run(['squeue', '--noheader', '--states=all', '--array',
+                                  f'--jobs={",".join(wanted)}', f'--format={fmt}'],
+                                 text=True, check=True, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+            lines = res.stdout.splitlines()
+        except subprocess.CalledProcessError:
+            # squeue fails if none of the jobs are known any more
+            lines = []
+        results = {}
+        for line in lines:
+            values = line.split('|', len(keys) - 1)
+            if len(values) != len(keys) or values[0] not in wanted:
+                continue
+            job_info = dict(zip(keys, values))
+            results[wanted[values[0]]] = (job_info['JobState'], job_info)
+        missing = [job_id for job_id in job_ids if job_id not in results]
+        try:
+            results.update((job_id, (state, {}))
+                           for job_id, state in get_states_sacct(missing).items())
+        except WorkerError as err:
+            log.warning(err)
+        return results
+
     def cancel_task(self, job_id):
         """Cancel task with job_id; returns job_state."""
         try:
@@ -322,6 +507,8 @@ class SlurmCLIWorker(BaseSlurmWorker):
 class SlurmWorker(Worker):
     """Main slurm worker class."""
 
+    supports_dependencies = True
+
     def __init__(self, use_commands, **kwargs):
         """Construct the slurm worker.
 
@@ -338,9 +525,17 @@ class SlurmWorker(Worker):
         """Build text for task script; use template if it exists."""
         return self._inner.build_text(task)
 
-    def submit_task(self, task):
+    def submit_task(self, task, depends_on=None):
         """Worker submits task; returns job_id, job_state."""
-        return self._inner.submit_task(task)
+        return self._inner.submit_task(task, depends_on=depends_on)
+
+    def array_key(self, task):
+        """Return the job array key of a task."""
+        return self._inner.array_key(task)
+
+    def submit_array(self, tasks):
+        """Submit tasks as one job array."""
+        return self._inner.submit_array(tasks)
 
     def cancel_task(self, job_id):
         """Cancel task with job_id; returns job_state."""
@@ -350,6 +545,33 @@ class SlurmWorker(Worker):
         """Query job state for the task."""
         return self._inner.query_task(job_id)
 
+    def query_tasks(self, job_ids):
+        """Query the states of several jobs at once."""
+        return self._inner.query_tasks(job_ids)
+
+
+def _slurmrestd_number(value):
+    """Return the value of a slurmrestd integer field (plain integers in older versions)."""
+    if isinstance(value, dict):
+        return value.get('number') if value.get('set', True) else None
+    return value
+
+
+def slurmrestd_job_ids(job):
+    """Return the job ids a slurmrestd job record stands for.
+
+    Job array elements are identified as ARRAYID_INDEX; pending elements
+    that slurmrestd still lists as one record are all returned.
+    """
+    array_id = _slurmrestd_number(job.get('array_job_id'))
+    if not array_id:
+        return [str(job.get('job_id'))]
+    index = _slurmrestd_number(job.get('array_task_id'))
+    if index is not None:
+        return [f'{array_id}_{index}']
+    indices = worker_utils.expand_array_indices(job.get('array_task_string') or '')
+    return [f'{array_id}_{index}' for index in indices]
+
 
 def check_slurm_error(data, msg):
     """Check for an error in a Slurm response."""
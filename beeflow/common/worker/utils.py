@@ -1,7 +1,10 @@
 """Worker utility functions."""
 
+import json
+import os
 import re
 import shlex
+import shutil
 import subprocess
 import datetime
 from packaging.version import Version
@@ -33,6 +36,43 @@ def get_state_sacct(job_id):
         raise WorkerError(f'sacct query failed for job {job_id}') from exc
 
 
+def get_states_sacct(job_ids):
+    """Get the states of several jobs with a single sacct call.
+
+    Returns a dict mapping job ids to states; jobs unknown to sacct are left out.
+    """
+    wanted = {str(job_id): job_id for job_id in job_ids}
+    if not wanted:
+        return {}
+    log.info(f'Getting states with sacct for {len(wanted)} jobs')
+    try:
+        resp = subprocess.run(['sacct', '--parsable2', '--noheader', '--format=JobID,State',
+                               f'--jobs={",".join(wanted)}'], text=True, check=True,
+                              stdout=subprocess.PIPE)
+    except (subprocess.CalledProcessError, FileNotFoundError) as exc:
+        raise WorkerError('sacct query failed for jobs') from exc
+    states = {}
+    for line in resp.stdout.splitlines():
+        # Job steps (e.g. 1234.batch) are reported on lines of their own
+        job_id, _, state = line.partition('|')
+        if job_id in wanted and state:
+            # Strip extra details such as 'CANCELLED by 1234'
+            states[wanted[job_id]] = state.split()[0]
+    return states
+
+
+def expand_array_indices(indices):
+    """Expand a Slurm job array index expression such as '0-5:2,7%4' into a list."""
+    # Drop the limit on simultaneously running elements
+    indices = indices.split('%', 1)[0]
+    result = []
+    for part in filter(None, indices.split(',')):
+        part, _, step = part.partition(':')
+        first, _, last = part.partition('-')
+        result.extend(range(int(first), int(last or first) + 1, int(step or 1)))
+    return result
+
+
 def parse_key_val(pair):
     """Parse the key-value pair separated by '='."""
     i = pair.find('=')
@@ -54,6 +94,48 @@ def get_slurmrestd_version():
     newest_api = sorted(api_versions, key=Version, reverse=True)[0]
     return newest_api
 
+
+def _slurmrestd_fingerprint():
+    """Identify the installed slurmrestd binary (None if it can't be found)."""
+    path = shutil.which('slurmrestd')
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def cached_slurmrestd_version(cache_file):
+    """Get the newest slurmrestd version, caching it in cache_file.
+
+    The cached version is reused as long as the slurmrestd binary hasn't been
+    replaced, which saves running `slurmrestd -d list` on every startup.
+
+    :param cache_file: path of the JSON cache file
+    :type cache_file: str
+    :rtype: str
+    """
+    fingerprint = _slurmrestd_fingerprint()
+    try:
+        with open(cache_file, encoding='utf-8') as fp:
+            cached = json.load(fp)
+        if fingerprint is not None and cached['fingerprint'] == fingerprint:
+            return cached['version']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    version = get_slurmrestd_version()
+    if fingerprint is not None:
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as fp:
+                json.dump({'fingerprint': fingerprint, 'version': version}, fp)
+            os.replace(tmp_file, cache_file)
+        except OSError as err:
+            log.warning(f'Could not cache the slurmrestd version: {err}')
+    return version
+
 def calculate_duration(start_time):
     """Calculates the duration of a task based on various start time formats."""
     now = datetime.datetime.now()
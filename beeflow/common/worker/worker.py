@@ -36,6 +36,9 @@ class WorkerError(Exception):
 class Worker(ABC):
     """Worker interface for a generic workload manager."""
 
+    # Whether submit_task() can hold a job until other jobs complete
+    supports_dependencies = False
+
     def __init__(self, bee_workdir, **kwargs):
         """Load appropriate container runtime driver, based on configs in kwargs."""
         try:
@@ -112,10 +115,35 @@ class Worker(ABC):
     def submit_task(self, task):
         """Worker submits task; returns job_id, job_state.
 
+        Workers that set supports_dependencies also take a depends_on list of
+        job ids that must complete successfully before the job may start.
+
         :param task: instance of Task
         :rtype: tuple (int, string)
         """
 
+    def array_key(self, task):  # pylint: disable=W0613
+        """Return the key shared by tasks that can be submitted as one job array.
+
+        Tasks with equal keys only differ in what their scripts run. Workers
+        without job arrays return None, meaning the task is submitted alone.
+
+        :param task: instance of Task
+        :rtype: hashable or None
+        """
+        return None
+
+    def submit_array(self, tasks):
+        """Submit tasks sharing an array_key() as one job array.
+
+        By default each task is submitted as a job of its own.
+
+        :param tasks: the tasks to submit
+        :type tasks: list of Task
+        :rtype: list of tuple (job_id, job_state, job_info), one per task
+        """
+        return [self.submit_task(task) for task in tasks]
+
     @abstractmethod
     def cancel_task(self, job_id):
         """Cancel task with job_id; returns job_state.
@@ -133,3 +161,22 @@ class Worker(ABC):
         :type job_id: int
         :rtype: string
         """
+
+    def query_tasks(self, job_ids):
+        """Query the states of several jobs at once.
+
+        Workers that can ask the scheduler about many jobs in one call should
+        override this; by default each job is queried separately. Jobs that
+        could not be queried are left out of the result.
+
+        :param job_ids: job ids to query for status.
+        :type job_ids: list of int
+        :rtype: dict mapping job id to tuple (string, dict)
+        """
+        results = {}
+        for job_id in job_ids:
+            try:
+                results[job_id] = self.query_task(job_id)
+            except WorkerError as err:
+                log.warning(f'Failed to query job {job_id}: {err}')
+        return results
@@ -9,6 +9,7 @@ the abstract base class 'Worker'. Default: 'SlurmWorker' class.
 
 from beeflow.common.worker.slurm_worker import SlurmWorker
 from beeflow.common.worker.lsf_worker import LSFWorker
+from beeflow.common.worker.worker import WorkerError
 
 
 class WorkerInterface:
@@ -25,17 +26,42 @@ class WorkerInterface:
         """
         self._worker = worker(**kwargs)
 
-    def submit_task(self, task):
+    def submit_task(self, task, depends_on=None):
         """Worker builds script and submits task as job returns job_id, job_state.
 
         :param task: instance of Task
+        :param depends_on: job ids that must complete before the job may start
+        :type depends_on: list of int
         :rtype: tuple (int, string)
         """
+        if depends_on and not self._worker.supports_dependencies:
+            raise WorkerError('The workload scheduler does not support job dependencies')
         # First prepare for the task (create necessary directories, etc.)
         self._worker.prepare(task)
         # Then submit it to the worker
+        if depends_on:
+            return self._worker.submit_task(task, depends_on=depends_on)
         return self._worker.submit_task(task)
 
+    def array_key(self, task):
+        """Return the job array key of a task (None if it must be submitted alone).
+
+        :param task: instance of Task
+        :rtype: hashable or None
+        """
+        return self._worker.array_key(task)
+
+    def submit_array(self, tasks):
+        """Submit tasks sharing an array key as one job array.
+
+        :param tasks: instances of Task
+        :type tasks: list of Task
+        :rtype: list of tuple (job_id, job_state, job_info), one per task
+        """
+        for task in tasks:
+            self._worker.prepare(task)
+        return self._worker.submit_array(tasks)
+
     def cancel_task(self, job_id):
         """Cancel job for task with job_id.
 
@@ -53,3 +79,14 @@ class WorkerInterface:
         :rtype: tuple (int, string)
         """
         return self._worker.query_task(job_id)
+
+    def query_tasks(self, job_ids):
+        """Query the states of several jobs at once.
+
+        Jobs that could not be queried are left out of the result.
+
+        :param job_ids: job ids to query for status.
+        :type job_ids: list of int
+        :rtype: dict mapping job id to tuple (string, dict)
+        """
+        return self._worker.query_tasks(job_ids)
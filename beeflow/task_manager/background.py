@@ -3,11 +3,15 @@
 This code processes submitted tasks, monitors status, and sends info back to
 the Workflow Manager.
 """
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+import time
 import traceback
 from beeflow.common.config_driver import BeeConfig as bc
 from beeflow.task_manager import utils
 from beeflow.common import log as bee_logging
-from beeflow.common.build.utils import ContainerBuildError
+from beeflow.common.build.image_cache import ImageCache
+from beeflow.common.build.utils import ContainerBuildError, image_requirement_key, image_tasks
 from beeflow.common.build_interfaces import build_main
 from beeflow.common.worker import WorkerError
 from beeflow.wf_manager.models import TaskStateUpdateRequest
@@ -27,33 +31,234 @@ log.info(f'The number of jobs queued will be limited to {jobs_limit}.')
 
 # States are based on https://slurm.schedmd.com/squeue.html#SECTION_JOB-STATE-CODES
 COMPLETED_STATES = {'UNKNOWN', 'COMPLETED', 'CANCELLED', 'FAILED', 'TIMEOUT'}
+# States of tasks that never got a job
+SUBMIT_FAILED_STATES = {'BUILD_FAIL', 'SUBMIT_FAIL', 'DEP_FAIL'}
+# Seconds for which the final states of finished tasks are kept for chained tasks
+FINISHED_JOB_TTL = 3600
+
+# Smallest number of tasks that are submitted as a job array (0 to disable)
+job_array_min_size = bc.get('task_manager', 'job_array_min_size')
+
+# Seconds after which an unchanged job state is reported to the WFM again
+heartbeat_interval = bc.get('task_manager', 'heartbeat_interval')
+
+# Number of tasks that may be built and submitted concurrently
+submit_workers = bc.get('task_manager', 'submit_workers')
+# Threads building containers and submitting jobs. Tasks are handed over as
+# soon as they arrive, so they don't wait for slow builds of other tasks.
+SUBMIT_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, submit_workers),
+                                     thread_name_prefix='tm-submit')
+# IDs of the tasks handed to SUBMIT_EXECUTOR whose submission hasn't finished
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+# Locks for container images that are being built, so that tasks sharing an
+# image wait for one build instead of each building it
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+# Number of container images prefetched concurrently for started workflows
+prefetch_workers = bc.get('task_manager', 'prefetch_workers')
+PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, prefetch_workers),
+                                       thread_name_prefix='tm-prefetch')
+# Workflow ID -> prefetch progress ({'total': ..., 'done': ..., 'failed': ...})
+_prefetch_progress = {}
+_prefetch_lock = threading.Lock()
+
+# Set whenever tasks are added to the submit queue (or room frees up in the
+# job queue) to wake up the submitter thread
+_submit_event = threading.Event()
+# Serializes sending the update queue to the WFM between the submitter and poller
+_send_lock = threading.Lock()
+
+
+class JobPoller:
+    """Per-job polling schedule with exponential backoff.
+
+    A job is polled every min_interval seconds after it is submitted or
+    changes state. Each poll that sees no change multiplies its interval by
+    backoff, up to max_interval, so long-running jobs are queried rarely.
+    """
+
+    def __init__(self, min_interval, max_interval, backoff=2.0):
+        """Construct the poller."""
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        # job queue id -> (next poll time, current interval)
+        self._schedule = {}
+
+    def is_due(self, id_, now=None):
+        """Return true if the job should be queried now."""
+        now = time.monotonic() if now is None else now
+        entry = self._schedule.get(id_)
+        return entry is None or entry[0] <= now
+
+    def polled(self, id_, changed, now=None):
+        """Record that the job was queried and whether its state changed."""
+        now = time.monotonic() if now is None else now
+        entry = self._schedule.get(id_)
+        if changed or entry is None:
+            interval = self.min_interval
+        else:
+            interval = min(entry[1] * self.backoff, self.max_interval)
+        self._schedule[id_] = (now + interval, interval)
+
+    def prune(self, ids):
+        """Forget jobs that are no longer in the job queue."""
+        for id_ in set(self._schedule) - set(ids):
+            del self._schedule[id_]
+
+
+job_poller = JobPoller(bc.get('task_manager', 'poll_interval_min'),
+                       bc.get('task_manager', 'poll_interval_max'),
+                       bc.get('task_manager', 'poll_backoff'))
+
+
+def _build_lock(task):
+    """Return the lock for the container image required by the task."""
+    key = image_requirement_key(task)
+    with _build_locks_lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
 
 def resolve_environment(task):
     """Use build interface to create a valid environment.
 
     This will build and/or pull containers if necessary; it can take some time
-    to run this step.
+    to run this step. Concurrent calls for the same image are serialized, so
+    only the first one builds it and the rest find it in the container archive.
+    """
+    with _build_lock(task):
+        build_main(task)
+
+
+def release_environment(task):
+    """Let the container images used by a finished task be evicted from the cache."""
+    if task.get_full_requirement('DockerRequirement'):
+        ImageCache.from_config().release(task.id)
+
+
+def prefetch_images(wf_id, tasks):
+    """Pull or build the container images of a workflow's tasks in the background.
+
+    Each image is only prefetched once, by up to prefetch_workers threads at
+    a time. Tasks submitted while their image is being prefetched wait for
+    it on the build lock and then find it in the container archive. Returns
+    the number of images to prefetch.
     """
-    build_main(task)
+    images = image_tasks(tasks)
+    if not prefetch_workers or not images:
+        return 0
+    with _prefetch_lock:
+        _prefetch_progress[wf_id] = {'total': len(images), 'done': 0, 'failed': 0}
+    log.info(f'Prefetching {len(images)} container images for workflow {wf_id}')
+    for task in images:
+        PREFETCH_EXECUTOR.submit(_prefetch_image, wf_id, task)
+    return len(images)
+
 
-def submit_task(db, worker, task):
-    """Submit (or resubmit) a task."""
+def _prefetch_image(wf_id, task):
+    """Prefetch the container image of one task and record the outcome."""
+    # Build under another ID so that the image isn't held once the prefetch is done
+    prefetch_task = task.model_copy(update={'id': f'prefetch-{task.id}'})
+    outcome = 'done'
+    try:
+        resolve_environment(prefetch_task)
+    except Exception as err:  # pylint: disable=W0718 # the task reports build errors itself
+        log.warning(f'Failed to prefetch the container image of {task.name}: {err}')
+        outcome = 'failed'
+    finally:
+        release_environment(prefetch_task)
+    with _prefetch_lock:
+        # The workflow may have finished in the meantime
+        if wf_id in _prefetch_progress:
+            _prefetch_progress[wf_id][outcome] += 1
+
+
+def prefetch_progress(wf_id):
+    """Return the prefetch progress of a workflow (None if nothing was prefetched)."""
+    with _prefetch_lock:
+        progress = _prefetch_progress.get(wf_id)
+        return None if progress is None else dict(progress)
+
+
+def forget_prefetch(wf_id):
+    """Drop the prefetch progress of a workflow that finished or was cancelled."""
+    with _prefetch_lock:
+        _prefetch_progress.pop(wf_id, None)
+
+
+class UpstreamError(Exception):
+    """An upstream task of a chained task won't complete successfully."""
+
+    def __init__(self, job_state, msg):
+        """Construct the error with the state to report for the chained task."""
+        super().__init__(msg)
+        self.job_state = job_state
+
+
+def upstream_job_ids(db, depends_on):
+    """Return the job ids of the upstream tasks that are still queued or running.
+
+    Upstream tasks that completed are left out. Raises UpstreamError with
+    DEP_FAIL if an upstream task failed, or with SUBMIT_FAIL if one is unknown.
+    """
+    if not depends_on:
+        return []
+    jobs = db.job_queue.jobs_for_tasks(depends_on)
+    finished = db.finished_jobs.states(depends_on)
+    job_ids = []
+    for task_id in depends_on:
+        if task_id in jobs:
+            job_id, job_state = jobs[task_id]
+        elif task_id in finished:
+            job_id, job_state = None, finished[task_id]
+        else:
+            raise UpstreamError('SUBMIT_FAIL', f'Upstream task {task_id} is unknown')
+        if job_state == 'COMPLETED':
+            continue
+        if job_state in COMPLETED_STATES or job_state in SUBMIT_FAILED_STATES:
+            raise UpstreamError('DEP_FAIL', f'Upstream task {task_id} ended in {job_state}')
+        job_ids.append(job_id)
+    return job_ids
+
+
+def submit_task(db, worker, task, depends_on=None):
+    """Submit (or resubmit) a task.
+
+    depends_on lists the IDs of upstream tasks; the job is held by the
+    scheduler until their jobs complete.
+    """
     try:
         has_container = task.get_full_requirement('DockerRequirement')
         if has_container:
             log.info(f'Resolving environment for task {task.name}')
             resolve_environment(task)
             log.info(f'Environment preparation complete for task {task.name}')
-        job_id, job_state,job_info = worker.submit_task(task)
+        job_ids = upstream_job_ids(db, depends_on)
+        if job_ids:
+            log.info(f"Chaining '{task.name}' after jobs {job_ids}")
+            job_id, job_state, job_info = worker.submit_task(task, depends_on=job_ids)
+        else:
+            job_id, job_state,job_info = worker.submit_task(task)
         log.info(f"Job Submitted '{task.name}' job_id: {job_id} job_state: {job_state}")
         # place job in queue to monitor
-        db.job_queue.push(task=task, job_id=job_id, job_state=job_state)
+        db.job_queue.push(task=task, job_id=job_id, job_state=job_state, metadata=job_info)
     except ContainerBuildError as err:
+        release_environment(task)
         job_info = {}
         job_state = 'BUILD_FAIL'
         log.error(f'Failed to build container for {task.name}: {err}')
         log.error(f'{task.name} state: {job_state}')
+    except UpstreamError as err:
+        release_environment(task)
+        job_info = {}
+        job_state = err.job_state
+        log.error(f'Not submitting {task.name}: {err}')
+        log.error(f'{task.name} state: {job_state}')
     except Exception as err:  # pylint: disable=W0718 # we have to catch everything here
+        release_environment(task)
         # Set job state to failed
         job_info = {}
         job_state = 'SUBMIT_FAIL'
@@ -66,49 +271,211 @@ def submit_task(db, worker, task):
     return job_state,job_info
 
 
+def group_job_arrays(worker, tasks):
+    """Split tasks into groups to submit as job arrays and tasks to submit alone.
+
+    Tasks are grouped by the worker's array key; groups smaller than
+    job_array_min_size are submitted alone.
+    """
+    if job_array_min_size < 2:
+        return [], tasks
+    groups = {}
+    single = []
+    for task in tasks:
+        try:
+            key = worker.array_key(task)
+        except (OSError, ValueError) as err:
+            # Let the normal submission report the problem
+            log.warning(f'Not submitting {task.name} in a job array: {err}')
+            key = None
+        if key is None:
+            single.append(task)
+        else:
+            groups.setdefault(key, []).append(task)
+    arrays = []
+    for group in groups.values():
+        if len(group) >= job_array_min_size:
+            arrays.append(group)
+        else:
+            single.extend(group)
+    return arrays, single
+
+
+def submit_array(db, worker, tasks):
+    """Submit tasks as one job array; returns the (job_state, job_info) of each task."""
+    results = {}
+    ready = []
+    for task in tasks:
+        try:
+            if task.get_full_requirement('DockerRequirement'):
+                log.info(f'Resolving environment for task {task.name}')
+                resolve_environment(task)
+            ready.append(task)
+        except ContainerBuildError as err:
+            release_environment(task)
+            log.error(f'Failed to build container for {task.name}: {err}')
+            results[task.id] = ('BUILD_FAIL', {})
+        except Exception as err:  # pylint: disable=W0718 # we have to catch everything here
+            release_environment(task)
+            log.error(f'Task Manager submit task {task.name} failed! \n {err}')
+            log.error(traceback.format_exc())
+            results[task.id] = ('SUBMIT_FAIL', {})
+    if ready:
+        try:
+            jobs = worker.submit_array(ready)
+        except Exception as err:  # pylint: disable=W0718 # we have to catch everything here
+            for task in ready:
+                release_environment(task)
+            log.error(f'Task Manager submit job array of {len(ready)} tasks failed! \n {err}')
+            log.error(traceback.format_exc())
+            results.update((task.id, ('SUBMIT_FAIL', {})) for task in ready)
+        else:
+            log.info(f'Job array submitted for {len(ready)} tasks')
+            for task, (job_id, job_state, job_info) in zip(ready, jobs):
+                log.info(f"Job Submitted '{task.name}' job_id: {job_id} job_state: {job_state}")
+                db.job_queue.push(task=task, job_id=job_id, job_state=job_state,
+                                  metadata=job_info)
+                results[task.id] = (job_state, job_info)
+    return [results[task.id] for task in tasks]
+
+
 def submit_jobs(db):
-    """Submit all jobs currently in submit queue to the workload scheduler."""
+    """Hand the tasks in the submit queue to the submit threads; returns their futures.
+
+    Tasks stay in the submit queue until a thread starts on them, so none are
+    lost if the TM stops first. Every task handed over counts against
+    jobs_limit until its submission has finished. A chained task is only
+    handed over once none of its upstream tasks is waiting to be submitted,
+    so that their job ids are known by then. Groups of tasks that only differ
+    in what they run are submitted as job arrays if the worker supports them.
+    """
     worker = utils.worker_interface()
-    while db.submit_queue.count() >= 1 and db.job_queue.count() < jobs_limit:
-        # Single value dictionary
-        task = db.submit_queue.pop()
-        log.info(f"Submitting task {task.workflow_id}")
-        job_state,job_info = submit_task(db, worker, task)
-        db.update_queue.push(task.workflow_id, task.id, job_state,\
-                             task_info=None, metadata=job_info, output=None)
+    tasks = []
+    chained = []
+    with _in_flight_lock:
+        free_slots = jobs_limit - db.job_queue.count() - len(_in_flight)
+        entries = db.submit_queue.entries()
+        pending = {task_id for task_id, _ in entries} | _in_flight
+        for task_id, depends_on in entries:
+            if free_slots <= 0:
+                break
+            if task_id in _in_flight or not pending.isdisjoint(depends_on):
+                continue
+            task = db.submit_queue.tasks.get(task_id)
+            if task is None:
+                continue
+            _in_flight.add(task_id)
+            (chained if depends_on else tasks).append(task)
+            free_slots -= 1
 
+    arrays, tasks = group_job_arrays(worker, tasks)
+    groups = arrays + [[task] for task in tasks + chained]
+    return [SUBMIT_EXECUTOR.submit(_submit_entries, db, worker, [task.id for task in group])
+            for group in groups]
 
-def update_jobs(db):
-    """Check and update states of jobs in queue, remove completed jobs."""
-    # pylint: disable=R0915 # (57/50) too many statements
+
+def _submit_entries(db, worker, task_ids):
+    """Take tasks off the submit queue and submit them (several as one job array)."""
+    try:
+        # Tasks are gone from the queue if they were cancelled in the meantime
+        entries = [entry for entry in map(db.submit_queue.take, task_ids)
+                   if entry is not None]
+        if len(entries) == 1:
+            task, depends_on = entries[0]
+            log.info(f"Submitting task {task.workflow_id}")
+            results = [submit_task(db, worker, task, depends_on)]
+        else:
+            results = submit_array(db, worker, [task for task, _ in entries])
+        for (task, _), (job_state, job_info) in zip(entries, results):
+            if job_state in SUBMIT_FAILED_STATES:
+                # Tasks chained to this one mustn't wait for it
+                db.finished_jobs.record(task.id, job_state)
+            db.update_queue.push(task.workflow_id, task.id, job_state,
+                                 task_info=None, metadata=job_info, output=None)
+    except Exception:  # pylint: disable=W0718 # keep the submit threads alive
+        log.error(traceback.format_exc())
+    finally:
+        with _in_flight_lock:
+            _in_flight.difference_update(task_ids)
+        # The finished submission frees a job slot and may unblock chained tasks
+        wake_submitter()
+
+
+def metadata_delta(reported, job_info):
+    """Return the job metadata that changed since it was last reported (None if nothing)."""
+    if not job_info:
+        return None
+    delta = {key: value for key, value in job_info.items()
+             if key not in reported or reported[key] != value}
+    return delta or None
+
+
+def update_jobs(db, poller=None):
+    """Check and update states of jobs in queue, remove completed jobs.
+
+    If a JobPoller is given, only the jobs that are due according to its
+    schedule are queried. Only state changes are reported to the WFM, along
+    with the metadata that changed since the last report; a job whose state
+    stays the same is reported again every heartbeat_interval seconds.
+    """
+    # pylint: disable=R0912,R0915 # (57/50) too many statements
 
     worker = utils.worker_interface()
-    # Need to make a copy first
-    job_q = list(db.job_queue)
-    for job in job_q: # pylint: disable=R1702 # (7/5) nested blocks
+    # Need to make a copy first; tasks are only loaded for jobs whose state changed
+    job_q = list(db.job_queue.states())
+    if poller is not None:
+        poller.prune([job.id for job in job_q])
+    db.finished_jobs.prune(FINISHED_JOB_TTL)
+    due_jobs = []
+    for job in job_q:
+        if job.job_state in COMPLETED_STATES:
+            # Completed states don't change. Move to the finished jobs and on to the next job.
+            db.job_queue.finish(job.id)
+            continue
+        if poller is not None and not poller.is_due(job.id):
+            continue
+        due_jobs.append(job)
+
+    # Ask the scheduler about all jobs at once. The worker already looked for
+    # the jobs it leaves out, so those are unknown; the jobs are only queried
+    # one by one if the bulk query failed altogether.
+    try:
+        job_states = worker.query_tasks([job.job_id for job in due_jobs]) if due_jobs else {}
+    except WorkerError as err:
+        log.warning(f'Failed to query jobs: {err}')
+        job_states = None
+
+    for job in due_jobs: # pylint: disable=R1702 # (7/5) nested blocks
         id_ = job.id
-        task = job.task
         job_id = job.job_id
         job_state = job.job_state
 
-        if job_state in COMPLETED_STATES:
-            # Completed states don't change. Remove from the job queue and move to the next job.
-            db.job_queue.remove_by_id(id_)
-            continue
+        if job_states is not None:
+            new_job_state, job_info = job_states.get(job_id, ('UNKNOWN', {}))
+        else:
+            try:
+                new_job_state,job_info = worker.query_task(job_id)
 
-        try:
-            new_job_state,job_info = worker.query_task(job_id)
+            except WorkerError as err:
+                log.warning(f'Failed to query job {job_id}: {err}')
+                new_job_state = 'UNKNOWN'
+                job_info={}
 
-        except WorkerError as err:
-            log.warning(f'Failed to query job {job_id}: {err}')
-            new_job_state = 'UNKNOWN'
-            job_info={}
+        if poller is not None:
+            poller.polled(id_, changed=job_state != new_job_state)
+
+        # Only send the WFM the metadata it hasn't seen yet
+        delta = metadata_delta(job.metadata, job_info)
+        reported_metadata = {**job.metadata, **(job_info or {})}
 
         # If state changes update the WFM
         if job_state != new_job_state:
+            task = db.job_queue.get_task(id_)
             db.job_queue.update_job_state(id_, new_job_state)
+            db.job_queue.set_reported(id_, reported_metadata)
             log.info(f"Job Updated '{task.name}' job_id: {job_id} job_state: {new_job_state}")
             if new_job_state in COMPLETED_STATES:
+                release_environment(task)
                 # Check for checkpoint requirement
                 task_checkpoint = task.get_full_requirement('beeflow:CheckpointRequirement')
                 if task_checkpoint:
@@ -134,47 +501,71 @@ def update_jobs(db):
                                                                         task.workdir)
                                 task_info = {'checkpoint_file': checkpoint_file, 'restart': True}
                                 db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                                    task_info=task_info, metadata=job_info,
+                                                    task_info=task_info, metadata=delta,
                                                     output=None)
                             else:
                                 # Sentinel conditions not met, don't restart
                                 log.info(f'Sentinel conditions not met for {task.name}, '
                                          f'not restarting')
                                 db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                                    task_info=None, metadata=job_info, output=None)
+                                                    task_info=None, metadata=delta, output=None)
                         except utils.CheckpointRestartError as err:
                             log.error(f'Checkpoint restart failed for '
                                       f'{task.name} ({task.id}): {err}')
                             db.update_queue.push(task.workflow_id, task.id, 'FAILED',
-                                                task_info=None, metadata=job_info, output=None)
+                                                task_info=None, metadata=delta, output=None)
                     else:
                         # restart_on_failure=True but state is not FAILED/TIMEOUT
                         db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                            task_info=None, metadata=job_info, output=None)
+                                            task_info=None, metadata=delta, output=None)
                 else:
                     # No checkpoint requirement
                     db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                        task_info=None, metadata=job_info, output=None)
+                                        task_info=None, metadata=delta, output=None)
             elif new_job_state in ('BOOT_FAIL', 'NODE_FAIL', 'OUT_OF_MEMORY', 'PREEMPTED'):
                 # Don't update wfm, just resubmit
                 log.info(f'Resubmitting task {task.name}')
                 db.job_queue.remove_by_id(id_)
                 job_state,job_info = submit_task(db, worker, task)
+                if job_state in SUBMIT_FAILED_STATES:
+                    db.finished_jobs.record(task.id, job_state)
                 db.update_queue.push(task.workflow_id, task.id, job_state,
                                     task_info=None,metadata=job_info,output=None)
             else:
 		# Other state (e.g., PENDING)
                 db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                    task_info=None,metadata=job_info,output=None)
+                                    task_info=None,metadata=delta,output=None)
+
+        # If job still running (not completed, archived, etc) then let the wfm
+        # know it's still alive every so often
+        elif (new_job_state not in COMPLETED_STATES
+              and time.time() - (job.reported_at or 0) >= heartbeat_interval):
+            db.job_queue.set_reported(id_, reported_metadata)
+            db.update_queue.push(job.workflow_id, job.task_id, new_job_state,
+                                task_info=None,metadata=delta,output=None)
 
-        # If job still running (not completed, archived, etc) then update wfm
-        elif new_job_state not in COMPLETED_STATES:
-            db.update_queue.push(task.workflow_id, task.id, new_job_state,
-                                task_info=None,metadata=job_info,output=None)
 
-        if job_state in COMPLETED_STATES:
-            # Remove from the job queue. Our job is finished
-            db.job_queue.remove_by_id(id_)
+def send_updates(db):
+    """Send the queued task updates to the WFM in one batch.
+
+    Updates are only removed from the queue once the WFM has accepted them.
+    """
+    with _send_lock:
+        last_revision = db.update_queue.last_revision()
+        if last_revision == 0:
+            return
+        state_updates = TaskStateUpdateRequest(
+            state_updates=db.update_queue.updates(last_revision))
+        conn = utils.wfm_conn()
+        resp = conn.put(utils.wfm_resource_url("update/"), json=state_updates.model_dump())
+        if resp.status_code == 200:
+            # The workflow manager received the updates, so remove them (but
+            # not any that were added or changed since)
+            db.update_queue.clear(last_revision)
+        else:
+            log.info(resp.json()['error'])
+            # Something bad happened so keep the udpates until the next round
+            log.warning("WFM not responding when sending task updates.")
 
 
 def process_queues():
@@ -182,20 +573,49 @@ def process_queues():
     db = utils.connect_db()
 
     # Submit and update jobs
-    submit_jobs(db)
+    wait(submit_jobs(db))
     update_jobs(db)
 
     # Attempt to send a batch of task updates to the wfm, otherwise keep the
     # updates for later
-    state_updates = TaskStateUpdateRequest(state_updates=db.update_queue.updates())
-    conn = utils.wfm_conn()
-    resp = conn.put(utils.wfm_resource_url("update/"), json=state_updates.model_dump())
-    if resp.status_code == 200:
-        # The workflow manager received the updates, so clear the queue
-        # ONly clear queue if not empty
-        if db.update_queue.count() > 0:
-            db.update_queue.clear()
-    else:
-        log.info(resp.json()['error'])
-        # Something bad happened so keep the udpates until the next round
-        log.warning("WFM not responding when sending task updates.")
+    send_updates(db)
+
+
+def wake_submitter():
+    """Wake up the submitter thread so that queued tasks are submitted right away."""
+    _submit_event.set()
+
+
+def submit_pending():
+    """Submit the tasks in the submit queue and report their states to the WFM."""
+    db = utils.connect_db()
+    submit_jobs(db)
+    send_updates(db)
+
+
+def poll_jobs():
+    """Query the jobs that are due for polling and report changes to the WFM."""
+    db = utils.connect_db()
+    update_jobs(db, poller=job_poller)
+    send_updates(db)
+    if db.submit_queue.count() > 0 and db.job_queue.count() < jobs_limit:
+        # Jobs finished, so there is room for more
+        wake_submitter()
+
+
+def run_submitter(stop_event):
+    """Submit tasks as soon as they arrive, until stop_event is set.
+
+    Falls back to checking the submit queue every background_interval seconds
+    in case a wake up is missed (e.g. after a restart with a non-empty queue).
+    """
+    interval = bc.get('task_manager', 'background_interval')
+    while not stop_event.is_set():
+        _submit_event.wait(timeout=interval)
+        _submit_event.clear()
+        if stop_event.is_set():
+            break
+        try:
+            submit_pending()
+        except Exception:  # pylint: disable=W0718 # keep the submitter alive
+            log.error(traceback.format_exc())
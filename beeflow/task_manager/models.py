@@ -5,7 +5,23 @@ from beeflow.common.object_models import Task
 class SubmitTasksRequest(BaseModel):
     """Request model for submitting tasks."""
     tasks: list[Task]
+    # Task ID -> IDs of the tasks whose jobs must complete before it may start
+    dependencies: dict[str, list[str]] = {}
+
+class CancelTasksRequest(BaseModel):
+    """Request model for cancelling specific tasks."""
+    task_ids: list[str]
 
 class TaskActionResponse(BaseModel):
     """Response model for task actions."""
     msg: str
+
+class PrefetchRequest(BaseModel):
+    """Request model for prefetching the container images of a workflow."""
+    tasks: list[Task]
+
+class PrefetchProgress(BaseModel):
+    """Progress of the container image prefetch of a workflow."""
+    total: int
+    done: int = 0
+    failed: int = 0
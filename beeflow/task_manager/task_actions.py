@@ -6,7 +6,9 @@ from flask_restful import Resource
 from pydantic import ValidationError
 from beeflow.common import log as bee_logging
 from beeflow.task_manager import utils
-from beeflow.task_manager.models import SubmitTasksRequest, TaskActionResponse
+from beeflow.task_manager import background
+from beeflow.task_manager.models import (SubmitTasksRequest, CancelTasksRequest,
+                                         TaskActionResponse, PrefetchRequest, PrefetchProgress)
 
 log = bee_logging.setup(__name__)
 
@@ -19,36 +21,98 @@ class TaskActions(Resource):
         """Receives tasks from WFM."""
         db = utils.connect_db()
         try:
-            tasks = SubmitTasksRequest.model_validate(request.json).tasks
+            data = SubmitTasksRequest.model_validate(request.json)
         except ValidationError as err:
             log.error(f"Invalid request data: {err}")
             return TaskActionResponse(msg=str(err)), 400
-        for task in tasks:
-            db.submit_queue.push(task)
+        for task in data.tasks:
+            db.submit_queue.push(task, depends_on=data.dependencies.get(task.id))
             log.info(f"Added {task.name} task to the submit queue")
+        background.wake_submitter()
         return TaskActionResponse(msg="Tasks submitted successfully").model_dump(), 200
 
     @staticmethod
     def delete():
-        """Cancel received from WFM to cancel job, update queue to monitor state."""
+        """Cancel received from WFM to cancel job, update queue to monitor state.
+
+        If the request lists task_ids, only those tasks are cancelled.
+        """
         db = utils.connect_db()
-        worker = utils.worker_interface()
-        cancel_msg = ""
-        for job in db.job_queue:
-            task_id = job.task.id
-            job_id = job.job_id
-            name = job.task.name
-            log.info(f"Cancelling {name} with job_id: {job_id}")
+        if request.get_json(silent=True):
             try:
-                job_state = worker.cancel_task(job_id)
-            except Exception as err:  # pylint: disable=W0718 # we have to catch everything here
-                log.error(err)
-                log.error(traceback.format_exc())
-                job_state = "ZOMBIE"
-            cancel_msg += f"{name} {task_id} {job_id} {job_state}"
+                task_ids = CancelTasksRequest.model_validate(request.json).task_ids
+            except ValidationError as err:
+                log.error(f"Invalid request data: {err}")
+                return TaskActionResponse(msg=str(err)).model_dump(), 400
+            tasks = [task for task in map(db.submit_queue.tasks.get, task_ids) if task]
+            db.submit_queue.remove_tasks(task_ids)
+            jobs = db.job_queue.jobs_for_tasks(task_ids)
+            cancel_msg = _cancel_jobs((task_id, task_id, job_id)
+                                      for task_id, (job_id, _) in jobs.items())
+            db.job_queue.remove_tasks(jobs)
+            _release_environments(tasks)
+            return TaskActionResponse(msg=f"Cancelled tasks: {cancel_msg}").model_dump(), 200
+        jobs = list(db.job_queue)
+        tasks = [job.task for job in jobs] + list(db.submit_queue)
+        cancel_msg = _cancel_jobs((job.task.name, job.task.id, job.job_id) for job in jobs)
         db.job_queue.clear()
         db.submit_queue.clear()
+        _release_environments(tasks)
         return (
             TaskActionResponse(msg=f"Cancelled all tasks: {cancel_msg}").model_dump(),
             200,
         )
+
+
+class PrefetchActions(Resource):
+    """API for prefetching the container images of workflows."""
+
+    @staticmethod
+    def post(wf_id):
+        """Start pulling or building the container images of a workflow's tasks."""
+        try:
+            data = PrefetchRequest.model_validate(request.json)
+        except ValidationError as err:
+            log.error(f"Invalid request data: {err}")
+            return TaskActionResponse(msg=str(err)).model_dump(), 400
+        count = background.prefetch_images(wf_id, data.tasks)
+        return TaskActionResponse(msg=f"Prefetching {count} container images").model_dump(), 200
+
+    @staticmethod
+    def get(wf_id):
+        """Report the prefetch progress of a workflow."""
+        progress = background.prefetch_progress(wf_id)
+        if progress is None:
+            return TaskActionResponse(msg="No images prefetched for workflow").model_dump(), 404
+        return PrefetchProgress(**progress).model_dump(), 200
+
+    @staticmethod
+    def delete(wf_id):
+        """Forget the prefetch progress of a workflow that finished or was cancelled."""
+        background.forget_prefetch(wf_id)
+        return TaskActionResponse(msg="Prefetch progress removed").model_dump(), 200
+
+
+def _release_environments(tasks):
+    """Let the container images of cancelled tasks be evicted from the cache."""
+    for task in tasks:
+        try:
+            background.release_environment(task)
+        except Exception as err:  # pylint: disable=W0718 # cancelling must not fail here
+            log.error(f"Failed to release the images of task {task.id}: {err}")
+
+
+def _cancel_jobs(jobs):
+    """Cancel each (name, task_id, job_id) job and return a summary message."""
+    worker = utils.worker_interface()
+    cancel_msg = ""
+    for name, task_id, job_id in jobs:
+        log.info(f"Cancelling {name} with job_id: {job_id}")
+        try:
+            job_state = worker.cancel_task(job_id)
+        except Exception as err:  # pylint: disable=W0718 # we have to catch everything here
+            log.error(err)
+            log.error(traceback.format_exc())
+            job_state = "ZOMBIE"
+        cancel_msg += f"{name} {task_id} {job_id} {job_state}"
+    return cancel_msg
@@ -5,11 +5,12 @@ Communicates status to the Work Flow Manager, through RESTful API.
 """
 import atexit
 import sys
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Flask, jsonify, make_response
 from beeflow.common.api import BeeApi
-from beeflow.task_manager.task_actions import TaskActions
-from beeflow.task_manager.background import process_queues
+from beeflow.task_manager.task_actions import TaskActions, PrefetchActions
+from beeflow.task_manager import background
 from beeflow.common.config_driver import BeeConfig as bc
 from beeflow.task_manager import utils
 
@@ -21,23 +22,38 @@ def create_app():
 
     # Endpoints
     api.add_resource(TaskActions, '/bee_tm/v1/task/')
+    api.add_resource(PrefetchActions, '/bee_tm/v1/prefetch/<string:wf_id>')
 
     @app.route('/status')
     def get_status():
         """Report the current status of the Task Manager."""
         return make_response(jsonify(stauts='up'), 200)
 
-    # Start the background scheduler and make sure it gets cleaned up
+    # Start the submitter thread and the background scheduler and make sure
+    # they get cleaned up
     if "pytest" not in sys.modules:
+        # Submission is event driven: TaskActions.post wakes the submitter
+        stop_event = threading.Event()
+        submitter = threading.Thread(target=background.run_submitter, args=(stop_event,),
+                                     name='tm-submitter', daemon=True)
+        submitter.start()
+
+        # Job states are polled on their own adaptive schedule
         scheduler = BackgroundScheduler({'apscheduler.timezone': 'UTC'})
-        scheduler.add_job(func=process_queues, trigger="interval", max_instances=1,
-                          coalesce=True, seconds=bc.get('task_manager', 'background_interval'))
+        scheduler.add_job(func=background.poll_jobs, trigger="interval", max_instances=1,
+                          coalesce=True, seconds=bc.get('task_manager', 'poll_interval_min'))
         scheduler.add_job(func=utils.check_tm_db, trigger="interval", max_instances=1,
                           coalesce=True, minutes=bc.get('task_manager', 'backup_interval'))
         scheduler.start()
 
-        # This kills the scheduler when the process terminates
+        def shutdown():
+            """Stop the submitter thread and the scheduler."""
+            stop_event.set()
+            background.wake_submitter()
+            scheduler.shutdown()
+
+        # This kills the scheduler and submitter when the process terminates
         # so we don't accidentally leave a zombie process
-        atexit.register(scheduler.shutdown)
+        atexit.register(shutdown)
 
     return app
@@ -2,6 +2,7 @@
 import os
 import re
 import getpass
+import threading
 from pathlib import Path
 from beeflow.common.config_driver import BeeConfig as bc
 from beeflow.common.db import tm_db
@@ -11,10 +12,16 @@ from beeflow.common import worker
 from beeflow.common import paths
 from beeflow.common.connection import Connection
 from beeflow.common.worker_interface import WorkerInterface
+from beeflow.common.worker.pilot_worker import PilotWorker
 import beeflow.common.worker.utils as worker_utils
 
 log = bee_logging.setup(__name__)
 
+# The worker interface is built once per process and shared by the
+# background jobs and the request handlers
+_worker_lock = threading.Lock()
+_worker_cache = {}
+
 def db_path():
     """Return the TM backup database path."""
     user = getpass.getuser()
@@ -59,7 +66,25 @@ def restore_tm_db():
     log.info("Restored task manager database.")
 
 def worker_interface():
-    """Load the worker interface."""
+    """Return the worker interface for this process, loading it on first use."""
+    pid = os.getpid()
+    with _worker_lock:
+        worker_ = _worker_cache.get(pid)
+        if worker_ is None:
+            # Drop any worker inherited from a parent process
+            _worker_cache.clear()
+            worker_ = _worker_cache[pid] = load_worker_interface()
+    return worker_
+
+
+def reset_worker_interface():
+    """Drop the cached worker interface, so that the next use reloads it."""
+    with _worker_lock:
+        _worker_cache.clear()
+
+
+def load_worker_interface():
+    """Load a new worker interface from the configuration."""
     wls = bc.get('DEFAULT', 'workload_scheduler')
     worker_class = worker.find_worker(wls)
     if worker_class is None:
@@ -80,7 +105,20 @@ def worker_interface():
     if wls == 'Slurm':
         worker_kwargs['use_commands'] = bc.get('slurm', 'use_commands')
         worker_kwargs['slurm_socket'] = paths.slurm_socket()
-        worker_kwargs['openapi_version'] = worker_utils.get_slurmrestd_version
+        if not worker_kwargs['use_commands']:
+            worker_kwargs['openapi_version'] = worker_utils.cached_slurmrestd_version(
+                paths.slurmrestd_version_cache())
+    elif wls == 'Simple':
+        worker_kwargs['cores'] = bc.get('simple', 'cores')
+        worker_kwargs['memory'] = bc.get('simple', 'memory')
+    # In pilot mode the scheduler's worker only starts the pilot jobs
+    if bc.get('pilot', 'enabled'):
+        worker_kwargs.update(worker_class=worker_class,
+                             pilot_nodes=bc.get('pilot', 'nodes'),
+                             pilot_cores=bc.get('pilot', 'cores'),
+                             pilot_time_limit=bc.get('pilot', 'time_limit'),
+                             pilot_idle_timeout=bc.get('pilot', 'idle_timeout'))
+        worker_class = PilotWorker
     return WorkerInterface(worker_class, **worker_kwargs)
 
 
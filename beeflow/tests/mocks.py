@@ -1,5 +1,6 @@
 """Mocks for the WFM and TM tests."""
 
+import contextlib
 from copy import deepcopy
 from beeflow.common.object_models import StepInput, StepOutput
 from beeflow.common import expr
@@ -117,6 +118,8 @@ class MockGDBDriver:
     interactions. This driver mock doesn't support multiple workflows per driver.
     """
 
+    marks_ready_dependents = False
+
     def __init__(self, **_kwargs):
         """Create a new mock gdb (ignore kwargs)."""
         self.workflow = None
@@ -182,6 +185,16 @@ class MockGDBDriver:
         for outp in task.outputs:
             self.outputs[task.id][outp.id] = outp
 
+    def load_workflow(self, workflow, tasks):
+        """Load a workflow and its tasks into the graph database."""
+        self.initialize_workflow(workflow)
+        for task in tasks:
+            self.load_task(task)
+
+    def transaction(self):
+        """Fake a transaction."""
+        return contextlib.nullcontext()
+
     def initialize_ready_tasks(self, workflow_id): # pylint: disable=W0613
         """Set runnable tasks in a workflow to ready."""
         for task_id in self.tasks:
@@ -216,6 +229,19 @@ class MockGDBDriver:
         """Return a workflow's tasks from the graph database."""
         return list(self.tasks.values())
 
+    def get_workflow_task_states(self, workflow_id): # pylint: disable=W0613
+        """Return the id, name, state and metadata of a workflow's tasks."""
+        return [(task_id, task.name, self.task_states[task_id],
+                 self.task_metadata.get(task_id, {}))
+                for task_id, task in self.tasks.items()]
+
+    def get_workflow_state_counts(self, workflow_id): # pylint: disable=W0613
+        """Return the number of tasks in each state."""
+        counts = {}
+        for state in self.task_states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
     def get_workflow_requirements_and_hints(self, workflow_id): # pylint: disable=W0613
         """Return a tuple containing a list of requirements and a list of hints."""
         return (None, None)
@@ -241,6 +267,14 @@ class MockGDBDriver:
         """Set the state of a task."""
         self.task_states[task_id] = state
 
+    def mark_downstream(self, task_id, state):
+        """Set the state of every task that transitively depends on a task."""
+        task_ids = [task_id]
+        while task_ids:
+            for dep_task in self.get_dependent_tasks(task_ids.pop()):
+                self.task_states[dep_task.id] = state
+                task_ids.append(dep_task.id)
+
     def get_task_metadata(self, task_id):
         """Return the job description metadata of a task."""
         return self.task_metadata[task_id]
@@ -338,6 +372,10 @@ class MockWorkerSubmission:
         """Return state, start time, and remaining time of task."""
         return 'RUNNING', {'job_name':'mock-job','start_time':'2025-07-03 13:38:22','time_left':'1 day, 23:59:35.874235','workdir':''}
 
+    def query_tasks(self, job_ids):
+        """Query several jobs at once."""
+        return {job_id: self.query_task(job_id) for job_id in job_ids}
+
     def cancel_task(self, job_id): # pylint: disable=W0613
         """Return cancelled status"""
         return 'CANCELLED'
@@ -354,6 +392,10 @@ class MockWorkerCompletion:
         """Submit a task."""
         return 'COMPLETED', {'job_name':'mock-job','start_time':'2025-07-03 13:38:22','time_left':'1 day, 23:59:35.874235','workdir':''}
 
+    def query_tasks(self, job_ids):
+        """Query several jobs at once."""
+        return {job_id: self.query_task(job_id) for job_id in job_ids}
+
     def cancel_task(self, job_id): # pylint: disable=W0613
         """Cancel a task."""
         return 'CANCELLED'
@@ -895,6 +895,23 @@ def test_query(mocker, capsys, wf_status, exp_out):
     assert cap.out == exp_out
 
 
+def test_query_prefetch(mocker, capsys):
+    """Test that query shows the container image prefetch progress."""
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 200
+    fake_resp.json.return_value = {
+        "tasks_status": [], "wf_status": "Running",
+        "msg": "Workflow status retrieved successfully",
+        "prefetch": {"total": 3, "done": 1, "failed": 1},
+    }
+    mock_conn = mocker.Mock()
+    mock_conn.get.return_value = fake_resp
+    mocker.patch("beeflow.client.bee_client._wfm_conn", return_value=mock_conn)
+    bee_client.query(123456)
+    cap = capsys.readouterr()
+    assert cap.out == "Running\nContainer images: 1/3 ready, 1 failed\n"
+
+
 def test_pause(mocker):
     """Regression test pause."""
     fake_resp = mocker.Mock()
@@ -909,6 +926,22 @@ def test_pause(mocker):
     )
 
 
+def test_archive(mocker):
+    """Test retrying the archive of a workflow whose archive failed."""
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 200
+    mock_conn = mocker.Mock()
+    mock_conn.patch.return_value = fake_resp
+    mocker.patch("beeflow.client.bee_client._wfm_conn", return_value=mock_conn)
+    mocker.patch("beeflow.client.bee_client.get_wf_status", return_value="Archive Failed")
+    bee_client.archive_workflows(["123456"], all_=False)
+    mock_conn.patch.assert_called_once_with(
+        bee_client._resource(123456),
+        json={"option": "archive"},
+        timeout=10,
+    )
+
+
 def test_resume(mocker):
     """Regression test resume."""
     fake_resp = mocker.Mock()
@@ -1,7 +1,9 @@
 """Charliecloud driver tests."""
 import pathlib
+import sys
 import pytest
 from beeflow.common.crt.charliecloud_driver import CharliecloudDriver as crt_driver
+from beeflow.common.crt.image_deploy import image_key
 from beeflow.common.object_models import Task, Requirement
 
 
@@ -11,9 +13,10 @@ from beeflow.common.object_models import Task, Requirement
         ("cont.sqfs", "", "ch-run cont.sqfs env --cd  -b : -- default", ""),
         (
             "cont.tar.gz",
-            "mkdir -p env one-per-node ch-convert -i tar -o dir cont.tar.gz env/cont one-per-node",
-            "ch-run env/cont env --cd  -b : -- default",
-            "rm -rf env/cont one-per-node",
+            "{deploy} deploy env {key} --archive cont.tar.gz --lease {lease} --ttl env "
+            "--max-size env one-per-node",
+            "ch-run env/{key} env --cd  -b : -- default",
+            "{deploy} release env {key} --lease {lease} --ttl env --max-size env one-per-node",
         ),
     ],
 )
@@ -65,7 +68,44 @@ def test_run_text_use_container(
     post_commands = " ".join(
         [f'{" ".join(com.args)} {com.type}' for com in res.post_commands]
     )
+    fields = {"deploy": f"{sys.executable} -m beeflow.common.crt.image_deploy",
+              "key": image_key("cont.tar.gz"), "lease": task.id}
     assert env_code == "env cd  "
-    assert pre_commands == pre_commands_exp
-    assert main_command == main_command_exp
-    assert post_commands == post_commands_exp
+    assert pre_commands == pre_commands_exp.format(**fields)
+    assert main_command == main_command_exp.format(**fields)
+    assert post_commands == post_commands_exp.format(**fields)
+
+
+@pytest.mark.parametrize("image_format", ["tar", "squash"])
+def test_archive_path(mocker, tmp_path, image_format):
+    """Test picking archived images in the configured format."""
+    config = {("builder", "image_format"): image_format}
+    mocker.patch("beeflow.common.config_driver.BeeConfig.get",
+                 side_effect=lambda sec, opt: config.get((sec, opt), "env"))
+    mocker.patch("beeflow.common.config_driver.BeeConfig.resolve_path",
+                 return_value=str(tmp_path))
+    driver = crt_driver()
+    ext = ".sqfs" if image_format == "squash" else ".tar.gz"
+    other_ext = ".tar.gz" if image_format == "squash" else ".sqfs"
+    assert driver.archive_path("cont") == str(tmp_path / f"cont{ext}")
+    (tmp_path / f"cont{other_ext}").touch()
+    assert driver.archive_path("cont") == str(tmp_path / f"cont{other_ext}")
+    (tmp_path / f"cont{ext}").touch()
+    assert driver.archive_path("cont") == str(tmp_path / f"cont{ext}")
+
+
+def test_run_text_squashfs_archive(mocker, tmp_path):
+    """Test that SquashFS images in the archive are run without unpacking."""
+    mocker.patch("beeflow.common.config_driver.BeeConfig.get",
+                 side_effect=lambda sec, opt: "squash" if opt == "image_format" else "")
+    mocker.patch("beeflow.common.config_driver.BeeConfig.resolve_path",
+                 return_value=str(tmp_path))
+    (tmp_path / "cont.sqfs").touch()
+    requirements = [Requirement(class_="DockerRequirement",
+                                params={"beeflow:containerName": "cont"})]
+    task = Task(name="", base_command=["true"], hints=[], requirements=requirements,
+                inputs=[], outputs=[], stdout="", stderr="", workflow_id="", workdir=None)
+    res = crt_driver().run_text(task)
+    assert not res.pre_commands
+    assert not res.post_commands
+    assert res.main_command.args[:2] == ["ch-run", str(tmp_path / "cont.sqfs")]
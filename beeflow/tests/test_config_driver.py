@@ -2,8 +2,9 @@
 
 import os
 import pytest
-from beeflow.common.config_driver import AlterConfig, ConfigGenerator, new
-from beeflow.common.config_validator import ConfigValidator
+from beeflow.common import config_utils
+from beeflow.common.config_driver import AlterConfig, ConfigGenerator, VALIDATOR, new
+from beeflow.common.config_validator import ConfigValidator, ConfigError
 
 
 # AlterConfig tests
@@ -184,3 +185,26 @@ def test_config_new(mocker, tmpdir, interactive, input_val, expected):
             )
         new("bee.conf", interactive=interactive)
         assert os.path.exists('bee.conf.1') == expected
+
+
+
+def test_pilot_native_dependencies(tmpdir):
+    """Test that pilot jobs can't be combined with native dependencies."""
+    img_dir = tmpdir.mkdir('img')
+    for image in ('neo4j.tar.gz', 'redis.tar.gz'):
+        img_dir.join(image).write('')
+    config = {
+        'DEFAULT': {'bee_workdir': str(tmpdir), 'workload_scheduler': 'Slurm',
+                    'neo4j_image': str(img_dir.join('neo4j.tar.gz')),
+                    'redis_image': str(img_dir.join('redis.tar.gz'))},
+        'slurm': {'use_commands': 'False'},
+        'workflow_manager': {'native_dependencies': 'True'},
+        'pilot': {'enabled': 'False'},
+    }
+    config_path = str(tmpdir.join('bee.conf'))
+    conf = config_utils.filter_and_validate(config, VALIDATOR, config_path)
+    assert conf['workflow_manager']['native_dependencies']
+
+    config['pilot']['enabled'] = 'True'
+    with pytest.raises(ConfigError, match='native_dependencies cannot both be set'):
+        config_utils.filter_and_validate(config, VALIDATOR, config_path)
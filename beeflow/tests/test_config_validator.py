@@ -139,3 +139,17 @@ def test_option_default():
 
     assert validator.validate({}) == {'abc': {'test': 1}}
     assert validator.validate({'abc': {'test': 3}}) == {'abc': {'test': 3}}
+
+
+def test_constraint():
+    """Test a constraint on options that can only be checked together."""
+    validator = ConfigValidator(description='constraint validator')
+    validator.section('abc', info='some section')
+    validator.option('abc', 'low', info='low value', validator=int, default=0)
+    validator.option('abc', 'high', info='high value', validator=int, default=10)
+    validator.constraint(lambda conf: conf['abc']['low'] <= conf['abc']['high'],
+                         'abc::low must not be greater than abc::high')
+
+    assert validator.validate({'abc': {'low': '5'}}) == {'abc': {'low': 5, 'high': 10}}
+    with pytest.raises(ConfigError, match='abc::low must not be greater'):
+        validator.validate({'abc': {'low': '11'}})
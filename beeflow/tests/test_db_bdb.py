@@ -0,0 +1,94 @@
+"""Tests of the base database connection layer."""
+
+# Disable W0621: Pylint complains about redefining 'db_file' from the outer
+#               scope. This is how pytest fixtures work.
+# pylint:disable=W0621
+
+import os
+import threading
+import sqlite3
+
+import pytest
+
+from beeflow.common.db import bdb
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """Pytest fixture for a database file with a simple table."""
+    fname = str(tmp_path / 'test.db')
+    bdb.create_table(fname, 'CREATE TABLE IF NOT EXISTS item (id INTEGER PRIMARY KEY, name TEXT)')
+    yield fname
+    bdb.close_connections()
+
+
+def test_connection_reused(db_file):
+    """Test that the same thread reuses one connection."""
+    assert bdb.get_connection(db_file) is bdb.get_connection(db_file)
+
+
+def test_connection_per_thread(db_file):
+    """Test that each thread gets its own connection."""
+    conns = []
+
+    def get_conn():
+        conns.append(bdb.get_connection(db_file))
+        bdb.close_connections()
+
+    thread = threading.Thread(target=get_conn)
+    thread.start()
+    thread.join()
+    assert conns[0] is not bdb.get_connection(db_file)
+
+
+def test_connection_pragmas(db_file):
+    """Test that the configured pragmas are applied."""
+    conn = bdb.get_connection(db_file)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_connection_reopened_when_file_replaced(db_file):
+    """Test that a removed database file doesn't leave a stale connection."""
+    conn = bdb.get_connection(db_file)
+    bdb.run(db_file, 'INSERT INTO item (name) VALUES (?)', ['a'])
+    os.remove(db_file)
+    bdb.create_table(db_file, 'CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)')
+
+    assert bdb.get_connection(db_file) is not conn
+    assert bdb.get_table_length(db_file, 'item') == 0
+
+
+def test_transaction_commit(db_file):
+    """Test that a transaction commits all statements together."""
+    with bdb.transaction(db_file):
+        bdb.run(db_file, 'INSERT INTO item (name) VALUES (?)', ['a'])
+        bdb.runmany(db_file, 'INSERT INTO item (name) VALUES (?)', [['b'], ['c']])
+        # Not visible to other connections until the commit
+        with sqlite3.connect(db_file) as other:
+            assert other.execute('SELECT COUNT(*) FROM item').fetchone()[0] == 0
+
+    assert bdb.get_table_length(db_file, 'item') == 3
+
+
+def test_transaction_rollback(db_file):
+    """Test that an error rolls back the whole transaction."""
+    with pytest.raises(sqlite3.Error):
+        with bdb.transaction(db_file):
+            bdb.run(db_file, 'INSERT INTO item (id, name) VALUES (?, ?)', [1, 'a'])
+            bdb.run(db_file, 'INSERT INTO item (id, name) VALUES (?, ?)', [1, 'b'])
+
+    assert bdb.get_table_length(db_file, 'item') == 0
+    # Errors outside of a transaction are still only reported
+    bdb.run(db_file, 'INSERT INTO no_such_table VALUES (1)')
+
+
+def test_nested_transaction(db_file):
+    """Test that only the outermost transaction commits."""
+    with pytest.raises(RuntimeError):
+        with bdb.transaction(db_file):
+            with bdb.transaction(db_file):
+                bdb.run(db_file, 'INSERT INTO item (name) VALUES (?)', ['a'])
+            raise RuntimeError
+
+    assert bdb.get_table_length(db_file, 'item') == 0
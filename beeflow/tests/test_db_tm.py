@@ -6,10 +6,14 @@
 
 import tempfile
 import os
+import sqlite3
 
+import jsonpickle
 import pytest
 
+from beeflow.common.db import bdb
 from beeflow.common.db import tm_db
+from beeflow.common.object_models import Task
 
 
 @pytest.fixture
@@ -21,6 +25,11 @@ def temp_db():
     os.remove(fname)
 
 
+def make_task(name):
+    """Create a simple task for pushing onto the queues."""
+    return Task(name=str(name), base_command='ls', workflow_id='wf-id')
+
+
 def test_empty(temp_db):
     """Test an empty database."""
     db = temp_db
@@ -33,16 +42,16 @@ def test_push_pop(temp_db):
     """Test pushing and popping values in a database."""
     db = temp_db
 
-    # Just push something random for the submit_queue, no need to be a real
-    # task
-    db.submit_queue.push(3)
-    db.job_queue.push(task=45, job_id=1289, job_state='READY')
+    task0 = make_task(3)
+    task1 = make_task(45)
+    db.submit_queue.push(task0)
+    db.job_queue.push(task=task1, job_id=1289, job_state='READY')
 
     assert db.submit_queue.count() == 1
     assert db.job_queue.count() == 1
-    assert db.submit_queue.pop() == 3
+    assert db.submit_queue.pop() == task0
     popped_job = db.job_queue.pop()
-    assert popped_job.task == 45
+    assert popped_job.task == task1
     assert popped_job.job_id == 1289
     assert popped_job.job_state == 'READY'
     assert db.submit_queue.count() == 0
@@ -54,17 +63,19 @@ def test_push_pop_many(temp_db):
     db = temp_db
 
     # Push 128 items
+    tasks = [make_task(i) for i in range(128)]
+    jobs = [make_task(i) for i in range(128)]
     for i in range(128):
-        db.submit_queue.push(i)
+        db.submit_queue.push(tasks[i])
         job_state = 'READY' if (i % 2) == 0 else 'COMPLETED'
-        db.job_queue.push(task=i, job_id=i + 1, job_state=job_state)
+        db.job_queue.push(task=jobs[i], job_id=i + 1, job_state=job_state)
         assert db.submit_queue.count() == (i + 1)
         assert db.job_queue.count() == (i + 1)
     # Now pop 128 items
     for i in range(128):
-        assert db.submit_queue.pop() == i
+        assert db.submit_queue.pop() == tasks[i]
         popped_job = db.job_queue.pop()
-        assert popped_job.task == i
+        assert popped_job.task == jobs[i]
         assert popped_job.job_id == i + 1
         assert popped_job.job_state == 'READY' if (i % 2) == 0 else 'COMPLETED'
         assert db.submit_queue.count() == (127 - i)
@@ -78,18 +89,19 @@ def test_clear(temp_db):
     db = temp_db
 
     # submit_queue
-    db.submit_queue.push(3)
-    db.submit_queue.push(4)
-    db.submit_queue.push({123, 4, 5})
+    db.submit_queue.push(make_task(3))
+    db.submit_queue.push(make_task(4))
+    db.submit_queue.push(make_task(5))
     db.submit_queue.clear()
     assert db.submit_queue.count() == 0
 
     # job_queue
-    db.job_queue.push(task={1, 2, 3}, job_id=168, job_state='COMPLETED')
-    db.job_queue.push(task={'some': 'value'}, job_id=12, job_state='READY')
-    db.job_queue.push(task=(1, 2, 3), job_id=88888, job_state='FAILED')
+    db.job_queue.push(task=make_task(1), job_id=168, job_state='COMPLETED')
+    db.job_queue.push(task=make_task(2), job_id=12, job_state='READY')
+    db.job_queue.push(task=make_task(3), job_id=88888, job_state='FAILED')
     db.job_queue.clear()
     assert db.submit_queue.count() == 0
+    assert db.job_queue.count() == 0
 
 
 def test_iter(temp_db):
@@ -97,26 +109,34 @@ def test_iter(temp_db):
     db = temp_db
 
     values = (127, 16)
-    for val in values:
-        db.submit_queue.push(val)
-    for task, other in zip(db.submit_queue, values):
+    tasks = [make_task(val) for val in values]
+    for task in tasks:
+        db.submit_queue.push(task)
+    for task, other in zip(db.submit_queue, tasks):
         assert task == other
 
-    for val in values:
-        db.job_queue.push(task=val, job_id=val, job_state='COMPLETED')
-    for job, val in zip(db.job_queue, values):
-        assert job.task == val
+    for task, val in zip(tasks, values):
+        db.job_queue.push(task=task, job_id=val, job_state='COMPLETED')
+    for job, task, val in zip(db.job_queue, tasks, values):
+        assert job.task == task
+        assert job.job_id == val
+        assert job.job_state == 'COMPLETED'
+    for job, task, val in zip(db.job_queue.states(), tasks, values):
+        assert job.workflow_id == task.workflow_id
+        assert job.task_id == task.id
         assert job.job_id == val
         assert job.job_state == 'COMPLETED'
+        assert db.job_queue.get_task(job.id) == task
 
 
 def test_job_queue_remove_by_id(temp_db):
     """Test removing a job by ID for the job queue."""
     db = temp_db
 
-    db.job_queue.push(task={8, 9, 10}, job_id=888, job_state='some-state0')
-    db.job_queue.push(task={10}, job_id=999, job_state='some-state1')
-    db.job_queue.push(task={46, 57}, job_id=111, job_state='some-state2')
+    tasks = [make_task(i) for i in range(3)]
+    db.job_queue.push(task=tasks[0], job_id=888, job_state='some-state0')
+    db.job_queue.push(task=tasks[1], job_id=999, job_state='some-state1')
+    db.job_queue.push(task=tasks[2], job_id=111, job_state='some-state2')
 
     assert db.job_queue.count() == 3
 
@@ -126,11 +146,11 @@ def test_job_queue_remove_by_id(temp_db):
 
     assert db.job_queue.count() == 2
     job = db.job_queue.pop()
-    assert job.task == {8, 9, 10}
+    assert job.task == tasks[0]
     assert job.job_id == 888
     assert job.job_state == 'some-state0'
     job = db.job_queue.pop()
-    assert job.task == {46, 57}
+    assert job.task == tasks[2]
     assert job.job_id == 111
     assert job.job_state == 'some-state2'
     assert db.job_queue.count() == 0
@@ -140,14 +160,15 @@ def test_job_queue_update_job_state(temp_db):
     """Test updating the job state for a job in the queue."""
     db = temp_db
 
-    db.job_queue.push(task={8, 9, 10}, job_id='888', job_state='READY')
+    task = make_task(8)
+    db.job_queue.push(task=task, job_id='888', job_state='READY')
 
     jobs = list(db.job_queue)
     id_ = jobs[0].id
     db.job_queue.update_job_state(id_, 'COMPLETED')
 
     job = db.job_queue.pop()
-    assert job.task == {8, 9, 10}
+    assert job.task == task
     assert job.job_id == 888
     assert job.job_state == 'COMPLETED'
 
@@ -168,23 +189,136 @@ def test_update_queue_order(temp_db):
     db = temp_db
 
     db.update_queue.push('wf-id', 'task-id', 'RUNNING')
-    db.update_queue.push('wf-id', 'task-id', 'COMPLETED')
     db.update_queue.push('wf-id-2', 'task-id-2', 'RUNNING')
-    db.update_queue.push('wf-id-2', 'task-id-2', 'FAILED')
+    db.update_queue.push('wf-id-3', 'task-id-3', 'FAILED')
+    assert db.update_queue.count() == 3
 
     updates = db.update_queue.updates()
     assert updates[0].wf_id == 'wf-id'
     assert updates[0].task_id == 'task-id'
     assert updates[0].job_state == 'RUNNING'
-    assert updates[1].wf_id == 'wf-id'
-    assert updates[1].task_id == 'task-id'
-    assert updates[1].job_state == 'COMPLETED'
-    assert updates[2].wf_id == 'wf-id-2'
-    assert updates[2].task_id == 'task-id-2'
-    assert updates[2].job_state == 'RUNNING'
-    assert updates[3].wf_id == 'wf-id-2'
-    assert updates[3].task_id == 'task-id-2'
-    assert updates[3].job_state == 'FAILED'
+    assert updates[1].wf_id == 'wf-id-2'
+    assert updates[1].task_id == 'task-id-2'
+    assert updates[1].job_state == 'RUNNING'
+    assert updates[2].wf_id == 'wf-id-3'
+    assert updates[2].task_id == 'task-id-3'
+    assert updates[2].job_state == 'FAILED'
 
     db.update_queue.clear()
     assert db.update_queue.updates() == []
+
+
+def test_update_queue_coalesce(temp_db):
+    """Test that pending updates for the same task are merged."""
+    db = temp_db
+
+    db.update_queue.push('wf-id', 'task-id', 'PENDING', metadata={'a': 1, 'b': 2})
+    last_revision = db.update_queue.last_revision()
+    db.update_queue.push('wf-id-2', 'task-id-2', 'RUNNING')
+    db.update_queue.push('wf-id', 'task-id', 'RUNNING', task_info={'restart': True},
+                         metadata={'b': 3})
+
+    # The merged update keeps its place in the queue
+    updates = db.update_queue.updates()
+    assert len(updates) == 2
+    assert updates[0].task_id == 'task-id'
+    assert updates[0].job_state == 'RUNNING'
+    assert updates[0].metadata == {'a': 1, 'b': 3}
+    assert updates[0].task_info == {'restart': True}
+    assert updates[1].task_id == 'task-id-2'
+    assert db.update_queue.updates(last_revision) == []
+
+    # Clearing what was read before the merge doesn't lose the merged update
+    db.update_queue.clear(last_revision)
+    assert db.update_queue.count() == 2
+
+
+def test_tasks_released(temp_db):
+    """Test that tasks are only kept while a queue references them."""
+    db = temp_db
+
+    task = make_task(1)
+    db.submit_queue.push(task)
+    db.job_queue.push(task=db.submit_queue.pop(), job_id=1, job_state='PENDING')
+    assert db.job_queue.get_task(next(db.job_queue.states()).id) == task
+
+    db.job_queue.remove_by_id(next(db.job_queue.states()).id)
+    assert bdb.get_table_length(db.db_file, 'task') == 0
+
+
+def test_submit_queue_dependencies(temp_db):
+    """Test that chained tasks keep their dependencies while queued."""
+    db = temp_db
+
+    task0 = make_task(0)
+    task1 = make_task(1)
+    task2 = make_task(2)
+    db.submit_queue.push(task0)
+    db.submit_queue.push(task1, depends_on=[task0.id])
+    db.submit_queue.push(task2, depends_on=[task1.id])
+
+    assert db.submit_queue.pop_entry() == (task0, [])
+    db.job_queue.push(task=task0, job_id=7, job_state='PENDING')
+    assert db.submit_queue.pop_entry() == (task1, [task0.id])
+    assert db.job_queue.jobs_for_tasks([task0.id, task1.id]) == {task0.id: (7, 'PENDING')}
+
+    db.submit_queue.remove_tasks([task2.id])
+    db.job_queue.remove_tasks([task0.id])
+    assert db.submit_queue.count() == 0
+    assert db.job_queue.count() == 0
+    assert bdb.get_table_length(db.db_file, 'task') == 0
+
+
+def test_migrate_v0():
+    """Test that queues stored in the original layout are migrated."""
+    fname = tempfile.mktemp()
+    task0 = make_task(0)
+    task1 = make_task(1)
+    with sqlite3.connect(fname) as conn:
+        conn.execute('CREATE TABLE submit_queue(id INTEGER PRIMARY KEY ASC, task TEXT)')
+        conn.execute("""CREATE TABLE job_queue(id INTEGER PRIMARY KEY ASC, task TEXT,
+                                               job_id INTEGER, job_state TEXT)""")
+        conn.execute("""CREATE TABLE update_queue(id INTEGER PRIMARY KEY ASC, wf_id TEXT,
+                                                  task_id TEXT, job_state TEXT, task_info TEXT,
+                                                  metadata TEXT, output TEXT)""")
+        conn.execute('INSERT INTO submit_queue (task) VALUES (?)', [jsonpickle.encode(task0)])
+        conn.execute('INSERT INTO job_queue (task, job_id, job_state) VALUES (?, ?, ?)',
+                     [jsonpickle.encode(task1), 12, 'RUNNING'])
+        conn.execute("""INSERT INTO update_queue (wf_id, task_id, job_state, task_info, metadata,
+                                                  output) VALUES (?, ?, ?, ?, ?, ?)""",
+                     ['wf-id', task1.id, 'RUNNING', 'null', 'null', 'null'])
+    conn.close()
+
+    try:
+        db = tm_db.open_db(fname)
+        assert bdb.getone(fname, 'PRAGMA user_version')[0] == tm_db.SCHEMA_VERSION
+        assert db.submit_queue.entries() == [(task0.id, [])]
+        assert list(db.submit_queue) == [task0]
+        job = next(db.job_queue.states())
+        assert (job.workflow_id, job.task_id, job.job_id, job.job_state) == (
+            'wf-id', task1.id, 12, 'RUNNING')
+        assert job.metadata == {}
+        assert db.job_queue.get_task(job.id) == task1
+        db.update_queue.push('wf-id', task1.id, 'COMPLETED')
+        assert [update.job_state for update in db.update_queue.updates()] == ['COMPLETED']
+    finally:
+        bdb.close_connections()
+        os.remove(fname)
+
+
+def test_finished_jobs(temp_db):
+    """Test that finished jobs are kept while queued tasks wait for them."""
+    db = temp_db
+
+    task0 = make_task(0)
+    task1 = make_task(1)
+    db.job_queue.push(task=task0, job_id=1, job_state='COMPLETED')
+    db.job_queue.finish(next(db.job_queue.states()).id)
+    db.finished_jobs.record(task1.id, 'SUBMIT_FAIL')
+    db.submit_queue.push(make_task(2), depends_on=[task0.id])
+
+    assert db.job_queue.count() == 0
+    assert db.finished_jobs.states([task0.id, task1.id, 'other']) == {
+        task0.id: 'COMPLETED', task1.id: 'SUBMIT_FAIL'}
+    db.finished_jobs.prune(-1)
+    assert db.finished_jobs.states([task0.id, task1.id]) == {task0.id: 'COMPLETED'}
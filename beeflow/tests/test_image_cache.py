@@ -0,0 +1,117 @@
+"""Tests of the container image cache."""
+
+# Disable W0621: Pylint complains about redefining fixtures from the outer
+#               scope. This is how pytest fixtures work.
+# pylint:disable=W0621
+
+import os
+import subprocess
+
+import pytest
+
+from beeflow.common.build import image_cache
+from beeflow.common.build.image_cache import ImageCache
+from beeflow.common.build_interfaces import build_main
+from beeflow.common.object_models import Hint, Task
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Image cache evicting images above 2000 bytes."""
+    return ImageCache(str(tmp_path), max_size=2000)
+
+
+def store_image(cache, key, name, task_id='task', size=1000):
+    """Write an image tarball and add it to the cache."""
+    os.makedirs(cache.store, exist_ok=True)
+    with open(cache.partial_path(key), 'wb') as fp:
+        fp.write(b'\0' * size)
+    return cache.add(key, name, task_id)
+
+
+def test_keys():
+    """Test that images are keyed by digest or Dockerfile contents."""
+    digest = 'a' * 64
+    assert image_cache.pull_key(f'ubuntu@sha256:{digest}') == f'sha256-{digest}'
+    assert (image_cache.pull_key(f'registry/ubuntu:22.04@sha256:{digest}')
+            == image_cache.pull_key(f'ubuntu@sha256:{digest}'))
+    assert image_cache.pull_key('ubuntu:22.04') != image_cache.pull_key('ubuntu:24.04')
+    assert (image_cache.dockerfile_key('FROM alpine\n', 'seccomp')
+            == image_cache.dockerfile_key('FROM alpine\n', 'seccomp'))
+    assert (image_cache.dockerfile_key('FROM alpine\n', 'seccomp')
+            != image_cache.dockerfile_key('FROM alpine\n', 'none'))
+
+
+def test_lookup(cache):
+    """Test linking names to stored images."""
+    path = store_image(cache, 'key', 'first')
+    assert os.path.realpath(cache.name_path('first')) == path
+    assert cache.lookup('missing', 'second', 'task') is None
+
+    assert cache.lookup('key', 'second', 'other') == path
+    assert os.path.realpath(cache.name_path('second')) == path
+    assert cache.db.get('key').refs == 2
+
+    # Index entries whose tarball is gone are dropped
+    os.remove(path)
+    assert cache.lookup('key', 'first', 'task') is None
+    assert cache.db.get('key') is None
+
+
+def test_evict(cache):
+    """Test that the least recently used images nobody uses are evicted."""
+    store_image(cache, 'old', 'old', task_id='running')
+    store_image(cache, 'unused', 'unused', task_id='done')
+    cache.release('done')
+    store_image(cache, 'new', 'new', task_id='done')
+
+    # 'old' is still in use, so 'unused' goes
+    assert cache.db.get('unused') is None
+    assert not os.path.lexists(cache.name_path('unused'))
+    assert not os.path.exists(cache.path('unused'))
+    assert {image.key for image in cache.db.images()} == {'old', 'new'}
+
+    cache.release('running')
+    cache.release('done')
+    cache.lookup('old', 'old', 'again')
+    store_image(cache, 'newest', 'newest', task_id='again')
+    assert {image.key for image in cache.db.images()} == {'old', 'newest'}
+
+
+def pretend_build(cmd, **_kwargs):
+    """Pretend to pull or build an image, writing the output file."""
+    with open(cmd.split()[-1], 'wb') as fp:
+        fp.write(b'image')
+    return subprocess.CompletedProcess(cmd, 0)
+
+
+def test_docker_file_built_once(cache, mocker):
+    """Test that identical Dockerfiles are only built once."""
+    mocker.patch.object(ImageCache, 'from_config', return_value=cache)
+    run = mocker.patch('beeflow.common.build.container_drivers.subprocess.run',
+                       side_effect=pretend_build)
+    for name in ['first', 'second']:
+        params = {'dockerFile': 'FROM alpine\n', 'beeflow:containerName': name}
+        task = Task(name=name, base_command=['true'], workflow_id='wf', workdir='/tmp',
+                    hints=[Hint(class_='DockerRequirement', params=params)])
+        build_main(task)
+        assert os.path.exists(cache.name_path(name))
+    assert run.call_count == 1
+    assert os.path.realpath(cache.name_path('first')) == os.path.realpath(
+        cache.name_path('second'))
+
+
+def test_squash_format(tmp_path, mocker):
+    """Test that images are converted to SquashFS once at build time."""
+    cache = ImageCache(str(tmp_path), image_format='squash')
+    mocker.patch.object(ImageCache, 'from_config', return_value=cache)
+    run = mocker.patch('beeflow.common.build.container_drivers.subprocess.run',
+                       side_effect=pretend_build)
+    params = {'dockerPull': 'alpine:3.20'}
+    task = Task(name='pull', base_command=['true'], workflow_id='wf', workdir='/tmp',
+                hints=[Hint(class_='DockerRequirement', params=params)])
+    build_main(task)
+    assert '-o squash alpine:3.20' in run.call_args.args[0]
+    assert cache.name_path('alpine:3.20') == str(tmp_path / 'alpine:3.20.sqfs')
+    assert os.path.realpath(cache.name_path('alpine:3.20')).endswith('-squash.sqfs')
+    assert image_cache.pull_key('alpine:3.20', 'squash') != image_cache.pull_key('alpine:3.20')
@@ -0,0 +1,80 @@
+"""Tests of the node-local image cache."""
+
+# Disable W0621: Pylint complains about redefining fixtures from the outer
+#               scope. This is how pytest fixtures work.
+# pylint:disable=W0621
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import pytest
+
+from beeflow.common.crt.image_deploy import DeployedImages, image_key
+
+
+@pytest.fixture
+def ch_convert(tmp_path, monkeypatch):
+    """Put a fake ch-convert on PATH; returns the file logging its calls."""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log_file = tmp_path / 'ch-convert.log'
+    script = bin_dir / 'ch-convert'
+    script.write_text('#!/bin/sh\n'
+                      f'echo "$5" >> {log_file}\n'
+                      'sleep 0.2\n'
+                      'mkdir -p "$6" && head -c 1000 /dev/zero > "$6/file"\n',
+                      encoding='utf-8')
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    return log_file
+
+
+def test_image_key(tmp_path):
+    """Test that the key changes when the tarball is replaced."""
+    archive = tmp_path / 'image.tar.gz'
+    archive.write_bytes(b'old')
+    key = image_key(str(archive))
+    assert key.startswith('image-')
+    assert image_key(str(archive)) == key
+    archive.write_bytes(b'newer')
+    assert image_key(str(archive)) != key
+
+
+def test_deploy_once(tmp_path, ch_convert):
+    """Test that concurrent tasks share one unpacked image."""
+    images = DeployedImages(str(tmp_path / 'root'), ttl=3600)
+    with ThreadPoolExecutor(4) as executor:
+        paths = list(executor.map(lambda i: images.deploy('key', 'image.tar.gz', f'task-{i}'),
+                                  range(4)))
+    assert paths == [images.path('key')] * 4
+    assert os.path.exists(os.path.join(images.path('key'), 'file'))
+    assert ch_convert.read_text(encoding='utf-8').split() == ['image.tar.gz']
+    assert sorted(images.leases('key')) == [f'task-{i}' for i in range(4)]
+
+    # Released images are kept for later tasks until the TTL runs out
+    for i in range(4):
+        images.release('key', f'task-{i}')
+    images.deploy('key', 'image.tar.gz', 'task-4')
+    assert len(ch_convert.read_text(encoding='utf-8').split()) == 1
+
+
+def test_evict(tmp_path, ch_convert):  # pylint: disable=W0613 # ch_convert is needed on PATH
+    """Test evicting expired images and images above the size limit."""
+    images = DeployedImages(str(tmp_path / 'root'), ttl=3600, max_size=2500)
+    for key in ['a', 'b', 'c']:
+        images.deploy(key, f'{key}.tar.gz', 'task')
+    # Every image is leased, so none can be evicted
+    assert sorted(images.keys()) == ['a', 'b', 'c']
+
+    # 'b' is the only image without a lease, so it goes to bring the cache under 2500 bytes
+    images.release('b', 'task')
+    assert sorted(images.keys()) == ['a', 'c']
+    assert not os.path.exists(images.path('b'))
+
+    # The rest fit, so they are kept until the TTL runs out
+    images.release('a', 'task')
+    images.release('c', 'task')
+    assert sorted(images.keys()) == ['a', 'c']
+    assert images.evict(now=time.time() + 7200) == ['a', 'c']
+    assert not images.keys()
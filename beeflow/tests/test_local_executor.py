@@ -0,0 +1,117 @@
+"""Tests of the local executor and the simple worker."""
+
+import pathlib
+import time
+
+from beeflow.common.object_models import Requirement, Task
+from beeflow.common.worker.local_executor import LocalExecutor
+from beeflow.common.worker.simple_worker import SimpleWorker
+
+# Seconds to wait for jobs to finish
+TIMEOUT = 60
+
+
+def submit(executor, tmp_path, name, text, **kwargs):
+    """Write a script and submit it; returns its state."""
+    script = tmp_path / f'{name}.sh'
+    script.write_text(text, encoding='utf-8')
+    return executor.submit(name, str(script), str(tmp_path / f'{name}.out'),
+                           str(tmp_path / f'{name}.err'), **kwargs)
+
+
+def wait(query, job_ids, results=None):
+    """Wait for the jobs to finish; returns their states and infos.
+
+    Jobs are forgotten once their final state was returned, so only the jobs
+    that haven't finished yet (according to results) are queried.
+    """
+    deadline = time.monotonic() + TIMEOUT
+    results = dict(results or {})
+    while time.monotonic() < deadline:
+        running = [job_id for job_id in job_ids
+                   if job_id not in results or results[job_id][0] in ('PENDING', 'RUNNING')]
+        if not running:
+            break
+        results.update(query(running))
+        time.sleep(0.1)
+    return results
+
+
+def test_pack_cores(tmp_path):
+    """Test that jobs run concurrently up to the number of cores."""
+    executor = LocalExecutor(cores=4)
+    assert submit(executor, tmp_path, 'a', 'sleep 30', cores=2) == 'RUNNING'
+    assert submit(executor, tmp_path, 'b', 'sleep 30', cores=2) == 'RUNNING'
+    assert submit(executor, tmp_path, 'c', 'true', cores=2) == 'PENDING'
+    # Jobs asking for more than the executor has get all of it
+    assert submit(executor, tmp_path, 'd', 'true', cores=64) == 'PENDING'
+    assert executor.info('d')[1]['cores'] == 4
+
+    assert executor.cancel('a') == 'CANCELLED'
+    results = executor.query(['c'])
+    assert results['c'][0] in ('RUNNING', 'COMPLETED')
+    assert executor.cancel('d') == 'CANCELLED'
+    executor.cancel('b')
+    assert wait(executor.query, ['c'], results)['c'][0] == 'COMPLETED'
+    assert executor.free_cores == 4
+    assert not executor.busy()
+    # Finished jobs are forgotten once their final state was returned
+    assert not executor.jobs
+    assert executor.query(['a', 'c']) == {}
+
+
+def test_memory_budget(tmp_path):
+    """Test that jobs wait for memory even when cores are free."""
+    executor = LocalExecutor(cores=4, memory=1000)
+    assert submit(executor, tmp_path, 'big', 'sleep 30', memory=800) == 'RUNNING'
+    assert submit(executor, tmp_path, 'wide', 'true', memory=400) == 'PENDING'
+    # A smaller job fills in around the waiting one
+    assert submit(executor, tmp_path, 'small', 'true', memory=100) == 'RUNNING'
+
+    executor.cancel('big')
+    results = wait(executor.query, ['wide', 'small'])
+    assert results['wide'][0] == 'COMPLETED'
+    assert results['small'][0] == 'COMPLETED'
+    assert executor.free_memory == 1000
+
+
+def test_job_info(tmp_path):
+    """Test the exit code, wall-clock time and max RSS recorded for jobs."""
+    executor = LocalExecutor(cores=2)
+    submit(executor, tmp_path, 'ok', 'sleep 0.2; echo out')
+    submit(executor, tmp_path, 'fail', 'exit 3')
+    results = wait(executor.query, ['ok', 'fail'])
+
+    state, info = results['ok']
+    assert state == 'COMPLETED'
+    assert info['exit_code'] == 0
+    assert info['wall_time'] >= 0.2
+    assert info['max_rss'] >= 0
+    assert (tmp_path / 'ok.out').read_text(encoding='utf-8') == 'out\n'
+    state, info = results['fail']
+    assert state == 'FAILED'
+    assert info['exit_code'] == 3
+
+
+def test_simple_worker_concurrent(tmp_path):
+    """Test that the simple worker runs tasks side by side within its cores."""
+    worker = SimpleWorker(container_runtime='Charliecloud', bee_workdir=str(tmp_path), cores=2)
+    tasks = [Task(name=f'task-{i}', base_command=['sleep', '1'], workflow_id='wf',
+                  workdir=str(tmp_path / 'work'),
+                  requirements=[Requirement(class_='beeflow:MPIRequirement',
+                                            params={'ntasks': 1})])
+             for i in range(3)]
+    states = []
+    for task in tasks:
+        worker.prepare(task)
+        job_id, state, _ = worker.submit_task(task)
+        assert job_id == task.id
+        states.append(state)
+    assert states == ['RUNNING', 'RUNNING', 'PENDING']
+
+    results = wait(worker.query_tasks, [task.id for task in tasks])
+    assert [results[task.id][0] for task in tasks] == ['COMPLETED'] * 3
+    assert results[tasks[0].id][1]['wall_time'] >= 1
+    for task in tasks:
+        stdout, _ = worker.resolve_stdout_stderr(task)
+        assert pathlib.Path(stdout).exists()
@@ -3,6 +3,8 @@
 from unittest.mock import call
 import pytest
 from beeflow.common.gdb import neo4j_cypher
+from beeflow.common.object_models import (Workflow, Task, Hint, InputParameter, StepInput,
+                                          StepOutput, generate_workflow_id)
 
 
 @pytest.mark.parametrize("reqs, expected", [(True, ["dummy"] * 3), (False, [])])
@@ -78,3 +80,66 @@ def test_final_tasks_completed(mocker, restart, single, expected):
     assert ("|RESTARTED_FROM" in tx.run.mock_calls[1].args[0]) == restart
     assert tx.run.mock_calls[2] == call().single()
     assert result == expected
+
+
+def test_get_tasks_data(mocker):
+    """Test that tasks are read with a single query."""
+    tx = mocker.MagicMock()
+    tx.run.return_value = iter([{"t": {"id": "A"}}, {"t": {"id": "B"}}])
+    result = neo4j_cypher.get_tasks_data(tx, ["A", "B"])
+    assert result == [{"t": {"id": "A"}}, {"t": {"id": "B"}}]
+    tx.run.assert_called_once()
+    assert tx.run.call_args.args[0].startswith("UNWIND $task_ids")
+    assert tx.run.call_args.kwargs == {"task_ids": ["A", "B"]}
+
+
+def test_mark_downstream(mocker):
+    """Test that the downstream closure is updated with a single query."""
+    tx = mocker.MagicMock()
+    neo4j_cypher.mark_downstream(tx, "A", "DEP_FAIL")
+    tx.run.assert_called_once()
+    assert "[:DEPENDS_ON*]" in tx.run.call_args.args[0]
+    assert tx.run.call_args.kwargs == {"task_id": "A", "state": "DEP_FAIL"}
+
+
+def test_get_final_task_state_counts(mocker):
+    """Test that the final task states are counted with a single query."""
+    tx = mocker.MagicMock()
+    tx.run.return_value = [{"state": "COMPLETED", "count": 3}, {"state": "FAILED", "count": 1}]
+    mocker.patch(
+        "beeflow.common.gdb.neo4j_cypher.get_workflow_by_id",
+        return_value={"restart": False},
+    )
+    result = neo4j_cypher.get_final_task_state_counts(tx, "WFID")
+    assert result == {"COMPLETED": 3, "FAILED": 1}
+    tx.run.assert_called_once()
+
+
+def test_load_workflow(mocker):
+    """Test that a workflow is loaded with a fixed number of queries."""
+    wf_id = generate_workflow_id()
+    workflow = Workflow(name="wf", hints=[], requirements=[],
+                        inputs=[InputParameter(id="wf_input", type="File", value="in.txt")],
+                        outputs=[], id=wf_id)
+
+    def make_task(name, source):
+        return Task(name=name, base_command="ls", requirements=[],
+                    hints=[Hint(class_="DockerRequirement", params={"dockerPull": "img"})],
+                    inputs=[StepInput(id=f"{name}/in", type="File", value=None, default=None,
+                                      source=source, prefix=None, position=None,
+                                      value_from=None)],
+                    outputs=[StepOutput(id=f"{name}/out", type="File", value=None,
+                                        glob=f"{name}.txt")],
+                    stdout=None, stderr=None, workflow_id=wf_id)
+
+    tasks = [make_task("a", "wf_input"), make_task("b", "a/out"), make_task("c", "a/out")]
+    tx = mocker.MagicMock()
+    neo4j_cypher.load_workflow(tx, workflow, tasks)
+
+    assert tx.run.call_count == 13
+    kwargs = [run.kwargs for run in tx.run.call_args_list]
+    assert [row["id"] for row in kwargs[5]["tasks"]] == [task.id for task in tasks]
+    assert len(kwargs[6]["rows"]) == 3
+    assert kwargs[11]["task_ids"] == [tasks[0].id]
+    assert sorted(kwargs[12]["deps"]) == sorted([[tasks[1].id, tasks[0].id],
+                                                 [tasks[2].id, tasks[0].id]])
@@ -0,0 +1,86 @@
+"""Tests of the pilot worker and agent."""
+
+# Disable W0621: Pylint complains about redefining fixtures from the outer
+#               scope. This is how pytest fixtures work.
+# pylint:disable=W0621
+
+import os
+import pathlib
+
+import pytest
+
+import beeflow
+from beeflow.common.object_models import Task
+from beeflow.common.worker.pilot_agent import PilotAgent
+from beeflow.common.worker.pilot_worker import PilotWorker
+from beeflow.common.worker.simple_worker import SimpleWorker
+from beeflow.tests.test_local_executor import wait
+
+
+def write_script(path, text):
+    """Write a task script and return its path."""
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def agent_job(tmp_path, name, text, cores=1):
+    """Return the submit parameters of an agent job."""
+    return {'job_id': name, 'script': write_script(tmp_path / f'{name}.sh', text),
+            'stdout': str(tmp_path / f'{name}.out'), 'stderr': str(tmp_path / f'{name}.err'),
+            'cores': cores}
+
+
+def test_agent_packs_cores(tmp_path):
+    """Test that the agent only runs as many jobs as it has cores."""
+    agent = PilotAgent(cores=2, idle_timeout=60)
+    agent.submit(**agent_job(tmp_path, 'long', 'sleep 30'))
+    agent.submit(**agent_job(tmp_path, 'wide', 'true', cores=2))
+    agent.submit(**agent_job(tmp_path, 'short', 'echo done'))
+
+    states = agent.query(['long', 'wide', 'short'])
+    assert states['long'][0] == 'RUNNING'
+    # The wide job waits, the short one fills the free core
+    assert states['wide'][0] == 'PENDING'
+    assert states['short'][0] in ('RUNNING', 'COMPLETED')
+
+    # The wide job only fits once both the long and the short job are done
+    assert wait(agent.query, ['short'], states)['short'][0] == 'COMPLETED'
+    assert agent.cancel('long') == 'CANCELLED'
+    agent.schedule()
+    assert agent.query(['wide'])['wide'][0] in ('RUNNING', 'COMPLETED')
+    assert (tmp_path / 'short.out').read_text(encoding='utf-8') == 'done\n'
+    assert not agent.idle()
+
+
+@pytest.fixture
+def pilot_worker(tmp_path, monkeypatch):
+    """Pilot worker starting its agent with the simple worker."""
+    # The agent runs in a process of its own and must find beeflow
+    monkeypatch.setenv('PYTHONPATH', str(pathlib.Path(beeflow.__file__).parent.parent))
+    worker = PilotWorker(bee_workdir=str(tmp_path), worker_class=SimpleWorker,
+                         container_runtime='Charliecloud', pilot_cores=2,
+                         pilot_idle_timeout=30)
+    yield worker
+    worker.stop_pilot()
+
+
+def test_pilot_worker_simple(tmp_path, pilot_worker):
+    """Test running tasks in a pilot started with the simple worker."""
+    tasks = [Task(name=f'task-{i}', base_command=['echo', str(i)], workflow_id='wf',
+                  workdir=str(tmp_path / 'work')) for i in range(3)]
+    job_ids = []
+    for task in tasks:
+        pilot_worker.prepare(task)
+        job_id, state, _ = pilot_worker.submit_task(task)
+        assert state == 'PENDING'
+        job_ids.append(job_id)
+
+    states = wait(pilot_worker.query_tasks, job_ids)
+
+    assert [states[job_id][0] for job_id in job_ids] == ['COMPLETED'] * 3
+    # All tasks ran in the one pilot job
+    assert len(pilot_worker.inner.executor.jobs) == 1
+    for i, task in enumerate(tasks):
+        stdout, _ = pilot_worker.resolve_stdout_stderr(task)
+        assert pathlib.Path(stdout).read_text(encoding='utf-8') == f'{i}\n'
+    assert os.path.exists(pilot_worker.pilot['contact_file'])
@@ -0,0 +1,109 @@
+"""Tests of the Slurm emulator."""
+
+# Disable W0621: Pylint complains about redefining fixtures from the outer
+#               scope. This is how pytest fixtures work.
+# pylint:disable=W0621
+
+import time
+
+import pytest
+
+from beeflow.common.object_models import Task
+from beeflow.common.sched_emulator.emulator import DEFAULTS, Emulator, parse_time_limit
+from beeflow.common.sched_emulator.harness import emulated_slurm
+from beeflow.common.sched_emulator.restd import OPENAPI_VERSIONS
+from beeflow.common.worker.slurm_worker import SlurmWorker
+from beeflow.common.worker_interface import WorkerInterface
+
+
+def job_options(name, **kwargs):
+    """Return the submit options of an emulated job."""
+    return {'name': name, 'command': f'/jobs/{name}.sh', **kwargs}
+
+
+@pytest.fixture
+def emulator(tmp_path):
+    """Emulator where jobs wait 10 seconds and run for 100."""
+    config = dict(DEFAULTS, queue_wait=10, run_time=100, distribution='fixed')
+    emulator = Emulator(str(tmp_path), config)
+    yield emulator
+    emulator.close()
+
+
+def test_timeline(emulator):
+    """Test the states that jobs go through."""
+    first = emulator.submit(job_options('first'))
+    after = emulator.submit(job_options('after', dependency=[str(first)]))
+    short = emulator.submit(job_options('short', time_limit=60))
+    array = emulator.submit(job_options('array'), array=[0, 1])
+    submitted = emulator.snapshot().jobs[first]['submit_time']
+
+    def states(offset):
+        snapshot = emulator.snapshot(submitted + offset)
+        return {job_id: snapshot.state(snapshot.find(job_id)[0])[0]
+                for job_id in [first, after, short, f'{array}_1']}
+
+    assert states(5) == {first: 'PENDING', after: 'PENDING', short: 'PENDING',
+                         f'{array}_1': 'PENDING'}
+    assert states(50) == {first: 'RUNNING', after: 'PENDING', short: 'RUNNING',
+                          f'{array}_1': 'RUNNING'}
+    # The dependent job starts waiting when the first one completes
+    assert states(115) == {first: 'COMPLETED', after: 'PENDING', short: 'TIMEOUT',
+                           f'{array}_1': 'COMPLETED'}
+    assert states(125)[after] == 'RUNNING'
+    assert emulator.snapshot(submitted + 5).state(after) == ('PENDING', 'Dependency')
+
+
+def test_failed_dependency(tmp_path):
+    """Test that jobs depending on a failed job are cancelled with kill-on-invalid-dep."""
+    config = dict(DEFAULTS, queue_wait=0, run_time=1, distribution='fixed', failure_rate=1)
+    emulator = Emulator(str(tmp_path), config)
+    failing = emulator.submit(job_options('failing'))
+    killed = emulator.submit(job_options('killed', dependency=[str(failing)],
+                                         kill_on_invalid_dep=True))
+    held = emulator.submit(job_options('held', dependency=[str(failing)]))
+    snapshot = emulator.snapshot(time.time() + 5)
+    assert snapshot.state(failing)[0] == 'FAILED'
+    assert snapshot.state(killed)[0] == 'CANCELLED'
+    assert snapshot.state(held) == ('PENDING', 'DependencyNeverSatisfied')
+
+    assert not emulator.cancel([str(held)])
+    assert emulator.snapshot().state(held)[0] == 'CANCELLED'
+    assert emulator.cancel(['12345']) == {'12345': 'Invalid job id specified'}
+    emulator.close()
+
+
+def test_parse_time_limit():
+    """Test parsing Slurm time limits."""
+    assert parse_time_limit('30') == 1800
+    assert parse_time_limit('1:30') == 90
+    assert parse_time_limit('01:00:00') == 3600
+    assert parse_time_limit('1-2') == 93600
+    assert parse_time_limit('UNLIMITED') is None
+
+
+@pytest.mark.parametrize('slurmrestd', [False, True], ids=['slurm-commands', 'slurmrestd'])
+def test_slurm_worker(tmp_path, slurmrestd):
+    """Test the Slurm worker against the emulated commands and slurmrestd."""
+    config = tmp_path / 'emulator.conf'
+    config.write_text('[emulator]\nqueue_wait = 0\nrun_time = 2\ndistribution = fixed\n',
+                      encoding='utf-8')
+    with emulated_slurm(str(tmp_path), str(config), slurmrestd) as socket_path:
+        worker = WorkerInterface(SlurmWorker, bee_workdir=str(tmp_path),
+                                 container_runtime='Charliecloud', use_commands=not slurmrestd,
+                                 slurm_socket=socket_path, openapi_version=OPENAPI_VERSIONS[0])
+        tasks = [Task(name=f'task-{i}', base_command=['true'], workflow_id='wf',
+                      workdir=str(tmp_path / 'work')) for i in range(2)]
+        job_id, state, _ = worker.submit_task(tasks[0])
+        assert state == 'RUNNING'
+        chained, state, _ = worker.submit_task(tasks[1], depends_on=[job_id])
+        assert state == 'PENDING'
+        assert worker.query_tasks([job_id, chained])[chained][0] == 'PENDING'
+
+        deadline = time.monotonic() + 30
+        while worker.query_task(job_id)[0] == 'RUNNING' and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert worker.query_task(job_id)[0] == 'COMPLETED'
+        assert worker.query_task(chained)[0] == 'RUNNING'
+        assert worker.cancel_task(chained) == 'CANCELLED'
+        assert worker.query_tasks([chained])[chained][0] == 'CANCELLED'
@@ -17,7 +17,7 @@ import pytest
 import beeflow.common.worker.utils as worker_utils
 from beeflow.common.worker_interface import WorkerInterface
 from beeflow.common.worker.worker import WorkerError
-from beeflow.common.worker.slurm_worker import SlurmWorker
+from beeflow.common.worker.slurm_worker import SlurmWorker, slurmrestd_job_ids
 from beeflow.common.object_models import Task
 
 
@@ -119,6 +119,106 @@ def test_query_bad_job_id(slurm_worker):
         slurm_worker.query_task(888)
 
 
+def test_query_tasks(slurm_worker):
+    """Test querying several jobs at once."""
+    temp_workdir = tempfile.mkdtemp()
+    GOOD_TASK.workdir = temp_workdir
+    job_ids = [slurm_worker.submit_task(GOOD_TASK)[0] for _ in range(3)]
+    states = slurm_worker.query_tasks(job_ids + [888])
+    for job_id in job_ids:
+        slurm_worker.cancel_task(job_id)
+    shutil.rmtree(temp_workdir)
+    assert sorted(states) == sorted(job_ids)
+    assert all(state in ('PENDING', 'RUNNING', 'COMPLETING', 'COMPLETED')
+               for state, _ in states.values())
+
+
+def test_query_tasks_commands(mocker, tmp_path):
+    """Test that the CLI worker queries jobs with one squeue call and one sacct call."""
+    squeue_out = ('101|RUNNING|job-a|user|acct|debug|normal|None|1|4|node1|0:10|1:00:00|'
+                  '2025-01-01T00:00:00|2025-01-01T00:00:01|2025-01-01T01:00:01|/bin/a|b\n'
+                  '102|PENDING|job-b|user|acct|debug|normal|Priority|1|4||0:00|1:00:00|'
+                  '2025-01-01T00:00:00|N/A|N/A|/bin/b\n')
+    sacct_out = '103|COMPLETED\n103.batch|COMPLETED\n104|CANCELLED by 1000\n'
+
+    def run(args, **_kwargs):
+        stdout = squeue_out if args[0] == 'squeue' else sacct_out
+        return subprocess.CompletedProcess(args, 0, stdout=stdout, stderr='')
+
+    run = mocker.patch('subprocess.run', side_effect=run)
+    worker = SlurmWorker(use_commands=True, container_runtime='Charliecloud',
+                         bee_workdir=str(tmp_path))
+
+    states = worker.query_tasks([101, 102, 103, 104, 105])
+
+    assert run.call_count == 2
+    assert '--jobs=101,102,103,104,105' in run.call_args_list[0].args[0]
+    assert '--jobs=103,104,105' in run.call_args_list[1].args[0]
+    assert states[101][0] == 'RUNNING'
+    assert states[101][1]['NodeList'] == 'node1'
+    assert states[101][1]['Command'] == '/bin/a|b'
+    fields = [key for key, _ in worker._inner.SQUEUE_FIELDS]  # pylint: disable=W0212
+    assert states[102] == ('PENDING', dict(zip(fields, squeue_out.splitlines()[1].split('|'))))
+    assert states[103] == ('COMPLETED', {})
+    assert states[104] == ('CANCELLED', {})
+    assert 105 not in states
+
+
+def test_submit_array_commands(mocker, tmp_path):
+    """Test that tasks are submitted as one job array and queried per element."""
+    squeue_out = ('555_0|RUNNING|job-a|user|acct|debug|normal|None|1|4|node1|0:10|1:00:00|'
+                  '2025-01-01T00:00:00|2025-01-01T00:00:01|2025-01-01T01:00:01|array.sh\n')
+
+    def run(args, **_kwargs):
+        stdout = {'sbatch': '555\n', 'squeue': squeue_out}.get(args[0], '')
+        return subprocess.CompletedProcess(args, 0, stdout=stdout, stderr='')
+
+    run = mocker.patch('subprocess.run', side_effect=run)
+    worker = WorkerInterface(SlurmWorker, use_commands=True, container_runtime='Charliecloud',
+                             bee_workdir=str(tmp_path))
+    tasks = [Task(name=f'task-{i}', base_command=['echo', str(i)], workdir=str(tmp_path),
+                  workflow_id='wf') for i in range(3)]
+    tasks[0].stdout = 'out-%j.txt'
+    assert len({worker.array_key(task) for task in tasks}) == 1
+
+    jobs = worker.submit_array(tasks)
+
+    sbatch_calls = [call.args[0] for call in run.call_args_list if call.args[0][0] == 'sbatch']
+    assert len(sbatch_calls) == 1
+    assert [job_id for job_id, _, _ in jobs] == ['555_0', '555_1', '555_2']
+    assert jobs[0][1] == 'RUNNING'
+    assert jobs[1][1] == 'PENDING'
+    # Paths in the table are expanded with the element job ids
+    assert tasks[0].stdout == 'out-555_0.txt'
+    array_script = sbatch_calls[0][-1]
+    with open(array_script, encoding='utf-8') as fp:
+        script = fp.read()
+    assert '#SBATCH --array=0-2' in script
+    assert f'#SBATCH --output={os.path.dirname(array_script)}/%A_%a.out' in script
+    with open(os.path.join(os.path.dirname(array_script), 'array.tsv'),
+              encoding='utf-8') as fp:
+        rows = [line.split('\t') for line in fp.read().splitlines()]
+    assert [os.path.basename(row[0]) for row in rows] == [
+        f'{task.name}-{task.id[:4]}.sh' for task in tasks
+    ]
+
+
+def test_expand_array_indices():
+    """Test expanding job array index expressions."""
+    assert worker_utils.expand_array_indices('0-3') == [0, 1, 2, 3]
+    assert worker_utils.expand_array_indices('1,4-8:2%2') == [1, 4, 6, 8]
+    assert not worker_utils.expand_array_indices('')
+
+
+def test_slurmrestd_job_ids():
+    """Test mapping slurmrestd job records to job array element ids."""
+    assert slurmrestd_job_ids({'job_id': 10, 'array_job_id': {'set': True, 'number': 0}}) == ['10']
+    assert slurmrestd_job_ids({'job_id': 12, 'array_job_id': 10, 'array_task_id': 2}) == ['10_2']
+    pending = {'job_id': 10, 'array_job_id': {'set': True, 'number': 10},
+               'array_task_id': {'set': False, 'number': 0}, 'array_task_string': '3-4'}
+    assert slurmrestd_job_ids(pending) == ['10_3', '10_4']
+
+
 def test_cancel_good_job(slurm_worker):
     """Cancel a good job."""
     temp_workdir = tempfile.mkdtemp()
@@ -1,11 +1,15 @@
 """Tests for sql_gdb module."""
 
-from unittest.mock import call
 import json
+import sqlite3
 
 import pytest
 
-from beeflow.common.db import gdb_db
+from beeflow.common.db import bdb, gdb_db
+from beeflow.common.gdb.sqlite3_driver import SQLDriver
+from beeflow.common.wf_interface import WorkflowInterface
+from beeflow.common.object_models import (Workflow, Task, InputParameter, OutputParameter,
+                                          StepInput, StepOutput, generate_workflow_id)
 
 
 @pytest.fixture
@@ -17,129 +21,61 @@ def sql_gdb_instance(mocker, tmp_path):
     return gdb_db.SQL_GDB(str(db_file))
 
 
-@pytest.mark.parametrize("count, expected", [(0, True), (3, False)])
-def test_final_tasks_completed(mocker, sql_gdb_instance, count, expected):
+@pytest.mark.parametrize("counts, expected", [
+    ({}, True),
+    ({"COMPLETED": 2, "FAILED": 1}, True),
+    ({"COMPLETED": 2, "RUNNING": 3}, False),
+])
+def test_final_tasks_completed(mocker, sql_gdb_instance, counts, expected):
     """Regression test final_tasks_completed."""
-    getone = mocker.patch(
-        "beeflow.common.db.gdb_db.bdb.getone",
-        return_value=(count,),
-    )
+    get_counts = mocker.patch.object(gdb_db.SQL_GDB, "get_task_state_counts",
+                                     return_value=counts)
 
-    wf_id = "WFID"
-    result = sql_gdb_instance.final_tasks_completed(wf_id)
-
-    placeholders = ",".join("?" for _ in gdb_db.final_task_states)
-    expected_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state NOT IN ({placeholders});
-        """
+    result = sql_gdb_instance.final_tasks_completed("WFID")
 
-    getone.assert_called_once()
-    assert getone.mock_calls[0] == call(
-        sql_gdb_instance.db_file,
-        expected_query,
-        [wf_id, *gdb_db.final_task_states],
-    )
+    get_counts.assert_called_once_with("WFID")
     assert result == expected
 
 
 @pytest.mark.parametrize(
-    "completed, failed_count, expected",
+    "counts, expected",
     [
-        (True, 0, True),   # all completed, none failed
-        (True, 2, False),  # completed but some failed
-        (False, 0, False), # not completed yet
+        ({"COMPLETED": 3, "RESTARTED": 1}, True),  # all completed, none failed
+        ({"COMPLETED": 1, "FAILED": 2}, False),    # completed but some failed
+        ({"COMPLETED": 1, "WAITING": 2}, False),   # not completed yet
     ],
 )
-def test_final_tasks_succeeded(mocker, sql_gdb_instance, completed, failed_count, expected):
+def test_final_tasks_succeeded(mocker, sql_gdb_instance, counts, expected):
     """Regression test final_tasks_succeeded."""
-    mocker.patch.object(
-        gdb_db.SQL_GDB,
-        "final_tasks_completed",
-        return_value=completed,
-    )
-    getone = mocker.patch(
-        "beeflow.common.db.gdb_db.bdb.getone",
-        return_value=(failed_count,),
-    )
+    get_counts = mocker.patch.object(gdb_db.SQL_GDB, "get_task_state_counts",
+                                     return_value=counts)
 
-    wf_id = "WFID"
-    result = sql_gdb_instance.final_tasks_succeeded(wf_id)
-
-    placeholders = ",".join("?" for _ in gdb_db.failed_task_states)
-    expected_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state IN ({placeholders});
-        """
+    result = sql_gdb_instance.final_tasks_succeeded("WFID")
 
-    getone.assert_called_once()
-    assert getone.mock_calls[0] == call(
-        sql_gdb_instance.db_file,
-        expected_query,
-        [wf_id, *gdb_db.failed_task_states],
-    )
+    get_counts.assert_called_once_with("WFID")
     assert result == expected
 
 
-@pytest.mark.parametrize("count, expected", [(0, True), (5, False)])
-def test_final_tasks_failed(mocker, sql_gdb_instance, count, expected):
+@pytest.mark.parametrize("counts, expected", [
+    ({"FAILED": 1, "DEP_FAIL": 4, "RESTARTED": 1}, True),
+    ({"FAILED": 1, "COMPLETED": 5}, False),
+])
+def test_final_tasks_failed(mocker, sql_gdb_instance, counts, expected):
     """Regression test final_tasks_failed."""
-    getone = mocker.patch(
-        "beeflow.common.db.gdb_db.bdb.getone",
-        return_value=(count,),
-    )
-
-    wf_id = "WFID"
-    result = sql_gdb_instance.final_tasks_failed(wf_id)
+    mocker.patch.object(gdb_db.SQL_GDB, "get_task_state_counts", return_value=counts)
 
-    placeholders = ",".join("?" for _ in gdb_db.failed_task_states) + ",?"
-    expected_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state NOT IN ({placeholders});
-        """
-
-    getone.assert_called_once()
-    assert getone.mock_calls[0] == call(
-        sql_gdb_instance.db_file,
-        expected_query,
-        [wf_id, *gdb_db.failed_task_states, "RESTARTED"],
-    )
-    assert result == expected
+    assert sql_gdb_instance.final_tasks_failed("WFID") == expected
 
 
-@pytest.mark.parametrize("count, expected", [(0, True), (1, False)])
-def test_cancelled_final_tasks_completed(mocker, sql_gdb_instance, count, expected):
+@pytest.mark.parametrize("counts, expected", [
+    ({"COMPLETED": 1, "WAITING": 2}, True),
+    ({"COMPLETED": 1, "PENDING": 1}, False),
+])
+def test_cancelled_final_tasks_completed(mocker, sql_gdb_instance, counts, expected):
     """Regression test cancelled_final_tasks_completed."""
-    getone = mocker.patch(
-        "beeflow.common.db.gdb_db.bdb.getone",
-        return_value=(count,),
-    )
+    mocker.patch.object(gdb_db.SQL_GDB, "get_task_state_counts", return_value=counts)
 
-    wf_id = "WFID"
-    result = sql_gdb_instance.cancelled_final_tasks_completed(wf_id)
-
-    incomplete_states = ["SUBMIT", "PENDING", "RUNNING", "COMPLETING"]
-    placeholders = ",".join("?" for _ in incomplete_states)
-    expected_query = f"""
-            SELECT COUNT(*)
-            FROM task
-            WHERE workflow_id = ?
-            AND state IN ({placeholders});
-        """
-
-    getone.assert_called_once()
-    assert getone.mock_calls[0] == call(
-        sql_gdb_instance.db_file,
-        expected_query,
-        [wf_id, *incomplete_states],
-    )
-    assert result == expected
+    assert sql_gdb_instance.cancelled_final_tasks_completed("WFID") == expected
 
 
 @pytest.mark.parametrize(
@@ -221,3 +157,195 @@ def test_set_workflow_state(mocker, sql_gdb_instance):
             WHERE id = :wf_id;""",
         {"wf_id": "WFID", "state": "COMPLETED"},
     )
+
+
+@pytest.fixture
+def sql_gdb_db(tmp_path):
+    """Create an SQL_GDB instance backed by a real database file."""
+    return gdb_db.SQL_GDB(str(tmp_path / "gdb.db"))
+
+
+def _diamond_workflow():
+    """Return a workflow with a prep -> (left, right) -> join diamond of tasks."""
+    wf_id = generate_workflow_id()
+    workflow = Workflow(name="diamond", hints=[], requirements=[],
+                        inputs=[InputParameter(id="wf_input", type="File", value="in.txt")],
+                        outputs=[OutputParameter(id="wf_output", type="File", value=None,
+                                                 source="join/out")],
+                        id=wf_id)
+
+    def make_task(name, sources):
+        inputs = [StepInput(id=f"{name}/in{i}", type="File", value=None, default=None,
+                            source=source, prefix=None, position=None, value_from=None)
+                  for i, source in enumerate(sources)]
+        outputs = [StepOutput(id=f"{name}/out", type="File", value=f"{name}.txt",
+                              glob=f"{name}.txt")]
+        return Task(name=name, base_command="ls", hints=[], requirements=[], inputs=inputs,
+                    outputs=outputs, stdout=None, stderr=None, workflow_id=wf_id,
+                    state="WAITING")
+
+    tasks = [make_task("prep", ["wf_input"]), make_task("left", ["prep/out"]),
+             make_task("right", ["prep/out"]), make_task("join", ["left/out", "right/out"])]
+    return workflow, tasks
+
+
+def test_bulk_load_workflow(sql_gdb_db):
+    """Test that a bulk load creates the same graph as loading task by task."""
+    workflow, tasks = _diamond_workflow()
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+
+    assert sql_gdb_db.get_workflow(workflow.id) == workflow
+    assert sorted(t.id for t in sql_gdb_db.get_workflow_tasks(workflow.id)) == sorted(
+        t.id for t in tasks)
+    bulk_deps = bdb.getall(sql_gdb_db.db_file, "SELECT * FROM task_dep")
+
+    workflow, tasks = _diamond_workflow()
+    sql_gdb_db.create_workflow(workflow)
+    for task in tasks:
+        sql_gdb_db.create_task(task)
+        sql_gdb_db.add_dependencies(task)
+    names = {task.id: task.name for task in tasks}
+    task_deps = bdb.getall(sql_gdb_db.db_file, """SELECT d.* FROM task_dep AS d
+                                                  JOIN task AS t ON t.id = d.depending_task_id
+                                                  WHERE t.workflow_id = ?""", [workflow.id])
+
+    assert len(bulk_deps) == 4
+    assert sorted((names[a], names[b]) for a, b in task_deps) == [
+        ("join", "left"), ("join", "right"), ("left", "prep"), ("right", "prep")]
+    assert {t.name for t in sql_gdb_db.get_dependent_tasks(tasks[0].id)} == {"left", "right"}
+
+
+def test_bulk_load_workflow_rolls_back(sql_gdb_db):
+    """Test that a failing bulk load leaves nothing behind."""
+    workflow, tasks = _diamond_workflow()
+    tasks[1].id = tasks[0].id
+
+    with pytest.raises(sqlite3.IntegrityError):
+        sql_gdb_db.bulk_load_workflow(workflow, tasks)
+
+    assert sql_gdb_db.get_workflow(workflow.id) is None
+    assert bdb.get_table_length(sql_gdb_db.db_file, "task") == 0
+
+
+def test_unsatisfied_inputs_counter(sql_gdb_db):
+    """Test that finalizing a task readies exactly the dependents it unblocks."""
+    workflow, tasks = _diamond_workflow()
+    prep, left, right, join = tasks
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+
+    def unsatisfied(task):
+        return bdb.getone(sql_gdb_db.db_file, "SELECT unsatisfied FROM task WHERE id=?",
+                          [task.id])[0]
+
+    assert [unsatisfied(task) for task in tasks] == [1, 1, 1, 2]
+    sql_gdb_db.set_init_task_inputs(workflow.id)
+    sql_gdb_db.set_runnable_tasks_to_ready(workflow.id)
+    assert [t.id for t in sql_gdb_db.get_ready_tasks(workflow.id)] == [prep.id]
+
+    for task in (prep, left):
+        sql_gdb_db.set_task_state(task.id, "COMPLETED")
+        sql_gdb_db.copy_task_outputs(task)
+        sql_gdb_db.set_runnable_dependents_to_ready(task.id)
+    assert sql_gdb_db.get_task_state(right.id) == "READY"
+    assert sql_gdb_db.get_task_state(join.id) == "WAITING"
+    assert unsatisfied(join) == 1
+
+    sql_gdb_db.set_task_input(join.id, "join/in0", None)
+    assert unsatisfied(join) == 2
+
+
+def test_finalize_task_skips_workflow_scan(mocker, sql_gdb_db):
+    """Test that finalizing a task only looks at its dependents for runnable tasks."""
+    workflow, tasks = _diamond_workflow()
+    prep, left, right, _ = tasks
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+    sql_gdb_db.set_init_task_inputs(workflow.id)
+    sql_gdb_db.set_runnable_tasks_to_ready(workflow.id)
+    driver = SQLDriver()
+    mocker.patch.object(driver, "db", sql_gdb_db, create=True)
+    scan = mocker.spy(sql_gdb_db, "set_runnable_tasks_to_ready")
+    wfi = WorkflowInterface(workflow.id, driver)
+
+    sql_gdb_db.set_task_state(prep.id, "RUNNING")
+    ready_tasks = wfi.finalize_task(prep)
+
+    assert sorted(task.id for task in ready_tasks) == sorted([left.id, right.id])
+    scan.assert_not_called()
+
+
+def test_bulk_task_hydration(sql_gdb_db):
+    """Test that tasks read in bulk match the tasks that were loaded."""
+    workflow, tasks = _diamond_workflow()
+    other_workflow, other_tasks = _diamond_workflow()
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+    sql_gdb_db.bulk_load_workflow(other_workflow, other_tasks)
+    sql_gdb_db.set_task_metadata(tasks[0].id, {"job_id": 1})
+
+    assert sql_gdb_db.get_workflow_tasks(workflow.id) == [
+        task.model_copy(update={"metadata": {"job_id": 1} if task is tasks[0] else {}})
+        for task in tasks]
+    assert sql_gdb_db.get_task(tasks[3].id) == tasks[3]
+    assert sql_gdb_db.get_task("missing") is None
+    assert sorted(t.name for t in sql_gdb_db.get_dependent_tasks(tasks[0].id)) == [
+        "left", "right"]
+    assert sql_gdb_db.get_workflow_task_states(workflow.id) == [
+        (tasks[0].id, "prep", "WAITING", {"job_id": 1}),
+        (tasks[1].id, "left", "WAITING", {}),
+        (tasks[2].id, "right", "WAITING", {}),
+        (tasks[3].id, "join", "WAITING", {})]
+
+
+def test_mark_downstream(sql_gdb_db):
+    """Test that every transitive dependent is marked, and nothing else."""
+    workflow, tasks = _diamond_workflow()
+    other_workflow, other_tasks = _diamond_workflow()
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+    sql_gdb_db.bulk_load_workflow(other_workflow, other_tasks)
+    prep, left, right, join = tasks
+
+    sql_gdb_db.mark_downstream(left.id, "DEP_FAIL")
+    assert [sql_gdb_db.get_task_state(task.id) for task in tasks] == [
+        "WAITING", "WAITING", "WAITING", "DEP_FAIL"]
+    sql_gdb_db.mark_downstream(prep.id, "DEP_FAIL")
+    assert [sql_gdb_db.get_task_state(task.id) for task in (prep, left, right, join)] == [
+        "WAITING", "DEP_FAIL", "DEP_FAIL", "DEP_FAIL"]
+    assert {sql_gdb_db.get_task_state(task.id) for task in other_tasks} == {"WAITING"}
+
+
+def test_task_state_counts(sql_gdb_db):
+    """Test that the per-workflow state counts follow task state changes."""
+    workflow, tasks = _diamond_workflow()
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+    prep, left, right, join = tasks
+    assert sql_gdb_db.get_task_state_counts(workflow.id) == {"WAITING": 4}
+
+    sql_gdb_db.set_task_state(prep.id, "COMPLETED")
+    sql_gdb_db.set_task_state(left.id, "FAILED")
+    sql_gdb_db.mark_downstream(left.id, "DEP_FAIL")
+    assert sql_gdb_db.get_task_state_counts(workflow.id) == {
+        "COMPLETED": 1, "FAILED": 1, "WAITING": 1, "DEP_FAIL": 1}
+    assert not sql_gdb_db.final_tasks_completed(workflow.id)
+
+    sql_gdb_db.set_task_state(right.id, "COMPLETED")
+    assert sql_gdb_db.final_tasks_completed(workflow.id)
+    assert not sql_gdb_db.final_tasks_succeeded(workflow.id)
+    assert not sql_gdb_db.final_tasks_failed(workflow.id)
+    assert sql_gdb_db.get_task_state(join.id) == "DEP_FAIL"
+
+    sql_gdb_db.remove_workflow(workflow.id)
+    assert sql_gdb_db.get_task_state_counts(workflow.id) == {}
+
+
+def test_task_state_counts_filled_in(sql_gdb_db):
+    """Test that the counts are filled in for databases created without them."""
+    workflow, tasks = _diamond_workflow()
+    sql_gdb_db.bulk_load_workflow(workflow, tasks)
+    sql_gdb_db.set_task_state(tasks[0].id, "RUNNING")
+    bdb.runscript(sql_gdb_db.db_file, """
+        DROP TRIGGER task_state_count_insert;
+        DROP TRIGGER task_state_count_update;
+        DROP TRIGGER task_state_count_delete;
+        DROP TABLE workflow_task_state;""")
+
+    db = gdb_db.SQL_GDB(sql_gdb_db.db_file)
+    assert db.get_task_state_counts(workflow.id) == {"RUNNING": 1, "WAITING": 3}
@@ -1,18 +1,24 @@
 """Unit tests for the task manager."""
+from concurrent.futures import wait
 import tempfile
 import os
+import threading
+import time
 import uuid
 import pytest
 import jsonpickle
-from beeflow.task_manager.models import SubmitTasksRequest
+from beeflow.task_manager.models import PrefetchRequest, SubmitTasksRequest
 from mocks import mock_put
 from mocks import MockWorkerCompletion, MockWorkerSubmission
+from test_image_cache import store_image
 
 from beeflow.common.db.bdb import connect_db
 from beeflow.common.db import tm_db
+from beeflow.common.build.image_cache import ImageCache
 import beeflow.task_manager.task_manager as tm
-from beeflow.common.object_models import Task
+from beeflow.common.object_models import Task, Hint
 import beeflow
+import beeflow.common.worker.utils as worker_utils
 
 
 @pytest.fixture
@@ -112,3 +118,365 @@ def test_remove_task(flask_client, mocker, temp_db):  # pylint: disable=W0621
     status = response.status_code
     assert status == 200
     assert msg.count('CANCELLED') == 3
+
+
+@pytest.mark.parametrize('by_id', [False, True])
+def test_remove_task_releases_images(flask_client, mocker, temp_db, tmp_path,  # pylint: disable=W0621
+                                     by_id):
+    """Test that cancelled tasks no longer keep their images in the cache."""
+    cache = ImageCache(str(tmp_path), max_size=500)
+    mocker.patch('beeflow.task_manager.background.ImageCache.from_config', return_value=cache)
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerCompletion)
+    mocker.patch('beeflow.task_manager.utils.db_path', lambda: temp_db.db_file)
+    running, queued = generate_tasks(2)
+    for task in (running, queued):
+        task.hints = [Hint(class_='DockerRequirement', params={'dockerPull': task.name})]
+        store_image(cache, task.name, task.name, task_id=task.id)
+    temp_db.job_queue.push(task=running, job_id=1, job_state='RUNNING')
+    temp_db.submit_queue.push(queued)
+
+    request = {'task_ids': [running.id, queued.id]} if by_id else None
+    response = flask_client.delete('/bee_tm/v1/task/', json=request)
+
+    assert response.status_code == 200
+    assert sorted(cache.evict()) == sorted([running.name, queued.name])
+
+
+@pytest.mark.usefixtures('flask_client', 'mocker')
+def test_submit_wakes_submitter(flask_client, mocker, temp_db):  # pylint: disable=W0621
+    """Test that submitting tasks wakes up the submitter thread."""
+    mocker.patch('beeflow.task_manager.utils.db_path', lambda: temp_db.db_file)
+    background = beeflow.task_manager.background
+    background._submit_event.clear()  # pylint: disable=W0212
+
+    task_request = SubmitTasksRequest(tasks=generate_tasks(1)).model_dump()
+    response = flask_client.post('/bee_tm/v1/task/', json=task_request)
+
+    assert response.status_code == 200
+    assert background._submit_event.is_set()  # pylint: disable=W0212
+
+
+def test_job_poller_backoff():
+    """Test that unchanged jobs are polled less and less often."""
+    poller = beeflow.task_manager.background.JobPoller(min_interval=2, max_interval=10)
+
+    assert poller.is_due(1, now=0)
+    poller.polled(1, changed=False, now=0)
+    assert not poller.is_due(1, now=1)
+    assert poller.is_due(1, now=2)
+    poller.polled(1, changed=False, now=2)
+    assert not poller.is_due(1, now=5)
+    assert poller.is_due(1, now=6)
+    for now in (6, 14, 24, 34):
+        poller.polled(1, changed=False, now=now)
+    # Capped at the max interval
+    assert poller.is_due(1, now=44)
+    # A state change resets the interval
+    poller.polled(1, changed=True, now=44)
+    assert poller.is_due(1, now=46)
+
+    poller.prune([])
+    assert poller.is_due(1, now=0)
+
+
+@pytest.mark.usefixtures('mocker')
+def test_update_jobs_skips_jobs_not_due(mocker, temp_db):  # pylint: disable=W0621
+    """Test that update_jobs only queries jobs that are due for polling."""
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerSubmission)
+    query_task = mocker.spy(MockWorkerSubmission, 'query_task')
+    task1, task2 = generate_tasks(2)
+    temp_db.job_queue.push(task=task1, job_id=1, job_state='RUNNING')
+    temp_db.job_queue.push(task=task2, job_id=2, job_state='RUNNING')
+    poller = beeflow.task_manager.background.JobPoller(min_interval=60, max_interval=60)
+    poller.polled(list(temp_db.job_queue)[0].id, changed=False)
+
+    beeflow.task_manager.background.update_jobs(temp_db, poller=poller)
+
+    assert query_task.call_count == 1
+    assert query_task.call_args.args[1] == 2
+
+
+def test_update_jobs_missing_job(mocker, temp_db):  # pylint: disable=W0621
+    """Test that jobs left out of a bulk query aren't queried again one by one."""
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerSubmission)
+    mocker.patch.object(MockWorkerSubmission, 'query_tasks', return_value={})
+    query_task = mocker.spy(MockWorkerSubmission, 'query_task')
+    task, = generate_tasks(1)
+    temp_db.job_queue.push(task=task, job_id=1, job_state='RUNNING')
+
+    beeflow.task_manager.background.update_jobs(temp_db)
+
+    assert query_task.call_count == 0
+    assert temp_db.update_queue.updates()[0].job_state == 'UNKNOWN'
+
+
+def test_update_jobs_heartbeat(mocker, temp_db):  # pylint: disable=W0621
+    """Test that unchanged jobs are only reported on a heartbeat, with changed metadata."""
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerSubmission)
+    metadata = MockWorkerSubmission().query_task(1)[1]
+    task, = generate_tasks(1)
+    temp_db.job_queue.push(task=task, job_id=1, job_state='RUNNING',
+                           metadata={**metadata, 'time_left': '2 days'})
+
+    beeflow.task_manager.background.update_jobs(temp_db)
+    assert temp_db.update_queue.count() == 0
+
+    mocker.patch('beeflow.task_manager.background.heartbeat_interval', 0)
+    beeflow.task_manager.background.update_jobs(temp_db)
+    updates = temp_db.update_queue.updates()
+    assert len(updates) == 1
+    assert updates[0].job_state == 'RUNNING'
+    assert updates[0].metadata == {'time_left': metadata['time_left']}
+
+    # Nothing changed since the heartbeat, so no metadata is sent again
+    temp_db.update_queue.clear()
+    beeflow.task_manager.background.update_jobs(temp_db)
+    assert temp_db.update_queue.updates()[0].metadata is None
+
+
+@pytest.mark.usefixtures('mocker')
+def test_submit_jobs_parallel_jobs_limit(mocker, temp_db):  # pylint: disable=W0621
+    """Test that parallel submission keeps to the jobs limit."""
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerSubmission)
+    mocker.patch('beeflow.task_manager.background.jobs_limit', 3)
+    mocker.patch('beeflow.task_manager.background.submit_workers', 4)
+    temp_db.job_queue.push(task=generate_tasks(1)[0], job_id=1, job_state='RUNNING')
+    for task in generate_tasks(5):
+        temp_db.submit_queue.push(task)
+
+    wait(beeflow.task_manager.background.submit_jobs(temp_db))
+
+    assert temp_db.job_queue.count() == 3
+    assert temp_db.submit_queue.count() == 3
+    assert len(temp_db.update_queue.updates()) == 2
+
+
+def test_submit_jobs_slow_build(mocker, temp_db):  # pylint: disable=W0621
+    """Test that tasks arriving during a slow submission don't wait for it."""
+    release = threading.Event()
+
+    class MockWorkerSlow(MockWorkerSubmission):
+        """Mock worker that takes long to submit task-0."""
+
+        def submit_task(self, task, depends_on=None):  # pylint: disable=W0221,W0613
+            if task.name == 'task-0':
+                release.wait(timeout=10)
+            return 1, 'PENDING', {}
+
+    mocker.patch('beeflow.task_manager.utils.worker_interface', return_value=MockWorkerSlow())
+    slow, fast = generate_tasks(2)
+    temp_db.submit_queue.push(slow)
+    slow_futures = beeflow.task_manager.background.submit_jobs(temp_db)
+    temp_db.submit_queue.push(fast)
+    try:
+        done, _ = wait(beeflow.task_manager.background.submit_jobs(temp_db), timeout=5)
+
+        assert len(done) == 1
+        assert list(temp_db.job_queue.jobs_for_tasks([slow.id, fast.id])) == [fast.id]
+    finally:
+        release.set()
+        wait(slow_futures)
+    assert temp_db.job_queue.count() == 2
+
+
+@pytest.mark.usefixtures('mocker')
+def test_submit_jobs_chained(mocker, temp_db):  # pylint: disable=W0621
+    """Test that chained tasks are submitted with the job ids of their upstream tasks."""
+
+    class MockWorkerDependencies(MockWorkerSubmission):
+        """Mock worker giving each job its own id."""
+
+        def __init__(self):
+            self.submitted = []
+
+        def submit_task(self, task, depends_on=None):  # pylint: disable=W0221
+            self.submitted.append((task.id, depends_on))
+            return len(self.submitted), 'PENDING', {}
+
+    worker = MockWorkerDependencies()
+    mocker.patch('beeflow.task_manager.utils.worker_interface', return_value=worker)
+    tasks = generate_tasks(4)
+    temp_db.job_queue.push(task=tasks[3], job_id=99, job_state='COMPLETED')
+    temp_db.submit_queue.push(tasks[1], depends_on=[tasks[0].id])
+    temp_db.submit_queue.push(tasks[0])
+    temp_db.submit_queue.push(tasks[2], depends_on=[tasks[1].id, tasks[3].id])
+
+    # Chained tasks are handed over once their upstream tasks are submitted
+    for _ in range(3):
+        wait(beeflow.task_manager.background.submit_jobs(temp_db))
+
+    # Upstream tasks go first, finished upstream jobs are left out
+    assert worker.submitted == [(tasks[0].id, None), (tasks[1].id, [1]),
+                                (tasks[2].id, [2])]
+    assert temp_db.submit_queue.count() == 0
+
+
+@pytest.mark.usefixtures('mocker')
+def test_submit_jobs_chained_upstream_failed(mocker, temp_db):  # pylint: disable=W0621
+    """Test that chained tasks are only released by upstream tasks that completed."""
+    mocker.patch('beeflow.task_manager.utils.worker_interface', MockWorkerSubmission)
+    tasks = generate_tasks(6)
+    temp_db.job_queue.push(task=tasks[0], job_id=1, job_state='FAILED')
+    temp_db.job_queue.push(task=tasks[1], job_id=2, job_state='COMPLETED')
+    temp_db.job_queue.finish(next(temp_db.job_queue.states()).id)
+    temp_db.finished_jobs.record(tasks[2].id, 'BUILD_FAIL')
+    temp_db.submit_queue.push(tasks[3], depends_on=[tasks[0].id, tasks[1].id])
+    temp_db.submit_queue.push(tasks[4], depends_on=[tasks[1].id, tasks[2].id])
+    temp_db.submit_queue.push(tasks[5], depends_on=['missing-task'])
+
+    wait(beeflow.task_manager.background.submit_jobs(temp_db))
+
+    states = {update.task_id: update.job_state for update in temp_db.update_queue.updates()}
+    assert states == {tasks[3].id: 'DEP_FAIL', tasks[4].id: 'DEP_FAIL',
+                      tasks[5].id: 'SUBMIT_FAIL'}
+    assert temp_db.job_queue.jobs_for_tasks([task.id for task in tasks[3:]]) == {}
+    # Tasks chained to the failed ones fail in turn
+    assert temp_db.finished_jobs.states([task.id for task in tasks[3:]]) == states
+
+
+@pytest.mark.usefixtures('mocker')
+def test_submit_jobs_job_array(mocker, temp_db):  # pylint: disable=W0621
+    """Test that tasks sharing an array key are submitted as one job array."""
+
+    class MockWorkerArrays(MockWorkerSubmission):
+        """Mock worker that puts tasks named task-0 and task-1 in one array."""
+
+        def __init__(self):
+            self.arrays = []
+
+        def array_key(self, task):
+            return 'array' if task.name in ('task-0', 'task-1') else None
+
+        def submit_array(self, tasks):
+            self.arrays.append([task.id for task in tasks])
+            return [(f'7_{i}', 'PENDING', {}) for i in range(len(tasks))]
+
+    worker = MockWorkerArrays()
+    mocker.patch('beeflow.task_manager.utils.worker_interface', return_value=worker)
+    mocker.patch('beeflow.task_manager.background.job_array_min_size', 2)
+    tasks = generate_tasks(3)
+    for task in tasks:
+        temp_db.submit_queue.push(task)
+
+    wait(beeflow.task_manager.background.submit_jobs(temp_db))
+
+    assert worker.arrays == [[tasks[0].id, tasks[1].id]]
+    assert temp_db.job_queue.jobs_for_tasks([task.id for task in tasks]) == {
+        tasks[0].id: ('7_0', 'PENDING'),
+        tasks[1].id: ('7_1', 'PENDING'),
+        tasks[2].id: (1, 'PENDING'),
+    }
+    assert len(temp_db.update_queue.updates()) == 3
+
+
+def test_submit_array_environment_error(mocker, temp_db):  # pylint: disable=W0621
+    """Test that a task whose environment fails to resolve isn't submitted in the array."""
+    worker = mocker.MagicMock()
+    worker.submit_array.side_effect = lambda tasks: [(f'7_{i}', 'PENDING', {})
+                                                     for i in range(len(tasks))]
+    mocker.patch('beeflow.task_manager.background.resolve_environment',
+                 side_effect=[None, RuntimeError('no runtime')])
+    mocker.patch('beeflow.task_manager.background.release_environment')
+    tasks = generate_tasks(2)
+    for task in tasks:
+        task.hints = [Hint(class_='DockerRequirement', params={'dockerPull': 'image'})]
+
+    results = beeflow.task_manager.background.submit_array(temp_db, worker, tasks)
+
+    assert results == [('PENDING', {}), ('SUBMIT_FAIL', {})]
+    assert list(temp_db.job_queue.jobs_for_tasks([task.id for task in tasks])) == [tasks[0].id]
+
+
+def test_resolve_environment_builds_image_once(mocker):
+    """Test that concurrent builds of the same image are serialized."""
+    active = []
+    overlapped = []
+
+    def build_main(task):
+        key = task.hints[0].params['dockerPull']
+        overlapped.append(key in active)
+        active.append(key)
+        time.sleep(0.05)
+        active.remove(key)
+
+    mocker.patch('beeflow.task_manager.background.build_main', build_main)
+    tasks = generate_tasks(4)
+    for i, task in enumerate(tasks):
+        task.hints = [Hint(class_='DockerRequirement', params={'dockerPull': f'image-{i % 2}'})]
+    threads = [threading.Thread(target=beeflow.task_manager.background.resolve_environment,
+                                args=(task,)) for task in tasks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlapped == [False] * 4
+    assert len(beeflow.task_manager.background._build_locks) >= 2  # pylint: disable=W0212
+
+
+def test_prefetch_images(flask_client, mocker):  # pylint: disable=W0621
+    """Test prefetching each container image of a workflow once."""
+    built = []
+    release = threading.Event()
+
+    def build_main(task):
+        release.wait(timeout=5)
+        built.append(task.hints[0].params['dockerPull'])
+        if task.hints[0].params['dockerPull'] == 'broken':
+            raise RuntimeError('pull failed')
+
+    mocker.patch('beeflow.task_manager.background.build_main', build_main)
+    mocker.patch('beeflow.task_manager.background.release_environment')
+    tasks = generate_tasks(5)
+    for task, image in zip(tasks, ['image-0', 'image-1', 'image-0', 'broken', None]):
+        if image is not None:
+            task.hints = [Hint(class_='DockerRequirement', params={'dockerPull': image})]
+    request = PrefetchRequest(tasks=tasks).model_dump()
+
+    assert flask_client.get('/bee_tm/v1/prefetch/wf').status_code == 404
+    resp = flask_client.post('/bee_tm/v1/prefetch/wf', json=request)
+    assert resp.status_code == 200
+    assert flask_client.get('/bee_tm/v1/prefetch/wf').get_json() == {'total': 3, 'done': 0,
+                                                                       'failed': 0}
+    release.set()
+    deadline = time.monotonic() + 5
+    while (sum(beeflow.task_manager.background.prefetch_progress('wf').values()) < 6
+           and time.monotonic() < deadline):
+        time.sleep(0.01)
+    assert flask_client.get('/bee_tm/v1/prefetch/wf').get_json() == {'total': 3, 'done': 2,
+                                                                       'failed': 1}
+    # The progress is dropped once the workflow is done
+    assert flask_client.delete('/bee_tm/v1/prefetch/wf').status_code == 200
+    assert flask_client.get('/bee_tm/v1/prefetch/wf').status_code == 404
+    assert sorted(built) == ['broken', 'image-0', 'image-1']
+
+
+def test_worker_interface_cached(mocker):
+    """Test that the worker interface is only loaded once per process."""
+    load = mocker.patch('beeflow.task_manager.utils.load_worker_interface',
+                        side_effect=lambda: object())
+    beeflow.task_manager.utils.reset_worker_interface()
+    try:
+        worker = beeflow.task_manager.utils.worker_interface()
+        assert beeflow.task_manager.utils.worker_interface() is worker
+        assert load.call_count == 1
+    finally:
+        beeflow.task_manager.utils.reset_worker_interface()
+
+
+def test_slurmrestd_version_cached(mocker, tmp_path):
+    """Test that the slurmrestd version is cached until the binary changes."""
+    fingerprint = ['/usr/bin/slurmrestd', 1, 100]
+    mocker.patch('beeflow.common.worker.utils._slurmrestd_fingerprint',
+                 side_effect=lambda: list(fingerprint))
+    detect = mocker.patch('beeflow.common.worker.utils.get_slurmrestd_version',
+                          side_effect=['v0.0.40', 'v0.0.41'])
+    cache_file = str(tmp_path / 'slurmrestd_version.json')
+
+    assert worker_utils.cached_slurmrestd_version(cache_file) == 'v0.0.40'
+    assert worker_utils.cached_slurmrestd_version(cache_file) == 'v0.0.40'
+    assert detect.call_count == 1
+    # Upgrading slurm invalidates the cache
+    fingerprint[1] = 2
+    assert worker_utils.cached_slurmrestd_version(cache_file) == 'v0.0.41'
+    assert detect.call_count == 2
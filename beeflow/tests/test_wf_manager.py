@@ -34,6 +34,14 @@ def temp_db():
     os.remove(fname)
 
 
+@pytest.fixture(autouse=True)
+def bee_workdir(mocker, tmp_path):
+    """Keep workflow directories created by the tests out of the working directory."""
+    mocker.patch('beeflow.wf_manager.resources.wf_utils.get_bee_workdir',
+                 return_value=str(tmp_path))
+    return tmp_path
+
+
 @pytest.fixture
 def app():
     """Create a new flask app object."""
@@ -141,12 +149,15 @@ def test_start_workflow(client, mocker):
     mocker.patch('beeflow.wf_manager.resources.wf_utils.get_workflow_interface',
                  return_value=MockWFI())
     submit_tasks_tm = mocker.patch('beeflow.wf_manager.resources.wf_utils.submit_tasks_tm', return_value=None)
+    prefetch_images_tm = mocker.patch('beeflow.wf_manager.resources.wf_utils.prefetch_images_tm',
+                                      return_value=None)
     mocker.patch('beeflow.wf_manager.resources.wf_utils.update_wf_status', return_value=None)
     mocker.patch('beeflow.tests.mocks.MockWFI.get_workflow_state', return_value='No Start')
     resp = client().post(f'/bee_wfm/v1/jobs/{WF_ID}')
     assert resp.status_code == 200
     assert resp.json['msg'] == 'Workflow started successfully'
     submit_tasks_tm.assert_called()
+    prefetch_images_tm.assert_called()
 
 
 def test_workflow_status(client, mocker, setup_teardown_workflow):
@@ -195,6 +206,7 @@ def test_workflow_status(client, mocker, setup_teardown_workflow):
     assert sorted_status[1][0] == '124'
     assert sorted_status[1][1] == 'task'
     assert sorted_status[1][2] == 'WAITING'
+    assert resp.json['state_counts'] == {'RUNNING': 1, 'WAITING': 1}
 
 
 def test_cancel_workflow(client, mocker, setup_teardown_workflow, temp_db):
@@ -260,6 +272,16 @@ def test_pause_workflow(client, mocker, setup_teardown_workflow, temp_db):
     assert resp.status_code == 200
 
 
+def test_archive_failed_workflow(client, mocker):
+    """Test retrying the archive of a workflow whose archive failed."""
+    mocker.patch('beeflow.wf_manager.resources.wf_utils.get_wf_status',
+                 return_value='Archive Failed/Failed')
+    archive_workflow = mocker.patch('beeflow.wf_manager.resources.wf_actions.archive_workflow')
+    resp = client().patch(f'/bee_wfm/v1/jobs/{WF_ID}', json={'option': 'archive'})
+    assert resp.json['msg'] == 'Workflow Archiving'
+    archive_workflow.assert_called_once_with(WF_ID, 'Failed', retry=True)
+
+
 def test_resume_workflow(client, mocker, setup_teardown_workflow, temp_db):
     """Test resuming a workflow."""
     mocker.patch('beeflow.wf_manager.resources.wf_utils.get_workflow_interface',
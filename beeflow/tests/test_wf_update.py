@@ -1,35 +1,67 @@
 """Tests for wf_update module."""
 
 import os
+import tarfile
+
 import pytest
 from beeflow.wf_manager.resources import wf_update
 
 
 @pytest.mark.parametrize(
-    "test_function, expected_state",
+    "test_function, final_state",
     [
-        (wf_update.archive_workflow, "Archived"),
-        (wf_update.archive_fail_workflow, "Archived/Failed"),
+        (wf_update.archive_workflow, None),
+        (wf_update.archive_fail_workflow, "Failed"),
     ],
 )
-def test_archive_workflow(tmpdir, mocker, test_function, expected_state):
-    """Regression test archive_workflow."""
-    workdir = str(tmpdir / "workdir")
+def test_archive_workflow(mocker, test_function, final_state):
+    """Test that archiving is left to a background job."""
     mocker.patch("beeflow.wf_manager.resources.wf_utils.get_wf_status", return_value="Running")
+    mock_update_wf_status = mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.update_wf_status"
+    )
+    mock_forget_prefetch = mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.forget_prefetch_tm"
+    )
+    mock_delay = mocker.patch.object(wf_update.archive_workflow_job, "delay")
+    test_function("wf_id_test")
+    mock_update_wf_status.assert_called_once_with("wf_id_test", "Archiving")
+    mock_forget_prefetch.assert_called_once_with("wf_id_test")
+    mock_delay.assert_called_once_with("wf_id_test", final_state)
+
+
+def mock_archive_config(mocker, tmpdir, config=None):
+    """Mock the config options used for archiving."""
+    options = {
+        ("DEFAULT", "bee_archive_dir"): str(tmpdir / "bee_archive_dir"),
+        ("DEFAULT", "delete_completed_workflow_dirs"): True,
+        ("DEFAULT", "archive_compression_level"): 1,
+        ("DEFAULT", "archive_compression_threads"): 2,
+        ("graphdb", "type"): "neo4j",
+    }
+    options.update(config or {})
+    mocker.patch(
+        "beeflow.common.config_driver.BeeConfig.get",
+        side_effect=lambda section, option, *a, **kw: options[(section, option)],
+    )
+
+
+@pytest.mark.parametrize(
+    "final_state, expected_state",
+    [(None, "Archived"), ("Failed", "Archived/Failed")],
+)
+def test_archive_workflow_job(tmpdir, mocker, final_state, expected_state):
+    """Regression test archive_workflow_job."""
+    workflows_dir = str(tmpdir / "workflows")
+    workdir = os.path.join(workflows_dir, "wf_id_test")
     mocker.patch("os.path.expanduser", return_value=str(tmpdir))
     mocker.patch(
         "beeflow.wf_manager.resources.wf_utils.get_workflow_dir", return_value=workdir
     )
     mocker.patch(
-        "beeflow.common.config_driver.BeeConfig.get",
-        side_effect=lambda section, option, *a, **kw: (
-            str(tmpdir / "bee_archive_dir")
-            if (section, option) == ("DEFAULT", "bee_archive_dir")
-            else "neo4j"
-            if (section, option) == ("graphdb", "type")
-            else str(tmpdir / "bee_archive_dir")
-        ),
+        "beeflow.wf_manager.resources.wf_utils.get_workflows_dir", return_value=workflows_dir
     )
+    mock_archive_config(mocker, tmpdir)
     mock_export_dag = mocker.patch("beeflow.wf_manager.resources.wf_utils.export_dag")
     mock_update_wf_status = mocker.patch(
         "beeflow.wf_manager.resources.wf_utils.update_wf_status"
@@ -41,24 +73,74 @@ def test_archive_workflow(tmpdir, mocker, test_function, expected_state):
     with tmpdir.as_cwd():
         # set up dummy folders for archiving process
         os.makedirs(".config/beeflow")
-        os.makedirs("workdir")
-        os.makedirs("bee_archive_dir/workflows")
+        os.makedirs(workdir)
+        with open(os.path.join(workdir, "output"), "wb") as fp:
+            fp.write(os.urandom(3 * 2**20))
         with open(".config/beeflow/bee.conf", "w", encoding="utf-8"):
             pass
-        test_function("wf_id_test")
-        assert os.path.exists("bee_archive_dir/wf_id_test.tgz")
+        wf_update.archive_workflow_job("wf_id_test", final_state)
+        with tarfile.open("bee_archive_dir/wf_id_test.tgz") as archive:
+            assert sorted(archive.getnames()) == [
+                "wf_id_test", "wf_id_test/bee.conf", "wf_id_test/dags",
+                "wf_id_test/graphmls", "wf_id_test/output",
+            ]
+        assert not os.path.exists("bee_archive_dir/wf_id_test.tgz.partial")
         mock_export_dag.assert_called_once_with(
             "wf_id_test",
             workdir + "/dags",
             workdir + "/graphmls",
             no_dag_dir=True
         )
-        mock_update_wf_status.assert_called_once_with("wf_id_test", expected_state)
+        states = [call.args[1] for call in mock_update_wf_status.call_args_list]
+        assert states[0] == "Archiving/Exporting DAG"
+        assert "Archiving/Compressing 33%" in states
+        assert states[-2:] == ["Archiving/Verifying", expected_state]
         mock_remove_wf_dir.assert_called_once_with("wf_id_test")
         mock_log.assert_called_once_with("Removing Workflow Directory")
 
 
-@pytest.mark.parametrize("wf_state", ["Archived", "Archived/Failed"])
+@pytest.mark.parametrize("compressor", ["false", "/nonexistent/compressor"])
+def test_archive_workflow_job_failed(tmpdir, mocker, compressor):
+    """Test that the workflow directory is kept if the archive can't be written."""
+    workflows_dir = str(tmpdir / "workflows")
+    workdir = os.path.join(workflows_dir, "wf_id_test")
+    os.makedirs(workdir)
+    os.makedirs(str(tmpdir / ".config/beeflow"))
+    (tmpdir / ".config/beeflow/bee.conf").write("")
+    mocker.patch("os.path.expanduser", return_value=str(tmpdir))
+    mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.get_workflow_dir", return_value=workdir
+    )
+    mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.get_workflows_dir", return_value=workflows_dir
+    )
+    mock_archive_config(mocker, tmpdir, {("graphdb", "type"): "sqlite"})
+    mocker.patch("beeflow.wf_manager.resources.wf_update.compress_command",
+                 return_value=[compressor])
+    mock_update_wf_status = mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.update_wf_status"
+    )
+    mock_remove_wf_dir = mocker.patch(
+        "beeflow.wf_manager.resources.wf_utils.remove_wf_dir"
+    )
+    wf_update.archive_workflow_job("wf_id_test", "Failed")
+    assert not os.listdir(str(tmpdir / "bee_archive_dir"))
+    mock_update_wf_status.assert_called_with("wf_id_test", "Archive Failed/Failed")
+    mock_remove_wf_dir.assert_not_called()
+
+
+@pytest.mark.parametrize("pigz, expected", [
+    ("/usr/bin/pigz", ["pigz", "-1", "-p", "2"]),
+    (None, ["gzip", "-1"]),
+])
+def test_compress_command(tmpdir, mocker, pigz, expected):
+    """Test that pigz compresses archives in parallel where it is installed."""
+    mock_archive_config(mocker, tmpdir)
+    mocker.patch("shutil.which", return_value=pigz)
+    assert wf_update.compress_command() == expected
+
+
+@pytest.mark.parametrize("wf_state", ["Archived", "Archived/Failed", "Archiving"])
 def test_archive_archived_wf(mocker, wf_state):
     """Don't archive workflow that is already archived."""
     mocker.patch("beeflow.wf_manager.resources.wf_utils.get_wf_status", return_value=wf_state)
@@ -72,6 +154,18 @@ def test_archive_archived_wf(mocker, wf_state):
     )
 
 
+@pytest.mark.parametrize("retry", [False, True])
+def test_archive_failed_wf(mocker, retry):
+    """Only archive a workflow whose archive failed again when asked to."""
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.get_wf_status",
+                 return_value="Archive Failed/Failed")
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.update_wf_status")
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.forget_prefetch_tm")
+    mock_delay = mocker.patch.object(wf_update.archive_workflow_job, "delay")
+    wf_update.archive_workflow("id", "Failed", retry=retry)
+    assert mock_delay.called == retry
+
+
 @pytest.mark.parametrize("job_state", ["FAILED", "SUBMIT_FAIL", 'BUILD_FAIL'])
 def test_handle_state_change_failed_task(mocker, job_state):
     """Regression test task failure."""
@@ -91,10 +185,13 @@ def test_handle_state_change_failed_task(mocker, job_state):
         "beeflow.wf_manager.resources.wf_update.set_dependent_tasks_dep_fail"
     )
     workflow_update = wf_update.WFUpdate()
-    workflow_update.handle_state_change(state_update, task, wfi)
+    batch = wf_update.UpdateBatch()
+    workflow_update.handle_state_change(state_update, task, wfi, batch)
     mock_log_info.assert_any_call("Task TestTask failed")
     mock_set_dependent_tasks_dep_fail.assert_called_once()
     mock_archive_workflow.assert_not_called()
+    assert batch.state_changed
+    assert not batch.completed_tasks
 
 
 @pytest.mark.parametrize(
@@ -106,12 +203,10 @@ def test_handle_state_change_failed_task(mocker, job_state):
         (False, True, ""),
     ],
 )
-def test_handle_state_change_completed_wf(
+def test_check_workflow_completed(
     mocker, completed, cancelled_completed, wf_state
 ):
     """Regression test when workflow is complete."""
-    state_update = mocker.MagicMock()
-    task = mocker.MagicMock()
     wfi = mocker.MagicMock()
     wfi.workflow_completed.return_value = completed
     wfi.cancelled_workflow_completed.return_value = cancelled_completed
@@ -122,7 +217,7 @@ def test_handle_state_change_completed_wf(
     mocker.patch("beeflow.wf_manager.resources.wf_utils.get_wf_status", return_value=wf_state)
     mock_log_info = mocker.patch("logging.Logger.info")
     workflow_update = wf_update.WFUpdate()
-    workflow_update.handle_state_change(state_update, task, wfi)
+    workflow_update.check_workflow_completed(wfi)
     print(mock_log_info.mock_calls)
     if completed:
         mock_log_info.assert_any_call("Workflow TESTID Completed")
@@ -137,6 +232,8 @@ def test_handle_state_change_completed_wf(
     else:
         mock_log_info.assert_not_called()
         mock_archive_workflow.assert_not_called()
+
+
 def test_skip_task_handlers_when_task_does_not_exist(mocker):
     """Skip task-specific handlers when task does not exist."""
     state_update = mocker.MagicMock()
@@ -161,10 +258,36 @@ def test_skip_task_handlers_when_task_does_not_exist(mocker):
         workflow_update, "handle_state_change"
     )
 
-    workflow_update.update_task_state(state_update)
+    workflow_update.update_workflow("WF_ID", [state_update])
 
     wfi.get_task_by_id.assert_called_once_with("NO_TASK_ID")
     wfi.set_task_state.assert_called_once_with("NO_TASK_ID", "SUBMIT")
     mock_handle_metadata.assert_not_called()
     mock_handle_checkpoint_restart.assert_not_called()
     mock_handle_state_change.assert_not_called()
+
+
+def test_update_workflow_batch(mocker):
+    """Test that a batch of completed tasks submits the ready tasks once."""
+    updates = [mocker.MagicMock(wf_id="WF_ID", task_id=task_id, job_state="COMPLETED",
+                                task_info=None, metadata=None, output=None)
+               for task_id in ("A", "B")]
+    wfi = mocker.MagicMock()
+    wfi.get_task_by_id.side_effect = lambda task_id: mocker.MagicMock(id=task_id, outputs=[])
+    ready_task = mocker.MagicMock(id="C")
+    wfi.update_ready_tasks.return_value = [ready_task]
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.get_workflow_interface",
+                 return_value=wfi)
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.get_wf_status", return_value="Running")
+    mocker.patch("beeflow.wf_manager.resources.wf_utils.copy_task_output")
+    mock_submit = mocker.patch("beeflow.wf_manager.resources.wf_utils.submit_tasks_tm")
+    workflow_update = wf_update.WFUpdate()
+    mock_check = mocker.patch.object(workflow_update, "check_workflow_completed")
+
+    workflow_update.update_workflow("WF_ID", updates)
+
+    wfi.transaction.assert_called_once()
+    assert wfi.complete_task.call_count == 2
+    wfi.update_ready_tasks.assert_called_once()
+    mock_submit.assert_called_once_with("WF_ID", [ready_task])
+    mock_check.assert_called_once_with(wfi)
@@ -2,6 +2,7 @@
 
 import pytest
 from beeflow.wf_manager.resources import wf_utils
+from beeflow.common.object_models import Task, StepInput, StepOutput
 
 from beeflow.tests.mocks import MockWFI
 
@@ -56,6 +57,45 @@ def test_export_dag(mocker, which_return, no_dag_flag, expected_dot_avail):
         mock_viz.assert_not_called()
 
 
+def make_task(name, sources=(), glob=None):
+    """Create a task reading the outputs in sources and writing name/out."""
+    inputs = [StepInput(id=f'{name}/in{i}', type='File', source=source)
+              for i, source in enumerate(sources)]
+    outputs = [StepOutput(id=f'{name}/out', type='File', glob=glob)]
+    return Task(name=name, base_command='ls', inputs=inputs, outputs=outputs,
+                workflow_id='wf', id=name)
 
 
+def test_chain_dependent_tasks(mocker):
+    """Test which waiting tasks are chained to the submitted tasks."""
+    upstream = make_task('a', glob='a.txt')
+    dependents = {
+        'a': [make_task('b', ['a/out'], glob='b.txt'), make_task('c', ['a/out', 'x/out'])],
+        'b': [make_task('d', ['b/out'])],
+        'c': [], 'd': [],
+    }
+    wfi = mocker.MagicMock()
+    wfi.get_dependent_tasks.side_effect = lambda task_id: dependents[task_id]
 
+    chained, dependencies = wf_utils.chain_dependent_tasks(wfi, [upstream])
+
+    # c also waits for x, which isn't being submitted
+    assert [task.id for task in chained] == ['b', 'd']
+    assert dependencies == {'b': ['a'], 'd': ['b']}
+    assert chained[0].inputs[0].value == 'a.txt'
+    # The tasks from the workflow aren't changed
+    assert dependents['a'][0].inputs[0].value is None
+
+
+@pytest.mark.parametrize(
+    "scheduler, pilot, expected",
+    [("Slurm", False, True), ("Slurm", True, False), ("Simple", False, False)],
+)
+def test_native_dependencies_enabled(mocker, scheduler, pilot, expected):
+    """Test that tasks are only chained when the scheduler holds them."""
+    conf = {('workflow_manager', 'native_dependencies'): True,
+            ('DEFAULT', 'workload_scheduler'): scheduler,
+            ('pilot', 'enabled'): pilot}
+    mocker.patch('beeflow.common.config_driver.BeeConfig.get',
+                 side_effect=lambda sec_name, opt_name: conf[(sec_name, opt_name)])
+    assert wf_utils.native_dependencies_enabled() == expected
@@ -1,8 +1,9 @@
 """Models for workflow management in Beeflow."""
 
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel
 from beeflow.common.object_models import Workflow, Task
+from beeflow.task_manager.models import PrefetchProgress
 
 class WorkflowInfo(BaseModel):
     """Information about a workflow."""
@@ -71,3 +72,7 @@ class WorkflowStatusResponse(BaseModel):
     tasks_status: List[tuple]
     wf_status: str
     msg: str
+    # Number of tasks in each state
+    state_counts: Dict[str, int] = {}
+    # Container image prefetch progress reported by the TM, if any
+    prefetch: Optional[PrefetchProgress] = None
@@ -60,14 +60,14 @@ class WFActions(Resource):
                 404,
             )
 
-        tasks = wfi.get_tasks()
-        tasks_status = []
-        for task in tasks:
-            tasks_status.append((task.id, task.name, task.state, wfi.get_task_metadata(task.id)))
+        tasks_status = wfi.get_task_states()
+        state_counts = wfi.get_task_state_counts()
 
         return (
             WorkflowStatusResponse(
                 tasks_status=tasks_status,
+                state_counts=state_counts,
+                prefetch=wf_utils.prefetch_progress_tm(wf_id),
                 wf_status=wf_status,
                 msg="Workflow status retrieved successfully",
             ).model_dump(),
@@ -121,7 +121,7 @@ class WFActions(Resource):
         return resp
 
     def patch(self, wf_id):
-        """Pause or resume workflow."""
+        """Pause or resume workflow, or retry archiving a workflow whose archive failed."""
         option = ModifyWorkflowRequest.model_validate(request.json).option
 
         log.info("Pausing/resuming workflow")
@@ -138,6 +138,12 @@ class WFActions(Resource):
 
             log.info(f"Workflow {wf_id} Resumed")
             resp = WorkflowActionResponse(msg="Workflow Resumed").model_dump(), 200
+        elif option == "archive" and wf_state.startswith("Archive Failed"):
+            # Keep the final state the workflow had before its archive failed
+            final_state = wf_state.partition("/")[2] or None
+            archive_workflow(wf_id, final_state, retry=True)
+            log.info(f"Workflow {wf_id} Archiving")
+            resp = WorkflowActionResponse(msg="Workflow Archiving").model_dump(), 200
         else:
             resp_msg = f"Cannot {option} workflow. It is currently {wf_state.lower()}."
             log.info(resp_msg)
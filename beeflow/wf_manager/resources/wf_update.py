@@ -5,13 +5,16 @@ import json
 import shutil
 import subprocess
 import time
+import traceback
 import yaml
 
 from flask import request
 from flask_restful import Resource, reqparse
+from celery import shared_task
 from beeflow.wf_manager.models import TaskStateUpdateRequest, TaskStateUpdateResponse
 from beeflow.wf_manager.resources import wf_utils
 from beeflow.common import log as bee_logging
+from beeflow.common.file_utils import dir_size
 
 from beeflow.common.config_driver import BeeConfig as bc
 
@@ -19,44 +22,150 @@ log = bee_logging.setup(__name__)
 db_path = wf_utils.get_db_path()
 
 
-def archive_workflow(wf_id, final_state=None):
-    """Archive a workflow after completion."""
+# Size of the pieces the workflow tarball is streamed to the compressor in
+ARCHIVE_CHUNK_SIZE = 2**20
+
+
+def archive_workflow(wf_id, final_state=None, retry=False):
+    """Archive a workflow after completion.
+
+    The workflow is marked as archiving and the archive is made by a
+    background job, so that task updates aren't held up while it's written.
+    A workflow whose archive failed is only archived again when retry is set,
+    i.e. when the user asks for it with ``beeflow archive``, so that state
+    updates arriving later don't keep retrying a failing archive.
+    """
     # this is the only way to retrieve wf state after archiving
     wf_state = wf_utils.get_wf_status(wf_id)
-    if wf_state.startswith("Archived"):
+    if wf_state.startswith(("Archived", "Archiving")):
         # Don't archive a workflow that has already been archived
         log.warning((
             f"Attempted to archive workflow {wf_id} which is already archived; "
             f"in state {wf_state}."
         ))
         return
-    # Archive Config
-    workflow_dir = wf_utils.get_workflow_dir(wf_id)
-    shutil.copyfile(os.path.expanduser("~") + '/.config/beeflow/bee.conf',
-                    workflow_dir + '/' + 'bee.conf')
-    # Archive Completed DAG
-    if bc.get('graphdb', 'type').lower() == 'neo4j':
-        graphmls_dir = workflow_dir + "/graphmls"
-        os.makedirs(graphmls_dir, exist_ok=True)
-        dags_dir = workflow_dir + "/dags"
-        os.makedirs(dags_dir, exist_ok=True)
-        wf_utils.export_dag(wf_id, dags_dir, graphmls_dir, no_dag_dir=True)
-
-    wf_state = f'Archived/{final_state}' if final_state is not None else 'Archived'
-    wf_utils.update_wf_status(wf_id, wf_state)
+    if wf_state.startswith("Archive Failed") and not retry:
+        log.warning((
+            f"Not archiving workflow {wf_id} again since its archive failed; "
+            f"in state {wf_state}."
+        ))
+        return
+    wf_utils.update_wf_status(wf_id, 'Archiving')
+    wf_utils.forget_prefetch_tm(wf_id)
+    archive_workflow_job.delay(wf_id, final_state)
 
-    archive_dir = bc.get('DEFAULT', 'bee_archive_dir')
-    os.makedirs(archive_dir, exist_ok=True)
-    archive_path = os.path.join(archive_dir, f'{wf_id}.tgz')
-    # We use tar directly since tarfile is apparently very slow
-    workflows_dir = wf_utils.get_workflows_dir()
-    subprocess.call(['tar', '-czf', archive_path, wf_id], cwd=workflows_dir)
+
+@shared_task
+def archive_workflow_job(wf_id, final_state=None):
+    """Write the archive of a workflow, removing its directory once the archive is verified.
+
+    Progress is reported as a sub-state of the workflow's Archiving state. If
+    the archive isn't written and verified, the workflow ends up in the
+    Archive Failed state instead of Archived, and its directory is kept.
+    """
+    try:
+        # Archive Config
+        workflow_dir = wf_utils.get_workflow_dir(wf_id)
+        shutil.copyfile(os.path.expanduser("~") + '/.config/beeflow/bee.conf',
+                        workflow_dir + '/' + 'bee.conf')
+        # Archive Completed DAG
+        if bc.get('graphdb', 'type').lower() == 'neo4j':
+            wf_utils.update_wf_status(wf_id, 'Archiving/Exporting DAG')
+            graphmls_dir = workflow_dir + "/graphmls"
+            os.makedirs(graphmls_dir, exist_ok=True)
+            dags_dir = workflow_dir + "/dags"
+            os.makedirs(dags_dir, exist_ok=True)
+            wf_utils.export_dag(wf_id, dags_dir, graphmls_dir, no_dag_dir=True)
+
+        archive_dir = bc.get('DEFAULT', 'bee_archive_dir')
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f'{wf_id}.tgz')
+        verified = write_archive(wf_id, archive_path)
+    except Exception:  # pylint: disable=W0718 # the workflow mustn't be left archiving
+        log.error(traceback.format_exc())
+        verified = False
+
+    wf_state = 'Archived' if verified else 'Archive Failed'
+    if final_state is not None:
+        wf_state = f'{wf_state}/{final_state}'
+    wf_utils.update_wf_status(wf_id, wf_state)
+    if not verified:
+        log.error(f'Failed to archive workflow {wf_id}; keeping its directory')
+        return
     remove_wf_dir = bc.get('DEFAULT', 'delete_completed_workflow_dirs')
     if remove_wf_dir:
         log.info('Removing Workflow Directory')
         wf_utils.remove_wf_dir(wf_id)
 
 
+def compress_command():
+    """Return the command compressing an archive from stdin to stdout.
+
+    pigz compresses on every core and writes gzip files, so archives stay
+    readable by tarfile; gzip is used where pigz isn't installed.
+    """
+    level = bc.get('DEFAULT', 'archive_compression_level')
+    if shutil.which('pigz') is None:
+        return ['gzip', f'-{level}']
+    cmd = ['pigz', f'-{level}']
+    threads = bc.get('DEFAULT', 'archive_compression_threads')
+    if threads:
+        cmd.extend(['-p', str(threads)])
+    return cmd
+
+
+def write_archive(wf_id, archive_path):
+    """Write and verify the compressed tarball of a workflow directory.
+
+    The tarball is only moved to archive_path once the compressor has checked
+    it. Returns True if the archive was written; the partial tarball is
+    removed otherwise, also if an error is raised.
+    """
+    partial_path = f'{archive_path}.partial'
+    try:
+        verified = _write_partial_archive(wf_id, partial_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    if verified:
+        os.replace(partial_path, archive_path)
+    else:
+        os.remove(partial_path)
+    return verified
+
+
+def _write_partial_archive(wf_id, partial_path):
+    """Write the compressed tarball of a workflow directory; returns True if it checks out."""
+    workflows_dir = wf_utils.get_workflows_dir()
+    total = dir_size(os.path.join(workflows_dir, wf_id))
+    compress = compress_command()
+    reported = 0
+    with open(partial_path, 'wb') as archive:
+        # We use tar directly since tarfile is apparently very slow
+        with subprocess.Popen(['tar', '-cf', '-', wf_id], cwd=workflows_dir,
+                              stdout=subprocess.PIPE) as tar, \
+             subprocess.Popen(compress, stdin=subprocess.PIPE, stdout=archive) as compressor:
+            written = 0
+            try:
+                for chunk in iter(lambda: tar.stdout.read(ARCHIVE_CHUNK_SIZE), b''):
+                    compressor.stdin.write(chunk)
+                    written += len(chunk)
+                    # The tar headers make the stream a little larger than the files
+                    percent = min(99, written * 100 // total) if total else 0
+                    if percent >= reported + 10:
+                        reported = percent
+                        wf_utils.update_wf_status(wf_id, f'Archiving/Compressing {percent}%')
+                compressor.stdin.close()
+            except BrokenPipeError:
+                # The compressor failed, which its exit code reports below
+                pass
+    # tar exits with 1 if a file changed while it was read, which still gives a usable archive
+    written_ok = tar.returncode in (0, 1) and compressor.returncode == 0
+    wf_utils.update_wf_status(wf_id, 'Archiving/Verifying')
+    return written_ok and subprocess.call([compress[0], '-t', partial_path]) == 0
+
+
 def archive_fail_workflow(wf_id):
     """Archive and fail a workflow."""
     archive_workflow(wf_id, final_state='Failed')
@@ -64,13 +173,24 @@ def archive_fail_workflow(wf_id):
 
 def set_dependent_tasks_dep_fail(wfi, task):
     """Recursively set all dependent task states of this task to DEP_FAIL."""
-    # List of tasks whose states have already been updated
-    set_tasks = [task]
-    while len(set_tasks) > 0:
-        dep_tasks = wfi.get_dependent_tasks(set_tasks.pop().id)
-        for dep_task in dep_tasks:
-            wfi.set_task_state(dep_task.id, 'DEP_FAIL')
-        set_tasks.extend(dep_tasks)
+    wfi.mark_downstream(task.id, 'DEP_FAIL')
+
+
+class UpdateBatch:
+    """Work left over after applying a batch of task updates for one workflow."""
+
+    def __init__(self):
+        """Construct an empty batch."""
+        # Set when a task completed, so that newly runnable tasks must be found
+        self.completed_tasks = False
+        # Set when a task reached a state that may end the workflow
+        self.state_changed = False
+        # Set when a task ran out of restarts and the workflow failed
+        self.failed = False
+        # Restarted tasks to submit to the TM
+        self.restarted_tasks = []
+        # Chained tasks to cancel in the TM since a task they wait for failed
+        self.cancelled_tasks = []
 
 
 class WFUpdate(Resource):
@@ -85,27 +205,58 @@ class WFUpdate(Resource):
         """Do a batch update of task states from the task manager."""
         state_updates = TaskStateUpdateRequest.model_validate(request.json).state_updates
 
+        # Group the updates by workflow, keeping their order within a workflow
+        wf_updates = {}
         for state_update in state_updates:
-            self.update_task_state(state_update)
+            wf_updates.setdefault(state_update.wf_id, []).append(state_update)
+        for wf_id, updates in wf_updates.items():
+            self.update_workflow(wf_id, updates)
 
         return TaskStateUpdateResponse(
             msg='Task states updated successfully',
         ).model_dump(), 200
 
-    def handle_metadata(self, state_update, task_id, wfi, task_workdir):
+    def update_workflow(self, wf_id, state_updates):
+        """Apply the task updates of one workflow.
+
+        The state and metadata changes are made in a single transaction. The
+        newly runnable tasks are then looked up once and submitted to the TM
+        together, and the workflow is archived if it's done.
+        """
+        wfi = wf_utils.get_workflow_interface(wf_id)
+        batch = UpdateBatch()
+        with wfi.transaction():
+            for state_update in state_updates:
+                self.update_task_state(state_update, wfi, batch)
+            tasks = list(batch.restarted_tasks)
+            if batch.completed_tasks:
+                ready_tasks = wfi.update_ready_tasks()
+                if wf_utils.get_wf_status(wf_id) not in ('Paused', 'Cancelled'):
+                    restarted_ids = {task.id for task in tasks}
+                    tasks.extend(task for task in ready_tasks if task.id not in restarted_ids)
+
+        if batch.cancelled_tasks:
+            wf_utils.cancel_tasks_tm(wf_id, batch.cancelled_tasks)
+        if tasks:
+            wf_utils.submit_tasks_tm(wf_id, tasks)
+        if batch.failed:
+            archive_fail_workflow(wf_id)
+        elif batch.state_changed:
+            self.check_workflow_completed(wfi)
+
+    def handle_metadata(self, state_update, task, wfi):
         """Handle metadata for a task update."""
         bee_workdir = wf_utils.get_bee_workdir()
 
         # Get metadata from update if available
         if state_update.metadata is not None:
-            old_metadata = wfi.get_task_metadata(task_id)
+            old_metadata = wfi.get_task_metadata(task.id)
             new_metadata = wf_utils.flatten_metadata_dict(state_update.metadata)
             clean_metadata = wf_utils.clean_dict(new_metadata)
             old_metadata.update(clean_metadata)
-            wfi.set_task_metadata(task_id, old_metadata)
-            task_name = wfi.get_task_by_id(task_id).name
+            wfi.set_task_metadata(task.id, old_metadata)
 
-            task_dir = f'{task_workdir}/{task_name}-{task_id[:4]}'
+            task_dir = f'{task.workdir}/{task.name}-{task.id[:4]}'
             metadata_path = os.path.join(task_dir,'metadata.yaml')
 
             # Create the metadata directory for sbatch runs
@@ -116,12 +267,12 @@ class WFUpdate(Resource):
 
         # Get output from the task
         if state_update.output is not None:
-            fname = f'{wfi.workflow_id}_{task_id}_{int(time.time())}.json'
+            fname = f'{wfi.workflow_id}_{task.id}_{int(time.time())}.json'
             task_output_path = os.path.join(bee_workdir, fname)
             with open(task_output_path, 'w', encoding='utf8') as fp:
                 json.dump(state_update.output, fp, indent=4)
 
-    def handle_checkpoint_restart(self, state_update, task, wfi):
+    def handle_checkpoint_restart(self, state_update, task, wfi, batch):
         """Handle checkpoint restart for a task update.
 
         Returns True if a checkpoint-restart was done, else False (indicating
@@ -132,19 +283,16 @@ class WFUpdate(Resource):
             new_task = wfi.restart_task(task, checkpoint_file)
             if new_task is None:
                 log.info('No more restarts')
-                archive_fail_workflow(state_update.wf_id)
+                batch.failed = True
                 return True
-            # Submit the restart task
-            tasks = [new_task]
-            wf_utils.submit_tasks_tm(state_update.wf_id, tasks)
+            # Submit the restart task along with the rest of the batch
+            batch.restarted_tasks.append(new_task)
             log.info(f'Task {state_update.task_id} restarted')
             return True
         return False
 
-    def handle_state_change(self, state_update, task, wfi):
+    def handle_state_change(self, state_update, task, wfi, batch):
         """Handle a normal state change for a task."""
-        wf_id = wfi.workflow_id
-        wf_state = wf_utils.get_wf_status(wf_id)
         if state_update.job_state == 'COMPLETED':
             for output in task.outputs:
                 if output.glob is not None:
@@ -152,18 +300,24 @@ class WFUpdate(Resource):
                 else:
                     wfi.set_task_output(task.id, output.id, "temp")
             wf_utils.copy_task_output(task)
-            tasks = wfi.finalize_task(task)
-            if tasks and wf_state not in ('Paused', 'Cancelled'):
-                wf_utils.submit_tasks_tm(state_update.wf_id, tasks)
+            wfi.complete_task(task)
+            batch.completed_tasks = True
 
         # If the job failed, fail the dependent tasks
         # TIMEOUT states should only be seen here if they can't restart
         if state_update.job_state in [
             'FAILED', 'SUBMIT_FAIL', 'BUILD_FAIL', 'TIMEOUT', 'CANCELLED'
         ]:
+            if wf_utils.native_dependencies_enabled():
+                batch.cancelled_tasks.extend(wf_utils.queued_dependents(wfi, task))
             set_dependent_tasks_dep_fail(wfi, task)
             log.info(f"Task {task.name} failed")
+        batch.state_changed = True
 
+    def check_workflow_completed(self, wfi):
+        """Archive the workflow if all of its tasks are done."""
+        wf_id = wfi.workflow_id
+        wf_state = wf_utils.get_wf_status(wf_id)
         if wfi.workflow_completed():
             final_state = wfi.get_workflow_final_state()
             log.info(f"Workflow {wf_id} Completed")
@@ -174,15 +328,14 @@ class WFUpdate(Resource):
             archive_workflow(wf_id, final_state=wf_state)
             log.info('Workflow Archived')
 
-    def update_task_state(self, state_update):
+    def update_task_state(self, state_update, wfi, batch):
         """Update the state of a single task from the task manager."""
-        wfi = wf_utils.get_workflow_interface(state_update.wf_id)
         task = wfi.get_task_by_id(state_update.task_id)
         wfi.set_task_state(state_update.task_id, state_update.job_state)
 
         # Check if task exists, since it may not have been submitted yet
         if task:
-            self.handle_metadata(state_update, state_update.task_id, wfi, task.workdir)
+            self.handle_metadata(state_update, task, wfi)
 
-            if not self.handle_checkpoint_restart(state_update, task, wfi):
-                self.handle_state_change(state_update, task, wfi)
+            if not self.handle_checkpoint_restart(state_update, task, wfi, batch):
+                self.handle_state_change(state_update, task, wfi, batch)
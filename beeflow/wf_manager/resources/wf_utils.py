@@ -17,7 +17,9 @@ from beeflow.common.connection import Connection
 from beeflow.common import paths
 from beeflow.common.db import wfm_db
 from beeflow.common.db.bdb import connect_db
-from beeflow.task_manager.models import SubmitTasksRequest
+from beeflow.task_manager.models import (SubmitTasksRequest, CancelTasksRequest,
+                                         PrefetchRequest, PrefetchProgress)
+from beeflow.common.build.utils import image_tasks
 from beeflow.common.deps.neo4j_manager import connect_neo4j_driver
 
 
@@ -164,6 +166,7 @@ def tm_url():
 
 # Base URLs for the TM and the Scheduler
 TM_URL = "bee_tm/v1/task/"
+TM_PREFETCH_URL = "bee_tm/v1/prefetch/"
 
 
 def _connect_tm():
@@ -176,10 +179,125 @@ def _taskmanager(tag=""):
     return TM_URL + str(tag)
 
 
+# Schedulers that can hold a job until the jobs it depends on have completed
+NATIVE_DEPENDENCY_SCHEDULERS = ('Slurm', 'Flux', 'LSF')
+# States of a chained task that is still waiting in the TM or the scheduler
+QUEUED_STATES = ('SUBMIT', 'PENDING', 'RUNNING', 'COMPLETING')
+
+
+def native_dependencies_enabled():
+    """Return true if dependent tasks should be chained with scheduler dependencies.
+
+    Tasks run by a pilot agent are never chained, since the agent starts them
+    as soon as they arrive.
+    """
+    return (bc.get('workflow_manager', 'native_dependencies')
+            and not bc.get('pilot', 'enabled')
+            and bc.get('DEFAULT', 'workload_scheduler') in NATIVE_DEPENDENCY_SCHEDULERS)
+
+
+def chain_dependent_tasks(wfi, tasks):
+    """Find the waiting tasks that can be submitted along with tasks.
+
+    A waiting task can be chained if each of its unset inputs comes from an
+    output with a glob of a task that is being submitted, since the value of
+    that input is then known in advance. Chained tasks are returned with
+    those inputs filled in, along with a dict mapping each chained task ID to
+    the IDs of the tasks it has to wait for. Tasks that can be restarted from
+    a checkpoint are never chained to, since a restart runs as a new task.
+
+    :param wfi: the workflow interface
+    :type wfi: WorkflowInterface
+    :param tasks: the tasks being submitted
+    :type tasks: list of Task
+    :rtype: tuple of (list of Task, dict)
+    """
+    outputs = {}
+    chained = []
+    dependencies = {}
+    pending = list(tasks)
+    seen = {task.id for task in tasks}
+    while pending:
+        task = pending.pop(0)
+        if task.get_full_requirement('beeflow:CheckpointRequirement') is not None:
+            continue
+        for output in task.outputs:
+            if output.glob is not None:
+                outputs[output.id] = (task.id, output.glob)
+        for dependent in wfi.get_dependent_tasks(task.id):
+            if dependent.id in seen or dependent.state != 'WAITING':
+                continue
+            unset = [input_ for input_ in dependent.inputs if input_.value is None]
+            if not unset or not all(input_.source in outputs for input_ in unset):
+                continue
+            seen.add(dependent.id)
+            dependent = dependent.model_copy(deep=True)
+            upstream = []
+            for input_ in dependent.inputs:
+                if input_.value is None:
+                    task_id, input_.value = outputs[input_.source]
+                    if task_id not in upstream:
+                        upstream.append(task_id)
+            chained.append(dependent)
+            dependencies[dependent.id] = upstream
+            pending.append(dependent)
+    return chained, dependencies
+
+
+def queued_dependents(wfi, task):
+    """Return the IDs of the downstream tasks of task that were already submitted.
+
+    These are tasks that were chained to task (directly or not) and that
+    have to be cancelled if it fails.
+
+    :param wfi: the workflow interface
+    :type wfi: WorkflowInterface
+    :param task: the upstream task
+    :type task: Task
+    :rtype: list of str
+    """
+    task_ids = []
+    pending = [task.id]
+    seen = set(pending)
+    while pending:
+        for dependent in wfi.get_dependent_tasks(pending.pop(0)):
+            if dependent.id in seen or dependent.state not in QUEUED_STATES:
+                continue
+            seen.add(dependent.id)
+            task_ids.append(dependent.id)
+            pending.append(dependent.id)
+    return task_ids
+
+
+def cancel_tasks_tm(wf_id, task_ids):
+    """Cancel the given tasks of a workflow in the task manager."""
+    log.info("Cancelling %s of workflow %s in Task Manager", task_ids, wf_id)
+    try:
+        conn = _connect_tm()
+        resp = conn.delete(
+            _taskmanager(),
+            json=CancelTasksRequest(task_ids=task_ids).model_dump(),
+            timeout=5,
+        )
+    except requests.exceptions.ConnectionError:
+        log.error("Unable to connect to task manager to cancel tasks.")
+        return
+    if resp.status_code != 200:
+        log.info("Cancel tasks in TM returned bad status: %s", resp.status_code)
+
+
 # Submit tasks to the TM
 def submit_tasks_tm(wf_id, tasks):
-    """Submit a task to the task manager."""
+    """Submit a task to the task manager.
+
+    If native dependencies are enabled, the waiting tasks that only depend
+    on these tasks are submitted too, chained to them in the scheduler.
+    """
     wfi = get_workflow_interface(wf_id)
+    dependencies = {}
+    if native_dependencies_enabled():
+        chained, dependencies = chain_dependent_tasks(wfi, tasks)
+        tasks = list(tasks) + chained
     # Serialize task with json
     names = [task.name for task in tasks]
     log.info("Submitted %s to Task Manager", names)
@@ -187,7 +305,7 @@ def submit_tasks_tm(wf_id, tasks):
         conn = _connect_tm()
         resp = conn.post(
             _taskmanager(),
-            json=SubmitTasksRequest(tasks=tasks).model_dump(),
+            json=SubmitTasksRequest(tasks=tasks, dependencies=dependencies).model_dump(),
             timeout=5,
         )
     except requests.exceptions.ConnectionError:
@@ -202,17 +320,61 @@ def submit_tasks_tm(wf_id, tasks):
         log.info("Submit task to TM returned bad status: %s", resp.status_code)
 
 
+def prefetch_images_tm(wf_id, tasks):
+    """Ask the task manager to pull or build the container images of a workflow.
+
+    Only one task is sent for each distinct DockerRequirement.
+    """
+    images = image_tasks(tasks)
+    if not images:
+        return
+    log.info("Prefetching %d container images for workflow %s", len(images), wf_id)
+    try:
+        conn = _connect_tm()
+        resp = conn.post(
+            TM_PREFETCH_URL + wf_id,
+            json=PrefetchRequest(tasks=images).model_dump(),
+            timeout=5,
+        )
+    except requests.exceptions.ConnectionError:
+        log.error("Unable to connect to task manager to prefetch images.")
+        return
+    if resp.status_code != 200:
+        log.info("Prefetch images in TM returned bad status: %s", resp.status_code)
+
+
+def forget_prefetch_tm(wf_id):
+    """Have the task manager drop the image prefetch progress of a workflow."""
+    try:
+        conn = _connect_tm()
+        conn.delete(TM_PREFETCH_URL + wf_id, timeout=5)
+    except requests.exceptions.RequestException:
+        log.error("Unable to connect to task manager to forget the image prefetch.")
+
+
+def prefetch_progress_tm(wf_id):
+    """Return the image prefetch progress of a workflow (None if unknown)."""
+    try:
+        conn = _connect_tm()
+        resp = conn.get(TM_PREFETCH_URL + wf_id, timeout=5)
+    except requests.exceptions.RequestException:
+        # Progress is informational, so status queries shouldn't fail without it
+        return None
+    if resp.status_code != 200:
+        return None
+    return PrefetchProgress.model_validate(resp.json())
+
+
 def setup_workflow(wf_id, wf_name, wf_dir, wf_workdir, no_start, workflow=None, # pylint: disable=W0613
                    tasks=None):
     """Initialize Workflow and Tasks then start workflow in separate process"""
     wfi = get_workflow_interface(wf_id)
-    wfi.initialize_workflow(workflow)
+    for task in tasks:
+        task.state = "" if no_start else "WAITING"
+    wfi.load_workflow(workflow, tasks)
 
     log.info("Setting workflow metadata")
     create_wf_metadata(wf_id, wf_name)
-    for task in tasks:
-        task.state = "" if no_start else "WAITING"
-        wfi.add_task(task)
 
     if no_start:
         update_wf_status(wf_id, "No Start")
@@ -249,6 +411,8 @@ def start_workflow(wf_id):
         if task.state == "":
             wfi.set_task_state(task.id, "WAITING")
     wfi.execute_workflow()
+    # Get the images of later tasks ready while the first ones run
+    prefetch_images_tm(wf_id, tasks)
     tasks = wfi.get_ready_tasks()
     submit_tasks_tm(wf_id, tasks)
     update_wf_status(wf_id, "Running")